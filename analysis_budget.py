@@ -0,0 +1,114 @@
+import time
+from typing import Dict, Any, Optional, Iterator, Tuple
+
+import sqlparse
+
+class BudgetExceeded(Exception):
+    """Raised at a cooperative checkpoint once the wall-time budget has run out"""
+
+class AnalysisBudget:
+    """Input size, statement count, per-statement token and wall-time limits for one analysis request"""
+
+    def __init__(self, max_input_bytes: Optional[int] = None, max_statements: Optional[int] = None,
+                 max_statement_tokens: Optional[int] = None, max_seconds: Optional[float] = None):
+        # 0 or None disables a limit
+        self.max_input_bytes = max_input_bytes or None
+        self.max_statements = max_statements or None
+        self.max_statement_tokens = max_statement_tokens or None
+        self.max_seconds = max_seconds or None
+        self.deadline = None
+        self.reasons = []
+        self.skipped_statements = []
+        self.statements_total = 0
+        self.bytes_seen = 0
+        self.admitted = 0
+
+    @property
+    def truncated(self) -> bool:
+        """Whether any statement was left out of the analysis"""
+        return bool(self.reasons or self.skipped_statements)
+
+    @property
+    def exhausted(self) -> bool:
+        """Whether the wall-time budget has run out; no further statement should be started"""
+        return 'max_seconds' in self.reasons
+
+    def start(self) -> None:
+        """Start the clock (once); queued background jobs only start it when they begin running"""
+        if self.deadline is None and self.max_seconds:
+            self.deadline = time.monotonic() + self.max_seconds
+
+    def check(self) -> None:
+        """Cooperative cancellation point for the analyzer's loops"""
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            if 'max_seconds' not in self.reasons:
+                self.reasons.append('max_seconds')
+            raise BudgetExceeded(f"analysis exceeded {self.max_seconds} seconds")
+
+    def statements(self, sql_content: str) -> Iterator[Tuple[int, str]]:
+        """(number, text) of the statements that fit the input, statement-count and token budgets
+
+        Repeated calls (one per file of an archive) share the budgets and continue the statement numbering.
+        """
+        self.start()
+        encoded = sql_content.encode('utf-8')
+        remaining = None if self.max_input_bytes is None else max(self.max_input_bytes - self.bytes_seen, 0)
+        self.bytes_seen += len(encoded)
+        truncated_input = remaining is not None and len(encoded) > remaining
+        if truncated_input:
+            self._stop('max_input_bytes')
+            sql_content = encoded[:remaining].decode('utf-8', 'ignore')
+
+        # split() only runs the lexer; the costly grouping pass happens per admitted statement
+        texts = sqlparse.split(sql_content)
+        if truncated_input and texts:
+            # The last statement was cut in the middle
+            texts.pop()
+        offset = self.statements_total
+        self.statements_total += len(texts)
+
+        for number, text in enumerate(texts, offset + 1):
+            if not text.strip():
+                continue
+            if self.max_statements is not None and self.admitted >= self.max_statements:
+                self._stop('max_statements')
+                return
+            self.check()
+            if self.max_statement_tokens is not None and self._exceeds_tokens(text):
+                self.skip(number, 'max_statement_tokens')
+                continue
+            self.admitted += 1
+            yield number, text
+
+    def _stop(self, reason: str) -> None:
+        if reason not in self.reasons:
+            self.reasons.append(reason)
+
+    def skip(self, number: int, reason: str) -> None:
+        """Record a statement that could not be analyzed within the budget"""
+        self.skipped_statements.append({'statement': number, 'reason': reason})
+
+    def report(self) -> Dict[str, Any]:
+        """Why and where the analysis stopped short, for the response"""
+        return {
+            'truncated': self.truncated,
+            'reasons': list(self.reasons),
+            'skipped_statements': list(self.skipped_statements),
+            'statements_in_input': self.statements_total,
+            'limits': {
+                'max_input_bytes': self.max_input_bytes,
+                'max_statements': self.max_statements,
+                'max_statement_tokens': self.max_statement_tokens,
+                'max_seconds': self.max_seconds
+            }
+        }
+
+    def _exceeds_tokens(self, text: str) -> bool:
+        """Count significant tokens, stopping as soon as the limit is passed"""
+        count = 0
+        for ttype, _ in sqlparse.lexer.tokenize(text):
+            if ttype not in sqlparse.tokens.Whitespace and ttype not in sqlparse.tokens.Comment:
+                count += 1
+                if count > self.max_statement_tokens:
+                    return True
+        return False
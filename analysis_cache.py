@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from typing import Dict, Any, Optional, Iterable
+
+import sqlparse
+
+DEFAULT_CACHE_DB = os.path.join(tempfile.gettempdir(), 'sql_optimizer_cache.sqlite3')
+# Let every worker read pages straight from the shared OS page cache
+MMAP_SIZE_BYTES = 256 * 1024 * 1024
+PRUNE_EVERY_WRITES = 500
+
+def source_digest(*modules) -> str:
+    """Digest of the given modules' source files, so cached results expire when the analysis code changes"""
+    digest = hashlib.blake2b(digest_size=8)
+    for module in modules:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+class AnalysisCache:
+    """Analysis results shared by every worker process on a host through a WAL-mode SQLite file"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_DB, max_entries: int = 100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._writes = 0
+
+        conn = self._connection()
+        # WAL lets readers in every process proceed while one writer commits
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                key BLOB PRIMARY KEY,
+                value BLOB NOT NULL,
+                created_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS analyses_created_at_idx ON analyses (created_at)')
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connection owned by the current process and thread"""
+        # Workers forked from a --preload master must never reuse the master's handle
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA mmap_size={MMAP_SIZE_BYTES}')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def key(self, statement, context: str) -> bytes:
+        """Cache key of a statement's text, with comments and whitespace normalized, within a context"""
+        # Unlike fingerprint(), literals stay in the key: analyses quote OFFSETs, compared values, ...
+        tokens = sqlparse.lexer.tokenize(str(statement))
+        text = ' '.join(
+            value for ttype, value in tokens
+            if ttype not in sqlparse.tokens.Whitespace and ttype not in sqlparse.tokens.Comment and value != ';'
+        )
+        return hashlib.blake2b(f"{context}\x00{text}".encode('utf-8'), digest_size=16).digest()
+
+    def get(self, key: bytes) -> Optional[Any]:
+        """Cached value for a key, or None"""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, Any]:
+        """Cached values for the keys that are present"""
+        keys = list(keys)
+        found = {}
+        try:
+            conn = self._connection()
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, value FROM analyses WHERE key IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, value in rows:
+                    found[bytes(key)] = self._decode(value)
+        except sqlite3.Error:
+            # A busy or unreadable cache file only costs a recomputation
+            pass
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key: bytes, value: Any) -> None:
+        """Store one value"""
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[bytes, Any]) -> None:
+        """Store several values in one transaction"""
+        if not items:
+            return
+        now = time.time()
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO analyses (key, value, created_at) VALUES (?, ?, ?)',
+                    [(key, self._encode(value), now) for key, value in items.items()]
+                )
+            self._writes += len(items)
+            if self._writes >= PRUNE_EVERY_WRITES:
+                self._writes = 0
+                self.prune()
+        except sqlite3.Error:
+            pass
+
+    def prune(self) -> int:
+        """Drop the oldest entries beyond max_entries; returns the number removed"""
+        conn = self._connection()
+        with conn:
+            count = conn.execute('SELECT COUNT(*) FROM analyses').fetchone()[0]
+            if count <= self.max_entries:
+                return 0
+            return conn.execute(
+                'DELETE FROM analyses WHERE key IN (SELECT key FROM analyses ORDER BY created_at LIMIT ?)',
+                (count - self.max_entries,)
+            ).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count and file size, plus this process's hit/miss counters"""
+        conn = self._connection()
+        entries = conn.execute('SELECT COUNT(*) FROM analyses').fetchone()[0]
+        return {
+            'path': self.path,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'size_bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+    def _encode(self, value: Any) -> bytes:
+        """Compact JSON, zlib-compressed"""
+        return zlib.compress(json.dumps(value, separators=(',', ':'), default=str).encode('utf-8'))
+
+    def _decode(self, blob: bytes) -> Any:
+        """Inverse of _encode"""
+        return json.loads(zlib.decompress(blob))
@@ -1,12 +1,23 @@
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for
-import sqlparse
+from flask import Flask, Request, render_template, request, jsonify, flash, redirect, url_for, Response
+import io
 import os
-from werkzeug.utils import secure_filename
-from sql_analyzer import SQLAnalyzer
-from sql_optimizer import SQLOptimizer
+import sys
+import hashlib
+import importlib
+import threading
+from werkzeug.exceptions import RequestEntityTooLarge
 import json
+import base64
+
+class InMemoryRequest(Request):
+    """Keeps uploaded files in memory; Werkzeug would spool anything over 500 KB to a temporary file"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # MAX_CONTENT_LENGTH bounds what can be buffered
+        return io.BytesIO()
 
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here')  # Use environment variable
 
 # Application Configuration
@@ -20,18 +31,363 @@ APP_CONFIG = {
     'linkedin_url': 'www.linkedin.com/in/scott-xin-shi'
 }
 
-# Configuration
-UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'sql', 'txt'}
+# Configuration: uploads are never written to disk, so these bound the memory one request can take
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 32 * 1024 * 1024))
+# Total size the files inside an archive may expand to, against zip bombs
+MAX_DECOMPRESSED_BYTES = int(os.environ.get('MAX_DECOMPRESSED_BYTES', 64 * 1024 * 1024))
+MAX_ARCHIVE_FILES = int(os.environ.get('MAX_ARCHIVE_FILES', 1000))
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
 app.config['APP_CONFIG'] = APP_CONFIG
 
-# Ensure upload directory exists
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Startup: 'lazy' (default) imports the analyzers and opens the job store, analysis cache and cost model on
+# first use, so serverless and Passenger cold starts only pay for Flask; 'eager' loads everything at import,
+# which suits `gunicorn --preload` where workers fork from an already warm master
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'lazy')
+# Classes and modules imported on first use: name -> (module, attribute)
+LAZY_IMPORTS = {
+    'SQLAnalyzer': ('sql_analyzer', 'SQLAnalyzer'),
+    'SQLOptimizer': ('sql_optimizer', 'SQLOptimizer'),
+    'SchemaCatalog': ('schema_catalog', 'SchemaCatalog'),
+    'IndexAdvisor': ('index_advisor', 'IndexAdvisor'),
+    'DDLAnalyzer': ('ddl_analyzer', 'DDLAnalyzer'),
+    'AnalysisBudget': ('analysis_budget', 'AnalysisBudget'),
+    'WorkloadReport': ('workload_report', 'WorkloadReport'),
+    'JobQueueFull': ('job_queue', 'JobQueueFull'),
+    'sqlparse': ('sqlparse', None)
+}
+_lazy_lock = threading.RLock()
+
+def lazy(name):
+    """A LAZY_IMPORTS class or LAZY_SERVICES object, loaded once per process on first use"""
+    if name not in globals():
+        with _lazy_lock:
+            if name not in globals():
+                if name in LAZY_IMPORTS:
+                    module, attribute = LAZY_IMPORTS[name]
+                    module = importlib.import_module(module)
+                    globals()[name] = getattr(module, attribute) if attribute else module
+                else:
+                    globals()[name] = LAZY_SERVICES[name]()
+    return globals()[name]
+
+def __getattr__(name):
+    """`app.SQLAnalyzer`, `app.analysis_cache`, ... resolve through lazy() for importers and tests"""
+    if name in LAZY_IMPORTS or name in LAZY_SERVICES:
+        return lazy(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def build_job_queue():
+    """Background analysis jobs: results are shared across worker processes through SQLite"""
+    from job_queue import JobStore, JobQueue, DEFAULT_JOB_DB
+    return JobQueue(
+        JobStore(os.environ.get('JOB_STORE_PATH', DEFAULT_JOB_DB), ttl_seconds=int(os.environ.get('JOB_TTL_SECONDS', 3600))),
+        max_workers=int(os.environ.get('JOB_WORKERS', 2)),
+        max_pending=int(os.environ.get('JOB_QUEUE_LIMIT', 20))
+    )
+
+def build_analysis_cache():
+    """Per-statement results shared by every gunicorn worker on the host; ANALYSIS_CACHE_PATH= disables it"""
+    from analysis_cache import AnalysisCache, DEFAULT_CACHE_DB
+    path = os.environ.get('ANALYSIS_CACHE_PATH', DEFAULT_CACHE_DB)
+    if not path:
+        return None
+    return AnalysisCache(path, max_entries=int(os.environ.get('ANALYSIS_CACHE_MAX_ENTRIES', 100000)))
+
+def analysis_code_version():
+    """Digest of the analysis code, so cached results expire when it changes"""
+    from analysis_cache import source_digest
+    return source_digest(*(
+        sys.modules[lazy(component).__module__]
+        for component in ('SQLAnalyzer', 'SQLOptimizer', 'SchemaCatalog', 'IndexAdvisor', 'DDLAnalyzer')
+    ))
+
+def load_cost_model():
+    """Weights fitted by cost_calibration.py replace the hand-picked complexity weights and issue penalties"""
+    path = os.environ.get('COST_MODEL_PATH', 'cost_model.json')
+    if not path or not os.path.exists(path):
+        return None
+    from cost_calibration import CostModel
+    model = CostModel.load(path)
+    # An all-zero model would score every query the same; keep the hand-picked weights instead
+    return None if model.is_degenerate() else model
+
+# Objects built on first use: name -> factory
+LAZY_SERVICES = {
+    'job_queue': build_job_queue,
+    'analysis_cache': build_analysis_cache,
+    'ANALYSIS_CODE_VERSION': analysis_code_version,
+    'cost_model': load_cost_model
+}
+
+def new_analyzer(schema=None, budget=None, dialect='postgresql'):
+    """SQLAnalyzer with the calibrated cost model, if one is configured"""
+    return lazy('SQLAnalyzer')(schema=schema, budget=budget, cost_model=lazy('cost_model'), dialect=dialect)
+
+def new_optimizer(schema=None, **options):
+    """SQLOptimizer with the calibrated cost model, if one is configured"""
+    return lazy('SQLOptimizer')(schema=schema, cost_model=lazy('cost_model'), **options)
+
+def build_schema_catalog(ddl=None, index_usage=None, table_stats=None):
+    """Build a SchemaCatalog from optional DDL text and index-usage / table-stats CSV exports"""
+    if not ddl and not index_usage and not table_stats:
+        return None
+    
+    catalog = lazy('SchemaCatalog')()
+    if ddl:
+        catalog.load_ddl(ddl)
+    if index_usage:
+        catalog.load_index_usage(index_usage)
+    if table_stats:
+        catalog.load_table_stats(table_stats)
+    return catalog
+
+def read_submitted_files():
+    """SQL from the `sql_file` upload (plain, .sql.gz, .zip or .tar.gz) or the `sql_text` form field
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    Returns ([(name, sql), ...], error). Names are archive member paths, or None for pasted text and plain
+    .sql/.txt uploads. Raises RequestEntityTooLarge past MAX_UPLOAD_BYTES or MAX_DECOMPRESSED_BYTES.
+    """
+    from sql_archive import SQLArchiveReader, UploadError, DecompressionLimitExceeded, upload_kind
+    files = []
+    
+    # Handle file upload, decoded straight from the in-memory request stream
+    if 'sql_file' in request.files:
+        file = request.files['sql_file']
+        if not file or file.filename == '':
+            return None, 'No file selected.'
+        reader = SQLArchiveReader(max_decompressed_bytes=MAX_DECOMPRESSED_BYTES, max_files=MAX_ARCHIVE_FILES)
+        try:
+            files = reader.read(file.stream, file.filename)
+        except DecompressionLimitExceeded as e:
+            raise RequestEntityTooLarge(str(e))
+        except UploadError as e:
+            return None, str(e)
+        if upload_kind(file.filename) == 'sql':
+            files = [(None, sql) for _, sql in files]
+    
+    # Handle direct SQL input
+    elif 'sql_text' in request.form:
+        files = [(None, request.form['sql_text'])]
+    
+    files = [(name, sql) for name, sql in files if sql.strip()]
+    if not files:
+        return None, 'No SQL content provided.'
+    return files, None
+
+def file_summaries(files, result_files, analysis_results, optimizer):
+    """Per-file totals for an archive upload, in archive order"""
+    summaries = []
+    for name, _ in files:
+        results = [analysis for file_name, analysis in zip(result_files, analysis_results) if file_name == name]
+        summaries.append({
+            'name': name,
+            'total_queries': len(results),
+            'issues_found': sum(len(analysis.get('issues', [])) for analysis in results),
+            'optimization_score': optimizer.calculate_optimization_score(results)
+        })
+    return summaries
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    """JSON 413 for uploads past MAX_UPLOAD_BYTES or archives past MAX_DECOMPRESSED_BYTES"""
+    description = error.description
+    if description == RequestEntityTooLarge.description:
+        description = f'Upload exceeds {MAX_UPLOAD_BYTES} bytes'
+    return jsonify({'error': description}), 413
+
+def format_query_result(query_id, query, analysis, suggestions, formatted=True):
+    """Shape one analyzed query the way the web UI renders it"""
+    return {
+        'id': query_id,
+        'original_query': str(query),
+        # Reindenting is the most expensive step for big files, so it can be skipped
+        'formatted_query': lazy('sqlparse').format(str(query), reindent=True, keyword_case='upper') if formatted else None,
+        'analysis': analysis,
+        'suggestions': suggestions
+    }
+
+# Per-request analysis limits (0 disables one). sqlparse's grouping pass grows quadratically with
+# statement length, so the token limit also bounds how far a single statement can overrun the time limit
+ANALYSIS_BUDGET = {
+    'max_input_bytes': int(os.environ.get('ANALYSIS_MAX_INPUT_BYTES', 10 * 1024 * 1024)),
+    'max_statements': int(os.environ.get('ANALYSIS_MAX_STATEMENTS', 20000)),
+    'max_statement_tokens': int(os.environ.get('ANALYSIS_MAX_STATEMENT_TOKENS', 10000)),
+    'max_seconds': float(os.environ.get('ANALYSIS_MAX_SECONDS', 20))
+}
+# Background jobs exist for large uploads and get a longer time limit
+JOB_MAX_SECONDS = float(os.environ.get('JOB_MAX_SECONDS', 600))
+# Largest page of statements one paginated request analyzes
+MAX_PAGE_LIMIT = int(os.environ.get('ANALYSIS_MAX_PAGE_LIMIT', 1000))
+
+def analysis_budget(**overrides):
+    """A fresh AnalysisBudget with the configured limits"""
+    return lazy('AnalysisBudget')(**dict(ANALYSIS_BUDGET, **overrides))
+
+def analysis_context(schema_inputs=(), dialect='postgresql', batch_size=5000):
+    """Cache namespace: everything besides the statement that its analysis and suggestions depend on"""
+    cost_model = lazy('cost_model')
+    key = json.dumps([lazy('ANALYSIS_CODE_VERSION'), cost_model.digest() if cost_model else None, dialect,
+                      int(batch_size), *schema_inputs])
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+
+def analyze_statement(analyzer, optimizer, query, context):
+    """(analysis, suggestions) for one statement, reusing a result any worker already cached"""
+    cache = lazy('analysis_cache')
+    key = cache.key(query, context) if cache else None
+    cached = cache.get(key) if key else None
+    if cached is not None:
+        return cached['analysis'], cached['suggestions']
+    
+    analyses = analyzer.analyze_queries([query])
+    if not analyses:
+        return None, None
+    suggestions = optimizer.generate_suggestions(analyses)[0]
+    if key:
+        cache.set(key, {'analysis': analyses[0], 'suggestions': suggestions})
+    return analyses[0], suggestions
+
+def parse_fields(value):
+    """Sparse fieldset from `fields=issues,complexity_score` (or a JSON list); None means every field"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    return {field.strip() for field in value if field.strip()}
+
+def encode_cursor(offset):
+    """Opaque pagination cursor pointing at a statement offset"""
+    return base64.urlsafe_b64encode(json.dumps({'offset': offset}).encode()).decode()
+
+def decode_cursor(cursor):
+    """Statement offset from a cursor returned by a previous page"""
+    if not cursor:
+        return 0
+    try:
+        return max(0, int(json.loads(base64.urlsafe_b64decode(cursor.encode()))['offset']))
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Invalid pagination cursor')
+
+def parse_page_limit(value):
+    """Statements per page from `limit`, capped at MAX_PAGE_LIMIT"""
+    if value in (None, ''):
+        return 100
+    try:
+        limit = int(value)
+    except (ValueError, TypeError):
+        raise ValueError('limit must be a positive integer')
+    if isinstance(value, (bool, float)) or limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, MAX_PAGE_LIMIT)
+
+def is_statement(text):
+    """Whether split() text holds more than comments and whitespace, judged by the lexer alone"""
+    sqlparse = lazy('sqlparse')
+    return any(ttype not in sqlparse.tokens.Comment and ttype not in sqlparse.tokens.Whitespace and value != ';'
+               for ttype, value in sqlparse.lexer.tokenize(text))
+
+def parse_statement_ids(value):
+    """Statement ids requested for per-statement detail, as a JSON list or a comma-separated string"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [part for part in value.split(',') if part.strip()]
+    try:
+        statement_ids = [int(statement_id) for statement_id in value]
+    except (ValueError, TypeError):
+        raise ValueError('statements must be a list of positive integer statement ids')
+    if not isinstance(value, list) or any(isinstance(part, (bool, float)) for part in value) \
+            or any(statement_id < 1 for statement_id in statement_ids):
+        raise ValueError('statements must be a list of positive integer statement ids')
+    return statement_ids
+
+def sse_event(event, data):
+    """Encode one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def run_analysis(sql_content, options=None, progress=None, max_seconds=None):
+    """Analyze SQL with the /api/analyze options, reporting progress(done, total) after each statement"""
+    options = options or {}
+    budget = analysis_budget(**({'max_seconds': max_seconds} if max_seconds is not None else {}))
+    schema_inputs = (options.get('schema'), options.get('index_usage'), options.get('table_stats'))
+    schema = build_schema_catalog(*schema_inputs)
+    analyzer = new_analyzer(schema=schema, budget=budget, dialect=options.get('dialect', 'postgresql'))
+    optimizer = new_optimizer(
+        schema=schema,
+        dialect=options.get('dialect', 'postgresql'),
+        batch_size=int(options.get('batch_size', 5000))
+    )
+    
+    context = analysis_context(schema_inputs, optimizer.dialect, optimizer.batch_size)
+    consolidated = options.get('report') == 'consolidated'
+    statement_ids = parse_statement_ids(options.get('statements')) if consolidated else []
+    fields = None if consolidated else parse_fields(options.get('fields'))
+    page = None
+    
+    if not consolidated and (options.get('limit') not in (None, '') or options.get('cursor')):
+        # Only the requested page is parsed and analyzed; split() runs the lexer alone over the rest
+        statements = [text for text in lazy('sqlparse').split(sql_content) if is_statement(text)]
+        offset = decode_cursor(options.get('cursor'))
+        limit = parse_page_limit(options.get('limit'))
+        next_offset = offset + limit
+        # Skipped statements keep their numbers from the whole upload
+        budget.statements_total = offset
+        parsed_queries = analyzer.parse_sql('\n'.join(statements[offset:next_offset]))
+        page = {
+            'offset': offset,
+            'limit': limit,
+            'total_statements': len(statements),
+            'next_cursor': encode_cursor(next_offset) if next_offset < len(statements) else None
+        }
+    else:
+        parsed_queries = analyzer.parse_sql(sql_content)
+    
+    analyzed_queries = []
+    analysis_results = []
+    suggestion_results = []
+    for done, query in enumerate(parsed_queries, 1):
+        analysis, suggestions = analyze_statement(analyzer, optimizer, query, context)
+        if budget.exhausted:
+            break
+        if analysis is not None:
+            analyzed_queries.append(query)
+            analysis_results.append(analysis)
+            suggestion_results.append(suggestions)
+        if progress:
+            progress(done, len(parsed_queries))
+    
+    if consolidated:
+        report = lazy('WorkloadReport')(analyzer).build(
+            analyzed_queries, analysis_results, suggestion_results,
+            optimizer.calculate_optimization_score(analysis_results), statement_ids
+        )
+        report['truncated'] = budget.truncated
+        if budget.truncated:
+            report['truncation'] = budget.report()
+        return report
+    
+    result = {'analysis': analysis_results}
+    if fields is None or 'suggestions' in fields:
+        result['suggestions'] = suggestion_results
+    result['optimization_score'] = optimizer.calculate_optimization_score(analysis_results)
+    
+    if fields is not None:
+        shaped = []
+        for query, analysis in zip(analyzed_queries, analysis_results):
+            entry = {field: value for field, value in analysis.items() if field in fields}
+            if 'original_query' in fields:
+                entry['original_query'] = str(query)
+            if 'formatted_query' in fields:
+                entry['formatted_query'] = lazy('sqlparse').format(str(query), reindent=True, keyword_case='upper')
+            shaped.append(entry)
+        result['analysis'] = shaped
+    if page is not None:
+        result['page'] = page
+    result['truncated'] = budget.truncated
+    if budget.truncated:
+        result['truncation'] = budget.report()
+    
+    return result
 
 @app.route('/')
 def index():
@@ -39,40 +395,51 @@ def index():
 
 @app.route('/analyze', methods=['POST'])
 def analyze_sql():
+    # Oversized uploads raise RequestEntityTooLarge, answered with a 413 rather than a 500
+    files, error = read_submitted_files()
+    if error:
+        return jsonify({'error': error}), 400
+    try:
+        statement_ids = parse_statement_ids(request.form.get('statements'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     try:
-        sql_content = ""
-        
-        # Handle file upload
-        if 'sql_file' in request.files:
-            file = request.files['sql_file']
-            if file and file.filename != '' and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    sql_content = f.read()
-                
-                # Clean up uploaded file
-                os.remove(filepath)
-            else:
-                return jsonify({'error': 'Invalid file type. Please upload a .sql or .txt file.'}), 400
-        
-        # Handle direct SQL input
-        elif 'sql_text' in request.form:
-            sql_content = request.form['sql_text']
-        
-        if not sql_content.strip():
-            return jsonify({'error': 'No SQL content provided.'}), 400
-        
         # Analyze SQL
-        analyzer = SQLAnalyzer()
-        optimizer = SQLOptimizer()
+        schema_inputs = (request.form.get('schema_sql'), request.form.get('index_usage'), request.form.get('table_stats'))
+        schema = build_schema_catalog(*schema_inputs)
+        budget = analysis_budget()
+        analyzer = new_analyzer(schema=schema, budget=budget)
+        optimizer = new_optimizer(schema=schema)
+        context = analysis_context(schema_inputs)
         
-        # Parse and analyze
-        parsed_queries = analyzer.parse_sql(sql_content)
-        analysis_results = analyzer.analyze_queries(parsed_queries)
-        optimization_suggestions = optimizer.generate_suggestions(analysis_results)
+        # Parse and analyze each file of an archive against the one request budget
+        parsed_queries = []
+        query_files = []
+        for name, sql_content in files:
+            queries = analyzer.parse_sql(sql_content)
+            parsed_queries.extend(queries)
+            query_files.extend([name] * len(queries))
+        analysis_results = []
+        optimization_suggestions = []
+        for query in parsed_queries:
+            analysis, suggestions = analyze_statement(analyzer, optimizer, query, context)
+            if budget.exhausted:
+                parsed_queries = parsed_queries[:len(analysis_results)]
+                break
+            if analysis is not None:
+                analysis_results.append(analysis)
+                optimization_suggestions.append(suggestions)
+        
+        if request.form.get('report') == 'consolidated':
+            report = lazy('WorkloadReport')(analyzer).build(
+                parsed_queries, analysis_results, optimization_suggestions,
+                optimizer.calculate_optimization_score(analysis_results), statement_ids
+            )
+            report['truncated'] = budget.truncated
+            if budget.truncated:
+                report['truncation'] = budget.report()
+            return jsonify(report)
         
         # Format results for display
         formatted_results = {
@@ -80,24 +447,98 @@ def analyze_sql():
             'summary': {
                 'total_queries': len(parsed_queries),
                 'issues_found': sum(len(result.get('issues', [])) for result in analysis_results),
-                'optimization_score': optimizer.calculate_optimization_score(analysis_results)
+                'optimization_score': optimizer.calculate_optimization_score(analysis_results),
+                'truncated': budget.truncated
             }
         }
+        if budget.truncated:
+            formatted_results['truncation'] = budget.report()
+        archive = files[0][0] is not None
+        if archive:
+            formatted_results['summary']['files'] = file_summaries(files, query_files, analysis_results, optimizer)
         
+        formatted = request.form.get('format', 'true').lower() != 'false'
         for i, (query, analysis) in enumerate(zip(parsed_queries, analysis_results)):
-            formatted_results['queries'].append({
-                'id': i + 1,
-                'original_query': str(query),
-                'formatted_query': sqlparse.format(str(query), reindent=True, keyword_case='upper'),
-                'analysis': analysis,
-                'suggestions': optimization_suggestions[i] if i < len(optimization_suggestions) else []
-            })
+            result = format_query_result(
+                i + 1, query, analysis, optimization_suggestions[i] if i < len(optimization_suggestions) else [],
+                formatted
+            )
+            if archive:
+                result['file'] = query_files[i]
+            formatted_results['queries'].append(result)
         
         return jsonify(formatted_results)
         
     except Exception as e:
         return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
 
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_sql_stream():
+    """Stream progress and per-query results as Server-Sent Events while a large upload is analyzed"""
+    files, error = read_submitted_files()
+    if error:
+        return jsonify({'error': error}), 400
+    archive = files[0][0] is not None
+    
+    schema_inputs = (request.form.get('schema_sql'), request.form.get('index_usage'), request.form.get('table_stats'))
+    schema = build_schema_catalog(*schema_inputs)
+    context = analysis_context(schema_inputs)
+    formatted = request.form.get('format', 'true').lower() != 'false'
+    
+    def generate():
+        # Work happens between yields, so when the client disconnects the server closes this
+        # generator at the next write and the remaining statements are never analyzed
+        try:
+            budget = analysis_budget()
+            analyzer = new_analyzer(schema=schema, budget=budget)
+            optimizer = new_optimizer(schema=schema)
+            parsed_queries = []
+            query_files = []
+            for name, sql_content in files:
+                queries = analyzer.parse_sql(sql_content)
+                parsed_queries.extend(queries)
+                query_files.extend([name] * len(queries))
+            total = len(parsed_queries)
+            yield sse_event('progress', {'stage': 'parsed', 'statements_parsed': total, 'statements_analyzed': 0,
+                                         'issues_found': 0})
+            
+            analysis_results = []
+            result_files = []
+            issues_found = 0
+            for i, query in enumerate(parsed_queries):
+                analysis, suggestions = analyze_statement(analyzer, optimizer, query, context)
+                if budget.exhausted:
+                    break
+                if analysis is not None:
+                    analysis_results.append(analysis)
+                    result_files.append(query_files[i])
+                    issues_found += len(analysis['issues'])
+                    result = format_query_result(len(analysis_results), query, analysis, suggestions, formatted)
+                    if archive:
+                        result['file'] = query_files[i]
+                    yield sse_event('query', result)
+                yield sse_event('progress', {'stage': 'analyzing', 'statements_parsed': total,
+                                             'statements_analyzed': i + 1, 'issues_found': issues_found})
+            
+            summary = {
+                'total_queries': total,
+                'issues_found': issues_found,
+                'optimization_score': optimizer.calculate_optimization_score(analysis_results),
+                'truncated': budget.truncated
+            }
+            if budget.truncated:
+                summary['truncation'] = budget.report()
+            if archive:
+                summary['files'] = file_summaries(files, result_files, analysis_results, optimizer)
+            yield sse_event('summary', summary)
+        except Exception as e:
+            yield sse_event('error', {'error': f'Analysis failed: {str(e)}'})
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/analyze', methods=['POST'])
 def api_analyze():
     """API endpoint for programmatic access"""
@@ -106,24 +547,199 @@ def api_analyze():
         if not data or 'sql' not in data:
             return jsonify({'error': 'SQL content required in JSON format'}), 400
         
-        sql_content = data['sql']
-        
-        analyzer = SQLAnalyzer()
-        optimizer = SQLOptimizer()
+        # fields, limit and cursor may also be given as query parameters
+        options = dict(data, **{name: request.args[name] for name in ('fields', 'limit', 'cursor') if name in request.args})
+        return jsonify(run_analysis(data['sql'], options))
         
-        parsed_queries = analyzer.parse_sql(sql_content)
-        analysis_results = analyzer.analyze_queries(parsed_queries)
-        optimization_suggestions = optimizer.generate_suggestions(analysis_results)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def api_submit_job():
+    """Queue a large analysis in the background and return its job id immediately"""
+    if 'sql_file' in request.files:
+        files, error = read_submitted_files()
+        if error:
+            return jsonify({'error': error}), 400
+        # Job results are not split per file, so the files of an archive are queued as one script
+        sql_content = '\n'.join(sql if sql.rstrip().endswith(';') else sql.rstrip() + ';' for _, sql in files)
+        options = request.form.to_dict()
+    else:
+        options = request.get_json(silent=True) or {}
+        sql_content = options.get('sql', '')
+    
+    try:
+        if not sql_content.strip():
+            return jsonify({'error': 'No SQL content provided.'}), 400
         
+        job_id = lazy('job_queue').submit(run_analysis, sql_content, options, max_seconds=JOB_MAX_SECONDS)
         return jsonify({
-            'analysis': analysis_results,
-            'suggestions': optimization_suggestions,
-            'optimization_score': optimizer.calculate_optimization_score(analysis_results)
-        })
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': url_for('api_job_status', job_id=job_id)
+        }), 202
+        
+    except lazy('JobQueueFull') as e:
+        response = jsonify({'error': f'Too many analysis jobs in progress ({e}); retry shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def api_job_status(job_id):
+    """Status, progress and (when completed) the result of a background analysis job"""
+    job = lazy('job_queue').get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(job)
+
+@app.route('/api/cache', methods=['GET'])
+def api_cache_stats():
+    """Size of the shared analysis cache and this worker's hit/miss counts"""
+    cache = lazy('analysis_cache')
+    if cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(cache.stats(), enabled=True))
+
+@app.route('/api/sequence', methods=['POST'])
+def api_sequence():
+    """Detect N+1 and single-row INSERT bursts across an ordered log or multi-statement upload"""
+    try:
+        data = request.get_json()
+        if not data or ('sql' not in data and 'log' not in data):
+            return jsonify({'error': 'SQL content or a statement log required in JSON format'}), 400
+        
+        from sequence_analyzer import SequenceAnalyzer
+        sequence_analyzer = SequenceAnalyzer(
+            dialect=data.get('dialect', 'postgresql'),
+            window_seconds=float(data.get('window_seconds', 1.0)),
+            window_statements=int(data.get('window_statements', 50)),
+            min_burst_size=int(data.get('min_burst_size', 3))
+        )
+        
+        return jsonify(sequence_analyzer.analyze_sequence(data['log'] if 'log' in data else data['sql']))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/clusters', methods=['POST'])
+def api_clusters():
+    """Group near-duplicate queries (extra columns/joins, copy-pasted variants) with MinHash/LSH"""
+    try:
+        data = request.get_json()
+        if not data or ('sql' not in data and 'log' not in data):
+            return jsonify({'error': 'SQL content or a statement log required in JSON format'}), 400
+        
+        from query_clustering import QueryClusterer
+        clusterer = QueryClusterer(
+            num_perm=int(data.get('num_perm', 64)),
+            bands=int(data.get('bands', 16)),
+            shingle_size=int(data.get('shingle_size', 3)),
+            threshold=float(data.get('threshold', 0.7))
+        )
+        
+        return jsonify(clusterer.cluster(data['log'] if 'log' in data else data['sql']))
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/views', methods=['POST'])
+def api_views():
+    """Recommend materialized views / summary tables for repeated GROUP BY rollups"""
+    try:
+        data = request.get_json()
+        if not data or ('sql' not in data and 'log' not in data):
+            return jsonify({'error': 'SQL content or a statement log required in JSON format'}), 400
+        
+        from view_advisor import MaterializedViewAdvisor
+        advisor = MaterializedViewAdvisor(
+            schema=build_schema_catalog(data.get('schema'), None, data.get('table_stats')),
+            dialect=data.get('dialect', 'postgresql'),
+            min_queries=int(data.get('min_queries', 2)),
+            refresh_interval_minutes=int(data.get('refresh_interval_minutes', 60))
+        )
+        
+        return jsonify(advisor.recommend(data['log'] if 'log' in data else data['sql']))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/parameterize', methods=['POST'])
+def api_parameterize():
+    """Find literal-only statement families and return bind-parameter versions for a target driver"""
+    try:
+        data = request.get_json()
+        if not data or ('sql' not in data and 'log' not in data):
+            return jsonify({'error': 'SQL content or a statement log required in JSON format'}), 400
+        
+        from parameterizer import LiteralParameterizer
+        parameterizer = LiteralParameterizer(
+            driver=data.get('driver', 'psycopg2'),
+            min_family_size=int(data.get('min_family_size', 2)),
+            max_vectors=int(data.get('max_vectors', 100))
+        )
+        
+        return jsonify(parameterizer.analyze(data['log'] if 'log' in data else data['sql']))
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/indexes', methods=['POST'])
+def api_indexes():
+    """Find duplicate, left-prefix-redundant and unused indexes from DDL and usage statistics"""
+    try:
+        data = request.get_json()
+        if not data or 'schema' not in data:
+            return jsonify({'error': 'Schema DDL required in JSON format'}), 400
+        
+        catalog = build_schema_catalog(data['schema'], data.get('index_usage'))
+        advisor = lazy('IndexAdvisor')(
+            catalog,
+            dialect=data.get('dialect', 'postgresql'),
+            max_unused_scans=int(data.get('max_unused_scans', 10))
+        )
+        
+        return jsonify(advisor.analyze())
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/migrations', methods=['POST'])
+def api_migrations():
+    """Lock levels, rewrite estimates and a lower-lock execution plan for a DDL migration"""
+    try:
+        data = request.get_json()
+        if not data or 'sql' not in data:
+            return jsonify({'error': 'Migration SQL required in JSON format'}), 400
+        
+        analyzer = lazy('DDLAnalyzer')(
+            schema=build_schema_catalog(data.get('schema'), table_stats=data.get('table_stats')),
+            dialect=data.get('dialect'),
+            server_version=int(data['server_version']) if data.get('server_version') else None,
+            lock_timeout=data.get('lock_timeout', '5s')
+        )
+        
+        return jsonify(analyzer.plan(data['sql']))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+if STARTUP_MODE == 'eager':
+    for name in (*LAZY_IMPORTS, *LAZY_SERVICES):
+        lazy(name)
+
+# With `gunicorn --preload` this runs once in the master, before the workers fork
+if os.environ.get('ANALYSIS_CACHE_PRELOAD') and lazy('analysis_cache'):
+    with open(os.environ['ANALYSIS_CACHE_PRELOAD'], 'r', encoding='utf-8') as preload_file:
+        run_analysis(preload_file.read())
+
 @app.route('/examples')
 def examples():
     return render_template('examples.html', config=APP_CONFIG)
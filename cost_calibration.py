@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+SQL Optimizer Pro - Cost Calibration
+
+Fits the complexity weights and issue penalties to measured latencies and saves
+the result as a cost model that the analyzer and optimizer load at startup.
+
+    python cost_calibration.py pg_stat_statements.csv --output cost_model.json
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import sys
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from sql_analyzer import SQLAnalyzer, COMPLEXITY_WEIGHTS, complexity_features
+from sql_optimizer import ISSUE_PENALTIES
+
+SEVERITIES = ('high', 'medium', 'low')
+FEATURE_NAMES = [*COMPLEXITY_WEIGHTS, *(f'{severity}_issues' for severity in SEVERITIES)]
+# Fitted weights are in doublings of latency; these convert them to the score scales
+COMPLEXITY_POINTS_PER_DOUBLING = 5
+PENALTY_POINTS_PER_DOUBLING = 20
+SQL_FIELDS = ('sql', 'query', 'statement')
+LATENCY_FIELDS = ('latency_ms', 'mean_exec_time', 'mean_time', 'duration_ms', 'elapsed_ms')
+
+def feature_vector(analyses: List[Dict[str, Any]]) -> List[float]:
+    """FEATURE_NAMES counts summed over the statements of one sample"""
+    totals = dict.fromkeys(FEATURE_NAMES, 0.0)
+    for analysis in analyses:
+        for feature, count in complexity_features(analysis).items():
+            totals[feature] += count
+        for issue in analysis.get('issues', []):
+            if issue.get('severity') in SEVERITIES:
+                totals[f"{issue['severity']}_issues"] += 1
+    return [totals[feature] for feature in FEATURE_NAMES]
+
+def rank(values: np.ndarray) -> np.ndarray:
+    """1-based ranks, ties sharing their average rank"""
+    ranks = np.empty(len(values))
+    ranks[np.argsort(values, kind='mergesort')] = np.arange(1, len(values) + 1)
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    return (np.bincount(inverse, weights=ranks) / counts)[inverse]
+
+def spearman(predicted: np.ndarray, observed: np.ndarray) -> Optional[float]:
+    """Spearman rank correlation; None when either side is constant"""
+    a, b = rank(np.asarray(predicted, dtype=float)), rank(np.asarray(observed, dtype=float))
+    if len(a) < 2 or a.std() == 0 or b.std() == 0:
+        return None
+    return float(np.corrcoef(a, b)[0, 1])
+
+def fit_ridge(X: np.ndarray, y: np.ndarray, sample_weight: np.ndarray, alpha: float) -> Tuple[np.ndarray, float]:
+    """Weighted ridge regression on standardized columns with an unpenalized intercept; returns (coef, intercept)"""
+    w = sample_weight / sample_weight.sum()
+    mean = w @ X
+    std = np.sqrt(w @ (X - mean) ** 2)
+    # Constant columns carry no signal; they keep a zero weight
+    varying = std > 0
+    Z = (X[:, varying] - mean[varying]) / std[varying]
+    y_mean = w @ y
+    gram = Z.T @ (Z * w[:, None]) + alpha / len(y) * np.eye(Z.shape[1])
+    beta = np.linalg.solve(gram, Z.T @ (w * (y - y_mean)))
+
+    coef = np.zeros(X.shape[1])
+    coef[varying] = beta / std[varying]
+    return coef, float(y_mean - coef @ mean)
+
+class CostModel:
+    """Complexity weights and issue penalties fitted to measured latencies"""
+
+    def __init__(self, coefficients: Dict[str, float], intercept: float, alpha: float = 1.0,
+                 metrics: Optional[Dict[str, Any]] = None, fitted_at: Optional[str] = None):
+        # Coefficients predict log2(latency in ms)
+        self.coefficients = {feature: float(coefficients.get(feature, 0.0)) for feature in FEATURE_NAMES}
+        self.intercept = float(intercept)
+        self.alpha = alpha
+        self.metrics = metrics or {}
+        self.fitted_at = fitted_at
+
+    def complexity_weights(self) -> Dict[str, float]:
+        """Complexity points per feature, in place of COMPLEXITY_WEIGHTS"""
+        # A feature that coincides with faster queries does not make a query simpler
+        return {
+            feature: round(max(0.0, self.coefficients[feature]) * COMPLEXITY_POINTS_PER_DOUBLING, 3)
+            for feature in COMPLEXITY_WEIGHTS
+        }
+
+    def issue_penalties(self) -> Dict[str, float]:
+        """Optimization-score deduction per issue severity, in place of ISSUE_PENALTIES"""
+        return {
+            severity: round(max(0.0, self.coefficients[f'{severity}_issues']) * PENALTY_POINTS_PER_DOUBLING, 3)
+            for severity in SEVERITIES
+        }
+
+    def is_degenerate(self) -> bool:
+        """True when every weight and penalty is zero, which would score every query the same"""
+        return not any(self.complexity_weights().values()) and not any(self.issue_penalties().values())
+
+    def predict_latency_ms(self, features: List[float]) -> float:
+        """Predicted latency for a feature_vector()"""
+        return float(2 ** (self.intercept + sum(
+            self.coefficients[feature] * value for feature, value in zip(FEATURE_NAMES, features)
+        )))
+
+    def digest(self) -> str:
+        """Short digest of the weights, for cache keys"""
+        return hashlib.blake2b(json.dumps([self.coefficients, self.intercept], sort_keys=True).encode('utf-8'),
+                               digest_size=8).hexdigest()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'coefficients': self.coefficients,
+            'intercept': self.intercept,
+            'alpha': self.alpha,
+            'complexity_weights': self.complexity_weights(),
+            'issue_penalties': self.issue_penalties(),
+            'metrics': self.metrics,
+            'fitted_at': self.fitted_at
+        }
+
+    def save(self, path: str) -> None:
+        if self.is_degenerate():
+            raise ValueError('The fitted weights are all zero; collect samples with more varied statements '
+                             'and latencies instead of replacing the hand-picked weights')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+    @classmethod
+    def load(cls, path: str) -> 'CostModel':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['coefficients'], data['intercept'], data.get('alpha', 1.0), data.get('metrics'),
+                   data.get('fitted_at'))
+
+class CostCalibrator:
+    """Fit a CostModel from (SQL, measured latency) samples"""
+
+    def __init__(self, alpha: float = 1.0, folds: int = 5, seed: int = 1):
+        self.alpha = alpha
+        self.folds = folds
+        self.seed = seed
+        # Hand-picked weights are the baseline: calibration has to beat their ranking
+        self.analyzer = SQLAnalyzer()
+
+    def load_samples(self, text: str) -> List[Dict[str, Any]]:
+        """Samples from a CSV export (pg_stat_statements, slow-log digests, ...) or JSON lines"""
+        stripped = text.lstrip()
+        if stripped.startswith('{') or stripped.startswith('['):
+            rows = json.loads(stripped) if stripped.startswith('[') else [
+                json.loads(line) for line in stripped.splitlines() if line.strip()
+            ]
+        else:
+            rows = list(csv.DictReader(io.StringIO(text)))
+
+        samples = []
+        for row in rows:
+            row = {key.strip().lower(): value for key, value in row.items() if key}
+            sql = next((row[field] for field in SQL_FIELDS if row.get(field)), None)
+            latency = next((row[field] for field in LATENCY_FIELDS if row.get(field) not in (None, '')), None)
+            if not sql or latency is None:
+                continue
+            samples.append({'sql': sql, 'latency_ms': float(latency), 'calls': float(row.get('calls') or 1)})
+        return samples
+
+    def feature_matrix(self, samples: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(features, log2 latency, weights) for the samples that could be analyzed"""
+        return self._feature_rows(samples)[:3]
+
+    def _feature_rows(self, samples: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """The feature matrix plus, per row, its normalized statement text"""
+        vectors = {}
+        rows = []
+        for sample in samples:
+            if sample['latency_ms'] <= 0:
+                continue
+            # Log samples repeat the same statements; analyze each text once
+            text = ' '.join(sample['sql'].split())
+            if text not in vectors:
+                analyses = self.analyzer.analyze_queries(self.analyzer.parse_sql(sample['sql']))
+                vectors[text] = feature_vector(analyses) if analyses else None
+            if vectors[text] is not None:
+                rows.append((vectors[text], sample['latency_ms'], sample.get('calls') or 1, text))
+
+        X = np.array([row[0] for row in rows], dtype=float).reshape(len(rows), len(FEATURE_NAMES))
+        y = np.log2(np.array([row[1] for row in rows], dtype=float))
+        weights = np.array([row[2] for row in rows], dtype=float)
+        groups = np.array([row[3] for row in rows], dtype=object)
+        return X, y, weights, groups
+
+    def fold_assignment(self, groups: np.ndarray) -> Optional[np.ndarray]:
+        """Cross-validation fold per row, shared by every copy of a statement so none is scored on itself"""
+        distinct = np.unique(groups)
+        folds = min(self.folds, len(distinct) // 2)
+        if folds < 2:
+            return None
+        fold_of = dict(zip(distinct.tolist(), (np.random.default_rng(self.seed).permutation(len(distinct)) % folds).tolist()))
+        return np.array([fold_of[group] for group in groups.tolist()], dtype=int)
+
+    def fit(self, samples: List[Dict[str, Any]]) -> CostModel:
+        """Fit a CostModel and record how well its ranking matches the observed latencies"""
+        X, y, weights, groups = self._feature_rows(samples)
+        if len(y) < 2:
+            raise ValueError('At least two samples with SQL and a positive latency are required')
+
+        coef, intercept = fit_ridge(X, y, weights, self.alpha)
+        predicted = X @ coef + intercept
+        residual = y - predicted
+        total = np.sum(weights * (y - np.average(y, weights=weights)) ** 2)
+        baseline = X @ self._baseline_coefficients()
+
+        metrics = {
+            'samples': int(len(y)),
+            'distinct_statements': int(len(np.unique(X, axis=0))),
+            'spearman': spearman(predicted, y),
+            'spearman_cross_validated': self._cross_validated_spearman(X, y, weights, groups),
+            'spearman_default_weights': spearman(baseline, y),
+            'r2_log_latency': float(1 - np.sum(weights * residual ** 2) / total) if total > 0 else None,
+            'median_abs_error_factor': float(2 ** np.median(np.abs(residual)))
+        }
+        return CostModel(dict(zip(FEATURE_NAMES, coef.tolist())), intercept, self.alpha, metrics,
+                         time.strftime('%Y-%m-%dT%H:%M:%S'))
+
+    def _baseline_coefficients(self) -> np.ndarray:
+        """The hand-picked weights expressed on the fitted scale"""
+        baseline = {feature: weight / COMPLEXITY_POINTS_PER_DOUBLING for feature, weight in COMPLEXITY_WEIGHTS.items()}
+        baseline.update({f'{severity}_issues': ISSUE_PENALTIES[severity] / PENALTY_POINTS_PER_DOUBLING
+                         for severity in SEVERITIES})
+        return np.array([baseline[feature] for feature in FEATURE_NAMES])
+
+    def _cross_validated_spearman(self, X: np.ndarray, y: np.ndarray, weights: np.ndarray,
+                                  groups: np.ndarray) -> Optional[float]:
+        """Rank correlation of out-of-fold predictions, the honest measure on a small log"""
+        assignment = self.fold_assignment(groups)
+        if assignment is None:
+            return None
+        predicted = np.empty(len(y))
+        for fold in np.unique(assignment):
+            held_out = assignment == fold
+            coef, intercept = fit_ridge(X[~held_out], y[~held_out], weights[~held_out], self.alpha)
+            predicted[held_out] = X[held_out] @ coef + intercept
+        return spearman(predicted, y)
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Calibrate SQL Optimizer Pro cost weights from measured latencies')
+    parser.add_argument('samples', help='CSV or JSON-lines file with sql/query and latency_ms/mean_exec_time (and calls)')
+    parser.add_argument('--output', default='cost_model.json', help='Where to save the calibrated model')
+    parser.add_argument('--alpha', type=float, default=1.0, help='Ridge regularization strength')
+    parser.add_argument('--folds', type=int, default=5, help='Cross-validation folds for the ranking report')
+    args = parser.parse_args()
+
+    with open(args.samples, 'r', encoding='utf-8') as f:
+        calibrator = CostCalibrator(alpha=args.alpha, folds=args.folds)
+        samples = calibrator.load_samples(f.read())
+    print(f"📥 {len(samples)} latency samples loaded")
+
+    try:
+        model = calibrator.fit(samples)
+        model.save(args.output)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    def shown(value):
+        return 'n/a' if value is None else f"{value:.3f}"
+
+    metrics = model.metrics
+    print("📊 Rank correlation with observed latency (Spearman):")
+    print(f"   calibrated {shown(metrics['spearman'])}, cross-validated {shown(metrics['spearman_cross_validated'])}, "
+          f"hand-picked weights {shown(metrics['spearman_default_weights'])}")
+    print(f"   complexity weights: {model.complexity_weights()}")
+    print(f"   issue penalties: {model.issue_penalties()}")
+    print(f"💾 Saved to {args.output}; set COST_MODEL_PATH to load it at startup")
+
+if __name__ == '__main__':
+    main()
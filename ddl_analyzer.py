@@ -0,0 +1,809 @@
+import heapq
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+import sqlparse
+
+from schema_catalog import SchemaCatalog, normalize_identifier, resolve_batch_key
+
+# Rough single-backend throughput for the work a DDL statement does while it holds its lock
+REWRITE_BYTES_PER_SECOND = 50 * 1024 * 1024
+SCAN_BYTES_PER_SECOND = 200 * 1024 * 1024
+INDEX_BUILD_BYTES_PER_SECOND = 80 * 1024 * 1024
+# Each index is rebuilt along with a rewritten table; assume it costs this share of the heap rewrite
+INDEX_REWRITE_SHARE = 0.5
+# PostgreSQL table lock modes, weakest first, and what each blocks for ordinary traffic
+POSTGRES_LOCKS = {
+    'ROW EXCLUSIVE': 'nothing',
+    'SHARE UPDATE EXCLUSIVE': 'nothing',
+    'SHARE': 'writes',
+    'SHARE ROW EXCLUSIVE': 'writes',
+    'ACCESS EXCLUSIVE': 'reads and writes'
+}
+# MySQL ALTER TABLE ... LOCK= levels
+MYSQL_LOCKS = {
+    'NONE': 'nothing',
+    'SHARED': 'writes',
+    'EXCLUSIVE': 'reads and writes'
+}
+# Defaults evaluated per row, which PostgreSQL 11+ still has to write into every existing row
+VOLATILE_DEFAULT = re.compile(
+    r'\b(?:random|clock_timestamp|timeofday|gen_random_uuid|uuid_generate_v[14]|nextval)\s*\(', re.IGNORECASE
+)
+# Column types that fill every existing row when added
+SELF_FILLING_COLUMN = re.compile(r'\b(?:SMALLSERIAL|SERIAL|BIGSERIAL|GENERATED\s+.*\bSTORED)\b', re.IGNORECASE)
+COLUMN_DEFINITION_END = r'(?=\s+(?:NOT\s+NULL|NULL|CONSTRAINT|CHECK|REFERENCES|UNIQUE|PRIMARY|GENERATED|COLLATE|' \
+                        r'DEFAULT|AUTO_INCREMENT|COMMENT|FIRST|AFTER)\b|$)'
+MYSQL_HINTS = re.compile(r'`|\b(?:ALGORITHM|LOCK)\s*=|\bMODIFY\s+(?:COLUMN\s+)?\w|\bCHANGE\s+(?:COLUMN\s+)?\w|'
+                         r'\bAUTO_INCREMENT\b|\bENGINE\s*=', re.IGNORECASE)
+# Rows per transaction when a safe alternative backfills a copied column
+BACKFILL_BATCH_ROWS = 5000
+# Migration plan phases, in execution order
+PHASES = ('expand', 'build', 'validate', 'enforce', 'blocking', 'contract')
+
+class DDLAnalyzer:
+    """Lock levels, table rewrites and online alternatives for CREATE/ALTER/DROP statements"""
+
+    def __init__(self, schema: Optional[SchemaCatalog] = None, dialect: Optional[str] = None,
+                 server_version: Optional[int] = None, lock_timeout: str = '5s'):
+        self.schema = schema
+        # None infers PostgreSQL or MySQL from each statement's syntax
+        self.dialect = dialect.lower() if dialect else None
+        # PostgreSQL major version; before 11 every ADD COLUMN ... DEFAULT rewrites the table
+        self.server_version = server_version
+        self.lock_timeout = lock_timeout
+
+    def analyze_statement(self, sql: str) -> Dict[str, Any]:
+        """Operations of one DDL statement with their lock, blocking, estimated duration and safe alternative"""
+        text = self._normalize(sql)
+        dialect = self._dialect(text)
+        operations = self._operations(text, dialect)
+        for operation in operations:
+            # Object keys only order plan steps
+            operation.pop('_keys')
+        locks = [operation['lock'] for operation in operations if operation['lock']]
+        timed = [operation['estimated_seconds'] for operation in operations if operation['blocks'] != 'nothing']
+
+        return {
+            'is_ddl': bool(re.match(r'^(?:CREATE|ALTER|DROP)\b', text, re.IGNORECASE)),
+            'dialect': dialect,
+            'operations': operations,
+            'lock': self._strongest(locks, dialect),
+            'blocks': self._lock_blocks(self._strongest(locks, dialect), dialect),
+            'estimated_seconds': None if None in timed else round(sum(timed), 2),
+            'rewrite': any(operation['rewrite'] for operation in operations),
+            'issues': [operation['issue'] for operation in operations if operation['issue']]
+        }
+
+    def plan(self, sql_content: str) -> Dict[str, Any]:
+        """Rewrite a migration into online steps and order them so the strongest locks come last and briefest
+
+        Statements that do not depend on each other are reordered by phase: expand (new tables and columns,
+        NOT VALID constraints), build (concurrent indexes), validate (constraint scans and backfills),
+        enforce, blocking (anything still holding a blocking lock for a scan or rewrite) and contract
+        (drops and renames). Steps touching an object created, dropped or renamed earlier stay after it.
+        """
+        statements = [statement for statement in sqlparse.split(sql_content) if self._normalize(statement)]
+        analyses = []
+        steps = []
+        # Tables the migration creates are still empty, so locking them costs nothing
+        new_tables = set()
+
+        for number, statement in enumerate(statements, 1):
+            analysis = self.analyze_statement(statement)
+            analyses.append(dict(analysis, statement=number, sql=self._normalize(statement) + ';'))
+            for operation in analysis['operations']:
+                empty = operation['table'] in new_tables
+                if empty:
+                    operation['estimated_seconds'] = 0.0
+                if operation['operation'] == 'create_table':
+                    new_tables.add(operation['table'])
+                replacement = [operation['sql']] if empty else operation['safe_alternative'] or [operation['sql']]
+                previous = None
+                for sql in replacement:
+                    step = self._step(sql, analysis['dialect'], number, empty)
+                    if previous is not None:
+                        step['after'].add(previous)
+                    previous = len(steps)
+                    steps.append(step)
+
+        ordered = self._order_steps(steps)
+        before = [operation for analysis in analyses for operation in analysis['operations']]
+        after = ordered
+        dialects = {analysis['dialect'] for analysis in analyses}
+
+        return {
+            'statements': analyses,
+            'preamble': [f"SET lock_timeout = '{self.lock_timeout}';"] if 'postgresql' in dialects else [],
+            'steps': [
+                {
+                    'step': position,
+                    'phase': PHASES[step['phase']],
+                    'sql': step['sql'],
+                    'operation': step['operation'],
+                    'table': step['table'],
+                    'lock': step['lock'],
+                    'blocks': step['blocks'],
+                    'estimated_seconds': step['estimated_seconds'],
+                    'transactional': step['transactional'],
+                    'statement': step['statement']
+                }
+                for position, step in enumerate(ordered, 1)
+            ],
+            'summary': {
+                'statements': len(analyses),
+                'issues': sum(len(analysis['issues']) for analysis in analyses),
+                'blocking_seconds_before': self._blocking_seconds(before),
+                'blocking_seconds_after': self._blocking_seconds(after),
+                'unestimated_blocking_before': sum(1 for op in before if op['blocks'] != 'nothing'
+                                                   and op['estimated_seconds'] is None),
+                'unestimated_blocking_after': sum(1 for step in after if step['blocks'] != 'nothing'
+                                                  and step['estimated_seconds'] is None),
+                'non_transactional_steps': sum(1 for step in after if not step['transactional'])
+            }
+        }
+
+    def table_bytes(self, table: str) -> Optional[int]:
+        """Heap size from table stats: total bytes, or row count times the average or estimated row width"""
+        entry = self.schema.get_table(table) if self.schema and table else None
+        if not entry:
+            return None
+        stats = entry['stats']
+        if stats.get('total_bytes'):
+            return stats['total_bytes']
+        if stats.get('row_count') is not None:
+            return stats['row_count'] * (stats.get('avg_row_bytes') or self.schema.estimate_row_width(table))
+        return None
+
+    def _operations(self, text: str, dialect: str) -> List[Dict[str, Any]]:
+        """One entry per action; ALTER TABLE can carry several"""
+        create_index = re.match(
+            r'^CREATE\s+(UNIQUE\s+)?(?:FULLTEXT\s+|SPATIAL\s+)?INDEX\s+(CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?'
+            r'(?:(\S+)\s+)?(?:USING\s+\w+\s+)?ON\s+(?:ONLY\s+)?([^\s(]+)',
+            text, re.IGNORECASE
+        )
+        if create_index:
+            return [self._create_index(text, dialect, create_index)]
+
+        alter = re.match(r'^ALTER\s+TABLE\s+(?:IF\s+EXISTS\s+)?(?:ONLY\s+)?(\S+)\s+(.*)$', text,
+                         re.IGNORECASE | re.DOTALL)
+        if alter:
+            table = normalize_identifier(alter.group(1))
+            actions = self._split_top_level(alter.group(2))
+            options = {
+                match.group(1).upper(): match.group(2).upper()
+                for match in (re.match(r'^(ALGORITHM|LOCK)\s*=?\s*(\w+)$', action, re.IGNORECASE) for action in actions)
+                if match
+            }
+            return [
+                self._alter_action(table, action, dialect, options, text)
+                for action in actions if not re.match(r'^(?:ALGORITHM|LOCK)\b', action, re.IGNORECASE)
+            ]
+
+        drop_index = re.match(r'^DROP\s+INDEX\s+(CONCURRENTLY\s+)?(?:IF\s+EXISTS\s+)?(\S+)(?:\s+ON\s+(\S+))?', text,
+                              re.IGNORECASE)
+        if drop_index:
+            name = normalize_identifier(drop_index.group(2))
+            table = normalize_identifier(drop_index.group(3)) if drop_index.group(3) else self._index_table(name)
+            keys = dict(drops={f'index:{name}'})
+            if dialect == 'mysql':
+                return [self._operation('drop_index', table, text, dialect, 'NONE', **keys)]
+            if drop_index.group(1):
+                return [self._operation('drop_index', table, text, dialect, 'SHARE UPDATE EXCLUSIVE',
+                                        transactional=False, **keys)]
+            online = re.sub(r'^DROP\s+INDEX\s+', 'DROP INDEX CONCURRENTLY ', text, flags=re.IGNORECASE) + ';'
+            return [self._operation('drop_index', table, text, dialect, 'ACCESS EXCLUSIVE', safe_alternative=[online],
+                                    **keys)]
+
+        drop_table = re.match(r'^DROP\s+TABLE\s+(?:IF\s+EXISTS\s+)?([^;]+?)(?:\s+(?:CASCADE|RESTRICT))?$', text,
+                              re.IGNORECASE)
+        if drop_table:
+            tables = [normalize_identifier(name) for name in drop_table.group(1).split(',')]
+            return [self._operation('drop_table', table, text, dialect, self._exclusive(dialect), drops={table})
+                    for table in tables]
+
+        create_table = re.match(r'^CREATE\s+(?:(?:GLOBAL|LOCAL|TEMP|TEMPORARY|UNLOGGED)\s+)*TABLE\s+'
+                                r'(?:IF\s+NOT\s+EXISTS\s+)?([^\s(]+)', text, re.IGNORECASE)
+        if create_table:
+            table = normalize_identifier(create_table.group(1))
+            referenced = {normalize_identifier(name) for name in
+                          re.findall(r'\bREFERENCES\s+([^\s(]+)', text, re.IGNORECASE)}
+            return [self._operation('create_table', table, text, dialect, None, creates={table}, uses=referenced)]
+
+        # A DO block that backfills in batches commits between them, so it cannot run inside a transaction
+        batched = re.match(r'^DO\b.*?\bUPDATE\s+(?:ONLY\s+)?([^\s(]+)', text, re.IGNORECASE | re.DOTALL)
+        if batched:
+            table = normalize_identifier(batched.group(1))
+            return [self._operation('backfill', table, text, dialect, 'ROW EXCLUSIVE', duration='rewrite',
+                                    transactional=False, uses=self._column_keys(table, self._words(text)))]
+
+        if re.match(r'^(?:UPDATE|INSERT|DELETE)\b', text, re.IGNORECASE):
+            target = re.match(r'^(?:UPDATE|INSERT\s+INTO|DELETE\s+FROM)\s+(?:ONLY\s+)?([^\s(]+)', text, re.IGNORECASE)
+            table = normalize_identifier(target.group(1)) if target else None
+            # Writes every row it touches; without row estimates assume a full pass over the table
+            return [self._operation('backfill', table, text, dialect,
+                                    'ROW EXCLUSIVE' if dialect == 'postgresql' else 'NONE', duration='rewrite',
+                                    uses=self._column_keys(table, self._words(text)))]
+
+        if re.match(r'^(?:BEGIN|COMMIT|START\s+TRANSACTION|SET|LOCK\s+TABLES|UNLOCK\s+TABLES)\b', text, re.IGNORECASE):
+            return [self._operation('session', None, text, dialect, None)]
+        return [self._operation('other', None, text, dialect, None)]
+
+    def _create_index(self, text: str, dialect: str, match) -> Dict[str, Any]:
+        unique, concurrently, name, table = match.groups()
+        table = normalize_identifier(table)
+        columns = self._index_columns(text[match.end():])
+        keys = dict(uses=self._column_keys(table, columns), creates={f'index:{normalize_identifier(name)}'} if name else set())
+
+        if dialect == 'mysql':
+            return self._mysql_index(table, text, keys, self._mysql_options(text))
+        if concurrently:
+            return self._operation('create_index', table, text, dialect, 'SHARE UPDATE EXCLUSIVE', transactional=False,
+                                   duration='build', **keys)
+
+        online = re.sub(r'^CREATE\s+(UNIQUE\s+)?INDEX\s+', lambda m: f"CREATE {m.group(1) or ''}INDEX CONCURRENTLY ",
+                        text, flags=re.IGNORECASE) + ';'
+        return self._operation(
+            'create_index', table, text, dialect, 'SHARE', duration='build', safe_alternative=[online],
+            issue=('blocking_index_build', 'high',
+                   f"CREATE {'UNIQUE ' if unique else ''}INDEX on {table} without CONCURRENTLY holds a SHARE lock, "
+                   'blocking INSERT, UPDATE and DELETE until the build finishes'),
+            **keys
+        )
+
+    def _mysql_index(self, table: str, text: str, keys: Dict[str, Any], options: Dict[str, str]) -> Dict[str, Any]:
+        """MySQL secondary index: online only when the statement insists on INPLACE with LOCK=NONE"""
+        if options.get('ALGORITHM') in ('INPLACE', 'INSTANT') and options.get('LOCK') == 'NONE':
+            return self._operation('create_index', table, text, 'mysql', 'NONE', duration='build', **keys)
+        online = self._with_mysql_options(text, 'INPLACE', 'NONE')
+        return self._operation(
+            'create_index', table, text, 'mysql', options.get('LOCK') or 'SHARED', duration='build',
+            safe_alternative=[online],
+            issue=('blocking_index_build', 'medium',
+                   f"Index on {table} without ALGORITHM=INPLACE, LOCK=NONE; MySQL falls back to a copying, "
+                   'write-blocking build instead of failing when an online build is not possible'),
+            **keys
+        )
+
+    def _alter_action(self, table: str, action: str, dialect: str, options: Dict[str, str], text: str) -> Dict[str, Any]:
+        """Lock and rewrite behaviour of one ALTER TABLE action"""
+        exclusive = self._exclusive(dialect)
+        statement = f"ALTER TABLE {table} {action}" + ''.join(f", {name}={value}" for name, value in options.items())
+
+        add_column = re.match(r'^ADD\s+(?!CONSTRAINT\b|FOREIGN\b|PRIMARY\b|UNIQUE\b|CHECK\b|INDEX\b|KEY\b|FULLTEXT\b|SPATIAL\b)'
+                              r'(?:COLUMN\s+)?(?:IF\s+NOT\s+EXISTS\s+)?(\S+)\s+(.*)$', action, re.IGNORECASE | re.DOTALL)
+        if add_column:
+            return self._add_column(table, normalize_identifier(add_column.group(1)), add_column.group(2), statement,
+                                    dialect)
+
+        foreign_key = re.match(r'^ADD\s+(?:CONSTRAINT\s+(\S+)\s+)?FOREIGN\s+KEY\s*\(([^)]*)\)\s*REFERENCES\s+([^\s(]+)',
+                               action, re.IGNORECASE)
+        if foreign_key:
+            return self._add_foreign_key(table, foreign_key, action, statement, dialect, options)
+
+        check = re.match(r'^ADD\s+(?:CONSTRAINT\s+(\S+)\s+)?CHECK\s*\(', action, re.IGNORECASE)
+        if check and dialect == 'postgresql':
+            name = normalize_identifier(check.group(1)) if check.group(1) else f'{table}_check'
+            keys = dict(uses={table}, creates={f'constraint:{name}'})
+            if re.search(r'\bNOT\s+VALID$', action, re.IGNORECASE):
+                return self._operation('add_check', table, statement, dialect, exclusive, **keys)
+            named = action if check.group(1) else re.sub(r'^ADD\s+', f'ADD CONSTRAINT {name} ', action, flags=re.IGNORECASE)
+            return self._operation(
+                'add_check', table, statement, dialect, exclusive, duration='scan',
+                safe_alternative=[f"ALTER TABLE {table} {named} NOT VALID;",
+                                  f"ALTER TABLE {table} VALIDATE CONSTRAINT {name};"],
+                issue=('blocking_validation', 'medium',
+                       f"Adding a CHECK constraint to {table} scans every row under an ACCESS EXCLUSIVE lock"),
+                **keys
+            )
+
+        unique = re.match(r'^ADD\s+(?:CONSTRAINT\s+(\S+)\s+)?(UNIQUE|PRIMARY\s+KEY)\s*(?:KEY\s*|INDEX\s*)?(\S*?)\s*\(([^)]*)\)',
+                          action, re.IGNORECASE)
+        if unique and dialect == 'postgresql':
+            kind = ' '.join(unique.group(2).upper().split())
+            columns = [normalize_identifier(column) for column in unique.group(4).split(',')]
+            name = normalize_identifier(unique.group(1)) if unique.group(1) else \
+                f"{table}_{'pkey' if kind == 'PRIMARY KEY' else '_'.join(columns) + '_key'}"
+            return self._operation(
+                'add_unique', table, statement, dialect, exclusive, duration='build',
+                uses=self._column_keys(table, columns), creates={f'constraint:{name}', f'index:{name}'},
+                safe_alternative=[
+                    f"CREATE UNIQUE INDEX CONCURRENTLY {name} ON {table} ({', '.join(columns)});",
+                    f"ALTER TABLE {table} ADD CONSTRAINT {name} {kind} USING INDEX {name};"
+                ],
+                issue=('blocking_validation', 'high',
+                       f"ADD {kind} builds its index on {table} under an ACCESS EXCLUSIVE lock"),
+            )
+        if re.match(r'^ADD\s+(?:CONSTRAINT\s+\S+\s+)?(?:PRIMARY\s+KEY|UNIQUE)\b.*\bUSING\s+INDEX\b', action, re.IGNORECASE):
+            return self._operation('add_unique', table, statement, dialect, exclusive, uses={table})
+
+        mysql_index = re.match(r'^ADD\s+(?:UNIQUE\s+|FULLTEXT\s+|SPATIAL\s+)?(?:INDEX|KEY)\s+(?:(\S+)\s*)?\(', action,
+                               re.IGNORECASE)
+        if mysql_index:
+            name = mysql_index.group(1)
+            keys = dict(uses=self._column_keys(table, self._index_columns(action[mysql_index.end() - 1:])),
+                        creates={f'index:{normalize_identifier(name)}'} if name else set())
+            return self._mysql_index(table, statement, keys, options)
+
+        column_type = re.match(r'^ALTER\s+(?:COLUMN\s+)?(\S+)\s+(?:SET\s+DATA\s+)?TYPE\s+(.+?)(?:\s+USING\s+(.+))?$',
+                               action, re.IGNORECASE | re.DOTALL)
+        modify = re.match(r'^(?:MODIFY\s+(?:COLUMN\s+)?(\S+)|CHANGE\s+(?:COLUMN\s+)?\S+\s+(\S+))\s+(.+?)' +
+                          COLUMN_DEFINITION_END, action, re.IGNORECASE | re.DOTALL)
+        if column_type or modify:
+            if column_type:
+                column, new_type, using = normalize_identifier(column_type.group(1)), column_type.group(2), column_type.group(3)
+            else:
+                column, new_type, using = normalize_identifier(modify.group(1) or modify.group(2)), modify.group(3), None
+            return self._alter_column_type(table, column, new_type.strip(), using, statement, dialect, options)
+
+        not_null = re.match(r'^ALTER\s+(?:COLUMN\s+)?(\S+)\s+SET\s+NOT\s+NULL$', action, re.IGNORECASE)
+        if not_null:
+            column = normalize_identifier(not_null.group(1))
+            name = f'{table}_{column}_not_null'
+            # PostgreSQL 12+ skips the scan when a validated CHECK already proves the column is not null,
+            # so the final SET NOT NULL only needs a brief lock
+            return self._operation(
+                'set_not_null', table, statement, dialect, exclusive, duration='scan',
+                uses=self._column_keys(table, [column]),
+                safe_alternative=[
+                    f"ALTER TABLE {table} ADD CONSTRAINT {name} CHECK ({column} IS NOT NULL) NOT VALID;",
+                    f"ALTER TABLE {table} VALIDATE CONSTRAINT {name};",
+                    f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL;",
+                    f"ALTER TABLE {table} DROP CONSTRAINT {name};"
+                ],
+                issue=('blocking_validation', 'medium',
+                       f"SET NOT NULL on {table}.{column} scans every row under an ACCESS EXCLUSIVE lock")
+            )
+
+        validate = re.match(r'^VALIDATE\s+CONSTRAINT\s+(\S+)$', action, re.IGNORECASE)
+        if validate:
+            return self._operation('validate_constraint', table, statement, dialect, 'SHARE UPDATE EXCLUSIVE',
+                                   duration='scan', uses={table, f'constraint:{normalize_identifier(validate.group(1))}'})
+
+        rename = re.match(r'^RENAME\s+(?:COLUMN\s+)?(\S+)\s+TO\s+(\S+)$', action, re.IGNORECASE)
+        if rename and rename.group(1).upper() != 'TO':
+            old, new = normalize_identifier(rename.group(1)), normalize_identifier(rename.group(2))
+            return self._operation('rename', table, statement, dialect, exclusive,
+                                   drops={f'{table}.{old}'}, creates={f'{table}.{new}'})
+        rename_table = re.match(r'^RENAME\s+TO\s+(\S+)$', action, re.IGNORECASE)
+        if rename_table:
+            return self._operation('rename', table, statement, dialect, exclusive, drops={table},
+                                   creates={normalize_identifier(rename_table.group(1))})
+
+        drop = re.match(r'^DROP\s+(COLUMN\s+|CONSTRAINT\s+|INDEX\s+|KEY\s+|FOREIGN\s+KEY\s+)?(?:IF\s+EXISTS\s+)?(\S+)',
+                        action, re.IGNORECASE)
+        if drop:
+            kind = (drop.group(1) or 'COLUMN').split()[0].upper()
+            name = normalize_identifier(drop.group(2))
+            key = {'COLUMN': f'{table}.{name}', 'INDEX': f'index:{name}', 'KEY': f'index:{name}'}.get(kind, f'constraint:{name}')
+            return self._operation(f"drop_{'index' if kind == 'KEY' else 'constraint' if kind == 'FOREIGN' else kind.lower()}",
+                                   table, statement, dialect, exclusive, drops={key})
+
+        # SET/DROP DEFAULT, DROP NOT NULL, SET STATISTICS, ...: catalog-only changes
+        return self._operation('alter_table', table, statement, dialect, exclusive, uses={table})
+
+    def _add_column(self, table: str, column: str, definition: str, statement: str, dialect: str) -> Dict[str, Any]:
+        """ADD COLUMN is catalog-only unless the new column must be written into every existing row"""
+        default = re.search(r'\bDEFAULT\s+(.+?)' + COLUMN_DEFINITION_END, definition, re.IGNORECASE | re.DOTALL)
+        default = default.group(1).strip() if default and default.group(1).strip().upper() != 'NULL' else None
+        keys = dict(uses={table}, creates={f'{table}.{column}'})
+
+        if dialect == 'mysql':
+            # ALGORITHM=INSTANT (8.0.12+) adds columns without touching rows
+            return self._operation('add_column', table, statement, dialect, 'NONE', **keys)
+
+        reason = None
+        if SELF_FILLING_COLUMN.search(definition):
+            reason = 'a serial or stored generated column is computed for every existing row'
+        elif default and VOLATILE_DEFAULT.search(default):
+            reason = f"the volatile default {default} is evaluated for every existing row"
+        elif default and self.server_version is not None and self.server_version < 11:
+            reason = f"PostgreSQL {self.server_version} writes any non-null default into every row"
+        if not reason:
+            return self._operation('add_column', table, statement, dialect, 'ACCESS EXCLUSIVE', **keys)
+
+        safe_alternative = None
+        if default and not SELF_FILLING_COLUMN.search(definition):
+            column_type = re.match(r'(.+?)' + COLUMN_DEFINITION_END, definition, re.IGNORECASE | re.DOTALL).group(1)
+            safe_alternative = [
+                f"ALTER TABLE {table} ADD COLUMN {column} {column_type.strip()};",
+                f"ALTER TABLE {table} ALTER COLUMN {column} SET DEFAULT {default};",
+                f"UPDATE {table} SET {column} = {default} WHERE {column} IS NULL;"
+            ]
+            if re.search(r'\bNOT\s+NULL\b', definition, re.IGNORECASE):
+                safe_alternative += self._alter_action(
+                    table, f"ALTER COLUMN {column} SET NOT NULL", dialect, {}, statement
+                )['safe_alternative']
+        return self._operation(
+            'add_column', table, statement, dialect, 'ACCESS EXCLUSIVE', duration='rewrite',
+            safe_alternative=safe_alternative,
+            issue=('table_rewrite', 'high', f"ADD COLUMN {column} rewrites {table} under an ACCESS EXCLUSIVE lock: {reason}"),
+            **keys
+        )
+
+    def _alter_column_type(self, table: str, column: str, new_type: str, using: Optional[str], statement: str,
+                           dialect: str, options: Dict[str, str]) -> Dict[str, Any]:
+        """Type changes rewrite the table unless the new type is binary-compatible with the old one"""
+        keys = dict(uses=self._column_keys(table, [column]))
+        old_type = self._column_type(table, column)
+        if old_type and self._binary_compatible(old_type, new_type):
+            lock = 'ACCESS EXCLUSIVE' if dialect == 'postgresql' else 'NONE'
+            return self._operation('alter_column_type', table, statement, dialect, lock, **keys)
+
+        lock = 'ACCESS EXCLUSIVE' if dialect == 'postgresql' else options.get('LOCK') or 'SHARED'
+        # MySQL converts on assignment; its CAST only accepts a few target types
+        cast = using or (f'{column}::{new_type}' if dialect == 'postgresql' else column)
+        message = (f"Changing {table}.{column}{f' from {old_type}' if old_type else ''} to {new_type} rewrites the "
+                   f"table under {'an ACCESS EXCLUSIVE lock' if dialect == 'postgresql' else 'ALGORITHM=COPY, blocking writes'}")
+        batch_key = resolve_batch_key(self.schema, table)
+        dependents = self._column_dependents(table, column)
+        if batch_key['column'] is None:
+            message += f"; no online copy is suggested because {batch_key['reason']}"
+        elif dependents:
+            message += f"; the online copy has to recreate {', '.join(dependents)} on the new column"
+        return self._operation(
+            'alter_column_type', table, statement, dialect, lock, duration='rewrite',
+            safe_alternative=self._copy_column_steps(table, column, new_type, cast, dialect, batch_key, dependents)
+            if batch_key['column'] else None,
+            issue=('table_rewrite', 'high', message),
+            **keys
+        )
+
+    def _copy_column_steps(self, table: str, column: str, new_type: str, cast: str, dialect: str,
+                           batch_key: Dict[str, Any], dependents: List[str]) -> List[str]:
+        """Add a copy of the column, keep it in sync with a trigger, backfill it in key batches, then swap names"""
+        new_column = f'{column}_new'
+        trigger = f"{table.split('.')[-1]}_{column}_sync"
+        synced = re.sub(rf'(?<![\w.]){re.escape(column)}\b', f'NEW.{column}', cast)
+        key, key_type, start = batch_key['column'], batch_key['variable_type'], batch_key['start']
+        # The old column takes its constraints and indexes with it; foreign keys and views are not in the catalog
+        drop_old = (f"-- Recreate {', '.join(dependents)} on {column} before this drop; foreign keys and views "
+                    f"that use {column}_old go with it or block it\n" if dependents else
+                    f"-- Foreign keys and views that use {column}_old go with it or block the drop\n")
+        drop_old += f"ALTER TABLE {table} DROP COLUMN {column}_old;"
+
+        def batch(last):
+            return f"SELECT {key} FROM {table} WHERE {key} > {last} ORDER BY {key} LIMIT {BACKFILL_BATCH_ROWS}"
+
+        def update(last, batch_max):
+            return f"UPDATE {table} SET {new_column} = {cast} WHERE {key} > {last} AND {key} <= {batch_max};"
+
+        if dialect == 'postgresql':
+            return [
+                f"ALTER TABLE {table} ADD COLUMN {new_column} {new_type};",
+                # Rows written from here on carry the converted value, so the backfill cannot miss them
+                f"CREATE FUNCTION {trigger}() RETURNS trigger LANGUAGE plpgsql AS $$ "
+                f"BEGIN NEW.{new_column} := {synced}; RETURN NEW; END $$; "
+                f"CREATE TRIGGER {trigger} BEFORE INSERT OR UPDATE ON {table} FOR EACH ROW EXECUTE FUNCTION {trigger}();",
+                # COMMIT inside DO requires PostgreSQL 11+ and must run outside an explicit transaction
+                f"DO $$\nDECLARE\n    last_key {key_type};\n    batch_max {key_type};\nBEGIN\n"
+                f"    SELECT {start} INTO last_key FROM {table};\n    LOOP\n"
+                f"        SELECT max({key}) INTO batch_max FROM ({batch('last_key')}) AS batch;\n"
+                "        EXIT WHEN batch_max IS NULL;\n"
+                f"        {update('last_key', 'batch_max')}\n"
+                "        last_key := batch_max;\n        COMMIT;\n    END LOOP;\nEND $$;",
+                # The trigger goes in the same transaction as the swap, so no write sees the renamed column
+                f"BEGIN; DROP TRIGGER {trigger} ON {table}; ALTER TABLE {table} RENAME COLUMN {column} TO {column}_old; "
+                f"ALTER TABLE {table} RENAME COLUMN {new_column} TO {column}; COMMIT;",
+                f"DROP FUNCTION {trigger}();",
+                drop_old
+            ]
+        return [
+            f"ALTER TABLE {table} ADD COLUMN {new_column} {new_type};",
+            f"CREATE TRIGGER {trigger}_insert BEFORE INSERT ON {table} FOR EACH ROW SET NEW.{new_column} = {synced}; "
+            f"CREATE TRIGGER {trigger}_update BEFORE UPDATE ON {table} FOR EACH ROW SET NEW.{new_column} = {synced};",
+            (f"-- Start from :last_key = (SELECT {start} FROM {table}); repeat with :last_key = batch_max until\n"
+             "-- batch_max is NULL, committing after each batch\n"
+             f"SELECT MAX({key}) AS batch_max FROM ({batch(':last_key')}) AS batch; {update(':last_key', ':batch_max')}"),
+            # Writes wait on the table lock, so none slips between dropping the triggers and the swap
+            f"LOCK TABLES {table} WRITE; DROP TRIGGER {trigger}_insert; DROP TRIGGER {trigger}_update; "
+            f"ALTER TABLE {table} RENAME COLUMN {column} TO {column}_old, RENAME COLUMN {new_column} TO {column}; "
+            'UNLOCK TABLES;',
+            drop_old
+        ]
+
+    def _add_foreign_key(self, table: str, match, action: str, statement: str, dialect: str,
+                         options: Dict[str, str]) -> Dict[str, Any]:
+        """Adding a foreign key checks every existing row unless validation is deferred"""
+        name, columns, referenced = match.groups()
+        referenced = normalize_identifier(referenced)
+        columns = [normalize_identifier(column) for column in columns.split(',')]
+        name = normalize_identifier(name) if name else f"{table}_{'_'.join(columns)}_fkey"
+        keys = dict(uses={*self._column_keys(table, columns), referenced}, creates={f'constraint:{name}'})
+
+        if dialect == 'mysql':
+            if options.get('ALGORITHM') == 'INPLACE':
+                return self._operation('add_foreign_key', table, statement, dialect, options.get('LOCK') or 'NONE', **keys)
+            return self._operation(
+                'add_foreign_key', table, statement, dialect, 'SHARED', duration='rewrite',
+                # One step, so the checks are off only around this statement
+                safe_alternative=[
+                    f"SET foreign_key_checks = 0; {self._with_mysql_options(statement, 'INPLACE', 'NONE')} "
+                    'SET foreign_key_checks = 1;'
+                ],
+                issue=('blocking_foreign_key', 'high',
+                       f"With foreign_key_checks on, MySQL adds the foreign key on {table} with ALGORITHM=COPY, "
+                       'rebuilding the table while writes are blocked; check for orphaned rows with a query instead'),
+                **keys
+            )
+
+        if re.search(r'\bNOT\s+VALID$', action, re.IGNORECASE):
+            return self._operation('add_foreign_key', table, statement, dialect, 'SHARE ROW EXCLUSIVE', **keys)
+        named = action if match.group(1) else re.sub(r'^ADD\s+', f'ADD CONSTRAINT {name} ', action, flags=re.IGNORECASE)
+        return self._operation(
+            'add_foreign_key', table, statement, dialect, 'SHARE ROW EXCLUSIVE', duration='scan',
+            safe_alternative=[f"ALTER TABLE {table} {named} NOT VALID;",
+                              f"ALTER TABLE {table} VALIDATE CONSTRAINT {name};"],
+            issue=('blocking_foreign_key', 'high',
+                   f"Foreign key on {table} without NOT VALID checks every row while SHARE ROW EXCLUSIVE locks on "
+                   f"{table} and {referenced} block writes to both"),
+            **keys
+        )
+
+    def _operation(self, kind: str, table: Optional[str], sql: str, dialect: str, lock: Optional[str],
+                   duration: str = 'brief', transactional: bool = True, safe_alternative: Optional[List[str]] = None,
+                   issue: Optional[Tuple[str, str, str]] = None, uses=(), creates=(), drops=()) -> Dict[str, Any]:
+        """Assemble an operation; duration is brief (catalog only), scan, build or rewrite"""
+        size = self.table_bytes(table) if duration != 'brief' else None
+        rate = {'scan': SCAN_BYTES_PER_SECOND, 'build': INDEX_BUILD_BYTES_PER_SECOND,
+                'rewrite': REWRITE_BYTES_PER_SECOND}.get(duration)
+        if duration == 'brief':
+            seconds = 0.0
+        elif size is None:
+            seconds = None
+        else:
+            seconds = size / rate
+            if duration == 'rewrite':
+                indexes = len(self.schema.get_indexes(table)) if self.schema else 0
+                seconds *= 1 + INDEX_REWRITE_SHARE * indexes
+        blocks = self._lock_blocks(lock, dialect)
+
+        operation = {
+            'operation': kind,
+            'table': table,
+            'sql': sql if sql.endswith(';') else sql + ';',
+            'lock': lock,
+            'blocks': blocks,
+            'duration': duration,
+            'rewrite': duration == 'rewrite',
+            'table_bytes': size,
+            'estimated_seconds': None if seconds is None else round(seconds, 2),
+            'transactional': transactional,
+            'safe_alternative': safe_alternative,
+            'issue': None,
+            '_keys': (set(uses) | ({table} if table else set()), set(creates), set(drops))
+        }
+        if issue:
+            issue_type, severity, message = issue
+            if seconds is not None:
+                message += f" (~{self._format_seconds(seconds)} for {size // (1024 * 1024):,} MiB)"
+            operation['issue'] = {
+                'type': issue_type,
+                'severity': severity,
+                'message': message,
+                'lock': lock,
+                'blocks': blocks,
+                'estimated_seconds': operation['estimated_seconds'],
+                'impact': f"Blocks {blocks} on {table} for the whole {duration}; queued queries pile up behind the lock"
+            }
+        return operation
+
+    def _step(self, sql: str, dialect: str, statement: int, empty: bool = False) -> Dict[str, Any]:
+        """A plan step: one entry of a safe alternative (or the original statement), with its ordering keys"""
+        operations = [operation for part in sqlparse.split(sql) if self._normalize(part)
+                      for operation in self._operations(self._normalize(part), dialect)]
+        # BEGIN/COMMIT/SET, trigger bookkeeping and batch-boundary queries wrap the statement that matters
+        operation = next((operation for operation in operations if operation['operation'] not in ('session', 'other')),
+                         operations[0])
+        uses, creates, drops = set(), set(), set()
+        for other in operations:
+            uses |= other['_keys'][0]
+            creates |= other['_keys'][1]
+            drops |= other['_keys'][2]
+        return {
+            'sql': sql if sql.endswith(';') else sql + ';',
+            'statement': statement,
+            'operation': operation['operation'],
+            'table': operation['table'],
+            'lock': operation['lock'],
+            'blocks': operation['blocks'],
+            'estimated_seconds': 0.0 if empty else operation['estimated_seconds'],
+            'transactional': operation['transactional'],
+            'phase': PHASES.index('expand') if empty else self._phase(operation),
+            'keys': (uses, creates, drops),
+            'text': sql,
+            'after': set()
+        }
+
+    def _phase(self, operation: Dict[str, Any]) -> int:
+        kind = operation['operation']
+        if kind in ('drop_column', 'drop_table', 'drop_index', 'drop_constraint', 'rename'):
+            return PHASES.index('contract')
+        if operation['blocks'] != 'nothing' and operation['duration'] != 'brief':
+            return PHASES.index('blocking')
+        if kind in ('validate_constraint', 'backfill'):
+            return PHASES.index('validate')
+        if operation['duration'] == 'build':
+            return PHASES.index('build')
+        if kind in ('set_not_null', 'add_unique'):
+            return PHASES.index('enforce')
+        return PHASES.index('expand')
+
+    def _order_steps(self, steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Topological order by phase, then original position; dependent steps never move ahead"""
+        for later, step in enumerate(steps):
+            for earlier in range(later):
+                if self._depends(steps[earlier], step):
+                    step['after'].add(earlier)
+
+        waiting = {i: set(step['after']) for i, step in enumerate(steps)}
+        ready = [(step['phase'], i) for i, step in enumerate(steps) if not waiting[i]]
+        heapq.heapify(ready)
+        ordered = []
+        while ready:
+            _, i = heapq.heappop(ready)
+            ordered.append(steps[i])
+            for j, blockers in waiting.items():
+                if i in blockers:
+                    blockers.discard(i)
+                    if not blockers:
+                        # A step cannot run in an earlier phase than something it waits for
+                        steps[j]['phase'] = max(steps[j]['phase'], steps[i]['phase'])
+                        heapq.heappush(ready, (steps[j]['phase'], j))
+        return ordered
+
+    def _depends(self, earlier: Dict[str, Any], later: Dict[str, Any]) -> bool:
+        """Whether `later` touches an object `earlier` creates, drops or renames, or drops one `earlier` uses"""
+        uses_a, creates_a, drops_a = earlier['keys']
+        uses_b, creates_b, drops_b = later['keys']
+        if self._overlap(creates_a | drops_a, uses_b | creates_b | drops_b, later['text']):
+            return True
+        return self._overlap(drops_b, uses_a | creates_a, earlier['text'])
+
+    def _overlap(self, changed: set, touched: set, text: str) -> bool:
+        for key in changed:
+            if key in touched:
+                return True
+            table, _, column = key.partition('.')
+            if column and ':' not in table:
+                # A new or dropped column matters to any statement on its table that names it
+                if table in touched and re.search(rf'\b{re.escape(column)}\b', text, re.IGNORECASE):
+                    return True
+            elif not column and any(other.startswith(key + '.') for other in touched):
+                return True
+        return False
+
+    def _blocking_seconds(self, operations: List[Dict[str, Any]]) -> float:
+        return round(sum(operation['estimated_seconds'] or 0 for operation in operations
+                         if operation['blocks'] != 'nothing'), 2)
+
+    def _dialect(self, text: str) -> str:
+        if self.dialect:
+            return 'mysql' if self.dialect in ('mysql', 'mariadb') else 'postgresql'
+        return 'mysql' if MYSQL_HINTS.search(text) else 'postgresql'
+
+    def _exclusive(self, dialect: str) -> str:
+        """Catalog changes: a brief ACCESS EXCLUSIVE lock, or MySQL's metadata lock with an online algorithm"""
+        return 'ACCESS EXCLUSIVE' if dialect == 'postgresql' else 'NONE'
+
+    def _strongest(self, locks: List[str], dialect: str) -> Optional[str]:
+        order = list(POSTGRES_LOCKS if dialect == 'postgresql' else MYSQL_LOCKS)
+        ranked = [lock for lock in locks if lock in order]
+        return max(ranked, key=order.index) if ranked else None
+
+    def _lock_blocks(self, lock: Optional[str], dialect: str) -> str:
+        if not lock:
+            return 'nothing'
+        return (POSTGRES_LOCKS if dialect == 'postgresql' else MYSQL_LOCKS).get(lock, 'reads and writes')
+
+    def _mysql_options(self, text: str) -> Dict[str, str]:
+        return {match.group(1).upper(): match.group(2).upper()
+                for match in re.finditer(r'\b(ALGORITHM|LOCK)\s*=?\s*(\w+)', text, re.IGNORECASE)}
+
+    def _with_mysql_options(self, text: str, algorithm: str, lock: str) -> str:
+        """The statement with ALGORITHM/LOCK replaced by the given ones"""
+        text = re.sub(r',?\s*\b(?:ALGORITHM|LOCK)\s*=?\s*\w+', '', self._normalize(text), flags=re.IGNORECASE)
+        separator = ', ' if re.match(r'^ALTER\b', text, re.IGNORECASE) else ' '
+        return f"{text}{separator}ALGORITHM={algorithm}{separator}LOCK={lock};"
+
+    def _column_type(self, table: str, column: str) -> Optional[str]:
+        entry = self.schema.get_table(table) if self.schema else None
+        column_entry = entry['columns'].get(column) if entry else None
+        return column_entry['type'] if column_entry else None
+
+    def _column_dependents(self, table: str, column: str) -> List[str]:
+        """NOT NULL, DEFAULT and the indexes of a column that are lost when the column is dropped"""
+        entry = self.schema.get_table(table) if self.schema else None
+        column_entry = entry['columns'].get(column) if entry else None
+        if not column_entry:
+            return []
+        dependents = []
+        if not column_entry['nullable'] and column not in entry['primary_key']:
+            dependents.append('NOT NULL')
+        if column_entry['default']:
+            dependents.append('the DEFAULT')
+        for index in entry['indexes']:
+            if column in index['columns'] or column in index['include']:
+                kind = 'primary key' if index['primary'] else 'unique index' if index['unique'] else 'index'
+                dependents.append(f"{kind} {index['name']}")
+        return dependents
+
+    def _binary_compatible(self, old_type: str, new_type: str) -> bool:
+        """Changes PostgreSQL and MySQL apply without a rewrite: widening VARCHAR, VARCHAR to TEXT"""
+        old_type, new_type = old_type.lower().strip(), new_type.lower().strip()
+        if old_type == new_type:
+            return True
+        old = re.match(r'^(?:varchar|character varying)\s*\((\d+)\)$', old_type)
+        new = re.match(r'^(?:varchar|character varying)\s*\((\d+)\)$', new_type)
+        if old and new:
+            return int(new.group(1)) >= int(old.group(1))
+        return bool(old or old_type in ('varchar', 'character varying')) and new_type == 'text'
+
+    def _index_table(self, index_name: str) -> Optional[str]:
+        for table in (self.schema.tables.values() if self.schema else []):
+            if any(index['name'] == index_name for index in table['indexes']):
+                return table['name']
+        return None
+
+    def _index_columns(self, text: str) -> List[str]:
+        """Plain column names in the first parenthesized list; expressions contribute their identifiers"""
+        start = text.find('(')
+        if start < 0:
+            return []
+        depth = 0
+        for end in range(start, len(text)):
+            depth += {'(': 1, ')': -1}.get(text[end], 0)
+            if depth == 0:
+                return self._words(text[start + 1:end])
+        return []
+
+    def _column_keys(self, table: Optional[str], columns: List[str]) -> set:
+        if not table:
+            return set()
+        return {table} | {f'{table}.{normalize_identifier(column)}' for column in columns}
+
+    def _words(self, text: str) -> List[str]:
+        return [word for word in re.findall(r'[A-Za-z_][\w$]*', text)
+                if word.upper() not in ('ASC', 'DESC', 'NULLS', 'FIRST', 'LAST', 'COLLATE', 'WHERE', 'AND', 'OR',
+                                        'IS', 'NOT', 'NULL', 'SET', 'UPDATE', 'INSERT', 'INTO', 'DELETE', 'FROM')]
+
+    def _split_top_level(self, text: str) -> List[str]:
+        """Split on commas that are not nested in parentheses or quotes"""
+        parts = []
+        depth = 0
+        quote = None
+        current = ''
+
+        for char in text:
+            if quote:
+                current += char
+                if char == quote:
+                    quote = None
+                continue
+            if char in ("'", '"'):
+                quote = char
+            elif char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+            elif char == ',' and depth == 0:
+                parts.append(current.strip())
+                current = ''
+                continue
+            current += char
+
+        if current.strip():
+            parts.append(current.strip())
+        return parts
+
+    def _normalize(self, sql: str) -> str:
+        """Comments stripped, whitespace collapsed, no trailing semicolon"""
+        text = sqlparse.format(sql, strip_comments=True)
+        return ' '.join(text.split()).rstrip(';').strip()
+
+    def _format_seconds(self, seconds: float) -> str:
+        if seconds < 120:
+            return f"{seconds:.0f} s"
+        if seconds < 7200:
+            return f"{seconds / 60:.0f} min"
+        return f"{seconds / 3600:.1f} h"
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+SQL Optimizer Pro - Workload Feature Store
+
+Keeps per-statement analyzer features for large query logs in NumPy columns,
+with tables, columns, functions and issue types dictionary-encoded, so workload
+questions are answered with vectorized filters, group-bys and top-k counts
+instead of loops over millions of analysis dicts.
+
+    python feature_store.py queries.sql --schema schema.sql --output features.npz
+    python feature_store.py features.npz --top where_tables --unindexed
+"""
+
+import argparse
+import json
+import os
+from typing import List, Dict, Any, Optional, Union, Tuple
+
+import numpy as np
+
+from sql_analyzer import SQLAnalyzer
+
+# One value per statement: name -> dtype
+SCALAR_FEATURES = {
+    'join_count': np.int16,
+    'subquery_count': np.int16,
+    'table_count': np.int16,
+    'where_function_count': np.int16,
+    'complexity_score': np.int32
+}
+FLAG_FEATURES = ('has_where', 'has_group_by', 'has_order_by', 'has_limit', 'is_write')
+# Dictionary-encoded labels, one id per statement
+LABEL_FEATURES = ('query_type', 'performance', 'service')
+# Variable-length lists per statement, stored as offsets into one flat id array: name -> vocabulary
+LIST_FEATURES = {
+    'tables': 'tables',
+    'where_columns': 'columns',
+    'where_functions': 'functions'
+}
+# Issue types are bits of one uint64 per statement
+MAX_ISSUE_TYPES = 64
+AGGREGATES = ('count', 'sum', 'mean', 'min', 'max')
+FORMAT_VERSION = 1
+
+class FeatureStore:
+    """Columnar per-statement features with vectorized filter, group-by and top-k summaries"""
+
+    def __init__(self):
+        self.vocabularies = {name: [] for name in ('query_type', 'performance', 'service', 'tables', 'columns',
+                                                   'functions', 'issues')}
+        self._ids = {name: {} for name in self.vocabularies}
+        self.columns = self._empty_columns()
+        self._pending = []
+
+    def __len__(self) -> int:
+        return len(self.columns['statement_id']) + len(self._pending)
+
+    @staticmethod
+    def _empty_columns() -> Dict[str, np.ndarray]:
+        columns = {'statement_id': np.zeros(0, dtype=np.int64), 'issue_flags': np.zeros(0, dtype=np.uint64)}
+        columns.update({name: np.zeros(0, dtype=dtype) for name, dtype in SCALAR_FEATURES.items()})
+        columns.update({name: np.zeros(0, dtype=bool) for name in FLAG_FEATURES})
+        columns.update({name: np.zeros(0, dtype=np.int32) for name in LABEL_FEATURES})
+        for name in LIST_FEATURES:
+            columns[f'{name}_offsets'] = np.zeros(1, dtype=np.int64)
+            columns[f'{name}_ids'] = np.zeros(0, dtype=np.int32)
+        # Whether each WHERE column leads an index; parallel to where_columns_ids
+        columns['where_columns_indexed'] = np.zeros(0, dtype=bool)
+        return columns
+
+    def encode(self, vocabulary: str, value: str) -> int:
+        """Id of a value in a vocabulary, adding it on first sight"""
+        ids = self._ids[vocabulary]
+        if value not in ids:
+            if vocabulary == 'issues' and len(ids) >= MAX_ISSUE_TYPES:
+                raise ValueError(f"More than {MAX_ISSUE_TYPES} issue types")
+            ids[value] = len(self.vocabularies[vocabulary])
+            self.vocabularies[vocabulary].append(value)
+        return ids[value]
+
+    def add(self, analysis: Dict[str, Any], statement_id: Optional[int] = None, service: Optional[str] = None,
+            schema=None) -> None:
+        """Append one analyzer result; `schema` marks which WHERE columns lead an index"""
+        where = analysis.get('where_clause', {})
+        where_columns = []
+        for usage in analysis.get('column_usage', []):
+            table = schema.get_table(usage['table']) if schema else None
+            for column in usage['equality'] + usage['range']:
+                indexed = bool(table) and any(index['columns'][:1] == [column] for index in table['indexes'])
+                where_columns.append((self.encode('columns', f"{usage['table']}.{column}"), indexed))
+
+        flags = 0
+        for issue in analysis.get('issues', []):
+            flags |= 1 << self.encode('issues', issue['type'])
+
+        self._pending.append({
+            'statement_id': len(self) + 1 if statement_id is None else statement_id,
+            'issue_flags': flags,
+            'join_count': analysis.get('joins', {}).get('join_count', 0),
+            'subquery_count': len(analysis.get('subqueries', [])),
+            'table_count': len(analysis.get('tables', [])),
+            'where_function_count': len(where.get('functions_used', [])),
+            'complexity_score': analysis.get('complexity_score', 0),
+            'has_where': where.get('has_where', False),
+            'has_group_by': analysis.get('group_by', {}).get('has_group_by', False),
+            'has_order_by': analysis.get('order_by', {}).get('has_order_by', False),
+            'has_limit': analysis.get('limit', {}).get('has_limit', False),
+            'is_write': analysis.get('write_path', {}).get('is_write', False),
+            'query_type': self.encode('query_type', analysis.get('query_type', 'UNKNOWN')),
+            'performance': self.encode('performance', analysis.get('estimated_performance', 'unknown')),
+            'service': self.encode('service', service or ''),
+            'tables': [self.encode('tables', table) for table in analysis.get('tables', [])],
+            'where_columns': [column for column, _ in where_columns],
+            'where_columns_indexed': [indexed for _, indexed in where_columns],
+            'where_functions': [self.encode('functions', name) for name in where.get('functions_used', [])]
+        })
+
+    def add_sql(self, sql_content: str, service: Optional[str] = None, schema=None,
+                analyzer: Optional[SQLAnalyzer] = None) -> int:
+        """Analyze a script and append every statement; returns how many were added"""
+        analyzer = analyzer or SQLAnalyzer(schema=schema)
+        analyses = analyzer.analyze_queries(analyzer.parse_sql(sql_content))
+        for analysis in analyses:
+            self.add(analysis, service=service, schema=schema)
+        return len(analyses)
+
+    def flush(self) -> None:
+        """Move appended rows into the column arrays"""
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        batch = {
+            'statement_id': np.array([row['statement_id'] for row in rows], dtype=np.int64),
+            'issue_flags': np.array([row['issue_flags'] for row in rows], dtype=np.uint64),
+            'where_columns_indexed': np.array(
+                [indexed for row in rows for indexed in row['where_columns_indexed']], dtype=bool
+            )
+        }
+        batch.update({name: np.array([row[name] for row in rows], dtype=dtype) for name, dtype in SCALAR_FEATURES.items()})
+        batch.update({name: np.array([row[name] for row in rows], dtype=bool) for name in FLAG_FEATURES})
+        batch.update({name: np.array([row[name] for row in rows], dtype=np.int32) for name in LABEL_FEATURES})
+
+        columns = dict(self.columns)
+        for name in LIST_FEATURES:
+            lengths = np.array([len(row[name]) for row in rows], dtype=np.int64)
+            offsets = columns[f'{name}_offsets']
+            columns[f'{name}_offsets'] = np.concatenate([offsets, offsets[-1] + np.cumsum(lengths)])
+            columns[f'{name}_ids'] = np.concatenate([
+                columns[f'{name}_ids'], np.array([value for row in rows for value in row[name]], dtype=np.int32)
+            ])
+        for name, values in batch.items():
+            columns[name] = np.concatenate([columns[name], values])
+        self.columns = columns
+
+    def mask(self, query_type: Optional[str] = None, service: Optional[str] = None,
+             performance: Optional[str] = None, issue: Optional[str] = None, table: Optional[str] = None,
+             **conditions) -> np.ndarray:
+        """Boolean row mask; conditions are `feature=value`, `min_feature=value` or `max_feature=value`"""
+        self.flush()
+        selected = np.ones(len(self), dtype=bool)
+        for name, value in (('query_type', query_type), ('service', service), ('performance', performance)):
+            if value is not None:
+                selected &= self.columns[name] == self._ids[name].get(value, -1)
+        if issue is not None:
+            selected &= self.issue_mask(issue)
+        if table is not None:
+            selected &= self.contains('tables', table)
+        for key, value in conditions.items():
+            bound, _, name = key.partition('_') if key.startswith(('min_', 'max_')) else ('', '', key)
+            if name not in SCALAR_FEATURES and name not in FLAG_FEATURES:
+                raise ValueError(f"Unknown feature: {name}")
+            column = self.columns[name]
+            selected &= column >= value if bound == 'min' else column <= value if bound == 'max' else column == value
+        return selected
+
+    def issue_mask(self, issue: str) -> np.ndarray:
+        """Rows flagged with an issue type"""
+        self.flush()
+        if issue not in self._ids['issues']:
+            return np.zeros(len(self), dtype=bool)
+        return (self.columns['issue_flags'] >> np.uint64(self._ids['issues'][issue])) & np.uint64(1) == 1
+
+    def contains(self, feature: str, value: str) -> np.ndarray:
+        """Rows whose list feature (tables, where_columns, where_functions) holds a value"""
+        rows, ids, _ = self._expand(feature)
+        selected = np.zeros(len(self), dtype=bool)
+        value_id = self._ids[LIST_FEATURES[feature]].get(value)
+        if value_id is not None:
+            selected[rows[ids == value_id]] = True
+        return selected
+
+    def group_by(self, keys: Union[str, Tuple[str, ...]], value: Optional[str] = None, agg: str = 'count',
+                 where: Optional[np.ndarray] = None) -> Dict[Any, Any]:
+        """Aggregate `value` (or count rows) per distinct key; several keys give tuple keys"""
+        if agg not in AGGREGATES:
+            raise ValueError(f"agg must be one of {', '.join(AGGREGATES)}")
+        if agg != 'count' and value is None:
+            raise ValueError(f"agg={agg} needs a value feature")
+        self.flush()
+        keys = (keys,) if isinstance(keys, str) else tuple(keys)
+        selected = np.ones(len(self), dtype=bool) if where is None else where
+        key_columns = [np.asarray(self.columns[key][selected], dtype=np.int64) for key in keys]
+        if not len(key_columns[0]):
+            return {}
+        # Several keys are packed into one integer per row, so a 1-D unique finds the groups
+        shape = tuple(int(column.max()) + 1 for column in key_columns)
+        packed = np.ravel_multi_index(key_columns, shape) if len(keys) > 1 else key_columns[0]
+        codes, inverse = np.unique(packed, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        groups = np.stack(np.unravel_index(codes, shape), axis=1) if len(keys) > 1 else codes[:, None]
+        counts = np.bincount(inverse, minlength=len(groups))
+
+        if agg == 'count':
+            results = counts
+        else:
+            values = self.columns[value][selected].astype(np.float64)
+            if agg in ('sum', 'mean'):
+                results = np.bincount(inverse, weights=values, minlength=len(groups))
+                if agg == 'mean':
+                    results = results / counts
+            else:
+                # Sort by group, then by value; the first (min) or last (max) of each group run is the answer
+                order = np.lexsort((values, inverse))
+                boundaries = np.concatenate([[0], np.cumsum(counts)])
+                picks = boundaries[:-1] if agg == 'min' else boundaries[1:] - 1
+                results = values[order][picks]
+
+        summary = {}
+        for group, result in zip(groups, results):
+            label = tuple(self._decode(key, int(code)) for key, code in zip(keys, group))
+            summary[label[0] if len(label) == 1 else label] = result.item()
+        return summary
+
+    def distribution(self, feature: str, by: Optional[str] = None,
+                     where: Optional[np.ndarray] = None) -> Dict[Any, Dict[Any, int]]:
+        """Value counts of a feature, overall ({value: n}) or per `by` label ({label: {value: n}})"""
+        if by is None:
+            return dict(sorted(self.group_by(feature, where=where).items()))
+        nested = {}
+        for (label, value), count in sorted(self.group_by((by, feature), where=where).items()):
+            nested.setdefault(label, {})[value] = count
+        return nested
+
+    def top_k(self, feature: str, k: int = 10, where: Optional[np.ndarray] = None,
+              unindexed: bool = False) -> List[Tuple[str, int]]:
+        """Most frequent values of a list feature, an issue type (`issues`) or `where_tables`
+
+        `where_tables` counts the table of each WHERE column; with `unindexed` only columns that lead no
+        index are counted, answering "which tables are filtered most often without an index".
+        """
+        self.flush()
+        selected = np.ones(len(self), dtype=bool) if where is None else where
+        if feature == 'issues':
+            bits = np.arange(len(self.vocabularies['issues']), dtype=np.uint64)
+            flags = self.columns['issue_flags'][selected]
+            counts = ((flags[:, None] >> bits[None, :]) & np.uint64(1)).sum(axis=0)
+            vocabulary = self.vocabularies['issues']
+        else:
+            source = 'where_columns' if feature == 'where_tables' else feature
+            rows, ids, indexed = self._expand(source)
+            keep = selected[rows]
+            if unindexed:
+                if source != 'where_columns':
+                    raise ValueError('unindexed applies to where_columns and where_tables')
+                keep &= ~indexed
+            ids = ids[keep]
+            if feature == 'where_tables':
+                # Map each column id to its table's id through a lookup array
+                tables = np.array([self.encode('tables', name.rsplit('.', 1)[0])
+                                   for name in self.vocabularies['columns']], dtype=np.int32)
+                ids = tables[ids] if len(tables) else ids
+                vocabulary = self.vocabularies['tables']
+            else:
+                vocabulary = self.vocabularies[LIST_FEATURES[feature]]
+            counts = np.bincount(ids, minlength=len(vocabulary))
+
+        k = min(k, int(np.count_nonzero(counts)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-counts, k - 1)[:k]
+        top = top[np.lexsort((top, -counts[top]))]
+        return [(vocabulary[i], int(counts[i])) for i in top]
+
+    def summary(self, where: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Statement count, query types, mean features and the most common issues"""
+        self.flush()
+        selected = np.ones(len(self), dtype=bool) if where is None else where
+        total = int(selected.sum())
+        return {
+            'statements': total,
+            'query_types': self.group_by('query_type', where=selected),
+            'means': {name: round(float(self.columns[name][selected].mean()), 3) if total else 0.0
+                      for name in SCALAR_FEATURES},
+            'rates': {name: round(float(self.columns[name][selected].mean()), 3) if total else 0.0
+                      for name in FLAG_FEATURES},
+            'top_issues': self.top_k('issues', where=selected)
+        }
+
+    def save(self, path: str) -> None:
+        """Write a compressed `.npz`, or (for any other path) a directory of `.npy` files that load() maps"""
+        self.flush()
+        metadata = np.array(json.dumps({'version': FORMAT_VERSION, 'vocabularies': self.vocabularies}))
+        if path.endswith('.npz'):
+            np.savez_compressed(path, _metadata=metadata, **self.columns)
+            return
+        os.makedirs(path, exist_ok=True)
+        for name, column in self.columns.items():
+            np.save(os.path.join(path, f'{name}.npy'), column)
+        with open(os.path.join(path, 'metadata.json'), 'w', encoding='utf-8') as f:
+            f.write(str(metadata))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'FeatureStore':
+        """Reopen a saved store; a directory store is memory-mapped read-only unless `mmap` is False"""
+        store = cls()
+        if path.endswith('.npz'):
+            with np.load(path, allow_pickle=False) as data:
+                metadata = json.loads(str(data['_metadata']))
+                columns = {name: data[name] for name in data.files if name != '_metadata'}
+        else:
+            with open(os.path.join(path, 'metadata.json'), 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            columns = {
+                name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                for name in store.columns
+            }
+        if metadata.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported feature store version: {metadata.get('version')}")
+        store.columns.update(columns)
+        for name, values in metadata['vocabularies'].items():
+            store.vocabularies[name] = list(values)
+            store._ids[name] = {value: i for i, value in enumerate(values)}
+        return store
+
+    def _expand(self, feature: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(row, id, indexed) per element of a list feature"""
+        if feature not in LIST_FEATURES:
+            raise ValueError(f"Unknown list feature: {feature}")
+        self.flush()
+        offsets = self.columns[f'{feature}_offsets']
+        ids = np.asarray(self.columns[f'{feature}_ids'])
+        rows = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        indexed = self.columns['where_columns_indexed'] if feature == 'where_columns' else np.zeros(len(ids), dtype=bool)
+        return rows, ids, np.asarray(indexed)
+
+    def _decode(self, feature: str, code: int) -> Any:
+        """Label of a dictionary-encoded value; other features are returned as is"""
+        if feature in LABEL_FEATURES:
+            return self.vocabularies[feature][code]
+        if feature in FLAG_FEATURES:
+            return bool(code)
+        return code
+
+def main():
+    """Command-line entry point: build a store from SQL files, or summarize a saved one"""
+    parser = argparse.ArgumentParser(description='Build or query a columnar workload feature store')
+    parser.add_argument('inputs', nargs='+', help='.sql files to analyze, or one saved store (.npz or directory)')
+    parser.add_argument('--schema', help='DDL file, so WHERE columns are resolved and checked for indexes')
+    parser.add_argument('--output', help='Save the built store here (.npz, or a directory for memory mapping)')
+    parser.add_argument('--top', default='issues', help='List feature to rank: issues, tables, where_tables, ...')
+    parser.add_argument('--unindexed', action='store_true', help='With where_tables/where_columns: unindexed only')
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    first = args.inputs[0]
+    if len(args.inputs) == 1 and (first.endswith('.npz') or os.path.isdir(first)):
+        store = FeatureStore.load(first)
+    else:
+        schema = None
+        if args.schema:
+            from schema_catalog import SchemaCatalog
+            with open(args.schema, 'r', encoding='utf-8') as f:
+                schema = SchemaCatalog().load_ddl(f.read())
+        store = FeatureStore()
+        analyzer = SQLAnalyzer(schema=schema)
+        for path in args.inputs:
+            with open(path, 'r', encoding='utf-8') as f:
+                added = store.add_sql(f.read(), service=os.path.splitext(os.path.basename(path))[0],
+                                      schema=schema, analyzer=analyzer)
+            print(f"📥 {path}: {added} statements")
+        if args.output:
+            store.save(args.output)
+            print(f"💾 Saved to {args.output}")
+
+    summary = store.summary()
+    print(f"📊 {summary['statements']} statements: {summary['query_types']}")
+    print(f"   means: {summary['means']}")
+    print(f"🔝 top {args.top}{' (unindexed)' if args.unindexed else ''}:")
+    for value, count in store.top_k(args.top, k=args.k, unindexed=args.unindexed):
+        print(f"   {count:>8}  {value}")
+
+if __name__ == '__main__':
+    main()
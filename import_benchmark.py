@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+SQL Optimizer Pro - Import-Time Benchmark
+
+Measures what `import app` costs on a cold start with `python -X importtime`,
+on top of Flask itself, and checks it against a budget.
+
+    python import_benchmark.py
+    STARTUP_MODE=eager python import_benchmark.py --top 20
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import List, Dict, Any, Optional, Tuple
+
+# Cost of `import app` after Flask is loaded; override with IMPORT_TIME_BUDGET_MS
+IMPORT_TIME_BUDGET_MS = float(os.environ.get('IMPORT_TIME_BUDGET_MS', 75))
+# The test suite runs on shared machines, so by default it enforces a looser ceiling (the lazy import
+# measures ~12 ms); setting IMPORT_TIME_BUDGET_MS makes it enforce that budget instead
+TEST_IMPORT_TIME_BUDGET_MS = float(os.environ.get('IMPORT_TIME_BUDGET_MS', 250))
+# Modules a lazy start must not load before the first request needs them
+DEFERRED_MODULES = (
+    'numpy', 'sqlparse', 'sql_analyzer', 'sql_optimizer', 'schema_catalog', 'ddl_analyzer', 'job_queue', 'analysis_cache',
+    'query_clustering', 'cost_calibration', 'concurrent.futures', 'sqlite3'
+)
+
+def parse_importtime(output: str) -> List[Tuple[str, int, float, float]]:
+    """(module, depth, self ms, cumulative ms) per line of -X importtime output, in completion order"""
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3:
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        entries.append((name.strip(), depth, int(fields[0]) / 1000, int(fields[1]) / 1000))
+    return entries
+
+def measure_import(module: str = 'app', preload: Tuple[str, ...] = ('flask',), runs: int = 3,
+                   env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Cheapest of `runs` cold imports of `module` in a fresh interpreter, after `preload` is imported"""
+    # -X importtime does not list modules loaded through importlib, so the loaded set comes from sys.modules
+    statement = (f"import sys; {'; '.join(f'import {name}' for name in preload)}; before = set(sys.modules); "
+                 f"import {module}; print('\\n'.join(sorted(set(sys.modules) - before)))")
+    best = None
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', statement],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=dict(os.environ, **(env or {})),
+            capture_output=True, text=True, check=True
+        )
+        entries = parse_importtime(completed.stderr)
+        # Everything after the last preloaded top-level import was pulled in by `module`
+        start = max((i + 1 for i, (name, depth, _, _) in enumerate(entries) if depth == 0 and name in preload), default=0)
+        own = entries[start:]
+        total = next((cumulative for name, depth, _, cumulative in own if depth == 0 and name == module), None)
+        if total is not None and (best is None or total < best['cumulative_ms']):
+            best = {
+                'module': module,
+                'cumulative_ms': round(total, 2),
+                'budget_ms': IMPORT_TIME_BUDGET_MS,
+                'within_budget': total <= IMPORT_TIME_BUDGET_MS,
+                'imported': completed.stdout.split(),
+                'slowest': sorted(
+                    ({'module': name, 'self_ms': round(self_ms, 2), 'cumulative_ms': round(cumulative, 2)}
+                     for name, _, self_ms, cumulative in own),
+                    key=lambda entry: -entry['self_ms']
+                )
+            }
+    if best is None:
+        raise RuntimeError(f"-X importtime reported no timing for {module}")
+    best['deferred_loaded'] = [name for name in DEFERRED_MODULES if name in best['imported']]
+    return best
+
+def main():
+    """Command-line entry point; exits non-zero over budget"""
+    parser = argparse.ArgumentParser(description='Measure the cold-start import time of the app')
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='Slowest modules to list')
+    args = parser.parse_args()
+
+    result = measure_import(args.module, runs=args.runs)
+    status = '✅' if result['within_budget'] else '❌'
+    print(f"{status} import {result['module']}: {result['cumulative_ms']} ms on top of Flask "
+          f"(budget {result['budget_ms']} ms, STARTUP_MODE={os.environ.get('STARTUP_MODE', 'lazy')})")
+    if result['deferred_loaded']:
+        print(f"   loaded at startup: {', '.join(result['deferred_loaded'])}")
+    for entry in result['slowest'][:args.top]:
+        print(f"   {entry['self_ms']:>8.2f} ms  {entry['module']}")
+    sys.exit(0 if result['within_budget'] else 1)
+
+if __name__ == '__main__':
+    main()
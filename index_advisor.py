@@ -0,0 +1,229 @@
+from typing import List, Dict, Any, Optional
+
+from schema_catalog import SchemaCatalog, normalize_identifier
+
+# Per-entry index overhead (tuple header + line pointer) and default B-tree fill factor
+INDEX_TUPLE_OVERHEAD_BYTES = 12
+INDEX_FILL_FACTOR = 0.9
+# Share of rows assumed to match an equality filter when nothing better is known
+DEFAULT_SELECTIVITY = 0.01
+MAX_COVERING_COLUMNS = 6
+INCLUDE_DIALECTS = {'postgresql', 'postgres', 'sqlserver'}
+
+class IndexAdvisor:
+    """Find duplicate, left-prefix-redundant and unused indexes in a schema catalog"""
+
+    def __init__(self, catalog: SchemaCatalog, dialect: str = 'postgresql', max_unused_scans: int = 10):
+        self.catalog = catalog
+        self.dialect = dialect.lower()
+        self.max_unused_scans = max_unused_scans
+
+    def find_droppable_indexes(self) -> List[Dict[str, Any]]:
+        """Return one finding per index that could be dropped, with the reason and a DROP statement"""
+        findings = []
+        flagged = set()
+
+        for table in self.catalog.tables.values():
+            indexes = table['indexes']
+
+            for index in indexes:
+                if index['primary'] or (table['name'], index['name']) in flagged:
+                    continue
+
+                finding = self._find_redundancy(index, indexes, flagged, table)
+                if not finding:
+                    finding = self._find_unused(index, table)
+                if finding:
+                    flagged.add((table['name'], index['name']))
+                    findings.append(finding)
+
+        return findings
+
+    def analyze(self) -> Dict[str, Any]:
+        """Full report: droppable indexes plus per-table write amplification before and after"""
+        findings = self.find_droppable_indexes()
+        tables = []
+
+        for table in self.catalog.tables.values():
+            dropped = [finding for finding in findings if finding['table'] == table['name'] and finding['droppable']]
+            if not table['indexes']:
+                continue
+            tables.append(dict(
+                {'table': table['name'], 'index_count': len(table['indexes']), 'droppable_indexes': len(dropped)},
+                **self.estimate_write_amplification(table['name'], len(dropped))
+            ))
+
+        return {
+            'findings': findings,
+            'tables': tables,
+            'summary': {
+                'indexes_analyzed': sum(len(table['indexes']) for table in self.catalog.tables.values()),
+                'droppable_indexes': sum(1 for finding in findings if finding['droppable']),
+                'reclaimable_bytes': sum(finding.get('size_bytes') or 0 for finding in findings if finding['droppable'])
+            }
+        }
+
+    def estimate_write_amplification(self, table_name: str, dropped: int = 0) -> Dict[str, Any]:
+        """Structures touched per row INSERT/DELETE (heap + every index) before and after dropping indexes"""
+        index_count = len(self.catalog.get_indexes(table_name))
+        # Clustered engines (InnoDB, SQL Server) store rows in the primary key index itself
+        heap = 0 if self.dialect in ('mysql', 'mariadb', 'sqlserver') and self._has_primary_key(table_name) else 1
+        before = heap + index_count
+        after = before - dropped
+
+        return {
+            'write_amplification': before,
+            'write_amplification_after': after,
+            'write_reduction_pct': round((before - after) / before * 100, 1) if before else 0.0
+        }
+
+    def recommend_covering_index(self, usage: Dict[str, Any], limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Covering index that turns a table access into an index-only scan, with row-width and I/O estimates"""
+        table = self.catalog.get_table(usage['table'])
+        if not table or usage['wildcard'] or usage['unresolved']:
+            return None
+
+        def ordered(*groups):
+            columns = []
+            for group in groups:
+                columns.extend(column for column in group if column not in columns)
+            return columns
+
+        needed = ordered(usage['equality'], usage['range'], usage['join'], usage['order_by'], usage['group_by'],
+                         usage['select'], usage['other'])
+        lookup = usage['equality'] or usage['join']
+        keys = ordered(lookup, usage['range'][:1] or usage['order_by'] or usage['group_by'])
+        if not keys or len(needed) > MAX_COVERING_COLUMNS:
+            return None
+
+        # InnoDB and clustered SQL Server tables carry the primary key in every secondary index entry
+        implicit = table['primary_key'] if self.dialect in ('mysql', 'mariadb', 'sqlserver') else []
+        include = [column for column in needed if column not in keys and column not in implicit]
+        if self.dialect not in INCLUDE_DIALECTS:
+            keys, include = keys + include, []
+
+        row_count = table['stats'].get('row_count')
+        row_bytes = self.catalog.estimate_row_width(table['name'])
+        needed_bytes = self.catalog.estimate_row_width(table['name'], needed)
+        entry_bytes = self.catalog.estimate_row_width(table['name'], keys + include) + INDEX_TUPLE_OVERHEAD_BYTES
+
+        if table['primary_key'] and set(table['primary_key']) <= set(usage['equality']):
+            rows = 1
+        elif row_count is not None:
+            rows = max(int(row_count * DEFAULT_SELECTIVITY), 1) if lookup or usage['range'] else row_count
+        else:
+            rows = None
+        if rows is not None and limit:
+            rows = min(rows, limit)
+
+        recommendation = {
+            'table': table['name'],
+            'key_columns': keys,
+            'include_columns': include,
+            'needed_columns': needed,
+            'row_bytes': row_bytes,
+            'needed_bytes': needed_bytes,
+            'index_entry_bytes': entry_bytes,
+            'index_size_bytes': int(row_count * entry_bytes / INDEX_FILL_FACTOR) if row_count is not None else None,
+            'rows_per_execution': rows,
+            'heap_fetches_avoided': rows,
+            'io_bytes_per_execution': rows * (row_bytes + entry_bytes) if rows is not None else None,
+            'io_bytes_per_execution_covering': rows * entry_bytes if rows is not None else None,
+            'io_reduction_pct': round(row_bytes / (row_bytes + entry_bytes) * 100, 1),
+            'already_covered_by': None,
+            'statement': self._create_covering_statement(table['name'], keys, include)
+        }
+
+        for index in table['indexes']:
+            covered = set(index['columns']) | set(index['include']) | set(implicit)
+            if set(needed) <= covered and set(index['columns'][:len(lookup)]) == set(lookup):
+                recommendation['already_covered_by'] = index['name']
+                break
+        return recommendation
+
+    def _create_covering_statement(self, table: str, keys: List[str], include: List[str]) -> str:
+        """CREATE INDEX for a covering index, using INCLUDE where the dialect has it"""
+        name = f"idx_{table}_{'_'.join(keys)}_covering"[:63]
+        statement = f"CREATE INDEX {name} ON {table} ({', '.join(keys)})"
+        if include:
+            statement += f" INCLUDE ({', '.join(include)})"
+        return statement + ';'
+
+    def _find_redundancy(self, index: Dict[str, Any], indexes: List[Dict[str, Any]], flagged: set,
+                         table: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Check whether another index on the same table already covers this one"""
+        candidates = [
+            other for other in indexes
+            if other is not index and (table['name'], other['name']) not in flagged
+            and other['method'] == index['method'] and other['where'] == index['where']
+        ]
+
+        for other in candidates:
+            if other['columns'] == index['columns']:
+                # Keep the constraint-backed copy of a duplicate pair, or the first declared one
+                if index['unique'] and not other['unique']:
+                    continue
+                if index['unique'] == other['unique'] and indexes.index(other) > indexes.index(index) and not other['primary']:
+                    continue
+                reason = 'redundant_with_primary_key' if other['primary'] else 'duplicate'
+                return self._finding(index, reason, other,
+                                     f"Same columns ({', '.join(index['columns'])}) as {other['name']}")
+
+        if index['unique']:
+            # Unique indexes enforce a constraint; a wider index cannot replace them
+            return None
+
+        width = len(index['columns'])
+        for other in candidates:
+            if width < len(other['columns']) and other['columns'][:width] == index['columns'] \
+                    and set(index['include']) <= set(other['columns']) | set(other['include']):
+                reason = 'redundant_with_primary_key' if other['primary'] else 'left_prefix'
+                return self._finding(index, reason, other,
+                                     f"({', '.join(index['columns'])}) is a left prefix of {other['name']} "
+                                     f"({', '.join(other['columns'])})")
+
+        return None
+
+    def _find_unused(self, index: Dict[str, Any], table: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Flag indexes whose recorded scan count is zero or near zero"""
+        usage = self.catalog.index_usage.get((table['name'], normalize_identifier(index['name'])))
+        if usage is None or usage['scans'] > self.max_unused_scans:
+            return None
+
+        finding = self._finding(index, 'unused', None, f"Only {usage['scans']} scan(s) recorded in usage statistics")
+        if index['unique']:
+            finding['droppable'] = False
+            finding['detail'] += '; it backs a UNIQUE constraint, so verify the constraint is not needed before dropping'
+        return finding
+
+    def _finding(self, index: Dict[str, Any], reason: str, covered_by: Optional[Dict[str, Any]], detail: str) -> Dict[str, Any]:
+        """Build a finding with its DROP statement and size/write estimates"""
+        usage = self.catalog.index_usage.get((index['table'], normalize_identifier(index['name'])), {})
+        return {
+            'table': index['table'],
+            'index': index['name'],
+            'columns': index['columns'],
+            'reason': reason,
+            'covered_by': covered_by['name'] if covered_by else None,
+            'detail': detail,
+            'droppable': True,
+            'scans': usage.get('scans'),
+            'size_bytes': usage.get('size_bytes'),
+            'drop_statement': self._drop_statement(index),
+            'write_amplification': self.estimate_write_amplification(index['table'], 1)
+        }
+
+    def _drop_statement(self, index: Dict[str, Any]) -> str:
+        """DROP statement in the advisor's dialect"""
+        if self.dialect in ('mysql', 'mariadb'):
+            return f"ALTER TABLE {index['table']} DROP INDEX {index['name']};"
+        if self.dialect == 'sqlserver':
+            return f"DROP INDEX {index['name']} ON {index['table']};"
+        if self.dialect in ('postgresql', 'postgres'):
+            return f"DROP INDEX CONCURRENTLY IF EXISTS {index['name']};"
+        return f"DROP INDEX IF EXISTS {index['name']};"
+
+    def _has_primary_key(self, table_name: str) -> bool:
+        """Whether the catalog knows a primary key for the table"""
+        table = self.catalog.get_table(table_name)
+        return bool(table and table['primary_key'])
@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Callable, Iterator
+
+DEFAULT_JOB_DB = os.path.join(tempfile.gettempdir(), 'sql_optimizer_jobs.sqlite3')
+
+class JobQueueFull(Exception):
+    """Raised when the number of queued and running jobs has reached the configured limit"""
+
+class JobStore:
+    """SQLite-backed job status/result store shared by every web worker process, with a TTL"""
+
+    def __init__(self, path: str = DEFAULT_JOB_DB, ttl_seconds: int = 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    progress_done INTEGER NOT NULL DEFAULT 0,
+                    progress_total INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_expires_at_idx ON jobs (expires_at)")
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """One short-lived connection per operation so worker threads never share a handle"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, job_id: str) -> None:
+        """Insert a new queued job"""
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, created_at, updated_at, expires_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, now, now, now + self.ttl_seconds)
+            )
+
+    def update(self, job_id: str, **fields) -> None:
+        """Update status/progress/result columns and push the expiry out by the TTL"""
+        if 'result' in fields and fields['result'] is not None:
+            fields['result'] = json.dumps(fields['result'])
+        now = time.time()
+        fields['updated_at'] = now
+        fields.setdefault('expires_at', now + self.ttl_seconds)
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        with self._connection() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the job as a dict, or None if it does not exist or has expired"""
+        with self._connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ? AND expires_at > ?", (job_id, time.time())).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def purge_expired(self) -> int:
+        """Delete jobs past their TTL; returns the number removed"""
+        with self._connection() as conn:
+            return conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (time.time(),)).rowcount
+
+class JobQueue:
+    """Bounded local worker pool that runs analysis jobs and records their progress in a JobStore"""
+
+    def __init__(self, store: JobStore, max_workers: int = 2, max_pending: int = 20):
+        self.store = store
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, task: Callable[..., Any], *args, **kwargs) -> str:
+        """Queue `task(*args, progress=callback, **kwargs)` and return its job id immediately"""
+        with self._lock:
+            if self._active >= self.max_pending:
+                raise JobQueueFull(f"{self._active} jobs already queued or running")
+            self._active += 1
+            if self._executor is None:
+                # Created lazily so pre-forking servers start the threads in each worker process
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='analysis-job')
+
+        self.store.purge_expired()
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id)
+        self._executor.submit(self._run, job_id, task, args, kwargs)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status, progress and (once finished) result or error"""
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+
+        total = job['progress_total']
+        return {
+            'id': job['id'],
+            'status': job['status'],
+            'progress': {
+                'done': job['progress_done'],
+                'total': total,
+                'percent': round(job['progress_done'] / total * 100, 1) if total else 0.0
+            },
+            'result': job['result'],
+            'error': job['error'],
+            'created_at': job['created_at'],
+            'updated_at': job['updated_at'],
+            'expires_at': job['expires_at']
+        }
+
+    def _run(self, job_id: str, task: Callable[..., Any], args, kwargs) -> None:
+        """Worker-thread body: run the task and persist progress, result or error"""
+        last_write = [0.0]
+
+        def progress(done: int, total: int) -> None:
+            # Throttle store writes; large uploads report progress once per statement
+            now = time.monotonic()
+            if done >= total or now - last_write[0] >= 0.5:
+                last_write[0] = now
+                self.store.update(job_id, progress_done=done, progress_total=total)
+
+        try:
+            self.store.update(job_id, status='running')
+            result = task(*args, progress=progress, **kwargs)
+            self.store.update(job_id, status='completed', result=result)
+        except Exception as e:
+            self.store.update(job_id, status='failed', error=str(e))
+        finally:
+            with self._lock:
+                self._active -= 1
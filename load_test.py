@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+SQL Optimizer Pro - Load Test Harness
+
+Replays a mixed corpus (pasted queries, file uploads, API batches) against the
+service and reports throughput, p50/p95/p99 latency, errors and per-worker RSS.
+
+    python load_test.py --spawn gunicorn --workers 4 --concurrency 16 --duration 30
+    python load_test.py --url http://localhost:5000 --rate 50 --duration 60
+    python load_test.py --compare load_results.jsonl
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from typing import List, Dict, Any, Optional, Callable
+
+DEFAULT_MIX = {'paste': 70, 'upload': 10, 'api_batch': 20}
+DEFAULT_RESULTS = 'load_results.jsonl'
+RSS_SAMPLE_SECONDS = 0.5
+
+def load_statements(path: str = 'test_queries.sql') -> List[str]:
+    """Individual statements of a SQL corpus file"""
+    import sqlparse
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return [statement for statement in sqlparse.split(f.read()) if statement.strip()]
+
+def build_corpus(statements: List[str], upload_statements: int = 200, batch_statements: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+    """Request templates per scenario: small pasted queries, large file uploads and API batch calls"""
+    repeated = (statements * (upload_statements // max(len(statements), 1) + 1))[:upload_statements]
+    upload = '\n'.join(statement.rstrip(';') + ';' for statement in repeated)
+    batches = [statements[i:i + batch_statements] for i in range(0, len(statements), batch_statements)] or [statements]
+
+    return {
+        'paste': [
+            {'method': 'POST', 'path': '/analyze', 'form': {'sql_text': statement}}
+            for statement in statements
+        ],
+        'upload': [
+            {'method': 'POST', 'path': '/analyze', 'files': {'sql_file': ('workload.sql', upload)}, 'form': {'format': 'false'}}
+        ],
+        'api_batch': [
+            {'method': 'POST', 'path': '/api/analyze', 'json': {'sql': '\n'.join(s.rstrip(';') + ';' for s in batch)}}
+            for batch in batches
+        ]
+    }
+
+def encode_multipart(form: Dict[str, str], files: Dict[str, Any]):
+    """multipart/form-data body and content type for urllib"""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in form.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8'))
+    for name, (filename, content) in files.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                   f'Content-Type: application/octet-stream\r\n\r\n'.encode('utf-8'))
+        body.write(content.encode('utf-8') if isinstance(content, str) else content)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode('utf-8'))
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+class HttpTarget:
+    """Sends corpus requests to a running server over HTTP"""
+
+    def __init__(self, base_url: str, timeout: float = 120):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def send(self, spec: Dict[str, Any]) -> int:
+        """Issue one request and return its status code"""
+        headers = {}
+        if 'json' in spec:
+            data = json.dumps(spec['json']).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        else:
+            data, headers['Content-Type'] = encode_multipart(spec.get('form', {}), spec.get('files', {}))
+        request = urllib.request.Request(self.base_url + spec['path'], data=data, headers=headers, method=spec['method'])
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+class InProcessTarget:
+    """Sends corpus requests through Flask's test client, without a network hop"""
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self._local = threading.local()
+
+    def send(self, spec: Dict[str, Any]) -> int:
+        """Issue one request and return its status code"""
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        if 'json' in spec:
+            response = client.open(spec['path'], method=spec['method'], json=spec['json'])
+        else:
+            data = dict(spec.get('form', {}))
+            for name, (filename, content) in spec.get('files', {}).items():
+                data[name] = (io.BytesIO(content.encode('utf-8') if isinstance(content, str) else content), filename)
+            response = client.open(spec['path'], method=spec['method'], data=data, content_type='multipart/form-data')
+        response.get_data()
+        return response.status_code
+
+def run_load(target, corpus: Dict[str, List[Dict[str, Any]]], mix: Dict[str, int] = None, concurrency: int = 4,
+             duration: float = 10.0, rate: Optional[float] = None, max_requests: Optional[int] = None,
+             seed: int = 1, sampler: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """Replay the corpus and collect one latency sample per request
+
+    Without `rate` this is a closed loop: each of `concurrency` clients sends its next request as soon as
+    the previous one returns. With `rate` requests arrive as a Poisson process at that many per second
+    and wait for one of the `concurrency` clients, so queueing delay counts towards their latency.
+    """
+    mix = {name: weight for name, weight in (mix or DEFAULT_MIX).items() if weight > 0 and corpus.get(name)}
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    samples = []
+    arrivals = []
+    issued = [0]
+    started = time.monotonic()
+    stop_at = started + duration
+
+    def next_request():
+        with lock:
+            if time.monotonic() >= stop_at or (max_requests is not None and issued[0] >= max_requests):
+                return None
+            issued[0] += 1
+            name = rng.choices(names, weights)[0]
+            return name, rng.choice(corpus[name])
+
+    def execute(name, spec, scheduled):
+        status = None
+        error = None
+        try:
+            status = target.send(spec)
+        except Exception as e:
+            error = type(e).__name__
+        finished = time.monotonic()
+        with lock:
+            samples.append({
+                'scenario': name,
+                'latency': finished - scheduled,
+                'status': status,
+                'ok': error is None and status is not None and status < 400,
+                'error': error
+            })
+
+    def closed_client():
+        while True:
+            request = next_request()
+            if request is None:
+                return
+            execute(request[0], request[1], time.monotonic())
+
+    def open_client():
+        while True:
+            with lock:
+                if not arrivals:
+                    if done.is_set():
+                        return
+                    request = None
+                else:
+                    request = arrivals.pop(0)
+            if request is None:
+                time.sleep(0.001)
+                continue
+            execute(*request)
+
+    done = threading.Event()
+    clients = [threading.Thread(target=open_client if rate else closed_client, daemon=True) for _ in range(concurrency)]
+    for client in clients:
+        client.start()
+
+    next_sample = started
+    if rate:
+        next_arrival = started
+        while True:
+            now = time.monotonic()
+            if now >= next_arrival:
+                request = next_request()
+                if request is None:
+                    break
+                with lock:
+                    arrivals.append((request[0], request[1], next_arrival))
+                next_arrival += rng.expovariate(rate)
+            if sampler and now >= next_sample:
+                sampler()
+                next_sample = now + RSS_SAMPLE_SECONDS
+            time.sleep(min(max(next_arrival - time.monotonic(), 0), 0.01))
+        done.set()
+
+    while any(client.is_alive() for client in clients):
+        if sampler and time.monotonic() >= next_sample:
+            sampler()
+            next_sample = time.monotonic() + RSS_SAMPLE_SECONDS
+        for client in clients:
+            client.join(timeout=0.05)
+    if sampler:
+        sampler()
+
+    return summarize(samples, time.monotonic() - started)
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered), max(1, math.ceil(fraction * len(ordered)))) - 1]
+
+def latency_summary(samples: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """Throughput, error count and latency percentiles in milliseconds for a group of samples"""
+    latencies = [sample['latency'] for sample in samples if sample['ok']]
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if not sample['ok']),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': ms(sum(latencies) / len(latencies)) if latencies else None,
+            'p50': ms(percentile(latencies, 0.50)),
+            'p95': ms(percentile(latencies, 0.95)),
+            'p99': ms(percentile(latencies, 0.99)),
+            'max': ms(max(latencies)) if latencies else None
+        }
+    }
+
+def summarize(samples: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """Overall and per-scenario results, with the status codes and exceptions behind the errors"""
+    summary = latency_summary(samples, elapsed)
+    summary['duration_seconds'] = round(elapsed, 3)
+    summary['scenarios'] = {
+        name: latency_summary([sample for sample in samples if sample['scenario'] == name], elapsed)
+        for name in sorted({sample['scenario'] for sample in samples})
+    }
+    failures = {}
+    for sample in samples:
+        if not sample['ok']:
+            key = sample['error'] or str(sample['status'])
+            failures[key] = failures.get(key, 0) + 1
+    summary['error_breakdown'] = failures
+    return summary
+
+def process_rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process from /proc (Linux); None where unavailable"""
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+def child_pids(parent: int) -> List[int]:
+    """Direct children of a process, e.g. the workers of a gunicorn master"""
+    children = []
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return children
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                # The command name may contain spaces; fields after it are space separated
+                fields = f.read().rsplit(')', 1)[1].split()
+            if int(fields[1]) == parent:
+                children.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return children
+
+class RssSampler:
+    """Tracks peak and last RSS per worker process while a load test runs"""
+
+    def __init__(self, master_pid: Optional[int], include_master: bool = False):
+        self.master_pid = master_pid
+        self.include_master = include_master
+        self.workers = {}
+
+    def __call__(self) -> None:
+        if self.master_pid is None:
+            return
+        pids = child_pids(self.master_pid)
+        if self.include_master or not pids:
+            pids.append(self.master_pid)
+        for pid in pids:
+            rss = process_rss_bytes(pid)
+            if rss is None:
+                continue
+            worker = self.workers.setdefault(pid, {'pid': pid, 'peak_rss_bytes': 0, 'rss_bytes': 0})
+            worker['rss_bytes'] = rss
+            worker['peak_rss_bytes'] = max(worker['peak_rss_bytes'], rss)
+
+    def report(self) -> Dict[str, Any]:
+        """Per-worker figures plus totals across workers"""
+        workers = sorted(self.workers.values(), key=lambda worker: worker['pid'])
+        return {
+            'workers': workers,
+            'total_rss_bytes': sum(worker['rss_bytes'] for worker in workers),
+            'max_worker_peak_rss_bytes': max((worker['peak_rss_bytes'] for worker in workers), default=None)
+        }
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def spawn_server(kind: str, port: int, workers: int = 2, worker_class: str = 'sync', threads: int = 1,
+                 env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    """Start gunicorn or the Flask development server on a local port and wait until it accepts connections"""
+    if kind == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+                   '--worker-class', worker_class, '--threads', str(threads), '--log-level', 'warning', 'app:app']
+    else:
+        command = [sys.executable, '-c',
+                   f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True, use_reloader=False)"]
+    process = subprocess.Popen(command, env=dict(os.environ, **(env or {})), cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{kind} exited with code {process.returncode} before accepting connections")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{kind} did not start listening on port {port}")
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """`paste=70,upload=10,api_batch=20` -> weights"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown scenario '{name.strip()}'; choose from {', '.join(DEFAULT_MIX)}")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+def save_result(path: str, result: Dict[str, Any]) -> None:
+    """Append one run as a JSON line so runs with different settings can be compared"""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result, sort_keys=True) + '\n')
+
+def compare_results(path: str) -> str:
+    """Table of saved runs, one row per run"""
+    with open(path, 'r', encoding='utf-8') as f:
+        runs = [json.loads(line) for line in f if line.strip()]
+
+    header = f"{'when':<20} {'server':<10} {'class':<8} {'wrk':>3} {'conc':>4} {'rate':>6} {'rps':>8} " \
+             f"{'p50':>8} {'p95':>8} {'p99':>8} {'err':>5} {'rss MiB':>8}"
+    rows = [header, '-' * len(header)]
+    for run in runs:
+        config, summary = run['config'], run['summary']
+        latency = summary['latency_ms']
+        rss = run.get('memory', {}).get('total_rss_bytes')
+        rows.append(
+            f"{run['started_at'][:19]:<20} {config['server']:<10} {str(config.get('worker_class') or '-'):<8} "
+            f"{str(config.get('workers') or '-'):>3} {config['concurrency']:>4} {str(config.get('rate') or '-'):>6} "
+            f"{summary['throughput_rps']:>8} {str(latency['p50']):>8} {str(latency['p95']):>8} {str(latency['p99']):>8} "
+            f"{summary['errors']:>5} {(round(rss / 1048576, 1) if rss else '-'):>8}"
+        )
+    return '\n'.join(rows)
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description='Load-test SQL Optimizer Pro')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help='Base URL of a running server')
+    target.add_argument('--spawn', choices=['gunicorn', 'flask'], help='Start a local server for the run')
+    target.add_argument('--compare', metavar='RESULTS', help='Print saved runs side by side and exit')
+    parser.add_argument('--server-pid', type=int, help='Master pid of a --url server, for RSS sampling')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--worker-class', default='sync', help='gunicorn worker class (sync, gthread, ...)')
+    parser.add_argument('--threads', type=int, default=1, help='Threads per gunicorn worker')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+    parser.add_argument('--rate', type=float, help='Open-loop arrival rate in requests/second')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to send requests for')
+    parser.add_argument('--requests', type=int, help='Stop after this many requests')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='Scenario weights, e.g. paste=70,upload=10,api_batch=20')
+    parser.add_argument('--corpus', default='test_queries.sql', help='SQL file the scenarios are built from')
+    parser.add_argument('--upload-statements', type=int, default=200, help='Statements in each uploaded file')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the shared analysis cache in a spawned server')
+    parser.add_argument('--output', default=DEFAULT_RESULTS, help='JSON-lines file the run is appended to')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.compare:
+        print(compare_results(args.compare))
+        return
+
+    corpus = build_corpus(load_statements(args.corpus), args.upload_statements)
+    process = None
+    if args.spawn:
+        port = free_port()
+        print(f"🚀 Starting {args.spawn} on port {port}...")
+        process = spawn_server(args.spawn, port, args.workers, args.worker_class, args.threads,
+                               {'ANALYSIS_CACHE_PATH': ''} if args.no_cache else None)
+        base_url = f'http://127.0.0.1:{port}'
+        master_pid = process.pid
+    else:
+        base_url = args.url or 'http://localhost:5000'
+        master_pid = args.server_pid
+
+    sampler = RssSampler(master_pid, include_master=args.spawn == 'flask')
+    started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+    print(f"📈 {'Open' if args.rate else 'Closed'} loop against {base_url}: concurrency {args.concurrency}"
+          f"{f', {args.rate}/s' if args.rate else ''}, {args.duration}s")
+    try:
+        summary = run_load(HttpTarget(base_url), corpus, args.mix, args.concurrency, args.duration, args.rate,
+                           args.requests, args.seed, sampler)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    result = {
+        'started_at': started_at,
+        'config': {
+            'server': args.spawn or 'external',
+            'url': base_url,
+            'workers': args.workers if args.spawn == 'gunicorn' else None,
+            'worker_class': args.worker_class if args.spawn == 'gunicorn' else None,
+            'threads': args.threads if args.spawn == 'gunicorn' else None,
+            'concurrency': args.concurrency,
+            'rate': args.rate,
+            'duration': args.duration,
+            'mix': args.mix,
+            'corpus': args.corpus,
+            'analysis_cache': not args.no_cache,
+            'cpu_count': os.cpu_count()
+        },
+        'summary': summary,
+        'memory': sampler.report()
+    }
+    save_result(args.output, result)
+
+    latency = summary['latency_ms']
+    print(f"✅ {summary['requests']} requests, {summary['errors']} errors, {summary['throughput_rps']} req/s")
+    print(f"   latency p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms")
+    for name, scenario in summary['scenarios'].items():
+        print(f"   {name:<10} {scenario['requests']:>6} req  p95 {scenario['latency_ms']['p95']} ms  errors {scenario['errors']}")
+    if result['memory']['workers']:
+        peaks = [f"{worker['pid']}={worker['peak_rss_bytes'] // 1048576} MiB" for worker in result['memory']['workers']]
+        print(f"   peak RSS per worker: {', '.join(peaks)}")
+    print(f"💾 Saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+import re
+from typing import List, Dict, Any, Optional, Union, Tuple
+
+import sqlparse
+
+from sql_analyzer import SQLAnalyzer
+
+# Driver -> DB-API paramstyle of the placeholders it expects
+PLACEHOLDER_STYLES = {
+    'psycopg2': 'format',
+    'mysql-connector': 'format',
+    'pymysql': 'format',
+    'sqlalchemy': 'named',
+    'sqlite3': 'qmark',
+    'asyncpg': 'numeric'
+}
+# Type keywords that prefix a string literal (DATE '2020-01-01'); bound values are cast instead
+TYPED_LITERAL_TYPES = {'DATE', 'TIME', 'TIMETZ', 'TIMESTAMP', 'TIMESTAMPTZ', 'INTERVAL'}
+INTERVAL_UNIT = re.compile(r'^(?:YEAR|QUARTER|MONTH|WEEK|DAY|HOUR|MINUTE|SECOND|MICROSECOND)(?:_\w+)?$', re.IGNORECASE)
+# Drivers that bind a whole IN list to a single placeholder
+LIST_BINDING_DRIVERS = {'psycopg2', 'sqlalchemy'}
+DRIVER_EXAMPLES = {
+    'psycopg2': 'cursor.execute(sql, params)',
+    'mysql-connector': 'cursor.execute(sql, params)',
+    'pymysql': 'cursor.execute(sql, params)',
+    'sqlalchemy': 'connection.execute(text(sql), params)',
+    'sqlite3': 'connection.execute(sql, params)',
+    'asyncpg': 'await connection.fetch(sql, *params)'
+}
+
+class LiteralParameterizer:
+    """Detect statement families that differ only in inlined literals and emit bind-parameter versions"""
+
+    def __init__(self, driver: str = 'psycopg2', min_family_size: int = 2, max_vectors: int = 100):
+        if driver not in PLACEHOLDER_STYLES:
+            raise ValueError(f"Unsupported driver '{driver}'; choose one of {', '.join(sorted(PLACEHOLDER_STYLES))}")
+        self.driver = driver
+        self.style = PLACEHOLDER_STYLES[driver]
+        self.min_family_size = min_family_size
+        self.max_vectors = max_vectors
+        self.analyzer = SQLAnalyzer()
+
+    def analyze(self, entries: Union[str, List[Any]]) -> Dict[str, Any]:
+        """Group statements by literal-free fingerprint and count the plan-cache entries each family costs"""
+        if isinstance(entries, str):
+            entries = [str(stmt) for stmt in self.analyzer.parse_sql(entries)]
+
+        families = {}
+        distinct_texts = set()
+        distinct_shapes = set()
+        total = 0
+
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {'sql': entry}
+            sql = (entry.get('sql') or '').strip().rstrip(';').strip()
+            if not sql:
+                continue
+            calls = int(entry.get('calls') or 1)
+            total += calls
+
+            text = ' '.join(sql.split())
+            fingerprint, literals = self.analyzer.fingerprint(sql)
+            parameterized, params = self.parameterize(sql)
+            distinct_texts.add(text)
+            distinct_shapes.add(' '.join(parameterized.split()))
+
+            family = families.setdefault(fingerprint, {
+                'fingerprint': fingerprint, 'texts': set(), 'shapes': {}, 'vectors': [], 'statement_count': 0,
+                'has_literals': False
+            })
+            family['statement_count'] += calls
+            family['has_literals'] = family['has_literals'] or bool(literals)
+            if text not in family['texts']:
+                family['texts'].add(text)
+                family['vectors'].append(params)
+            family['shapes'][parameterized] = family['shapes'].get(parameterized, 0) + 1
+
+        reported = [
+            self._describe_family(family) for family in families.values()
+            if family['has_literals'] and len(family['texts']) >= self.min_family_size
+        ]
+        reported.sort(key=lambda family: -family['plan_cache_entries'])
+
+        return {
+            'total_statements': total,
+            'driver': self.driver,
+            'placeholder_style': self.style,
+            'plan_cache_entries': len(distinct_texts),
+            'plan_cache_entries_parameterized': len(distinct_shapes),
+            'families': reported
+        }
+
+    def parameterize(self, sql: str) -> Tuple[str, Union[List[Any], Dict[str, Any]]]:
+        """Replace literals with driver placeholders and return (sql, parameters)"""
+        tokens = [(ttype, value) for ttype, value in sqlparse.lexer.tokenize(sql.strip().rstrip(';').strip())]
+        pieces = []
+        positional = []
+        named = {}
+        i = 0
+
+        while i < len(tokens):
+            ttype, value = tokens[i]
+            type_index = self._typed_literal(tokens, i) if self._is_literal(ttype) else None
+            if type_index is not None:
+                following = next((v for t, v in tokens[i + 1:] if t not in sqlparse.tokens.Whitespace), '')
+                if INTERVAL_UNIT.match(following):
+                    # INTERVAL '1' DAY: the unit belongs to the literal syntax, so the literal stays inline
+                    pieces.append(value)
+                    i += 1
+                    continue
+                # DATE '2020-01-01' -> CAST(%s AS date); a placeholder cannot follow a type keyword
+                del pieces[len(pieces) - (i - type_index):]
+                name = self._parameter_name(tokens, type_index, named)
+                pieces.append(f"CAST({self._placeholder(name, len(positional) + 1)} AS {tokens[type_index][1].lower()})")
+                self._bind(positional, named, name, self._literal_value(ttype, value))
+            elif self._is_literal(ttype):
+                in_list = self._in_list_end(tokens, i)
+                if in_list is not None:
+                    values = [self._literal_value(t, v) for t, v in tokens[i:in_list] if self._is_literal(t)]
+                    name = self._parameter_name(tokens, i - 1, named)
+                    # Swallow the opening parenthesis already emitted
+                    while pieces and pieces[-1] != '(':
+                        pieces.pop()
+                    pieces.pop()
+                    if self.driver in LIST_BINDING_DRIVERS:
+                        pieces.append(self._placeholder(name, len(positional) + 1))
+                        self._bind(positional, named, name, values if self.style == 'named' else tuple(values))
+                    else:
+                        placeholders = []
+                        for value_ in values:
+                            placeholders.append(self._placeholder(name, len(positional) + 1))
+                            self._bind(positional, named, name, value_)
+                        pieces.append(f"({', '.join(placeholders)})")
+                    i = in_list + 1
+                    continue
+
+                name = self._parameter_name(tokens, i, named)
+                pieces.append(self._placeholder(name, len(positional) + 1))
+                self._bind(positional, named, name, self._literal_value(ttype, value))
+            elif self.style == 'format' and '%' in value and ttype not in sqlparse.tokens.Comment:
+                # %-style drivers treat a bare % as a placeholder marker
+                pieces.append(value.replace('%', '%%'))
+            else:
+                pieces.append(value)
+            i += 1
+
+        return ''.join(pieces), (named if self.style == 'named' else positional)
+
+    def _describe_family(self, family: Dict[str, Any]) -> Dict[str, Any]:
+        """Summarize one literal-only family with its parameterized statement(s)"""
+        shapes = sorted(family['shapes'], key=lambda shape: -family['shapes'][shape])
+        entries = len(family['texts'])
+        return {
+            'fingerprint': family['fingerprint'],
+            'statement_count': family['statement_count'],
+            'plan_cache_entries': entries,
+            'plan_cache_entries_parameterized': len(shapes),
+            'parameterized_sql': shapes[0],
+            'shapes': shapes,
+            'parameters': family['vectors'][:self.max_vectors],
+            'parameters_truncated': len(family['vectors']) > self.max_vectors,
+            'suggestion': {
+                'type': 'parameterization_optimization',
+                'priority': 'high' if entries >= 10 else 'medium',
+                'title': f"Bind parameters instead of inlining literals ({entries} plan-cache entries)",
+                'description': ('Each distinct literal makes the server hard-parse and cache a separate plan; '
+                                'sending the values as bind parameters lets every execution reuse one entry'),
+                'code_example': self._code_example(shapes[0]),
+                'impact': f"{entries} plan-cache entries collapse to {len(shapes)}"
+            }
+        }
+
+    def _code_example(self, sql: str) -> str:
+        """Driver call for a parameterized statement; text() needs expanding bindparams for IN lists"""
+        example = f"sql = {sql!r}\n{DRIVER_EXAMPLES[self.driver]}"
+        if self.driver == 'sqlalchemy':
+            expanding = re.findall(r'\bIN\s+:(\w+)', sql, re.IGNORECASE)
+            if expanding:
+                binds = ', '.join(f"bindparam({name!r}, expanding=True)" for name in expanding)
+                example = (f"sql = {sql!r}\n"
+                           f"statement = text(sql).bindparams({binds})\n"
+                           f"connection.execute(statement, params)")
+        return example
+
+    def _is_literal(self, ttype) -> bool:
+        """Numbers and single-quoted strings are the literals a bind parameter can replace"""
+        return ttype in sqlparse.tokens.Literal.Number or ttype in sqlparse.tokens.Literal.String.Single
+
+    def _typed_literal(self, tokens: List[Tuple[Any, str]], index: int) -> Optional[int]:
+        """Index of the type keyword of a typed string literal (DATE '...', INTERVAL '...'), if any"""
+        if tokens[index][0] not in sqlparse.tokens.Literal.String.Single:
+            return None
+        previous = index - 1
+        while previous >= 0 and tokens[previous][0] in sqlparse.tokens.Whitespace:
+            previous -= 1
+        if previous >= 0 and tokens[previous][1].upper() in TYPED_LITERAL_TYPES:
+            return previous
+        return None
+
+    def _in_list_end(self, tokens: List[Tuple[Any, str]], start: int):
+        """If `start` opens an `IN (literal, ...)` list, return the index of its closing parenthesis"""
+        previous = [value.upper() for ttype, value in reversed(tokens[:start]) if ttype not in sqlparse.tokens.Whitespace]
+        if len(previous) < 2 or previous[0] != '(' or previous[1] not in ('IN', 'NOT IN'):
+            return None
+        expect_literal = True
+        for index in range(start, len(tokens)):
+            ttype, value = tokens[index]
+            if ttype in sqlparse.tokens.Whitespace:
+                continue
+            if expect_literal and self._is_literal(ttype):
+                expect_literal = False
+            elif not expect_literal and value == ',':
+                expect_literal = True
+            elif not expect_literal and value == ')':
+                return index
+            else:
+                return None
+        return None
+
+    def _parameter_name(self, tokens: List[Tuple[Any, str]], index: int, named: Dict[str, Any]) -> str:
+        """Name a parameter after the column it is compared with (email, email_2, ...) or p<n>"""
+        name = None
+        seen = 0
+        for ttype, value in reversed(tokens[:index]):
+            if ttype in sqlparse.tokens.Whitespace or value in ('.', '('):
+                continue
+            if ttype in sqlparse.tokens.Name and ttype not in sqlparse.tokens.Name.Placeholder:
+                name = re.sub(r'\W+', '_', value.strip('"`[]')).lower()
+                break
+            seen += 1
+            if seen > 3 or value in (',', ';', ')'):
+                break
+        name = name or f"p{len(named) + 1}"
+        candidate = name
+        suffix = 2
+        while candidate in named:
+            candidate = f"{name}_{suffix}"
+            suffix += 1
+        return candidate
+
+    def _placeholder(self, name: str, position: int) -> str:
+        """Placeholder text in the driver's paramstyle"""
+        if self.style == 'named':
+            return f":{name}"
+        if self.style == 'numeric':
+            return f"${position}"
+        if self.style == 'qmark':
+            return '?'
+        return '%s'
+
+    def _bind(self, positional: List[Any], named: Dict[str, Any], name: str, value) -> None:
+        """Record a parameter value in the positional list or the named mapping"""
+        if self.style == 'named':
+            named[name] = value
+        else:
+            positional.append(value)
+
+    def _literal_value(self, ttype, text: str):
+        """Python value of a SQL literal token"""
+        if ttype in sqlparse.tokens.Literal.Number.Integer:
+            return int(text)
+        if ttype in sqlparse.tokens.Literal.Number:
+            return float(text)
+        return text[1:-1].replace("''", "'")
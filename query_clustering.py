@@ -0,0 +1,153 @@
+import hashlib
+import random
+from collections import defaultdict
+from typing import List, Dict, Any, Union
+
+try:
+    import numpy as np
+except ImportError:  # The pure-Python path below produces identical signatures
+    np = None
+
+from sql_analyzer import SQLAnalyzer
+
+HASH_MASK = (1 << 64) - 1
+
+class QueryClusterer:
+    """Group near-duplicate queries with MinHash signatures and locality-sensitive hashing"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle_size: int = 3,
+                 threshold: float = 0.7, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.analyzer = SQLAnalyzer()
+
+        # Multiply-shift hashing: h(x) = ((a * x + b) mod 2**64) >> 32 with odd a
+        rng = random.Random(seed)
+        self._permutations = [(rng.getrandbits(64) | 1, rng.getrandbits(64)) for _ in range(num_perm)]
+        if np is not None:
+            self._a = np.array([a for a, _ in self._permutations], dtype=np.uint64)[:, None]
+            self._b = np.array([b for _, b in self._permutations], dtype=np.uint64)[:, None]
+
+    def cluster(self, entries: Union[str, List[Any]]) -> Dict[str, Any]:
+        """Cluster statements whose normalized token shingles are similar above the threshold"""
+        groups = self._group_by_fingerprint(entries)
+        fingerprints = list(groups)
+        signatures = [self.signature(fingerprint.split(' ')) for fingerprint in fingerprints]
+
+        parent = list(range(len(fingerprints)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        # Each band hashes to a bucket; only queries sharing a bucket are ever compared,
+        # and each is compared with the bucket's first member, keeping the work near-linear
+        for band in range(self.bands):
+            buckets = {}
+            start = band * self.rows
+            for i, signature in enumerate(signatures):
+                key = tuple(signature[start:start + self.rows])
+                first = buckets.setdefault(key, i)
+                if first != i and find(first) != find(i) \
+                        and self.similarity(signatures[first], signature) >= self.threshold:
+                    parent[find(i)] = find(first)
+
+        members = defaultdict(list)
+        for i in range(len(fingerprints)):
+            members[find(i)].append(i)
+
+        clusters = []
+        for indexes in members.values():
+            if len(indexes) < 2:
+                continue
+            clusters.append(self._describe_cluster([groups[fingerprints[i]] for i in indexes],
+                                                   [signatures[i] for i in indexes]))
+
+        clusters.sort(key=lambda cluster: (-(cluster['total_duration_ms'] or 0), -cluster['statement_count']))
+        for number, cluster in enumerate(clusters, 1):
+            cluster['cluster_id'] = number
+
+        return {
+            'total_statements': sum(group['count'] for group in groups.values()),
+            'unique_fingerprints': len(groups),
+            'clusters': clusters
+        }
+
+    def signature(self, tokens: List[str]) -> List[int]:
+        """MinHash signature of the token shingles"""
+        size = min(self.shingle_size, len(tokens)) or 1
+        shingles = {' '.join(tokens[i:i + size]) for i in range(max(len(tokens) - size + 1, 1))}
+        hashes = [
+            int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+            for shingle in shingles
+        ]
+        if np is not None:
+            values = np.array(hashes, dtype=np.uint64)[None, :]
+            return ((self._a * values + self._b) >> np.uint64(32)).min(axis=1).tolist()
+        return [
+            min(((a * value + b) & HASH_MASK) >> 32 for value in hashes)
+            for a, b in self._permutations
+        ]
+
+    def similarity(self, first: List[int], second: List[int]) -> float:
+        """Estimated Jaccard similarity: the share of matching signature slots"""
+        return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+    def _group_by_fingerprint(self, entries: Union[str, List[Any]]) -> Dict[str, Dict[str, Any]]:
+        """Collapse exact repeats first so MinHash only runs once per distinct query shape"""
+        if isinstance(entries, str):
+            entries = [str(stmt) for stmt in self.analyzer.parse_sql(entries)]
+
+        groups = {}
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {'sql': entry}
+            sql = (entry.get('sql') or '').strip()
+            if not sql:
+                continue
+
+            fingerprint = self.analyzer.fingerprint(sql)[0]
+            if not fingerprint:
+                continue
+            calls = int(entry.get('calls') or 1)
+            group = groups.setdefault(fingerprint, {
+                'fingerprint': fingerprint, 'sample_query': sql, 'count': 0, 'total_duration_ms': None
+            })
+            group['count'] += calls
+            if entry.get('duration_ms') is not None:
+                # Log lines carry one execution; pg_stat_statements-style rows carry mean time and calls
+                group['total_duration_ms'] = (group['total_duration_ms'] or 0) + float(entry['duration_ms']) * calls
+
+        return groups
+
+    def _describe_cluster(self, groups: List[Dict[str, Any]], signatures: List[List[int]]) -> Dict[str, Any]:
+        """Pick the most expensive (or most frequent) member as representative and total the cost"""
+        ranked = sorted(range(len(groups)), key=lambda i: (-(groups[i]['total_duration_ms'] or 0), -groups[i]['count']))
+        representative = ranked[0]
+        durations = [group['total_duration_ms'] for group in groups if group['total_duration_ms'] is not None]
+
+        return {
+            'cluster_id': None,
+            'representative_query': groups[representative]['sample_query'],
+            'representative_fingerprint': groups[representative]['fingerprint'],
+            'variant_count': len(groups),
+            'statement_count': sum(group['count'] for group in groups),
+            'total_duration_ms': round(sum(durations), 3) if durations else None,
+            'members': [
+                {
+                    'fingerprint': groups[i]['fingerprint'],
+                    'sample_query': groups[i]['sample_query'],
+                    'count': groups[i]['count'],
+                    'total_duration_ms': groups[i]['total_duration_ms'],
+                    'similarity': round(self.similarity(signatures[representative], signatures[i]), 3)
+                }
+                for i in ranked
+            ]
+        }
@@ -0,0 +1,431 @@
+import csv
+import io
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+import sqlparse
+
+# Typical stored width in bytes; variable-length types use an average rather than their maximum
+TYPE_WIDTHS = {
+    'boolean': 1, 'bool': 1, 'tinyint': 1, 'smallint': 2, 'int2': 2, 'mediumint': 3, 'int': 4, 'integer': 4,
+    'int4': 4, 'serial': 4, 'bigint': 8, 'int8': 8, 'bigserial': 8, 'real': 4, 'float4': 4, 'float': 8,
+    'float8': 8, 'double': 8, 'double precision': 8, 'money': 8, 'date': 4, 'time': 8, 'timestamp': 8,
+    'timestamptz': 8, 'datetime': 8, 'interval': 16, 'uuid': 16, 'inet': 7, 'text': 32, 'json': 128,
+    'jsonb': 128, 'bytea': 64, 'blob': 64, 'xml': 128
+}
+DEFAULT_COLUMN_WIDTH = 16
+# Type families that decide how a comparison between two types is resolved
+TYPE_CATEGORIES = {
+    'integer': {'tinyint', 'smallint', 'int2', 'mediumint', 'int', 'integer', 'int4', 'serial', 'smallserial',
+                'bigint', 'int8', 'bigserial'},
+    'decimal': {'numeric', 'decimal', 'number', 'money', 'smallmoney'},
+    'float': {'real', 'float4', 'float', 'float8', 'double', 'double precision', 'binary_float', 'binary_double'},
+    'string': {'char', 'character', 'varchar', 'character varying', 'varchar2', 'text', 'tinytext', 'mediumtext',
+               'longtext', 'citext', 'clob', 'enum'},
+    'national_string': {'nchar', 'nvarchar', 'nvarchar2', 'ntext', 'nclob'},
+    'temporal': {'date', 'time', 'timestamp', 'timestamptz', 'datetime', 'datetime2', 'smalldatetime',
+                 'datetimeoffset', 'interval', 'year'},
+    'boolean': {'boolean', 'bool', 'bit'},
+    'uuid': {'uuid', 'uniqueidentifier'}
+}
+
+def estimate_column_width(column_type: Optional[str]) -> int:
+    """Estimate the average stored width of a column type"""
+    if not column_type:
+        return DEFAULT_COLUMN_WIDTH
+    column_type = column_type.lower()
+    base = re.sub(r'\s*\(.*$|\s+unsigned$|\[\]$', '', column_type).strip()
+    if base.startswith('timestamp'):
+        return 8
+    length = re.search(r'\((\d+)(?:\s*,\s*(\d+))?\)', column_type)
+    if base in ('numeric', 'decimal'):
+        return 4 + (int(length.group(1)) // 2 if length else 8)
+    if base in ('char', 'character', 'nchar', 'binary'):
+        return int(length.group(1)) if length else 1
+    if base in ('varchar', 'character varying', 'nvarchar', 'varbinary'):
+        # Variable-length strings are rarely filled; assume half the declared length, capped
+        return min(int(length.group(1)) // 2 + 1, 64) if length else 32
+    return TYPE_WIDTHS.get(base, DEFAULT_COLUMN_WIDTH)
+
+def column_type_category(column_type: Optional[str]) -> str:
+    """Type family of a column type (integer, decimal, float, string, national_string, temporal, ...)"""
+    if not column_type:
+        return 'unknown'
+    base = re.sub(r'\s*\(.*$|\s+unsigned$|\[\]$', '', column_type.lower()).strip()
+    if base.startswith('timestamp'):
+        return 'temporal'
+    if base == 'number' and re.search(r'\(\s*\d+\s*(?:,\s*0\s*)?\)', column_type):
+        # Oracle NUMBER(p) / NUMBER(p, 0) holds integers only
+        return 'integer'
+    for category, types in TYPE_CATEGORIES.items():
+        if base in types:
+            return category
+    return 'other'
+
+def normalize_identifier(name: str) -> str:
+    """Strip quoting and schema qualification and lowercase an identifier"""
+    name = name.strip().split('.')[-1]
+    return name.strip('`"[]').lower()
+
+class SchemaCatalog:
+    """Table, column, key and index metadata parsed from DDL plus optional usage statistics"""
+
+    def __init__(self):
+        self.tables = {}
+        self.index_usage = {}
+
+    def load_ddl(self, ddl: str) -> 'SchemaCatalog':
+        """Parse CREATE TABLE, CREATE INDEX and ALTER TABLE ... ADD statements"""
+        for statement in sqlparse.split(ddl):
+            text = sqlparse.format(statement, strip_comments=True).strip().rstrip(';')
+            if re.match(r'^CREATE\s+(?:(?:GLOBAL|LOCAL|TEMP|TEMPORARY|UNLOGGED)\s+)*TABLE\b', text, re.IGNORECASE):
+                self._parse_create_table(text)
+            elif re.match(r'^CREATE\s+(?:UNIQUE\s+)?(?:CLUSTERED\s+|NONCLUSTERED\s+)?INDEX\b', text, re.IGNORECASE):
+                self._parse_create_index(text)
+            elif re.match(r'^ALTER\s+TABLE\b', text, re.IGNORECASE):
+                self._parse_alter_table(text)
+        return self
+
+    def load_index_usage(self, csv_text: str) -> 'SchemaCatalog':
+        """Load a pg_stat_user_indexes or MySQL sys.schema_unused_indexes / schema_index_statistics CSV export"""
+        reader = csv.DictReader(io.StringIO(csv_text.strip()))
+        for row in reader:
+            row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+
+            if 'indexrelname' in row:
+                table, index = row.get('relname', ''), row['indexrelname']
+                scans = row.get('idx_scan', '0')
+            elif 'index_name' in row:
+                table, index = row.get('object_name') or row.get('table_name', ''), row['index_name']
+                # schema_unused_indexes lists only indexes that were never used
+                scans = row.get('rows_selected', '0')
+            else:
+                continue
+
+            usage = {'scans': int(float(scans or 0))}
+            for size_column in ('size_bytes', 'index_size_bytes', 'pg_relation_size'):
+                if row.get(size_column):
+                    usage['size_bytes'] = int(float(row[size_column]))
+            self.index_usage[(normalize_identifier(table), normalize_identifier(index))] = usage
+
+        return self
+
+    def load_table_stats(self, csv_text: str) -> 'SchemaCatalog':
+        """Load row counts and sizes from pg_stat_user_tables / pg_class or information_schema.tables CSV exports"""
+        reader = csv.DictReader(io.StringIO(csv_text.strip()))
+        for row in reader:
+            row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+            name = row.get('relname') or row.get('table_name') or row.get('table')
+            if not name:
+                continue
+
+            stats = self._ensure_table(name)['stats']
+            for column in ('n_live_tup', 'reltuples', 'table_rows', 'rows', 'row_count'):
+                if row.get(column):
+                    stats['row_count'] = int(float(row[column]))
+                    break
+            for column in ('avg_row_length', 'avg_row_bytes'):
+                if row.get(column):
+                    stats['avg_row_bytes'] = int(float(row[column]))
+                    break
+            for column in ('data_length', 'total_bytes', 'table_bytes', 'pg_relation_size'):
+                if row.get(column):
+                    stats['total_bytes'] = int(float(row[column]))
+                    break
+            if row.get('relpages'):
+                stats['total_bytes'] = int(float(row['relpages'])) * 8192
+
+        return self
+
+    def estimate_row_width(self, table_name: str, columns: Optional[List[str]] = None) -> int:
+        """Average bytes per row, from statistics when available, otherwise from column types"""
+        table = self.get_table(table_name)
+        if not table:
+            return DEFAULT_COLUMN_WIDTH * max(len(columns or []), 4)
+
+        stats = table['stats']
+        if columns is None:
+            if stats.get('avg_row_bytes'):
+                return stats['avg_row_bytes']
+            if stats.get('total_bytes') and stats.get('row_count'):
+                return max(stats['total_bytes'] // stats['row_count'], 1)
+            columns = list(table['columns'])
+
+        return sum(
+            estimate_column_width(table['columns'][column]['type'] if column in table['columns'] else None)
+            for column in columns
+        )
+
+    def get_table(self, name: str) -> Optional[Dict[str, Any]]:
+        """Look up a table by (possibly qualified or quoted) name"""
+        return self.tables.get(normalize_identifier(name))
+
+    def get_indexes(self, table: str) -> List[Dict[str, Any]]:
+        """All indexes on a table, including the primary key index"""
+        entry = self.get_table(table)
+        return entry['indexes'] if entry else []
+
+    def _ensure_table(self, name: str) -> Dict[str, Any]:
+        """Return the catalog entry for a table, creating an empty one if needed"""
+        key = normalize_identifier(name)
+        if key not in self.tables:
+            self.tables[key] = {
+                'name': key,
+                'columns': {},
+                'primary_key': [],
+                'unique_keys': [],
+                'indexes': [],
+                'collation': None,
+                'charset': None,
+                'stats': {}
+            }
+        return self.tables[key]
+
+    def _parse_create_table(self, text: str):
+        """Parse columns, inline constraints and MySQL inline KEY definitions"""
+        match = re.match(
+            r'^CREATE\s+(?:(?:GLOBAL|LOCAL|TEMP|TEMPORARY|UNLOGGED)\s+)*TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([^\s(]+)\s*\((.*)\)',
+            text, re.IGNORECASE | re.DOTALL
+        )
+        if not match:
+            return
+
+        table = self._ensure_table(match.group(1))
+        # MySQL table options: DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        options = text[match.end():]
+        collation = re.search(r'\bCOLLATE\s*=?\s*(\w+)', options, re.IGNORECASE)
+        charset = re.search(r'\b(?:CHARSET|CHARACTER\s+SET)\s*=?\s*(\w+)', options, re.IGNORECASE)
+        table['collation'] = collation.group(1).lower() if collation else None
+        table['charset'] = charset.group(1).lower() if charset else None
+
+        for item in split_top_level(match.group(2)):
+            upper = item.upper()
+            constraint = re.match(r'^CONSTRAINT\s+(\S+)\s+(.*)$', item, re.IGNORECASE | re.DOTALL)
+            constraint_name = None
+            if constraint:
+                constraint_name, item = constraint.group(1), constraint.group(2)
+                upper = item.upper()
+
+            if upper.startswith('PRIMARY KEY'):
+                self._add_primary_key(table, parse_column_list(item), constraint_name)
+            elif upper.startswith('UNIQUE'):
+                name_match = re.match(r'^UNIQUE\s+(?:KEY|INDEX)?\s*([^\s(]+)?\s*\(', item, re.IGNORECASE)
+                name = constraint_name or (name_match.group(1) if name_match and name_match.group(1) else None)
+                self._add_index(table, name, parse_column_list(item), unique=True)
+            elif re.match(r'^(?:KEY|INDEX|FULLTEXT|SPATIAL)\b', upper):
+                name_match = re.match(r'^(?:FULLTEXT\s+|SPATIAL\s+)?(?:KEY|INDEX)\s+([^\s(]+)', item, re.IGNORECASE)
+                method = upper.split()[0].lower() if upper.startswith(('FULLTEXT', 'SPATIAL')) else 'btree'
+                self._add_index(table, name_match.group(1) if name_match else None, parse_column_list(item), method=method,
+                                descending=parse_column_list(item, directions=True))
+            elif upper.startswith(('FOREIGN KEY', 'CHECK', 'EXCLUDE')):
+                continue
+            else:
+                self._parse_column(table, item)
+
+    def _parse_column(self, table: Dict[str, Any], definition: str):
+        """Parse a single column definition with its inline constraints"""
+        match = re.match(r'^(`[^`]+`|"[^"]+"|\[[^\]]+\]|\S+)\s+(.*)$', definition, re.DOTALL)
+        if not match:
+            return
+
+        name = normalize_identifier(match.group(1))
+        rest = match.group(2)
+        type_match = re.match(
+            r'^((?:DOUBLE\s+PRECISION|CHARACTER\s+VARYING|TIMESTAMP\s+(?:WITH|WITHOUT)\s+TIME\s+ZONE|[\w]+)(?:\s*\([^)]*\))?(?:\s+UNSIGNED)?(?:\[\])?)',
+            rest, re.IGNORECASE
+        )
+        column_type = type_match.group(1).lower() if type_match else rest.split()[0].lower()
+        collation = re.search(r'\bCOLLATE\s+("?[\w.-]+"?)', rest, re.IGNORECASE)
+        charset = re.search(r'\b(?:CHARSET|CHARACTER\s+SET)\s+(\w+)', rest, re.IGNORECASE)
+        upper = rest.upper()
+
+        table['columns'][name] = {
+            'type': re.sub(r'\s+', ' ', column_type),
+            'nullable': 'NOT NULL' not in upper and 'PRIMARY KEY' not in upper,
+            'collation': collation.group(1).strip('"') if collation else None,
+            'charset': charset.group(1).lower() if charset else None,
+            'default': 'DEFAULT' in upper
+        }
+
+        if re.search(r'\bPRIMARY\s+KEY\b', upper):
+            self._add_primary_key(table, [name])
+        elif re.search(r'\bUNIQUE\b', upper):
+            self._add_index(table, None, [name], unique=True)
+
+    def _parse_create_index(self, text: str):
+        """Parse CREATE [UNIQUE] INDEX name ON table [USING method] (cols) [INCLUDE (cols)] [WHERE ...]"""
+        match = re.match(
+            r'^CREATE\s+(UNIQUE\s+)?(?:CLUSTERED\s+|NONCLUSTERED\s+)?INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?'
+            r'(\S+)\s+ON\s+(?:ONLY\s+)?([^\s(]+)\s*(?:USING\s+(\w+)\s*)?\((.*)$',
+            text, re.IGNORECASE | re.DOTALL
+        )
+        if not match:
+            return
+
+        body = '(' + match.group(5)
+        columns_text, remainder = take_parenthesized(body)
+        include = re.search(r'\bINCLUDE\s*\(([^)]*)\)', remainder, re.IGNORECASE)
+        where = re.search(r'\bWHERE\s+(.*)$', remainder, re.IGNORECASE | re.DOTALL)
+
+        self._add_index(
+            self._ensure_table(match.group(3)),
+            match.group(2),
+            [normalize_index_column(column) for column in split_top_level(columns_text)],
+            unique=bool(match.group(1)),
+            method=(match.group(4) or 'btree').lower(),
+            include=[normalize_identifier(column) for column in split_top_level(include.group(1))] if include else [],
+            where=where.group(1).strip() if where else None,
+            descending=[index_column_descending(column) for column in split_top_level(columns_text)]
+        )
+
+    def _parse_alter_table(self, text: str):
+        """Parse ALTER TABLE ... ADD PRIMARY KEY / UNIQUE / INDEX forms"""
+        match = re.match(r'^ALTER\s+TABLE\s+(?:ONLY\s+)?(?:IF\s+EXISTS\s+)?([^\s(]+)\s+(.*)$', text, re.IGNORECASE | re.DOTALL)
+        if not match:
+            return
+
+        table = self._ensure_table(match.group(1))
+        for action in split_top_level(match.group(2)):
+            add = re.match(r'^ADD\s+(?:CONSTRAINT\s+(\S+)\s+)?(.*)$', action, re.IGNORECASE | re.DOTALL)
+            if not add:
+                continue
+            name, body = add.group(1), add.group(2)
+            upper = body.upper()
+            if upper.startswith('PRIMARY KEY'):
+                self._add_primary_key(table, parse_column_list(body), name)
+            elif upper.startswith('UNIQUE'):
+                self._add_index(table, name, parse_column_list(body), unique=True)
+            elif re.match(r'^(?:KEY|INDEX)\b', upper):
+                name_match = re.match(r'^(?:KEY|INDEX)\s+([^\s(]+)', body, re.IGNORECASE)
+                self._add_index(table, name_match.group(1) if name_match else name, parse_column_list(body),
+                                descending=parse_column_list(body, directions=True))
+            elif upper.startswith('COLUMN') or not upper.startswith(('FOREIGN', 'CHECK', 'CONSTRAINT')):
+                self._parse_column(table, re.sub(r'^COLUMN\s+(?:IF\s+NOT\s+EXISTS\s+)?', '', body, flags=re.IGNORECASE))
+
+    def _add_primary_key(self, table: Dict[str, Any], columns: List[str], name: Optional[str] = None):
+        """Record the primary key and its implicit index"""
+        table['primary_key'] = columns
+        for column in columns:
+            if column in table['columns']:
+                table['columns'][column]['nullable'] = False
+        self._add_index(table, name or f"{table['name']}_pkey", columns, unique=True, primary=True)
+
+    def _add_index(self, table: Dict[str, Any], name: Optional[str], columns: List[str], unique: bool = False,
+                   primary: bool = False, method: str = 'btree', include: Optional[List[str]] = None,
+                   where: Optional[str] = None, descending: Optional[List[bool]] = None):
+        """Record an index with the direction of each key column; unique indexes also count as unique keys"""
+        if not columns:
+            return
+        name = normalize_identifier(name) if name else f"{table['name']}_{'_'.join(columns)}_{'key' if unique else 'idx'}"
+        table['indexes'].append({
+            'name': name,
+            'table': table['name'],
+            'columns': columns,
+            'unique': unique,
+            'primary': primary,
+            'method': method,
+            'include': include or [],
+            'where': where,
+            'descending': descending or [False] * len(columns)
+        })
+        if unique and not where and columns not in table['unique_keys']:
+            table['unique_keys'].append(columns)
+
+def resolve_batch_key(schema: Optional[SchemaCatalog], table: Optional[str],
+                      updated_columns: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    """Single-column integer primary key a keyset-batched write can walk, or the reason there is none"""
+    result = {'column': None, 'type': None, 'variable_type': None, 'start': None, 'reason': None}
+    entry = schema.get_table(table) if schema and table else None
+    if not entry or not entry['columns']:
+        result['reason'] = (f"the schema does not describe {table}, so its primary key column and type are unknown; "
+                            'pass its CREATE TABLE to get a batched rewrite')
+        return result
+    key = entry['primary_key']
+    if not key:
+        result['reason'] = f"{table} has no primary key to walk in batches"
+        return result
+    if len(key) > 1:
+        result['reason'] = (f"the primary key of {table} ({', '.join(key)}) has several columns; seeking on "
+                            'its first column alone does not bound the size of a batch')
+        return result
+    column = key[0]
+    column_type = entry['columns'][column]['type'] if column in entry['columns'] else None
+    if column_type_category(column_type) != 'integer':
+        result['reason'] = (f"{table}.{column} is {column_type or 'of unknown type'}; the batched rewrite needs "
+                            'an integer key it can seek on')
+        return result
+    if column in updated_columns:
+        result['reason'] = (f"the statement changes the key {column} itself, so updated rows move past the "
+                            'batch cursor and are written again')
+        return result
+
+    base = re.sub(r'\s*\(.*$', '', column_type)
+    unsigned = base.endswith(' unsigned')
+    # Variables cannot be declared serial, and MIN(key) - 1 on an unsigned key can go below zero
+    variable_type = 'bigint' if unsigned else {'serial': 'integer', 'bigserial': 'bigint',
+                                                  'smallserial': 'smallint'}.get(base, base)
+    result.update(column=column, type=column_type, variable_type=variable_type,
+                  start=f"CAST(MIN({column}) AS SIGNED) - 1" if unsigned else f"MIN({column}) - 1")
+    return result
+
+def split_top_level(text: str, separator: str = ',') -> List[str]:
+    """Split on separators that are not nested in parentheses or quotes"""
+    parts = []
+    depth = 0
+    quote = None
+    current = ''
+
+    for char in text:
+        if quote:
+            current += char
+            if char == quote:
+                quote = None
+            continue
+        if char in ("'", '"', '`'):
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(current.strip())
+            current = ''
+            continue
+        current += char
+
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+def take_parenthesized(text: str):
+    """Split '(inner) rest' into its inner text and the remainder"""
+    depth = 0
+    for i, char in enumerate(text):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return text[1:i], text[i + 1:]
+    return text[1:], ''
+
+def parse_column_list(text: str, directions: bool = False) -> List[Any]:
+    """Extract the first parenthesized column list of a constraint or index definition (or whether each is DESC)"""
+    start = text.find('(')
+    if start < 0:
+        return []
+    inner, _ = take_parenthesized(text[start:])
+    if directions:
+        return [index_column_descending(column) for column in split_top_level(inner)]
+    return [normalize_index_column(column) for column in split_top_level(inner)]
+
+def index_column_descending(column: str) -> bool:
+    """Whether an index column is declared DESC"""
+    return bool(re.search(r'\sDESC\b', column, re.IGNORECASE))
+
+def normalize_index_column(column: str) -> str:
+    """Drop sort direction, NULLS ordering and MySQL prefix lengths from an index column"""
+    column = re.sub(r'\s+(?:ASC|DESC)\b.*$|\s+NULLS\s+(?:FIRST|LAST)$', '', column.strip(), flags=re.IGNORECASE)
+    if re.match(r'^[`"\[]?[\w.]+[`"\]]?(?:\(\d+\))?$', column):
+        return normalize_identifier(re.sub(r'\(\d+\)$', '', column))
+    return re.sub(r'\s+', ' ', column).lower()
@@ -0,0 +1,344 @@
+import re
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Union
+
+import sqlparse
+
+from sql_analyzer import SQLAnalyzer
+
+# A value COPY can load as-is: NULL, a boolean, a number or a single-quoted string
+LITERAL_VALUE = re.compile(r"^(?:NULL|TRUE|FALSE|[+-]?(?:\d+\.?\d*|\.\d+)(?:E[+-]?\d+)?|'(?:[^']|'')*')$", re.IGNORECASE)
+
+class SequenceAnalyzer:
+    """Detect chatty access patterns (N+1 lookups, single-row INSERT runs) across ordered statements"""
+
+    def __init__(self, dialect: str = 'postgresql', window_seconds: float = 1.0,
+                 window_statements: int = 50, min_burst_size: int = 3, batch_size: int = 1000):
+        self.dialect = dialect.lower()
+        self.window_seconds = window_seconds
+        self.window_statements = window_statements
+        self.min_burst_size = min_burst_size
+        self.batch_size = batch_size
+        self.analyzer = SQLAnalyzer()
+
+    def analyze_sequence(self, entries: Union[str, List[Any]]) -> Dict[str, Any]:
+        """Find bursts of same-fingerprint statements and generate batched rewrites"""
+        statements = self._normalize_entries(entries)
+
+        open_bursts = {}
+        finished_bursts = []
+
+        for seq, entry in enumerate(statements):
+            fingerprint, literals = self.analyzer.fingerprint(entry['sql'])
+            member = dict(entry, seq=seq, literals=literals)
+
+            burst = open_bursts.get(fingerprint)
+            if burst and self._within_window(burst['members'][-1], member):
+                burst['members'].append(member)
+            else:
+                if burst:
+                    finished_bursts.append(burst)
+                open_bursts[fingerprint] = {'fingerprint': fingerprint, 'members': [member]}
+
+        finished_bursts.extend(open_bursts.values())
+
+        bursts = [
+            self._describe_burst(burst)
+            for burst in sorted(finished_bursts, key=lambda b: b['members'][0]['seq'])
+            if len(burst['members']) >= self.min_burst_size
+        ]
+
+        return {
+            'total_statements': len(statements),
+            'bursts': bursts,
+            'round_trips_saved': sum(burst['round_trips_saved'] for burst in bursts)
+        }
+
+    def _normalize_entries(self, entries: Union[str, List[Any]]) -> List[Dict[str, Any]]:
+        """Turn a multi-statement string, a list of SQL strings or a list of log dicts into ordered entries"""
+        if isinstance(entries, str):
+            entries = [str(stmt) for stmt in self.analyzer.parse_sql(entries)]
+
+        statements = []
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {'sql': entry}
+            sql = (entry.get('sql') or '').strip()
+            if not sql:
+                continue
+            statements.append({
+                'sql': sql,
+                'timestamp': self._parse_timestamp(entry.get('timestamp')),
+                'duration_ms': entry.get('duration_ms')
+            })
+
+        return statements
+
+    def _parse_timestamp(self, value) -> Optional[float]:
+        """Accept epoch seconds or ISO-8601 strings"""
+        if value is None or value == '':
+            return None
+        if isinstance(value, (int, float)):
+            return float(value)
+        try:
+            return float(value)
+        except ValueError:
+            return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+
+    def _within_window(self, previous: Dict[str, Any], current: Dict[str, Any]) -> bool:
+        """Check whether a statement continues the burst started by earlier ones"""
+        if current['seq'] - previous['seq'] > self.window_statements:
+            return False
+        if previous['timestamp'] is not None and current['timestamp'] is not None:
+            return current['timestamp'] - previous['timestamp'] <= self.window_seconds
+        return True
+
+    def _describe_burst(self, burst: Dict[str, Any]) -> Dict[str, Any]:
+        """Classify a burst and attach the batched equivalent"""
+        members = burst['members']
+        first_sql = members[0]['sql']
+        query_type = self.analyzer._get_query_type(sqlparse.parse(first_sql)[0])
+
+        description = {
+            'fingerprint': burst['fingerprint'],
+            'query_type': query_type,
+            'pattern': 'repeated_statement',
+            'statement_ids': [member['seq'] + 1 for member in members],
+            'count': len(members),
+            'round_trips_saved': len(members) - 1,
+            'rewrites': [],
+            'suggestions': []
+        }
+
+        durations = [member['duration_ms'] for member in members if member['duration_ms'] is not None]
+        if durations:
+            description['total_duration_ms'] = round(sum(durations), 3)
+
+        if query_type == 'SELECT':
+            rewrites = self._batch_select(members)
+            if rewrites:
+                description['pattern'] = 'n_plus_one_select'
+                description['rewrites'] = rewrites
+        elif query_type == 'INSERT':
+            rewrites = self._batch_insert(members)
+            if rewrites:
+                description['pattern'] = 'single_row_insert'
+                description['rewrites'] = rewrites
+
+        # Only a read returns a result worth reusing; repeated writes each take effect and keep their batching
+        if query_type == 'SELECT' and len({tuple(member['literals']) for member in members}) == 1:
+            description['pattern'] = 'duplicate_statement'
+
+        description['suggestions'] = self._build_suggestions(description)
+        return description
+
+    def _batch_select(self, members: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Collapse `col = literal` lookups that only differ in one literal into a set lookup"""
+        tokens = [
+            token for token in sqlparse.parse(members[0]['sql'])[0].flatten()
+            if token.ttype not in sqlparse.tokens.Comment
+        ]
+        literal_positions = [
+            i for i, token in enumerate(tokens)
+            if token.ttype in sqlparse.tokens.Literal.Number or token.ttype in sqlparse.tokens.Literal.String.Single
+        ]
+
+        if any(len(member['literals']) != len(literal_positions) for member in members):
+            return []
+
+        varying = [
+            n for n in range(len(literal_positions))
+            if len({member['literals'][n] for member in members}) > 1
+        ]
+        if len(varying) != 1:
+            return []
+
+        literal_index = literal_positions[varying[0]]
+        operator_index = self._previous_significant(tokens, literal_index)
+        if operator_index is None or tokens[operator_index].value != '=':
+            return []
+
+        column_index = self._previous_significant(tokens, operator_index)
+        if column_index is None or tokens[column_index].ttype not in sqlparse.tokens.Name:
+            return []
+
+        column_start = column_index
+        while column_start >= 2 and tokens[column_start - 1].value == '.' and tokens[column_start - 2].ttype in sqlparse.tokens.Name:
+            column_start -= 2
+        column = ''.join(token.value for token in tokens[column_start:column_index + 1])
+
+        values = list(dict.fromkeys(member['literals'][varying[0]] for member in members))
+        prefix = ''.join(token.value for token in tokens[:operator_index]).rstrip()
+        suffix = ''.join(token.value for token in tokens[literal_index + 1:]).strip()
+        # A per-row LIMIT (e.g. ORM .first()) would truncate the batched result
+        suffix = re.sub(r'\bLIMIT\s+\d+', '', suffix, flags=re.IGNORECASE).strip()
+        suffix = suffix.rstrip(';').strip()
+
+        select_list = re.search(r'^\s*SELECT\s+(.*?)\s+FROM\b', prefix, re.IGNORECASE | re.DOTALL)
+        key_name = column.split('.')[-1]
+        if select_list and select_list.group(1).strip() != '*' and not re.search(
+                r'\b' + re.escape(key_name) + r'\b', select_list.group(1), re.IGNORECASE):
+            prefix = re.sub(r'^\s*SELECT\s+', f'SELECT {column}, ', prefix, count=1, flags=re.IGNORECASE)
+
+        rewrites = []
+        for start in range(0, len(values), self.batch_size):
+            chunk = values[start:start + self.batch_size]
+            in_sql = f"{prefix} IN ({', '.join(chunk)}) {suffix}".strip() + ';'
+            rewrites.append({'strategy': 'in_list', 'sql': in_sql, 'values': len(chunk)})
+
+        if self.dialect in ('postgresql', 'postgres'):
+            any_sql = f"{prefix} = ANY(ARRAY[{', '.join(values)}]) {suffix}".strip() + ';'
+            rewrites.append({'strategy': 'any_array', 'sql': any_sql, 'values': len(values)})
+            param_sql = f"{prefix} = ANY(%s) {suffix}".strip() + ';'
+            rewrites.append({'strategy': 'any_array_parameter', 'sql': param_sql, 'values': len(values)})
+
+        return rewrites
+
+    def _batch_insert(self, members: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Combine single-row INSERT ... VALUES statements into multi-row VALUES or COPY"""
+        rows = []
+        header = None
+        tail = None
+
+        for member in members:
+            match = re.match(r'^(.*?\bVALUES)\s*(\(.*?)\s*;?\s*$', member['sql'], re.IGNORECASE | re.DOTALL)
+            if not match:
+                return []
+            row, rest = self._take_tuple(match.group(2))
+            # RETURNING / ON CONFLICT apply to the whole statement and must be the same for every row
+            if row is None or rest.startswith(',') or (tail is not None and rest != tail):
+                return []
+            if header is None:
+                header, tail = match.group(1), rest
+            rows.append(row)
+
+        rewrites = []
+        for start in range(0, len(rows), self.batch_size):
+            chunk = rows[start:start + self.batch_size]
+            rewrites.append({
+                'strategy': 'multi_row_values',
+                'sql': header + '\n    ' + ',\n    '.join(chunk) + (f'\n{tail}' if tail else '') + ';',
+                'values': len(chunk)
+            })
+
+        # COPY loads plain values only: no RETURNING / ON CONFLICT, no expressions such as now() or nextval()
+        fields = [self._split_top_level(row[1:-1]) for row in rows]
+        copyable = not tail and all(LITERAL_VALUE.match(value) for row in fields for value in row)
+        target = re.match(r'^\s*INSERT\s+INTO\s+(.*?)\s*VALUES$', header, re.IGNORECASE | re.DOTALL)
+        if target and copyable and self.dialect in ('postgresql', 'postgres'):
+            lines = [','.join(self._csv_field(self._csv_value(value)) for value in row) for row in fields]
+            rewrites.append({
+                'strategy': 'copy',
+                'sql': f"COPY {target.group(1)} FROM STDIN WITH (FORMAT csv);\n" + '\n'.join(lines) + '\n\\.',
+                'values': len(rows)
+            })
+
+        return rewrites
+
+    def _build_suggestions(self, burst: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Express a burst in the suggestion format used by SQLOptimizer"""
+        example = burst['rewrites'][0]['sql'] if burst['rewrites'] else ''
+
+        if burst['pattern'] == 'n_plus_one_select':
+            return [{
+                'type': 'batching_optimization',
+                'priority': 'high',
+                'title': f"Batch {burst['count']} single-row lookups into one query",
+                'description': 'The same SELECT runs once per key (N+1 pattern); fetch all keys in a single set-based query',
+                'code_example': example,
+                'impact': f"Saves {burst['round_trips_saved']} round trips"
+            }]
+        if burst['pattern'] == 'single_row_insert':
+            return [{
+                'type': 'batching_optimization',
+                'priority': 'high',
+                'title': f"Combine {burst['count']} single-row INSERTs",
+                'description': 'Multi-row VALUES (or COPY) amortizes parsing, network and commit overhead across rows',
+                'code_example': example,
+                'impact': f"Saves {burst['round_trips_saved']} round trips"
+            }]
+        if burst['pattern'] == 'duplicate_statement':
+            return [{
+                'type': 'batching_optimization',
+                'priority': 'medium',
+                'title': f"Identical statement executed {burst['count']} times",
+                'description': 'The result can be reused within the request instead of being fetched again',
+                'code_example': '',
+                'impact': f"Saves {burst['round_trips_saved']} round trips"
+            }]
+        return [{
+            'type': 'batching_optimization',
+            'priority': 'medium',
+            'title': f"Statement repeated {burst['count']} times with different literals",
+            'description': 'Consider restructuring the calling code to issue a single set-based statement',
+            'code_example': '',
+            'impact': f"Up to {burst['round_trips_saved']} round trips could be saved"
+        }]
+
+    def _previous_significant(self, tokens, index: int) -> Optional[int]:
+        """Index of the closest non-whitespace token before `index`"""
+        index -= 1
+        while index >= 0 and tokens[index].is_whitespace:
+            index -= 1
+        return index if index >= 0 else None
+
+    def _split_top_level(self, text: str) -> List[str]:
+        """Split on commas that are not nested in parentheses or quotes"""
+        parts = []
+        depth = 0
+        quote = None
+        current = ''
+
+        for char in text:
+            if quote:
+                current += char
+                if char == quote:
+                    quote = None
+                continue
+            if char in ("'", '"'):
+                quote = char
+            elif char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+            elif char == ',' and depth == 0:
+                parts.append(current.strip())
+                current = ''
+                continue
+            current += char
+
+        if current.strip():
+            parts.append(current.strip())
+        return parts
+
+    def _take_tuple(self, text: str):
+        """Split '(a, b) rest' into the parenthesized row and the text after it"""
+        depth = 0
+        quote = None
+        for i, char in enumerate(text):
+            if quote:
+                if char == quote:
+                    quote = None
+            elif char in ("'", '"'):
+                quote = char
+            elif char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+                if depth == 0:
+                    return text[:i + 1], text[i + 1:].strip()
+        return None, ''
+
+    def _csv_value(self, value: str) -> Optional[str]:
+        """Convert a SQL literal into its CSV representation for COPY"""
+        if value.upper() == 'NULL':
+            return None
+        if len(value) >= 2 and value[0] == "'" and value[-1] == "'":
+            return value[1:-1].replace("''", "'")
+        return value
+
+    def _csv_field(self, value: Optional[str]) -> str:
+        """Quote every non-NULL field: COPY CSV reads only an unquoted empty field as NULL, so '' stays ''"""
+        if value is None:
+            return ''
+        return '"' + value.replace('"', '""') + '"'
@@ -23,7 +23,7 @@ def create_directories():
     """Create necessary directories"""
     print("📁 Creating necessary directories...")
     
-    directories = ['uploads', 'logs']
+    directories = ['logs']
     
     for directory in directories:
         if not os.path.exists(directory):
@@ -39,7 +39,7 @@ def test_imports():
     required_modules = [
         'flask',
         'sqlparse',
-        'sqlalchemy',
+        'numpy',
         'jinja2',
         'werkzeug'
     ]
@@ -1,10 +1,171 @@
 import sqlparse
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from collections import defaultdict
 
+from schema_catalog import normalize_identifier, column_type_category, estimate_column_width, resolve_batch_key
+from analysis_budget import BudgetExceeded
+from ddl_analyzer import DDLAnalyzer
+from index_advisor import DEFAULT_SELECTIVITY
+
+TABLE_INTRODUCERS = {'FROM', 'INTO', 'UPDATE', 'STRAIGHT_JOIN'}
+JOIN_MODIFIERS = {'LEFT', 'RIGHT', 'INNER', 'OUTER', 'FULL', 'CROSS', 'NATURAL', 'LATERAL', 'ONLY'}
+TABLE_CLAUSE_END = {
+    'WHERE', 'ON', 'USING', 'GROUP BY', 'ORDER BY', 'HAVING', 'LIMIT', 'OFFSET', 'FETCH', 'SET',
+    'VALUES', 'UNION', 'UNION ALL', 'EXCEPT', 'INTERSECT', 'WINDOW', 'RETURNING', 'FOR', 'SELECT',
+    'DEFAULT', 'TABLESAMPLE', 'WITH'
+}
+CLAUSE_KEYWORDS = {
+    'WITH', 'WITH RECURSIVE', 'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'FROM', 'WHERE', 'GROUP BY', 'HAVING',
+    'WINDOW', 'QUALIFY', 'ORDER BY', 'LIMIT', 'OFFSET', 'FETCH', 'FOR', 'RETURNING', 'SET', 'VALUES'
+}
+SET_OPERATORS = {'UNION', 'UNION ALL', 'EXCEPT', 'EXCEPT ALL', 'INTERSECT', 'INTERSECT ALL', 'MINUS'}
+DEEP_OFFSET_THRESHOLD = 1000
+# PostgreSQL's default work_mem; a sort larger than this spills to disk
+SORT_MEMORY_BYTES = 4 * 1024 * 1024
+# Per-row bookkeeping a sort keeps besides the row itself
+SORT_TUPLE_OVERHEAD_BYTES = 24
+# Words that look like identifiers inside predicates but are not column references
+SQL_WORDS = {
+    'AND', 'OR', 'NOT', 'IN', 'IS', 'NULL', 'LIKE', 'ILIKE', 'BETWEEN', 'EXISTS', 'TRUE', 'FALSE', 'CASE', 'WHEN',
+    'THEN', 'ELSE', 'END', 'CURRENT_DATE', 'CURRENT_TIMESTAMP', 'INTERVAL', 'ANY', 'ALL', 'SOME', 'ESCAPE'
+}
+# Numeric, string and national-string literals as rendered by _tokens_to_text
+LITERAL_PATTERN = r"N\s*'(?:[^']|'')*'|'(?:[^']|'')*'|-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+NUMERIC_CATEGORIES = {'integer', 'decimal', 'float'}
+STRING_CATEGORIES = {'string', 'national_string'}
+# Rule patterns, compiled once at import
+LITERAL = re.compile(LITERAL_PATTERN)
+IN_LIST_PLACEHOLDERS = re.compile(r'\bIN \( \?(?: , \?)* \)')
+COLUMN_EXPRESSION = re.compile(r'^[\w$"`]+(\.[\w$"`]+)?$')
+LEADING_PREDICATE = re.compile(r'^([\w.]+)\s*(=|\bIN\b|\bIS\s+NULL\b|<=|>=|<|>|\bBETWEEN\b|\bLIKE\s+\'[^%_])', re.IGNORECASE)
+BARE_COLUMN = re.compile(r'(?<![\w.\'])([A-Za-z_][\w$]*(?:\.[A-Za-z_][\w$]*)?)(?![\w(\'])')
+QUALIFIED_COLUMN = re.compile(r'([A-Za-z_][\w$]*\.[A-Za-z_][\w$]*)')
+QUALIFIED_REFERENCE = re.compile(r'\b([A-Za-z_][\w$]*)\.([A-Za-z_][\w$]*)\b')
+# One alternation for every family of index-defeating functions; the group name says which family matched
+WHERE_FUNCTIONS = re.compile(
+    r'\b(?:(?P<transform>UPPER|LOWER|TRIM|SUBSTRING|DATE|YEAR|MONTH|DAY)|(?P<null_handling>ISNULL|COALESCE|NULLIF)'
+    r'|(?P<conversion>CONVERT|CAST))\s*\(', re.IGNORECASE
+)
+WHERE_FUNCTION_FAMILIES = ('transform', 'null_handling', 'conversion')
+OR_OPERATOR = re.compile(r'\bOR\b', re.IGNORECASE)
+EQUALITY_FILTER = re.compile(r"(?:([\w$]+)\.)?([\w$]+)\s*=\s*(?:'[^']*'|-?\d+(?:\.\d+)?|\?|%s|:\w+|\$\d+)")
+FUNCTION_CALL = re.compile(r'\b(\w+)\s*\(\s*([\w$.]+)')
+NUMBER_TEXT = re.compile(r'^[\d.]+$')
+# (pattern, description) of the non-sargable shapes besides function calls
+NON_SARGABLE_RULES = (
+    (re.compile(r"\bLIKE\s+'%", re.IGNORECASE), 'LIKE pattern with a leading wildcard'),
+    (re.compile(r'[\w$.]+\s*[-+*/]\s*[\w$.]+\s*(?:=|<|>)'), 'arithmetic on a column'),
+    (re.compile(r'<>|!=|\bNOT\s+(?:IN|LIKE)\b', re.IGNORECASE), 'negated comparison (<>, !=, NOT IN, NOT LIKE)'),
+    (OR_OPERATOR, 'OR across predicates')
+)
+_COLUMN = r'([A-Za-z_][\w$]*(?:\.[A-Za-z_][\w$]*)?)'
+_LITERAL = f"(?:{LITERAL_PATTERN})"
+_OPERATOR = r'(=|<>|!=|<=|>=|<|>)'
+COLUMN_COMPARISON = re.compile(rf'^{_COLUMN}\s*{_OPERATOR}\s*{_COLUMN}$')
+LITERAL_COMPARISON = re.compile(
+    rf'^{_COLUMN}\s*(?:{_OPERATOR}\s*{_LITERAL}'
+    rf'|(?:NOT\s+)?(IN)\s*\(\s*{_LITERAL}(?:\s*,\s*{_LITERAL})*\s*\)'
+    rf'|(?:NOT\s+)?(BETWEEN)\s+{_LITERAL}\s+AND\s+{_LITERAL})$', re.IGNORECASE
+)
+REVERSED_LITERAL_COMPARISON = re.compile(rf'^({_LITERAL})\s*{_OPERATOR}\s*{_COLUMN}$')
+# The lexer splits N'...' into a name and a string
+SPLIT_NATIONAL_LITERAL = re.compile(r"(?<![\w.])N '")
+NATIONAL_LITERAL = re.compile(r"^N\s*'", re.IGNORECASE)
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+LEADING_CALL = re.compile(r'^(\w+)\s*\(')
+COLUMN_EQUALITY = re.compile(r'^([\w$.]+)\s*=\s*([\w$.]+)$')
+COLUMN_CONSTANT = re.compile(rf'^{_COLUMN}\s*=\s*({_LITERAL}|\?|%s|:\w+|\$\d+)$')
+REVERSED_COLUMN_CONSTANT = re.compile(rf'^({_LITERAL}|\?|%s|:\w+|\$\d+)\s*=\s*{_COLUMN}$')
+# Stands for "the table's row" in functional-dependency closures
+ROW_IDENTITY = '*'
+# Over a single-row group these aggregates return their argument
+SINGLE_ROW_AGGREGATES = {'SUM', 'MIN', 'MAX', 'AVG'}
+REDUNDANT_OPERATIONS = {'distinct': 'DISTINCT', 'group_by': 'GROUP BY', 'union': 'UNION'}
+MYSQL_CHARSETS = {'utf8mb4', 'utf8mb3', 'utf8', 'latin1', 'ascii', 'ucs2', 'utf16', 'utf32', 'binary'}
+AGGREGATE_FUNCTIONS = {'COUNT', 'SUM', 'AVG', 'MIN', 'MAX', 'GROUP_CONCAT', 'STRING_AGG', 'ARRAY_AGG', 'BOOL_OR', 'BOOL_AND'}
+# Hand-picked complexity points per feature; a calibrated CostModel replaces them
+COMPLEXITY_WEIGHTS = {'tables': 2, 'joins': 3, 'subqueries': 5, 'where_functions': 2, 'group_by': 3, 'order_by': 2}
+SUBQUERY_LOCATIONS = {
+    'SELECT': 'select', 'FROM': 'from', 'ON': 'join_condition', 'WHERE': 'where', 'HAVING': 'having',
+    'SET': 'set', 'VALUES': 'values', 'ORDER BY': 'order_by', 'GROUP BY': 'group_by', 'WITH': 'cte'
+}
+DATA_MODIFYING = {'INSERT', 'UPDATE', 'DELETE', 'MERGE'}
+PLACEHOLDER = re.compile(r'%s|(?<![:\w]):\w+|\$\d+')
+# A comparison on the CTE's own columns (n < 10, depth <= 5) bounds a recursive member; <> does not
+RECURSION_BOUND = re.compile(r'(?<![<!])(?:<=?|>=?)(?!>)|\bBETWEEN\b', re.IGNORECASE)
+# Visited-path checks that stop a recursive member from revisiting a row
+CYCLE_GUARD = re.compile(r'\bNOT\s+IN\b|(?:<>|!=)\s*ALL\b|\bNOT\b[^()]*=\s*ANY\b|\bNOT\s+LIKE\b', re.IGNORECASE)
+RECURSION_DEPTH_LIMIT = 100
+
+def implicit_conversion(mismatch: Dict[str, Any], dialect: str) -> Optional[str]:
+    """Which side this dialect converts ('column' or 'other'), 'error', or None when no index is affected"""
+    column, other = mismatch['column'], mismatch['other_column']
+    literal = mismatch['kind'] == 'literal'
+    postgres = dialect in ('postgresql', 'postgres')
+    mysql = dialect in ('mysql', 'mariadb')
+    x = column['category']
+    y = mismatch['literal_category'] if literal else other['category']
+    
+    if mismatch['reason'] == 'collation':
+        if mysql:
+            # utf8mb3/latin1 values are converted up to utf8mb4; equal charsets with different collations clash
+            charsets = [column['charset'], other['charset']]
+            if charsets[0] != charsets[1] and 'utf8mb4' in charsets:
+                return 'other' if charsets[0] == 'utf8mb4' else 'column'
+            return 'error'
+        if postgres or dialect == 'sqlserver':
+            return 'error'
+        # SQLite uses the left operand's collation
+        return 'other' if dialect == 'sqlite' else None
+    
+    string_side = 'column' if x in STRING_CATEGORIES else 'other'
+    if {x, y} & NUMERIC_CATEGORIES and {x, y} & STRING_CATEGORIES:
+        if postgres:
+            return 'error'
+        # SQLite applies the literal's affinity to the literal, not the column
+        if dialect == 'sqlite' and literal:
+            return None
+        result = string_side
+    elif x in NUMERIC_CATEGORIES and y in NUMERIC_CATEGORIES:
+        # PostgreSQL and SQL Server promote the lower-precedence numeric type
+        rank = {'integer': 0, 'decimal': 1, 'float': 2}
+        if not (postgres or dialect == 'sqlserver'):
+            return None
+        if rank[x] != rank[y]:
+            result = 'column' if rank[x] < rank[y] else 'other'
+        elif dialect == 'sqlserver' and not literal and column['width'] != other['width']:
+            result = 'column' if column['width'] < other['width'] else 'other'
+        else:
+            return None
+    elif x in STRING_CATEGORIES and y in STRING_CATEGORIES and dialect in ('sqlserver', 'oracle'):
+        # varchar is promoted to nvarchar
+        result = 'column' if x == 'string' else 'other'
+    else:
+        return None
+    
+    # A converted literal costs nothing
+    return None if literal and result == 'other' else result
+
+def complexity_features(analysis: Dict[str, Any]) -> Dict[str, int]:
+    """Counts the complexity score weighs, keyed like COMPLEXITY_WEIGHTS"""
+    return {
+        'tables': len(analysis['tables']),
+        'joins': analysis['joins']['join_count'],
+        'subqueries': len(analysis['subqueries']),
+        'where_functions': len(analysis['where_clause']['functions_used']),
+        'group_by': int(analysis['group_by']['has_group_by']),
+        'order_by': int(analysis['order_by']['has_order_by'])
+    }
+
 class SQLAnalyzer:
-    def __init__(self):
+    def __init__(self, schema=None, budget=None, cost_model=None, dialect='postgresql'):
+        self.schema = schema
+        self.budget = budget
+        # Decides which type mismatches convert an indexed column; matches SQLOptimizer's default
+        self.dialect = dialect
+        self.ddl_analyzer = DDLAnalyzer(schema=schema)
+        self.complexity_weights = cost_model.complexity_weights() if cost_model else COMPLEXITY_WEIGHTS
         self.performance_issues = {
             'missing_indexes': [],
             'inefficient_joins': [],
@@ -21,11 +182,68 @@ class SQLAnalyzer:
     def parse_sql(self, sql_content: str) -> List[sqlparse.sql.Statement]:
         """Parse SQL content into individual statements"""
         try:
+            if self.budget is not None:
+                return self._parse_within_budget(sql_content)
             statements = sqlparse.parse(sql_content)
             return [stmt for stmt in statements if stmt.get_type() != 'Comment']
         except Exception as e:
             raise Exception(f"Failed to parse SQL: {str(e)}")
     
+    def _parse_within_budget(self, sql_content: str) -> List[sqlparse.sql.Statement]:
+        """Parse one statement at a time, skipping any over the token budget and stopping when time runs out"""
+        statements = []
+        
+        try:
+            for number, text in self.budget.statements(sql_content):
+                try:
+                    parsed = sqlparse.parse(text)
+                except RecursionError:
+                    # sqlparse groups nested parentheses recursively
+                    self.budget.skip(number, 'nesting_depth')
+                    continue
+                statements.extend(stmt for stmt in parsed if stmt.get_type() != 'Comment')
+        except BudgetExceeded:
+            pass
+        
+        return statements
+    
+    def _checkpoint(self):
+        """Cooperative cancellation point: raises BudgetExceeded once the request's time is up"""
+        if self.budget is not None:
+            self.budget.check()
+
+    def fingerprint(self, query) -> Tuple[str, List[str]]:
+        """Normalize a query into a literal-free fingerprint and return it with the extracted literals"""
+        if isinstance(query, str):
+            # The lexer alone yields the same leaf tokens as parse() without the costly grouping pass
+            tokens = sqlparse.lexer.tokenize(query)
+        else:
+            tokens = ((token.ttype, token.value) for token in query.flatten())
+
+        parts = []
+        literals = []
+
+        for ttype, value in tokens:
+            if ttype in sqlparse.tokens.Comment or ttype in sqlparse.tokens.Whitespace:
+                continue
+            if ttype in sqlparse.tokens.Literal.Number or ttype in sqlparse.tokens.Literal.String.Single:
+                literals.append(value)
+                parts.append('?')
+            elif ttype in sqlparse.tokens.Name.Placeholder:
+                parts.append('?')
+            elif ttype in sqlparse.tokens.Keyword:
+                parts.append(value.upper())
+            elif value == ';':
+                continue
+            else:
+                parts.append(value.lower())
+
+        fingerprint = ' '.join(parts)
+        # IN lists of any length collapse to a single shape
+        fingerprint = IN_LIST_PLACEHOLDERS.sub('IN ( ?+ )', fingerprint)
+
+        return fingerprint, literals
+
     def analyze_queries(self, parsed_queries: List[sqlparse.sql.Statement]) -> List[Dict[str, Any]]:
         """Analyze each parsed query for performance issues"""
         results = []
@@ -33,31 +251,54 @@ class SQLAnalyzer:
         for query in parsed_queries:
             if not query.get_type() or query.get_type() == 'Comment':
                 continue
-                
-            analysis = {
-                'query_type': self._get_query_type(query),
-                'tables': self._extract_tables(query),
-                'columns': self._extract_columns(query),
-                'joins': self._analyze_joins(query),
-                'where_clause': self._analyze_where_clause(query),
-                'group_by': self._analyze_group_by(query),
-                'order_by': self._analyze_order_by(query),
-                'limit': self._analyze_limit(query),
-                'subqueries': self._find_subqueries(query),
-                'issues': [],
-                'complexity_score': 0,
-                'estimated_performance': 'unknown'
-            }
-            
-            # Detect issues
-            analysis['issues'] = self._detect_issues(query, analysis)
-            analysis['complexity_score'] = self._calculate_complexity_score(analysis)
-            analysis['estimated_performance'] = self._estimate_performance(analysis)
             
-            results.append(analysis)
+            try:
+                self._checkpoint()
+                results.append(self._analyze_query(query))
+            except BudgetExceeded:
+                # Keep what was finished; the statement in progress is dropped
+                break
         
         return results
     
+    def _analyze_query(self, query) -> Dict[str, Any]:
+        """Analyze one statement"""
+        analysis = {
+            'query_type': self._get_query_type(query),
+            'tables': self._extract_tables(query),
+            'columns': self._extract_columns(query),
+            'joins': self._analyze_joins(query),
+            'where_clause': self._analyze_where_clause(query),
+            'group_by': self._analyze_group_by(query),
+            'order_by': self._analyze_order_by(query),
+            'limit': self._analyze_limit(query),
+            'sorts': {},
+            'pagination': {},
+            'write_path': {},
+            'ddl': self._analyze_ddl(query),
+            'column_usage': self._analyze_column_usage(query),
+            'subqueries': self._find_subqueries(query),
+            'type_mismatches': self._find_type_mismatches(query),
+            'ctes': {},
+            'uniqueness': {},
+            'issues': [],
+            'complexity_score': 0,
+            'estimated_performance': 'unknown'
+        }
+        
+        analysis['pagination'] = self._analyze_pagination(query, analysis)
+        analysis['write_path'] = self._analyze_write_path(query, analysis)
+        analysis['ctes'] = self._analyze_ctes(query, analysis)
+        analysis['sorts'] = self._analyze_sorts(query, analysis)
+        analysis['uniqueness'] = self._analyze_uniqueness(query, analysis)
+        
+        # Detect issues
+        analysis['issues'] = self._detect_issues(query, analysis)
+        analysis['complexity_score'] = self._calculate_complexity_score(analysis)
+        analysis['estimated_performance'] = self._estimate_performance(analysis)
+        
+        return analysis
+        
     def _get_query_type(self, query) -> str:
         """Determine the type of SQL query"""
         tokens = [token.value.upper() for token in query.flatten()]
@@ -80,20 +321,275 @@ class SQLAnalyzer:
             return 'UNKNOWN'
     
     def _extract_tables(self, query) -> List[str]:
-        """Extract table names from the query"""
-        tables = []
-        from_seen = False
+        """Extract table names from the query, leaving out the names of its CTEs"""
+        definitions, _, _ = self._split_with_clause(self._significant_tokens(query))
+        ctes = {normalize_identifier(definition['name']) for definition in definitions}
+        tables = [ref['name'] for ref in self._extract_table_references(query)
+                  if ref['name'] and normalize_identifier(ref['name']) not in ctes]
+        return list(dict.fromkeys(tables))
+    
+    def _significant_tokens(self, query) -> List[Any]:
+        """Flatten a statement, dropping whitespace and comments"""
+        self._checkpoint()
+        return [
+            token for token in query.flatten()
+            if not token.is_whitespace and token.ttype not in sqlparse.tokens.Comment
+        ]
+    
+    def _top_level_clauses(self, query) -> Dict[str, List[Any]]:
+        """Group the significant tokens of the outermost query block by clause keyword"""
+        clauses = {}
+        current = None
+        depth = 0
         
-        for token in query.flatten():
-            if token.value.upper() == 'FROM':
-                from_seen = True
-            elif from_seen and token.ttype is None and token.value.strip():
-                if token.value.strip() not in ['AS', 'JOIN', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'ON']:
-                    tables.append(token.value.strip())
-                if token.value.upper() in ['WHERE', 'GROUP', 'ORDER', 'HAVING', 'LIMIT']:
+        for token in self._significant_tokens(query):
+            keyword = ' '.join(token.value.upper().split())
+            
+            if depth == 0 and token.ttype in sqlparse.tokens.Keyword:
+                if keyword in SET_OPERATORS:
                     break
+                if keyword in CLAUSE_KEYWORDS:
+                    current = keyword
+                    clauses.setdefault(current, [])
+                    continue
+            
+            if token.value == '(':
+                depth += 1
+            elif token.value == ')':
+                depth -= 1
+            
+            if current is not None and token.value != ';':
+                clauses[current].append(token)
         
-        return list(set(tables))
+        return clauses
+    
+    def _query_prefix(self, query, stop_keywords) -> str:
+        """Text of the statement up to the first top-level keyword in `stop_keywords`"""
+        parts = []
+        depth = 0
+        
+        for token in query.flatten():
+            if token.ttype in sqlparse.tokens.Comment:
+                continue
+            if depth == 0 and token.ttype in sqlparse.tokens.Keyword and ' '.join(token.value.upper().split()) in stop_keywords:
+                break
+            if token.value == '(':
+                depth += 1
+            elif token.value == ')':
+                depth -= 1
+            parts.append(token.value)
+        
+        return ''.join(parts).strip().rstrip(';').strip()
+    
+    def _split_top_level_tokens(self, tokens) -> List[List[Any]]:
+        """Split a token list on commas that are not nested in parentheses"""
+        items = [[]]
+        depth = 0
+        
+        for token in tokens:
+            if token.value == '(':
+                depth += 1
+            elif token.value == ')':
+                depth -= 1
+            elif token.value == ',' and depth == 0:
+                items.append([])
+                continue
+            items[-1].append(token)
+        
+        return [item for item in items if item]
+    
+    def _tokens_to_text(self, tokens) -> str:
+        """Render significant tokens back into compact SQL text"""
+        text = ''
+        previous = None
+        
+        for token in tokens:
+            if previous is not None and token.value not in ('.', ',', ')') and previous.value not in ('.', '(') \
+                    and not (token.value == '(' and previous.ttype in sqlparse.tokens.Name):
+                text += ' '
+            text += token.value
+            previous = token
+        
+        return text
+    
+    def _resolve_column(self, expression: str, references: List[Dict[str, Any]]) -> Optional[Tuple[str, str]]:
+        """Map a (possibly alias-qualified) column expression to a (table, column) pair using the schema"""
+        if not self.schema or not COLUMN_EXPRESSION.match(expression):
+            return None
+        
+        tables = [ref for ref in references if ref['depth'] == 0 and not ref['derived']]
+        parts = expression.split('.')
+        column = normalize_identifier(parts[-1])
+        
+        if len(parts) == 2:
+            qualifier = normalize_identifier(parts[0])
+            tables = [
+                ref for ref in tables
+                if (ref['alias'] and normalize_identifier(ref['alias']) == qualifier) or normalize_identifier(ref['name']) == qualifier
+            ]
+        
+        candidates = [
+            normalize_identifier(ref['name']) for ref in tables
+            if self.schema.get_table(ref['name']) and column in self.schema.get_table(ref['name'])['columns']
+        ]
+        if len(candidates) == 1:
+            return candidates[0], column
+        if len(parts) == 2 and len(tables) == 1:
+            return normalize_identifier(tables[0]['name']), column
+        return None
+    
+    def _extract_table_references(self, query) -> List[Dict[str, Any]]:
+        """Extract table references (name, alias, nesting depth) from FROM/JOIN/UPDATE/INTO clauses"""
+        tokens = self._significant_tokens(query)
+        references = []
+        state = {0: None}
+        query_scopes = {0}
+        from_clauses = set()
+        depth = 0
+        i = 0
+        
+        while i < len(tokens):
+            token = tokens[i]
+            upper = token.value.upper()
+            
+            if token.value == '(':
+                if state.get(depth) == 'table':
+                    state[depth] = 'derived'
+                depth += 1
+                state[depth] = None
+            elif token.value == ')':
+                state.pop(depth, None)
+                query_scopes.discard(depth)
+                from_clauses.discard(depth)
+                depth = max(depth - 1, 0)
+                if state.get(depth) == 'derived':
+                    references.append({'name': None, 'alias': None, 'depth': depth, 'derived': True})
+                    state[depth] = 'alias'
+            elif token.ttype in sqlparse.tokens.DML:
+                query_scopes.add(depth)
+                state[depth] = 'table' if upper in TABLE_INTRODUCERS else None
+            elif depth in query_scopes and (upper in TABLE_INTRODUCERS or upper.endswith('JOIN')):
+                state[depth] = 'table'
+                from_clauses.add(depth)
+            elif state.get(depth) == 'table' and upper not in TABLE_CLAUSE_END and upper not in JOIN_MODIFIERS:
+                name = token.value
+                while i + 2 < len(tokens) and tokens[i + 1].value == '.':
+                    name += '.' + tokens[i + 2].value
+                    i += 2
+                references.append({'name': name, 'alias': None, 'depth': depth, 'derived': False})
+                state[depth] = 'alias'
+            elif state.get(depth) == 'alias' and upper == 'AS':
+                pass
+            elif (state.get(depth) == 'alias' and token.value != ','
+                    and upper not in TABLE_CLAUSE_END and upper not in JOIN_MODIFIERS
+                    and (token.ttype in sqlparse.tokens.Name or token.ttype in sqlparse.tokens.Keyword)):
+                references[-1]['alias'] = token.value
+                state[depth] = 'list'
+            elif token.value == ',' and depth in from_clauses:
+                state[depth] = 'table'
+            elif upper in TABLE_CLAUSE_END:
+                state[depth] = None
+                if upper not in ('ON', 'USING'):
+                    from_clauses.discard(depth)
+            
+            i += 1
+        
+        return references
+    
+    def _analyze_column_usage(self, query) -> List[Dict[str, Any]]:
+        """Per table, the columns a SELECT projects, filters on (equality/range), joins on and sorts by"""
+        if not self.schema or self._get_query_type(query) != 'SELECT':
+            return []
+        
+        references = self._extract_table_references(query)
+        usage = {}
+        
+        def record(expression: str, role: str) -> bool:
+            resolved = self._resolve_column(expression, references)
+            if not resolved:
+                return False
+            table, column = resolved
+            entry = usage.setdefault(table, {
+                'table': table, 'select': [], 'equality': [], 'range': [], 'join': [], 'order_by': [],
+                'group_by': [], 'other': [], 'wildcard': False, 'unresolved': []
+            })
+            if column not in entry[role]:
+                entry[role].append(column)
+            return True
+        
+        clauses = self._top_level_clauses(query)
+        unresolved = []
+        
+        for item in self._split_top_level_tokens(clauses.get('SELECT', [])):
+            if item[-1].value == '*':
+                qualifier = item[0].value if len(item) == 3 else None
+                for ref in references:
+                    if ref['depth'] == 0 and not ref['derived'] and self.schema.get_table(ref['name']) and (
+                            qualifier is None or normalize_identifier(qualifier) in
+                            (normalize_identifier(ref['alias'] or ''), normalize_identifier(ref['name']))):
+                        table = self.schema.get_table(ref['name'])
+                        for column in table['columns']:
+                            record(f"{ref['alias'] or ref['name']}.{column}", 'select')
+                        usage[table['name']]['wildcard'] = True
+                continue
+            for column in self._column_references(self._select_item_tokens(item)[0]):
+                if not record(column, 'select'):
+                    unresolved.append(column)
+        
+        for condition in self._split_conjuncts(clauses.get('WHERE', [])):
+            match = LEADING_PREDICATE.match(condition)
+            if match:
+                role = 'equality' if match.group(2).upper().split()[0] in ('=', 'IN', 'IS') else 'range'
+                if record(match.group(1), role):
+                    condition = condition[len(match.group(1)):]
+            for column in BARE_COLUMN.findall(condition):
+                if column.upper() not in SQL_WORDS and not record(column, 'other'):
+                    unresolved.append(column)
+        
+        for condition in self._join_conditions(clauses.get('FROM', [])):
+            for column in QUALIFIED_COLUMN.findall(condition):
+                if not record(column, 'join'):
+                    unresolved.append(column)
+        
+        for key in self._analyze_order_by(query)['keys']:
+            if not record(key['expression'], 'order_by'):
+                unresolved.append(key['expression'])
+        for item in self._split_top_level_tokens(clauses.get('GROUP BY', [])):
+            if not record(self._tokens_to_text(item), 'group_by'):
+                unresolved.append(self._tokens_to_text(item))
+        
+        for entry in usage.values():
+            entry['unresolved'] = unresolved
+        return list(usage.values())
+    
+    def _join_conditions(self, from_tokens) -> List[str]:
+        """The conjuncts of every ON clause in a FROM clause"""
+        conditions = []
+        
+        for i, token in enumerate(from_tokens):
+            if token.value.upper() != 'ON':
+                continue
+            end = next((j for j in range(i + 1, len(from_tokens)) if from_tokens[j].value.upper().endswith('JOIN')), len(from_tokens))
+            conditions.extend(self._split_conjuncts(from_tokens[i + 1:end]))
+        
+        return conditions
+    
+    def _column_references(self, tokens) -> List[str]:
+        """Column expressions (name or qualifier.name) in a token list, skipping function names"""
+        columns = []
+        i = 0
+        
+        while i < len(tokens):
+            token = tokens[i]
+            if token.ttype in sqlparse.tokens.Name and not (i + 1 < len(tokens) and tokens[i + 1].value == '('):
+                expression = token.value
+                if i + 2 < len(tokens) and tokens[i + 1].value == '.' and tokens[i + 2].value != '*':
+                    expression += '.' + tokens[i + 2].value
+                    i += 2
+                columns.append(expression)
+            i += 1
+        
+        return columns
     
     def _extract_columns(self, query) -> List[str]:
         """Extract column names from SELECT clause"""
@@ -163,16 +659,11 @@ class SQLAnalyzer:
         if where_analysis['has_where']:
             where_text = ' '.join(where_tokens)
             
-            # Check for functions in WHERE clause
-            function_patterns = [
-                r'\b(UPPER|LOWER|TRIM|SUBSTRING|DATE|YEAR|MONTH|DAY)\s*\(',
-                r'\b(ISNULL|COALESCE|NULLIF)\s*\(',
-                r'\b(CONVERT|CAST)\s*\('
-            ]
-            
-            for pattern in function_patterns:
-                if re.search(pattern, where_text, re.IGNORECASE):
-                    where_analysis['functions_used'].append(re.search(pattern, where_text, re.IGNORECASE).group(1))
+            # Check for functions in WHERE clause: the first one of each family
+            found = {}
+            for match in WHERE_FUNCTIONS.finditer(where_text):
+                found.setdefault(match.lastgroup, match.group(match.lastgroup))
+            where_analysis['functions_used'].extend(found[family] for family in WHERE_FUNCTION_FAMILIES if family in found)
             
             # Check for potential issues
             if 'LIKE' in where_text and '%' in where_text:
@@ -188,7 +679,9 @@ class SQLAnalyzer:
         group_analysis = {
             'has_group_by': False,
             'columns': [],
-            'with_aggregation': False
+            'with_aggregation': False,
+            'aggregates': [],
+            'has_having': False
         }
         
         tokens = [token.value.upper() for token in query.flatten()]
@@ -203,62 +696,1752 @@ class SQLAnalyzer:
                     group_analysis['with_aggregation'] = True
                     break
         
+        clauses = self._top_level_clauses(query)
+        select_items = [
+            self._split_select_item(item) for item in self._split_top_level_tokens(clauses.get('SELECT', []))
+        ]
+        aliases = {normalize_identifier(alias): expression for expression, alias in select_items if alias}
+        
+        for item in self._split_top_level_tokens(clauses.get('GROUP BY', [])):
+            key = self._tokens_to_text(item)
+            # GROUP BY 1 and GROUP BY <select alias> refer back to the select list
+            if key.isdigit() and 0 < int(key) <= len(select_items):
+                key = select_items[int(key) - 1][0]
+            elif normalize_identifier(key) in aliases:
+                key = aliases[normalize_identifier(key)]
+            group_analysis['columns'].append(key)
+        
+        group_analysis['aggregates'] = self._extract_aggregate_calls(clauses.get('SELECT', []))
+        group_analysis['has_having'] = 'HAVING' in clauses
+        
         return group_analysis
     
+    def _split_select_item(self, tokens) -> Tuple[str, Optional[str]]:
+        """Split one select-list item into (expression, alias)"""
+        expression, alias = self._select_item_tokens(tokens)
+        return self._tokens_to_text(expression), alias
+    
+    def _select_item_tokens(self, tokens) -> Tuple[List[Any], Optional[str]]:
+        """Split one select-list item into (expression tokens, alias)"""
+        if len(tokens) >= 3 and tokens[-2].value.upper() == 'AS':
+            return tokens[:-2], tokens[-1].value
+        if len(tokens) >= 2 and tokens[-1].ttype in sqlparse.tokens.Name and tokens[-2].value not in ('.', '(') \
+                and (tokens[-2].ttype in sqlparse.tokens.Name or tokens[-2].value == ')'):
+            return tokens[:-1], tokens[-1].value
+        return tokens, None
+    
+    def _extract_aggregate_calls(self, tokens) -> List[Dict[str, Any]]:
+        """Find aggregate function calls (COUNT(*), SUM(DISTINCT x), ...) in a token list"""
+        calls = []
+        
+        for i, token in enumerate(tokens[:-1]):
+            function = token.value.upper()
+            if function not in AGGREGATE_FUNCTIONS or tokens[i + 1].value != '(':
+                continue
+            depth = 0
+            for end in range(i + 1, len(tokens)):
+                if tokens[end].value == '(':
+                    depth += 1
+                elif tokens[end].value == ')':
+                    depth -= 1
+                    if depth == 0:
+                        break
+            argument = tokens[i + 2:end]
+            distinct = bool(argument) and argument[0].value.upper() == 'DISTINCT'
+            calls.append({
+                'function': function,
+                'argument': self._tokens_to_text(argument[1:] if distinct else argument),
+                'distinct': distinct,
+                'expression': self._tokens_to_text(tokens[i:end + 1])
+            })
+        
+        return calls
+    
     def _analyze_order_by(self, query) -> Dict[str, Any]:
         """Analyze ORDER BY clause"""
         order_analysis = {
             'has_order_by': False,
             'columns': [],
+            'keys': [],
             'has_limit': False
         }
         
         tokens = [token.value.upper() for token in query.flatten()]
         
-        if 'ORDER BY' in ' '.join(tokens):
-            order_analysis['has_order_by'] = True
+        # An ORDER BY inside a window specification, subquery or CTE does not sort the result
+        depth = 0
+        for token in self._significant_tokens(query):
+            if token.value == '(':
+                depth += 1
+            elif token.value == ')':
+                depth -= 1
+            elif depth == 0 and ' '.join(token.value.upper().split()) == 'ORDER BY':
+                order_analysis['has_order_by'] = True
         
         if 'LIMIT' in tokens:
             order_analysis['has_limit'] = True
         
+        order_tokens = self._top_level_clauses(query).get('ORDER BY', [])
+        order_analysis['keys'] = self._extract_sort_keys(order_tokens)
+        order_analysis['columns'] = [key['expression'] for key in order_analysis['keys']]
+        
         return order_analysis
     
+    def _extract_sort_keys(self, tokens) -> List[Dict[str, Any]]:
+        """Split an ORDER BY token list into expressions with direction and NULLS ordering"""
+        keys = []
+        
+        for item in self._split_top_level_tokens(tokens):
+            direction = 'ASC'
+            nulls = None
+            expression_tokens = []
+            depth = 0
+            
+            for token in item:
+                upper = ' '.join(token.value.upper().split())
+                if token.value == '(':
+                    depth += 1
+                elif token.value == ')':
+                    depth -= 1
+                
+                if depth == 0 and token.ttype in sqlparse.tokens.Keyword.Order:
+                    direction = upper
+                elif depth == 0 and upper in ('NULLS FIRST', 'NULLS LAST'):
+                    nulls = upper
+                else:
+                    expression_tokens.append(token)
+            
+            expression = self._tokens_to_text(expression_tokens)
+            keys.append({
+                'expression': expression,
+                'direction': direction,
+                'nulls': nulls,
+                'is_column': bool(COLUMN_EXPRESSION.match(expression))
+            })
+        
+        return keys
+    
+    def _analyze_sorts(self, query, analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """Sort keys of ORDER BY, windows, DISTINCT and GROUP BY, with shared window orderings, index order and sort memory"""
+        clauses = self._top_level_clauses(query)
+        references = [ref for ref in self._extract_table_references(query) if ref['depth'] == 0]
+        windows = self._extract_windows(clauses)
+        sorts = {
+            'operations': [],
+            'windows': windows,
+            'window_sorts': 0,
+            'shared_window_sorts': 0,
+            'window_orderings': [],
+            'top_n': False,
+            'limit_rows': None,
+            'estimated_rows': None,
+            'sort_row_bytes': None,
+            'estimated_sort_bytes': None,
+            'sort_method': None,
+            'spills_to_disk': False
+        }
+        
+        select_tokens = clauses.get('SELECT', [])
+        distinct = bool(select_tokens) and select_tokens[0].value.upper() == 'DISTINCT' and not (
+            len(select_tokens) > 1 and select_tokens[1].value.upper() == 'ON')
+        
+        def unordered(expression):
+            return {'expression': expression, 'direction': None, 'nulls': None,
+                    'is_column': bool(COLUMN_EXPRESSION.match(expression))}
+        
+        if analysis['order_by']['keys']:
+            sorts['operations'].append({'source': 'order_by', 'keys': analysis['order_by']['keys'], 'ordered': True})
+        if 'GROUP BY' in clauses and analysis['group_by']['columns']:
+            sorts['operations'].append({'source': 'group_by', 'ordered': False,
+                                        'keys': [unordered(column) for column in analysis['group_by']['columns']]})
+        if distinct:
+            items = [self._split_select_item(item)[0] for item in self._split_top_level_tokens(select_tokens[1:])]
+            sorts['operations'].append({'source': 'distinct', 'ordered': False,
+                                        'keys': [unordered(item) for item in items if item != '*']})
+        for number, window in enumerate(windows):
+            if window['partition_by'] or window['order_by']:
+                sorts['operations'].append({
+                    'source': 'window', 'window': number, 'ordered': True,
+                    'keys': [unordered(expression) for expression in window['partition_by']] + window['order_by']
+                })
+        
+        for operation in sorts['operations']:
+            operation['index_order'] = self._index_order(clauses, operation, references)
+        
+        self._share_window_sorts(sorts)
+        
+        # Memory for the statement's own sort: ORDER BY, otherwise the GROUP BY or DISTINCT sort
+        primary = next((operation for operation in sorts['operations'] if operation['source'] != 'window'), None)
+        limit = analysis['limit']
+        sorts['top_n'] = bool(primary) and primary['source'] == 'order_by' and limit['has_limit']
+        if sorts['top_n'] and limit['limit_value'] is not None:
+            sorts['limit_rows'] = limit['limit_value'] + (limit['offset_value'] or 0)
+        main_table = next((ref for ref in references if not ref['derived']), None)
+        table_entry = self.schema.get_table(main_table['name']) if self.schema and main_table else None
+        
+        if primary and table_entry and table_entry['stats'].get('row_count') is not None:
+            row_count = table_entry['stats']['row_count']
+            rows = max(int(row_count * DEFAULT_SELECTIVITY), 1) if 'WHERE' in clauses else row_count
+            usage = next((entry for entry in analysis['column_usage'] if entry['table'] == table_entry['name']), None)
+            columns = None
+            if usage and not usage['wildcard']:
+                columns = list(dict.fromkeys(usage['select'] + usage['order_by'] + usage['group_by'])) or None
+            row_bytes = self.schema.estimate_row_width(table_entry['name'], columns) + SORT_TUPLE_OVERHEAD_BYTES
+            
+            sorts['estimated_rows'] = rows
+            sorts['sort_row_bytes'] = row_bytes
+            if primary['index_order'] and primary['index_order']['satisfied_by']:
+                sorts['sort_method'] = 'index_scan'
+                sorts['estimated_sort_bytes'] = 0
+            elif sorts['top_n'] and sorts['limit_rows'] is not None and sorts['limit_rows'] < rows \
+                    and 2 * sorts['limit_rows'] * row_bytes <= SORT_MEMORY_BYTES:
+                # A bounded heap keeps only the top N rows (PostgreSQL's top-N heapsort)
+                sorts['sort_method'] = 'top_n_heapsort'
+                sorts['estimated_sort_bytes'] = sorts['limit_rows'] * row_bytes
+            else:
+                sorts['estimated_sort_bytes'] = rows * row_bytes
+                sorts['spills_to_disk'] = sorts['estimated_sort_bytes'] > SORT_MEMORY_BYTES
+                sorts['sort_method'] = 'external_merge' if sorts['spills_to_disk'] else 'quicksort'
+        
+        return sorts
+    
+    def _extract_windows(self, clauses: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+        """Window function calls in the select list with their PARTITION BY, ORDER BY and frame"""
+        named = {}
+        for item in self._split_top_level_tokens(clauses.get('WINDOW', [])):
+            if len(item) >= 3 and item[1].value.upper() == 'AS' and item[2].value == '(':
+                named[normalize_identifier(item[0].value)] = item[3:self._closing_paren(item, 2)]
+        
+        windows = []
+        tokens = clauses.get('SELECT', [])
+        for i, token in enumerate(tokens):
+            if token.value.upper() != 'OVER' or i + 1 >= len(tokens):
+                continue
+            
+            # The call is the name before the parenthesized arguments that precede OVER
+            start = i - 1
+            if start >= 0 and tokens[start].value == ')':
+                depth = 0
+                while start >= 0:
+                    depth += tokens[start].value == ')'
+                    depth -= tokens[start].value == '('
+                    if depth == 0:
+                        break
+                    start -= 1
+                start -= 1
+            function = self._tokens_to_text(tokens[max(start, 0):i])
+            
+            name = None
+            if tokens[i + 1].value == '(':
+                spec = tokens[i + 2:self._closing_paren(tokens, i + 1)]
+            else:
+                name = tokens[i + 1].value
+                spec = named.get(normalize_identifier(name), [])
+            # OVER (w ORDER BY x) extends the named window w
+            if spec and spec[0].ttype in sqlparse.tokens.Name and normalize_identifier(spec[0].value) in named:
+                name = spec[0].value
+                spec = named[normalize_identifier(name)] + spec[1:]
+            
+            window = self._window_specification(spec)
+            window.update({'function': function, 'name': name})
+            windows.append(window)
+        
+        return windows
+    
+    def _window_specification(self, tokens) -> Dict[str, Any]:
+        """Split a window specification into PARTITION BY expressions, ORDER BY keys and the frame"""
+        sections = {'partition': [], 'order': [], 'frame': []}
+        current = None
+        depth = 0
+        
+        for token in tokens:
+            upper = ' '.join(token.value.upper().split())
+            if token.value == '(':
+                depth += 1
+            elif token.value == ')':
+                depth -= 1
+            if depth == 0 and upper in ('PARTITION', 'PARTITION BY'):
+                current = 'partition'
+                continue
+            if depth == 0 and upper == 'BY' and current == 'partition' and not sections['partition']:
+                continue
+            if depth == 0 and upper == 'ORDER BY':
+                current = 'order'
+                continue
+            if depth == 0 and upper in ('ROWS', 'RANGE', 'GROUPS') and current != 'frame':
+                current = 'frame'
+            if current is not None:
+                sections[current].append(token)
+        
+        partition_by = [self._tokens_to_text(item) for item in self._split_top_level_tokens(sections['partition'])]
+        order_by = self._extract_sort_keys(sections['order'])
+        specification = ' '.join(
+            part for part in (
+                f"PARTITION BY {', '.join(partition_by)}" if partition_by else '',
+                f"ORDER BY {self._sort_key_text(order_by)}" if order_by else '',
+                self._tokens_to_text(sections['frame'])
+            ) if part
+        )
+        
+        return {
+            'specification': specification,
+            'partition_by': partition_by,
+            'order_by': order_by,
+            'frame': self._tokens_to_text(sections['frame']) or None,
+            'aligned_specification': specification
+        }
+    
+    def _sort_key_text(self, keys: List[Dict[str, Any]]) -> str:
+        """Render sort keys back into an ORDER BY list"""
+        return ', '.join(
+            key['expression'] + (' DESC' if key['direction'] == 'DESC' else '') + (f" {key['nulls']}" if key['nulls'] else '')
+            for key in keys
+        )
+    
+    def _share_window_sorts(self, sorts: Dict[str, Any]):
+        """Count the sorts the windows need as written, and find orderings that let several windows share one"""
+        windows = sorts['windows']
+        requirements = [
+            (number, [expression.lower() for expression in window['partition_by']],
+             [(key['expression'].lower(), key['direction']) for key in window['order_by']])
+            for number, window in enumerate(windows) if window['partition_by'] or window['order_by']
+        ]
+        
+        # As written, a window reuses a sort only when its ordering is a prefix of another window's ordering
+        written = {tuple([(expression, 'ASC') for expression in partition] + order) for _, partition, order in requirements}
+        sorts['window_sorts'] = sum(
+            1 for ordering in written
+            if not any(other != ordering and other[:len(ordering)] == ordering for other in written)
+        )
+        
+        # PARTITION BY columns can be listed in any order, so one sort may serve several windows
+        orderings = []
+        for number, partition, order in sorted(requirements, key=lambda item: -(len(item[1]) + len(item[2]))):
+            for ordering in orderings:
+                slots = ordering['keys']
+                if len(slots) >= len(partition) + len(order) \
+                        and {slot[0] for slot in slots[:len(partition)]} == set(partition) \
+                        and all(slot[1] == 'ASC' for slot in slots[:len(partition)]) \
+                        and all(tuple(slot) == key for slot, key in zip(slots[len(partition):], order)):
+                    break
+            else:
+                ordering = {'keys': [(expression, 'ASC') for expression in partition] + list(order), 'windows': []}
+                orderings.append(ordering)
+            ordering['windows'].append(number)
+            
+            # Write PARTITION BY in the shared ordering's column order
+            window = windows[number]
+            original = {expression.lower(): expression for expression in window['partition_by']}
+            aligned = [original[slot[0]] for slot in ordering['keys'][:len(partition)]]
+            window['aligned_specification'] = ' '.join(
+                part for part in (
+                    f"PARTITION BY {', '.join(aligned)}" if aligned else '',
+                    f"ORDER BY {self._sort_key_text(window['order_by'])}" if window['order_by'] else '',
+                    window['frame'] or ''
+                ) if part
+            )
+        
+        sorts['shared_window_sorts'] = len(orderings)
+        sorts['window_orderings'] = [
+            {'keys': [expression + (' DESC' if direction == 'DESC' else '') for expression, direction in ordering['keys']],
+             'windows': sorted(ordering['windows'])}
+            for ordering in orderings
+        ]
+    
+    def _index_order(self, clauses: Dict[str, List[Any]], operation: Dict[str, Any],
+                     references: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """An existing index that returns rows in the sort's order, or the index that would"""
+        main_table = next((ref for ref in references if not ref['derived']), None)
+        keys = [dict(key, direction=key['direction'] or 'ASC') for key in operation['keys']]
+        columns = self._keyset_index_columns(clauses, keys, main_table, references)
+        if not columns:
+            return None
+        
+        table = normalize_identifier(main_table['name'])
+        sort_columns = [normalize_identifier(key['expression']) for key in keys]
+        equality = [column for column in columns if column not in sort_columns and not column.endswith(' DESC')]
+        # Equality-filtered sort keys are constant and need no ordering
+        needed = [(column, key['direction'] == 'DESC') for column, key in zip(sort_columns, keys) if column not in equality]
+        index_order = {
+            'table': table,
+            'satisfied_by': None,
+            'backward': False,
+            'index_columns': columns,
+            'checked': bool(self.schema and self.schema.get_table(table)),
+            'statement': f"CREATE INDEX idx_{table}_{'_'.join(column.split()[0] for column in columns)}_sort"[:63]
+                         + f" ON {main_table['name']} ({', '.join(columns)});"
+        }
+        if not self.schema or not needed:
+            return index_order
+        
+        for index in self.schema.get_indexes(table):
+            if index['method'] != 'btree' or index['where']:
+                continue
+            remaining = list(needed)
+            flips = set()
+            for column, descending in zip(index['columns'], index.get('descending') or [False] * len(index['columns'])):
+                if not remaining:
+                    break
+                if operation['ordered'] and column == remaining[0][0]:
+                    flips.add(descending != remaining.pop(0)[1])
+                elif not operation['ordered'] and column in [entry[0] for entry in remaining]:
+                    remaining = [entry for entry in remaining if entry[0] != column]
+                elif column not in equality:
+                    break
+            # Every key in the index's direction, or every key reversed for a backward scan
+            if not remaining and len(flips) <= 1:
+                index_order['satisfied_by'] = index['name']
+                index_order['backward'] = flips == {True}
+                break
+        
+        return index_order
+    
     def _analyze_limit(self, query) -> Dict[str, Any]:
-        """Analyze LIMIT clause"""
+        """Analyze LIMIT / OFFSET / FETCH FIRST / TOP pagination clauses"""
         limit_analysis = {
             'has_limit': False,
-            'limit_value': None
+            'limit_value': None,
+            'limit_parameterized': False,
+            'has_offset': False,
+            'offset_value': None,
+            'offset_parameterized': False,
+            'syntax': None
         }
         
-        tokens = [token.value for token in query.flatten()]
+        clauses = self._top_level_clauses(query)
         
-        for i, token in enumerate(tokens):
-            if token.upper() == 'LIMIT' and i + 1 < len(tokens):
-                try:
-                    limit_analysis['limit_value'] = int(tokens[i + 1])
-                    limit_analysis['has_limit'] = True
-                except ValueError:
-                    pass
-                break
+        if 'LIMIT' in clauses:
+            parts = self._split_top_level_tokens(clauses['LIMIT'])
+            if len(parts) == 2:
+                # MySQL: LIMIT offset, count
+                self._set_pagination_value(limit_analysis, 'offset', parts[0])
+                self._set_pagination_value(limit_analysis, 'limit', parts[1])
+                limit_analysis['syntax'] = 'limit_comma'
+            elif parts:
+                self._set_pagination_value(limit_analysis, 'limit', parts[0])
+                limit_analysis['syntax'] = 'limit'
+        
+        if 'OFFSET' in clauses:
+            self._set_pagination_value(limit_analysis, 'offset', clauses['OFFSET'])
+            limit_analysis['syntax'] = limit_analysis['syntax'] or 'offset_fetch'
+        
+        if 'FETCH' in clauses:
+            fetch_tokens = [token for token in clauses['FETCH'] if token.value.upper() not in ('FIRST', 'NEXT')]
+            if fetch_tokens and fetch_tokens[0].value.upper() in ('ROW', 'ROWS'):
+                limit_analysis['has_limit'] = True
+                limit_analysis['limit_value'] = 1
+            else:
+                self._set_pagination_value(limit_analysis, 'limit', fetch_tokens)
+            limit_analysis['syntax'] = 'offset_fetch' if limit_analysis['has_offset'] else 'fetch_first'
+        
+        select_tokens = clauses.get('SELECT', [])
+        while select_tokens and select_tokens[0].value.upper() in ('DISTINCT', 'ALL'):
+            select_tokens = select_tokens[1:]
+        if select_tokens and select_tokens[0].value.upper() == 'TOP':
+            self._set_pagination_value(limit_analysis, 'limit', select_tokens[1:])
+            limit_analysis['syntax'] = 'top'
         
         return limit_analysis
     
+    def _set_pagination_value(self, limit_analysis: Dict[str, Any], kind: str, tokens):
+        """Record a LIMIT/OFFSET operand as an integer or as a bind parameter"""
+        operand = next((token for token in tokens if token.value not in ('(', ')')), None)
+        if operand is None or operand.value.upper() == 'ALL':
+            return
+        
+        if operand.ttype in sqlparse.tokens.Literal.Number.Integer:
+            limit_analysis[f'{kind}_value'] = int(operand.value)
+            limit_analysis[f'has_{kind}'] = True
+        elif operand.ttype in sqlparse.tokens.Name.Placeholder or operand.ttype in sqlparse.tokens.Name:
+            limit_analysis[f'{kind}_parameterized'] = True
+            limit_analysis[f'has_{kind}'] = True
+    
+    def _analyze_pagination(self, query, analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """Detect deep OFFSET pagination and collect what a keyset (seek) rewrite needs"""
+        limit = analysis['limit']
+        keys = analysis['order_by']['keys']
+        pagination = {
+            'deep_offset': False,
+            'order_by_unique': None,
+            'tie_breaker': [],
+            'nullable_keys': [],
+            'keyset': None
+        }
+        
+        if not limit['has_offset']:
+            return pagination
+        
+        pagination['deep_offset'] = limit['offset_parameterized'] or (limit['offset_value'] or 0) >= DEEP_OFFSET_THRESHOLD
+        if not keys:
+            return pagination
+        
+        clauses = self._top_level_clauses(query)
+        references = [ref for ref in self._extract_table_references(query) if ref['depth'] == 0]
+        main_table = next((ref for ref in references if not ref['derived']), None)
+        
+        # Keyset pagination needs a total order: the sort keys must cover a unique key
+        if self.schema and main_table and self.schema.get_table(main_table['name']):
+            resolved = [self._resolve_column(key['expression'], references) for key in keys]
+            sorted_columns = defaultdict(set)
+            for table_column in resolved:
+                if table_column:
+                    sorted_columns[table_column[0]].add(table_column[1])
+            
+            pagination['order_by_unique'] = any(
+                set(unique_key) <= sorted_columns[table_name]
+                for table_name in sorted_columns
+                for unique_key in (self.schema.get_table(table_name) or {}).get('unique_keys', [])
+            )
+            # A row-value comparison is never true for NULL, so seeking on a nullable key skips those rows
+            pagination['nullable_keys'] = [
+                key['expression'] for key, table_column in zip(keys, resolved)
+                if table_column and self.schema.get_table(table_column[0])['columns'].get(table_column[1], {}).get('nullable')
+            ]
+            
+            table_entry = self.schema.get_table(main_table['name'])
+            if not pagination['order_by_unique'] and table_entry and table_entry['primary_key']:
+                qualifier = main_table['alias'] or main_table['name'] if len(references) > 1 else None
+                pagination['tie_breaker'] = [
+                    f"{qualifier}.{column}" if qualifier else column
+                    for column in table_entry['primary_key']
+                    if column not in sorted_columns[normalize_identifier(main_table['name'])]
+                ]
+        
+        # The client binds the last row's sort keys, so they have to be in the select list
+        base_query = self._query_prefix(query, {'WHERE', 'GROUP BY', 'HAVING', 'ORDER BY', 'LIMIT', 'OFFSET', 'FETCH'})
+        select_list = self._query_prefix(query, {'FROM'})
+        missing = self._unselected_keys(clauses.get('SELECT', []), [key['expression'] for key in keys] + pagination['tie_breaker'])
+        if missing and base_query.startswith(select_list):
+            base_query = f"{select_list}, {', '.join(missing)}{base_query[len(select_list):]}"
+        
+        pagination['keyset'] = {
+            'base_query': base_query,
+            'added_columns': missing,
+            'where': self._tokens_to_text(clauses['WHERE']) if 'WHERE' in clauses else None,
+            'rewritable': 'GROUP BY' not in clauses and 'HAVING' not in clauses and limit['syntax'] != 'top',
+            'table': main_table['name'] if main_table else None,
+            'index_columns': self._keyset_index_columns(clauses, keys + [
+                {'expression': column, 'direction': keys[-1]['direction'], 'nulls': None, 'is_column': True}
+                for column in pagination['tie_breaker']
+            ], main_table, references)
+        }
+        
+        return pagination
+    
+    def _unselected_keys(self, select_tokens: List[Any], expressions: List[str]) -> List[str]:
+        """Sort-key expressions that the select list neither contains nor covers with a wildcard"""
+        items = [self._tokens_to_text(item) for item in self._split_top_level_tokens(select_tokens) if item]
+        if any(item == '*' or item.endswith('.*') for item in items):
+            return []
+        selected = set()
+        for item in items:
+            selected.add(' '.join(item.lower().split()))
+            # Both the expression and the name the client receives it under count as selected
+            name = re.search(r'([\w"`\]\[]+)\s*$', item)
+            if name:
+                selected.add(normalize_identifier(name.group(1)))
+            selected.add(' '.join(re.sub(r'\s+AS\s+\S+$', '', item, flags=re.IGNORECASE).lower().split()))
+        return [
+            expression for expression in dict.fromkeys(expressions)
+            if ' '.join(expression.lower().split()) not in selected and normalize_identifier(expression) not in selected
+        ]
+    
+    def _keyset_index_columns(self, clauses: Dict[str, List[Any]], keys: List[Dict[str, Any]], main_table,
+                              references: List[Dict[str, Any]]) -> List[str]:
+        """Equality-filtered columns followed by the sort keys, when all belong to the main table"""
+        if not main_table:
+            return []
+        
+        own_names = {normalize_identifier(main_table['name'])}
+        if main_table['alias']:
+            own_names.add(normalize_identifier(main_table['alias']))
+        
+        def own_column(expression):
+            parts = expression.split('.')
+            if len(parts) == 2 and normalize_identifier(parts[0]) not in own_names:
+                return None
+            if len(parts) == 1 and len([ref for ref in references if not ref['derived']]) > 1:
+                return None
+            return normalize_identifier(parts[-1])
+        
+        columns = []
+        where_text = self._tokens_to_text(clauses['WHERE']) if 'WHERE' in clauses else ''
+        # Equality filters only lead the index when they are ANDed together
+        if where_text and not OR_OPERATOR.search(where_text):
+            for match in EQUALITY_FILTER.finditer(where_text):
+                column = own_column(f"{match.group(1)}.{match.group(2)}" if match.group(1) else match.group(2))
+                if column and column not in columns:
+                    columns.append(column)
+        
+        for key in keys:
+            column = own_column(key['expression']) if key['is_column'] else None
+            if column is None:
+                return []
+            if column not in columns:
+                columns.append(column + (' DESC' if key['direction'] == 'DESC' else ''))
+        
+        return columns
+    
+    def _analyze_write_path(self, query, analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """Analyze UPDATE/DELETE statements for full-table, non-sargable and unbounded writes"""
+        write_analysis = {
+            'is_write': analysis['query_type'] in ('UPDATE', 'DELETE'),
+            'target_table': None,
+            'where': None,
+            'non_sargable_predicates': [],
+            'point_write': False,
+            'unbounded': False,
+            'set_clause': None,
+            'updated_columns': [],
+            'indexed_columns_updated': [],
+            'estimated_rows': None,
+            'batchable': False,
+            'batch_key': None
+        }
+        
+        if not write_analysis['is_write']:
+            return write_analysis
+        
+        clauses = self._top_level_clauses(query)
+        references = [ref for ref in self._extract_table_references(query) if ref['depth'] == 0]
+        target = references[0] if references and not references[0]['derived'] else None
+        write_analysis['target_table'] = target['name'] if target else None
+        
+        if 'WHERE' in clauses:
+            write_analysis['where'] = self._tokens_to_text(clauses['WHERE'])
+            write_analysis['non_sargable_predicates'] = self._find_non_sargable_predicates(write_analysis['where'])
+        
+        if analysis['query_type'] == 'UPDATE':
+            write_analysis['set_clause'] = self._tokens_to_text(clauses.get('SET', []))
+            for assignment in self._split_top_level_tokens(clauses.get('SET', [])):
+                if assignment:
+                    write_analysis['updated_columns'].append(normalize_identifier(assignment[0].value))
+        
+        table_entry = self.schema.get_table(target['name']) if self.schema and target else None
+        unique_keys = table_entry['unique_keys'] if table_entry else [['id']]
+        equality_columns = set()
+        if write_analysis['where'] and not OR_OPERATOR.search(write_analysis['where']):
+            for match in EQUALITY_FILTER.finditer(write_analysis['where']):
+                equality_columns.add(normalize_identifier(match.group(2)))
+        
+        write_analysis['point_write'] = any(set(key) <= equality_columns for key in unique_keys)
+        write_analysis['unbounded'] = not write_analysis['point_write'] and not analysis['limit']['has_limit']
+        
+        if table_entry:
+            indexed = {column for index in table_entry['indexes'] for column in index['columns'] + index['include']}
+            write_analysis['indexed_columns_updated'] = [
+                column for column in write_analysis['updated_columns'] if column in indexed
+            ]
+            if table_entry['stats'].get('row_count') is not None and not write_analysis['point_write']:
+                # Without selectivity statistics the table size is the upper bound
+                write_analysis['estimated_rows'] = table_entry['stats']['row_count']
+        
+        # Chunking is generated for single-table writes only (no UPDATE ... FROM / multi-table DELETE)
+        if target is not None and len(references) == 1 and 'USING' not in clauses and not (
+                analysis['query_type'] == 'UPDATE' and 'FROM' in clauses):
+            write_analysis['batch_key'] = resolve_batch_key(self.schema, target['name'],
+                                                            tuple(write_analysis['updated_columns']))
+        else:
+            write_analysis['batch_key'] = {'column': None, 'reason': 'the statement writes through a join or to '
+                                                                     'several tables, which batching does not cover'}
+        write_analysis['batchable'] = write_analysis['batch_key']['column'] is not None
+        
+        return write_analysis
+    
+    def _analyze_ddl(self, query) -> Dict[str, Any]:
+        """Lock level, table rewrite and online alternative of CREATE/ALTER/DROP statements"""
+        first = query.token_first(skip_cm=True)
+        if first is None or first.normalized not in ('CREATE', 'ALTER', 'DROP'):
+            return {
+                'is_ddl': False,
+                'dialect': None,
+                'operations': [],
+                'lock': None,
+                'blocks': 'nothing',
+                'estimated_seconds': None,
+                'rewrite': False,
+                'issues': []
+            }
+        return self.ddl_analyzer.analyze_statement(str(query))
+    
+    def _find_non_sargable_predicates(self, where_text: str) -> List[str]:
+        """Predicates that keep an index from being used to locate the matching rows"""
+        predicates = []
+        
+        for match in FUNCTION_CALL.finditer(where_text):
+            if match.group(1).upper() not in ('IN', 'EXISTS', 'ANY', 'ALL', 'NOT', 'AND', 'OR', 'VALUES') \
+                    and not NUMBER_TEXT.match(match.group(2)):
+                predicates.append(f"function {match.group(1).upper()}() applied to {match.group(2)}")
+        for pattern, description in NON_SARGABLE_RULES:
+            if pattern.search(where_text):
+                predicates.append(description)
+        
+        return predicates
+    
+    def _find_type_mismatches(self, query) -> List[Dict[str, Any]]:
+        """Comparisons whose sides differ in type family or collation, typed from the schema catalog"""
+        if not self.schema:
+            return []
+        
+        references = self._extract_table_references(query)
+        clauses = self._top_level_clauses(query)
+        flipped = {'<': '>', '>': '<', '<=': '>=', '>=': '<='}
+        conditions = [('where', condition) for condition in self._split_conjuncts(clauses.get('WHERE', []))]
+        conditions += [('join_condition', condition) for condition in self._join_conditions(clauses.get('FROM', []))]
+        mismatches = []
+        
+        for location, condition in conditions:
+            condition = SPLIT_NATIONAL_LITERAL.sub("N'", condition)
+            match = COLUMN_COMPARISON.match(condition)
+            if match:
+                left = self._typed_column(match.group(1), references)
+                right = self._typed_column(match.group(3), references)
+                reason = self._column_mismatch(left, right) if left and right else None
+                if reason:
+                    mismatches.append({
+                        'kind': 'join', 'reason': reason, 'location': location, 'condition': condition,
+                        'operator': match.group(2), 'column': left, 'other_column': right,
+                        'literals': [], 'literal_category': None
+                    })
+                continue
+            
+            match = LITERAL_COMPARISON.match(condition)
+            if match:
+                expression, operator_text = match.group(1), match.group(2) or (match.group(3) or match.group(4)).upper()
+                literals = LITERAL.findall(condition[len(expression):])
+            else:
+                match = REVERSED_LITERAL_COMPARISON.match(condition)
+                if not match:
+                    continue
+                expression, operator_text = match.group(3), flipped.get(match.group(2), match.group(2))
+                literals = [match.group(1)]
+            
+            typed = self._typed_column(expression, references)
+            if not typed:
+                continue
+            categories = [self._literal_category(value) for value in literals]
+            mismatched = [category for category in categories if self._literal_mismatch(typed['category'], category)]
+            if mismatched:
+                mismatches.append({
+                    'kind': 'literal', 'reason': 'type', 'location': location, 'condition': condition,
+                    'operator': operator_text, 'column': typed, 'other_column': None,
+                    'literals': literals, 'literal_category': mismatched[0]
+                })
+        
+        return mismatches
+    
+    def _typed_column(self, expression: str, references: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Schema type, collation and index facts for a column expression"""
+        resolved = self._resolve_column(expression, references)
+        table = self.schema.get_table(resolved[0]) if resolved else None
+        if not table or resolved[1] not in table['columns']:
+            return None
+        
+        name = resolved[1]
+        column = table['columns'][name]
+        collation = (column['collation'] or table.get('collation') or '').lower() or None
+        charset = column.get('charset') or (collation.split('_')[0] if collation and collation.split('_')[0] in MYSQL_CHARSETS else None) \
+            or table.get('charset')
+        return {
+            'expression': expression,
+            'table': table['name'],
+            'column': name,
+            'type': column['type'],
+            'category': column_type_category(column['type']),
+            'width': estimate_column_width(column['type']),
+            'nullable': column['nullable'],
+            'collation': collation,
+            'charset': 'utf8mb3' if charset == 'utf8' else charset,
+            'indexed': any(index['columns'][0] == name for index in table['indexes'])
+        }
+    
+    def _literal_category(self, literal: str) -> str:
+        """Type family of a SQL literal"""
+        if NATIONAL_LITERAL.match(literal):
+            return 'national_string'
+        if literal.startswith("'"):
+            return 'string'
+        if 'e' in literal.lower():
+            return 'float'
+        return 'decimal' if '.' in literal else 'integer'
+    
+    def _literal_mismatch(self, category: str, literal_category: str) -> bool:
+        """Whether comparing a column with the literal needs a conversion that can land on the column"""
+        # A quoted literal compared with a numeric or temporal column is converted on the literal side everywhere
+        return ((category in STRING_CATEGORIES and literal_category in NUMERIC_CATEGORIES)
+                or (category == 'integer' and literal_category in ('decimal', 'float'))
+                or (category == 'string' and literal_category == 'national_string'))
+    
+    def _column_mismatch(self, left: Dict[str, Any], right: Dict[str, Any]) -> Optional[str]:
+        """'type' or 'collation' when two compared columns differ, None when they match"""
+        categories = {left['category'], right['category']}
+        if categories <= NUMERIC_CATEGORIES:
+            same_integer = categories == {'integer'} and left['width'] == right['width']
+            return None if same_integer or categories <= {'decimal'} or categories <= {'float'} else 'type'
+        if categories <= STRING_CATEGORIES:
+            if len(categories) > 1:
+                return 'type'
+            if (left['collation'] and right['collation'] and left['collation'] != right['collation']) \
+                    or (left['charset'] and right['charset'] and left['charset'] != right['charset']):
+                return 'collation'
+            return None
+        if categories & NUMERIC_CATEGORIES and categories & STRING_CATEGORIES:
+            return 'type'
+        return None
+    
     def _find_subqueries(self, query) -> List[Dict[str, Any]]:
-        """Find and analyze subqueries"""
+        """Find subqueries in the SELECT list, FROM, WHERE and HAVING and classify them"""
+        tokens = [token for token in query.flatten() if token.ttype not in sqlparse.tokens.Comment]
+        significant = [i for i, token in enumerate(tokens) if not token.is_whitespace]
+        all_references = self._extract_table_references(query)
         subqueries = []
+        open_parens = []
+        clauses = {0: None}
+        depth = 0
+        
+        for position, i in enumerate(significant):
+            token = tokens[i]
+            keyword = ' '.join(token.value.upper().split())
+            
+            if token.value == '(':
+                following = tokens[significant[position + 1]] if position + 1 < len(significant) else None
+                open_parens.append({
+                    'index': i,
+                    'position': position,
+                    'subquery': following is not None and following.value.upper() in ('SELECT', 'WITH'),
+                    'clause': clauses.get(depth)
+                })
+                depth += 1
+                clauses[depth] = None
+            elif token.value == ')' and open_parens:
+                paren = open_parens.pop()
+                depth -= 1
+                if paren['subquery']:
+                    subqueries.append(self._describe_subquery(tokens, significant, paren, position, depth, all_references))
+            elif token.ttype in sqlparse.tokens.Keyword:
+                if keyword in CLAUSE_KEYWORDS or keyword == 'ON':
+                    clauses[depth] = keyword
+                elif keyword.endswith('JOIN'):
+                    clauses[depth] = 'FROM'
+        
+        return sorted(subqueries, key=lambda subquery: subquery['position'])
+    
+    def _describe_subquery(self, tokens, significant: List[int], paren: Dict[str, Any], close_position: int,
+                           depth: int, all_references: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Classify one parenthesized subquery and detect its correlation with the enclosing query"""
+        # Each subquery is parsed again below, so deeply nested SQL costs a parse per level
+        self._checkpoint()
+        content = ''.join(token.value for token in tokens[paren['index'] + 1:significant[close_position]]).strip()
+        before = [tokens[i] for i in significant[max(paren['position'] - 6, 0):paren['position']]]
+        previous = ' '.join(before[-1].value.upper().split()) if before else ''
+        previous_2 = ' '.join(before[-2].value.upper().split()) if len(before) > 1 else ''
+        after = [tokens[i] for i in significant[close_position + 1:close_position + 3]]
+        clause = paren['clause']
+        
+        subquery = {
+            'type': 'subquery',
+            'kind': 'scalar',
+            'location': SUBQUERY_LOCATIONS.get(clause, (clause or 'expression').lower()),
+            'depth': depth + 1,
+            'position': paren['position'],
+            'content': content,
+            'alias': None,
+            'outer_expression': None,
+            'operator': None,
+            'correlated': False,
+            'correlated_columns': [],
+            'correlated_tables': {},
+            'correlation_predicates': [],
+            'inner_filters': [],
+            'correlated_filters': [],
+            'inner_select': None,
+            'inner_from': None,
+            'inner_table': None,
+            'aggregate': None,
+            'estimated_executions': None
+        }
+        
+        if previous == 'EXISTS':
+            subquery['kind'] = 'not_exists' if previous_2 == 'NOT' else 'exists'
+        elif previous in ('IN', 'NOT IN'):
+            subquery['kind'] = 'not_in' if previous == 'NOT IN' or previous_2 == 'NOT' else 'in'
+            operand = before[:-2] if previous_2 == 'NOT' else before[:-1]
+            subquery['outer_expression'] = self._trailing_expression(operand)
+        elif previous in ('ANY', 'ALL', 'SOME'):
+            subquery['kind'] = 'quantified'
+            subquery['operator'] = f"{previous_2} {previous}"
+            subquery['outer_expression'] = self._trailing_expression(before[:-2])
+        elif clause == 'FROM' or previous == 'LATERAL':
+            subquery['kind'] = 'lateral' if previous == 'LATERAL' else 'derived_table'
+        elif clause == 'WITH':
+            subquery['kind'] = 'cte'
+            names = [token.value for token, following in zip(before, before[1:]) if following.value.upper() == 'AS']
+            subquery['alias'] = names[-1] if names else None
+        elif before and before[-1].ttype in sqlparse.tokens.Operator.Comparison:
+            subquery['operator'] = previous
+            subquery['outer_expression'] = self._trailing_expression(before[:-1])
+        
+        if after and after[0].value.upper() == 'AS':
+            after = after[1:]
+        if subquery['kind'] != 'cte' and after and (after[0].ttype in sqlparse.tokens.Name or after[0].ttype in sqlparse.tokens.Keyword) \
+                and ' '.join(after[0].value.upper().split()) not in TABLE_CLAUSE_END | CLAUSE_KEYWORDS | SET_OPERATORS \
+                and not after[0].value.upper().endswith('JOIN') and after[0].value.upper() not in ('AND', 'OR', 'ON'):
+            subquery['alias'] = after[0].value
+        
+        parsed = sqlparse.parse(content)
+        if not parsed:
+            return subquery
+        inner = parsed[0]
+        inner_clauses = self._top_level_clauses(inner)
+        inner_references = self._extract_table_references(inner)
+        
+        inner_names = set()
+        for ref in inner_references:
+            if ref['name']:
+                inner_names.add(normalize_identifier(ref['name']))
+            if ref['alias']:
+                inner_names.add(normalize_identifier(ref['alias']))
+        outer_tables = {}
+        for ref in all_references:
+            if ref['name']:
+                outer_tables.setdefault(normalize_identifier(ref['name']), ref['name'])
+            if ref['alias']:
+                outer_tables.setdefault(normalize_identifier(ref['alias']), ref['name'] or ref['alias'])
+        
+        # A qualifier that is not defined inside the subquery refers to an enclosing query
+        literal_free = STRING_LITERAL.sub("''", content)
+        for qualifier, column in QUALIFIED_REFERENCE.findall(literal_free):
+            normalized = normalize_identifier(qualifier)
+            if normalized not in inner_names and normalized in outer_tables:
+                reference = f"{qualifier}.{column}"
+                if reference not in subquery['correlated_columns']:
+                    subquery['correlated_columns'].append(reference)
+                    subquery['correlated_tables'][qualifier] = outer_tables[normalized]
+        subquery['correlated'] = bool(subquery['correlated_columns'])
+        
+        top_references = [ref for ref in inner_references if ref['depth'] == 0 and not ref['derived']]
+        if top_references:
+            subquery['inner_table'] = top_references[0]['name']
+        subquery['inner_select'] = self._tokens_to_text(inner_clauses.get('SELECT', []))
+        subquery['inner_from'] = self._tokens_to_text(inner_clauses.get('FROM', []))
+        aggregate = LEADING_CALL.match(subquery['inner_select'] or '')
+        if aggregate and aggregate.group(1).upper() in AGGREGATE_FUNCTIONS and 'GROUP BY' not in inner_clauses:
+            subquery['aggregate'] = aggregate.group(1).upper()
+        
+        outer_qualifiers = {reference.split('.')[0] for reference in subquery['correlated_columns']}
+        for conjunct in self._split_conjuncts(inner_clauses.get('WHERE', [])):
+            equality = COLUMN_EQUALITY.match(conjunct)
+            sides = [equality.group(1), equality.group(2)] if equality else []
+            outer_sides = [side for side in sides if '.' in side and side.split('.')[0] in outer_qualifiers]
+            if len(outer_sides) == 1:
+                inner_side = sides[1] if sides[0] == outer_sides[0] else sides[0]
+                subquery['correlation_predicates'].append({'inner': inner_side, 'outer': outer_sides[0]})
+            elif any(qualifier in outer_qualifiers for qualifier, _ in QUALIFIED_REFERENCE.findall(STRING_LITERAL.sub("''", conjunct))):
+                # Other predicates on the outer row cannot move into a derived table that is joined afterwards
+                subquery['correlated_filters'].append(conjunct)
+            else:
+                subquery['inner_filters'].append(conjunct)
+        
+        if subquery['correlated'] and self.schema:
+            qualifier = normalize_identifier(next(iter(outer_qualifiers)))
+            table_entry = self.schema.get_table(outer_tables.get(qualifier, qualifier))
+            if table_entry and table_entry['stats'].get('row_count') is not None:
+                subquery['estimated_executions'] = table_entry['stats']['row_count']
+        
+        return subquery
+    
+    def _trailing_expression(self, tokens) -> Optional[str]:
+        """The column reference (name or qualifier.name) at the end of a token list"""
+        parts = []
+        for token in reversed(tokens):
+            if token.ttype in sqlparse.tokens.Name or token.value == '.':
+                parts.insert(0, token.value)
+            else:
+                break
+        return ''.join(parts) or None
+    
+    def _split_conjuncts(self, tokens) -> List[str]:
+        """Split a predicate token list on top-level AND (BETWEEN ... AND ... stays intact)"""
+        conjuncts = [[]]
+        depth = 0
+        pending_between = False
+        
+        for token in tokens:
+            upper = token.value.upper()
+            if token.value == '(':
+                depth += 1
+            elif token.value == ')':
+                depth -= 1
+            elif depth == 0 and upper == 'BETWEEN':
+                pending_between = True
+            elif depth == 0 and upper == 'AND':
+                if pending_between:
+                    pending_between = False
+                else:
+                    conjuncts.append([])
+                    continue
+            conjuncts[-1].append(token)
+        
+        return [self._tokens_to_text(conjunct) for conjunct in conjuncts if conjunct]
+    
+    def _analyze_ctes(self, query, analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """Analyze CTEs and derived tables: reference counts, outer filters that could move inside, recursion bounds"""
+        cte_analysis = {'has_ctes': False, 'recursive': False, 'definitions': [], 'derived_tables': []}
+        tokens = [token for token in self._significant_tokens(query) if token.value != ';']
+        definitions, main_tokens, recursive = self._split_with_clause(tokens)
+        
+        main = query
+        if definitions:
+            self._checkpoint()
+            parsed = sqlparse.parse(self._tokens_to_text(main_tokens))
+            main = parsed[0] if parsed else query
+        main_clauses = self._top_level_clauses(main)
+        main_references = self._extract_table_references(main)
+        outer_references = [ref for ref in main_references if ref['depth'] == 0]
+        conjuncts = self._split_conjuncts(main_clauses.get('WHERE', []))
+        single_source = len(outer_references) == 1
+        # WHERE conditions on the NULL-filled side of an outer join (c.id IS NULL in an anti-join) must stay outside
+        null_supplying = self._null_supplying(main_clauses.get('FROM', []), outer_references)
+        names = {normalize_identifier(definition['name']) for definition in definitions}
+        
+        views = [self._describe_view(definition['name'], definition['tokens'], definition['columns'])
+                 for definition in definitions]
+        used_names = [view.pop('_names') for view in views]
+        for number, (definition, view) in enumerate(zip(definitions, views)):
+            name = normalize_identifier(definition['name'])
+            view['tables'] = [table for table in view['tables'] if normalize_identifier(table) not in names]
+            view['ctes_used'] = [other['name'] for other in definitions
+                                 if normalize_identifier(other['name']) in used_names[number] and other is not definition]
+            view['materialized'] = definition['materialized']
+            view['recursive'] = name in used_names[number]
+            
+            referenced_by = ['main'] * sum(
+                1 for ref in main_references if ref['name'] and normalize_identifier(ref['name']) == name)
+            for other_number, other in enumerate(definitions):
+                if other_number != number:
+                    referenced_by.extend([other['name']] * used_names[other_number].count(name))
+            view['references'] = len(referenced_by)
+            view['referenced_by'] = list(dict.fromkeys(referenced_by))
+            count = view['references']
+            
+            # A filter on every reference can move into the definition; otherwise only the planner can push it
+            qualifiers = [ref['alias'] or ref['name'] for ref in outer_references
+                          if ref['name'] and normalize_identifier(ref['name']) == name]
+            pushed = []
+            for qualifier in qualifiers:
+                predicates = [] if normalize_identifier(qualifier) in null_supplying else \
+                    self._pushdown_predicates(view, qualifier, conjuncts, single_source)
+                view['pushdown'].extend(predicates)
+                pushed.append(sorted({predicate['pushed_predicate'] for predicate in predicates}))
+            if pushed and pushed[0] and len(qualifiers) == count and all(entry == pushed[0] for entry in pushed):
+                view['pushed_content'] = self._rebuild_query(definition['tokens'], predicates=pushed[0])
+            
+            view['termination'] = None
+            view['unbounded'] = False
+            view['bounded_definition'] = None
+            if view['recursive']:
+                view['termination'], member_qualifier = self._recursion_bound(definition, view, main_clauses)
+                view['unbounded'] = view['termination'] is None
+                if view['unbounded'] and member_qualifier:
+                    view['bounded_definition'] = self._bounded_recursion(definition, view, member_qualifier)
+            
+            view['inline_query'] = None
+            if count == 1 and view['referenced_by'] == ['main'] and not view['recursive'] and not view['data_modifying']:
+                view['inline_query'] = self._inline_cte(definitions, definition, main_tokens, recursive)
+        
+        for subquery in analysis['subqueries']:
+            if subquery['kind'] != 'derived_table' or subquery['depth'] != 1 or not subquery['alias']:
+                continue
+            parsed = sqlparse.parse(subquery['content'])
+            if not parsed:
+                continue
+            inner_tokens = [token for token in self._significant_tokens(parsed[0]) if token.value != ';']
+            view = self._describe_view(subquery['alias'], inner_tokens, [])
+            view.pop('_names')
+            if normalize_identifier(subquery['alias']) not in null_supplying:
+                view['pushdown'] = self._pushdown_predicates(view, subquery['alias'], conjuncts, single_source)
+            if view['pushdown']:
+                view['pushed_content'] = self._rebuild_query(
+                    inner_tokens, predicates=sorted({predicate['pushed_predicate'] for predicate in view['pushdown']}))
+            cte_analysis['derived_tables'].append(view)
+        
+        cte_analysis['has_ctes'] = bool(definitions)
+        cte_analysis['recursive'] = recursive
+        cte_analysis['definitions'] = views
+        return cte_analysis
+    
+    def _split_with_clause(self, tokens) -> Tuple[List[Dict[str, Any]], List[Any], bool]:
+        """Split a leading WITH list into CTE definitions; returns them, the main query tokens and RECURSIVE"""
+        if not tokens or tokens[0].ttype not in sqlparse.tokens.Keyword.CTE:
+            return [], tokens, False
+        
+        recursive = len(tokens) > 1 and tokens[1].value.upper() == 'RECURSIVE'
+        definitions = []
+        i = 2 if recursive else 1
+        
+        while i + 2 < len(tokens):
+            start = i
+            definition = {'name': tokens[i].value, 'columns': [], 'materialized': None, 'tokens': [],
+                          'cycle_clause': False, 'text': ''}
+            i += 1
+            if tokens[i].value == '(':
+                end = self._closing_paren(tokens, i)
+                definition['columns'] = [token.value for token in tokens[i + 1:end] if token.value != ',']
+                i = end + 1
+            if i >= len(tokens) or tokens[i].value.upper() != 'AS':
+                break
+            i += 1
+            if i + 1 < len(tokens) and tokens[i].value.upper() == 'NOT' and tokens[i + 1].value.upper() == 'MATERIALIZED':
+                definition['materialized'] = False
+                i += 2
+            elif i < len(tokens) and tokens[i].value.upper() == 'MATERIALIZED':
+                definition['materialized'] = True
+                i += 1
+            if i >= len(tokens) or tokens[i].value != '(':
+                break
+            end = self._closing_paren(tokens, i)
+            definition['tokens'] = tokens[i + 1:end]
+            i = end + 1
+            # PostgreSQL 14 SEARCH and CYCLE clauses follow the body
+            while i < len(tokens) and tokens[i].value != ',' and tokens[i].ttype not in sqlparse.tokens.DML:
+                definition['cycle_clause'] = definition['cycle_clause'] or tokens[i].value.upper() == 'CYCLE'
+                i += 1
+            definition['text'] = self._tokens_to_text(tokens[start:i])
+            definitions.append(definition)
+            if i >= len(tokens) or tokens[i].value != ',':
+                break
+            i += 1
+        
+        return definitions, tokens[i:], recursive
+    
+    def _closing_paren(self, tokens, start: int) -> int:
+        """Index of the parenthesis that closes the one at `start` (the last index when it is unbalanced)"""
+        depth = 0
+        
+        for i in range(start, len(tokens)):
+            if tokens[i].value == '(':
+                depth += 1
+            elif tokens[i].value == ')':
+                depth -= 1
+                if depth == 0:
+                    return i
+        
+        return len(tokens) - 1
+    
+    def _set_branches(self, tokens) -> Tuple[List[List[Any]], List[str]]:
+        """Split a query's tokens on top-level UNION / EXCEPT / INTERSECT"""
+        branches = [[]]
+        operators = []
+        depth = 0
+        
+        for token in tokens:
+            if token.value == '(':
+                depth += 1
+            elif token.value == ')':
+                depth -= 1
+            elif depth == 0 and token.ttype in sqlparse.tokens.Keyword and ' '.join(token.value.upper().split()) in SET_OPERATORS:
+                operators.append(' '.join(token.value.upper().split()))
+                branches.append([])
+                continue
+            branches[-1].append(token)
+        
+        return branches, operators
+    
+    def _describe_view(self, name: str, tokens, columns: List[str]) -> Dict[str, Any]:
+        """Describe a CTE body or derived table: base tables, output columns and what keeps filters outside it"""
+        self._checkpoint()
+        _, operators = self._set_branches(tokens)
+        parsed = sqlparse.parse(self._tokens_to_text(tokens))
+        inner = parsed[0] if parsed else None
+        clauses = self._top_level_clauses(inner) if inner is not None else {}
+        references = self._extract_table_references(inner) if inner is not None else []
+        
+        select_tokens = clauses.get('SELECT', [])
+        leading = select_tokens[0].value.upper() if select_tokens else ''
+        distinct = leading == 'DISTINCT'
+        distinct_on = distinct and len(select_tokens) > 1 and select_tokens[1].value.upper() == 'ON'
+        if distinct or leading == 'ALL':
+            select_tokens = select_tokens[1:]
+        
+        view = {
+            'name': name,
+            'columns': columns,
+            'content': self._tokens_to_text(tokens),
+            'tables': list(dict.fromkeys(ref['name'] for ref in references if ref['name'])),
+            'output_columns': {},
+            'set_operator': operators[0] if operators else None,
+            'data_modifying': bool(tokens) and tokens[0].value.upper() in DATA_MODIFYING,
+            'grouped': 'GROUP BY' in clauses,
+            'distinct': distinct,
+            'limited': distinct_on or leading == 'TOP' or any(keyword in clauses for keyword in ('LIMIT', 'OFFSET', 'FETCH')),
+            'windowed': any(token.value.upper() == 'OVER' for token in select_tokens),
+            'mergeable': False,
+            'wildcard': False,
+            'pushdown': [],
+            'pushed_content': None,
+            '_names': [normalize_identifier(ref['name']) for ref in references if ref['name']]
+        }
+        view['mergeable'] = not (view['grouped'] or view['distinct'] or view['set_operator'] or view['limited']
+                                 or view['windowed'] or view['data_modifying'])
+        
+        group_keys = {
+            self._tokens_to_text(item).lower() for item in self._split_top_level_tokens(clauses.get('GROUP BY', []))
+        }
+        for position, item in enumerate(self._split_top_level_tokens(select_tokens)):
+            expression_tokens, alias = self._select_item_tokens(item)
+            expression = self._tokens_to_text(expression_tokens)
+            if expression.endswith('*'):
+                view['wildcard'] = len([ref for ref in references if ref['depth'] == 0]) == 1
+                continue
+            if position < len(columns):
+                output = columns[position]
+            elif alias:
+                output = alias
+            elif COLUMN_EXPRESSION.match(expression) and not NUMBER_TEXT.match(expression):
+                output = expression
+            else:
+                continue
+            # Aggregates, window results and non-grouping columns of a grouped view cannot be filtered before it
+            computed = self._extract_aggregate_calls(expression_tokens) or any(
+                token.value.upper() == 'OVER' for token in expression_tokens)
+            grouping = not view['grouped'] or bool(
+                {expression.lower(), str(position + 1), (alias or '').lower()} & group_keys)
+            view['output_columns'][normalize_identifier(output)] = expression if not computed and grouping else None
+        
+        return view
+    
+    def _null_supplying(self, from_tokens, references: List[Dict[str, Any]]) -> set:
+        """Qualifiers of the FROM items that an outer join pads with NULLs"""
+        qualifiers = [normalize_identifier(ref['alias'] or ref['name'] or '') for ref in references]
+        null_supplying = set()
+        modifiers = set()
+        position = 0
+        depth = 0
+        
+        for token in from_tokens:
+            keyword = ' '.join(token.value.upper().split())
+            if depth == 0 and keyword in JOIN_MODIFIERS:
+                modifiers.add(keyword)
+            elif depth == 0 and (token.value == ',' or keyword.endswith('JOIN')):
+                words = set(keyword.split()) | modifiers
+                modifiers = set()
+                position += 1
+                if words & {'LEFT', 'FULL'} and position < len(qualifiers):
+                    null_supplying.add(qualifiers[position])
+                if words & {'RIGHT', 'FULL'}:
+                    null_supplying.update(qualifiers[:position])
+            if token.value == '(':
+                depth += 1
+            elif token.value == ')':
+                depth -= 1
+        
+        return null_supplying
+    
+    def _pushdown_predicates(self, view: Dict[str, Any], qualifier: str, conjuncts: List[str],
+                             single_source: bool) -> List[Dict[str, Any]]:
+        """Outer WHERE conjuncts on one reference of a view that could be evaluated inside it instead"""
+        if view['set_operator'] or view['limited'] or view['windowed'] or view['data_modifying'] or view.get('recursive'):
+            return []
+        
+        predicates = []
+        for conjunct in conjuncts:
+            text = PLACEHOLDER.sub('?', STRING_LITERAL.sub("''", conjunct))
+            if 'SELECT' in text.upper():
+                continue
+            sources = {}
+            for column in BARE_COLUMN.findall(text):
+                if column.upper() in SQL_WORDS:
+                    continue
+                parts = column.split('.')
+                if (len(parts) == 2 and normalize_identifier(parts[0]) != normalize_identifier(qualifier)) \
+                        or (len(parts) == 1 and not single_source):
+                    break
+                source = view['output_columns'].get(normalize_identifier(parts[-1]))
+                if source is None and view['wildcard'] and normalize_identifier(parts[-1]) not in view['output_columns']:
+                    source = parts[-1]
+                if source is None:
+                    break
+                sources[column] = source
+            else:
+                if sources:
+                    pushed = conjunct
+                    for column, source in sources.items():
+                        pushed = re.sub(rf"(?<![\w.$']){re.escape(column)}(?![\w$(.'])", source, pushed)
+                    predicates.append({'predicate': conjunct, 'reference': qualifier, 'pushed_predicate': pushed})
+        
+        return predicates
+    
+    def _rebuild_query(self, tokens, predicates: List[str] = (), select_items: List[str] = ()) -> str:
+        """Render a single query block with extra WHERE conjuncts and select-list items"""
+        parsed = sqlparse.parse(self._tokens_to_text(tokens))
+        clauses = self._top_level_clauses(parsed[0]) if parsed else {}
+        where = self._tokens_to_text(clauses.get('WHERE', []))
+        conditions = ([f"({where})" if OR_OPERATOR.search(where) else where] if where else []) + list(predicates)
+        parts = []
         
-        def find_subqueries_recursive(token):
-            if hasattr(token, 'tokens'):
-                for subtoken in token.tokens:
-                    if isinstance(subtoken, sqlparse.sql.Statement):
-                        subqueries.append({
-                            'type': 'subquery',
-                            'content': str(subtoken)
-                        })
-                    find_subqueries_recursive(subtoken)
+        for keyword, clause in clauses.items():
+            if keyword == 'WHERE':
+                continue
+            text = self._tokens_to_text(clause)
+            if keyword == 'SELECT' and select_items:
+                text = ', '.join([text] + list(select_items))
+            parts.append(f"{keyword} {text}".rstrip())
+            if keyword == 'FROM' and conditions:
+                parts.append('WHERE ' + ' AND '.join(conditions))
+        
+        return ' '.join(parts)
+    
+    def _recursion_bound(self, definition: Dict[str, Any], view: Dict[str, Any],
+                         main_clauses: Dict[str, List[Any]]) -> Tuple[Optional[str], Optional[str]]:
+        """How a recursive CTE stops and the qualifier its recursive member gives the CTE"""
+        name = normalize_identifier(definition['name'])
+        member_qualifier = None
+        branches, _ = self._set_branches(definition['tokens'])
+        own_columns = set(view['output_columns'])
+        
+        if view['set_operator'] == 'UNION':
+            return 'union', None
+        if definition['cycle_clause']:
+            return 'cycle_clause', None
+        
+        for branch in branches[1:]:
+            parsed = sqlparse.parse(self._tokens_to_text(branch))
+            if not parsed:
+                continue
+            clauses = self._top_level_clauses(parsed[0])
+            qualifiers = {
+                normalize_identifier(ref['alias'] or ref['name']): ref['alias'] or ref['name']
+                for ref in self._extract_table_references(parsed[0])
+                if ref['depth'] == 0 and ref['name'] and normalize_identifier(ref['name']) == name
+            }
+            if not qualifiers:
+                continue
+            member_qualifier = member_qualifier or next(iter(qualifiers.values()))
+            if any(keyword in clauses for keyword in ('LIMIT', 'FETCH')):
+                return 'limit', member_qualifier
+            
+            for condition in self._split_conjuncts(clauses.get('WHERE', [])) + self._join_conditions(clauses.get('FROM', [])):
+                text = STRING_LITERAL.sub("''", condition)
+                if CYCLE_GUARD.search(text):
+                    return 'cycle_check', member_qualifier
+                own = any(
+                    normalize_identifier(column.split('.')[0]) in qualifiers if '.' in column
+                    else normalize_identifier(column) in own_columns
+                    for column in BARE_COLUMN.findall(text) if column.upper() not in SQL_WORDS
+                )
+                if own and RECURSION_BOUND.search(text):
+                    return 'depth_limit', member_qualifier
+        
+        if any(keyword in main_clauses for keyword in ('LIMIT', 'FETCH')):
+            return 'outer_limit', member_qualifier
+        return None, member_qualifier
+    
+    def _bounded_recursion(self, definition: Dict[str, Any], view: Dict[str, Any], qualifier: str) -> str:
+        """The CTE definition with a depth counter carried through the recursion and capped"""
+        depth = 'recursion_depth' if 'depth' in view['output_columns'] else 'depth'
+        branches, operators = self._set_branches(definition['tokens'])
+        name = normalize_identifier(definition['name'])
+        alias = '' if definition['columns'] else f" AS {depth}"
+        parts = []
+        
+        for number, branch in enumerate(branches):
+            parsed = sqlparse.parse(self._tokens_to_text(branch))
+            recursive = number > 0 and bool(parsed) and name in [
+                normalize_identifier(ref['name']) for ref in self._extract_table_references(parsed[0]) if ref['name']]
+            if recursive:
+                parts.append(self._rebuild_query(branch, predicates=[f"{qualifier}.{depth} < {RECURSION_DEPTH_LIMIT}"],
+                                                 select_items=[f"{qualifier}.{depth} + 1"]))
+            else:
+                parts.append(self._rebuild_query(branch, select_items=[f"1{alias}"]))
+            if number < len(operators):
+                parts.append(operators[number])
+        
+        columns = f"({', '.join(definition['columns'] + [depth])})" if definition['columns'] else ''
+        return f"{definition['name']}{columns} AS ({' '.join(parts)})"
+    
+    def _inline_cte(self, definitions: List[Dict[str, Any]], definition: Dict[str, Any], main_tokens,
+                    recursive: bool) -> Optional[str]:
+        """The statement with a single-use CTE written as a derived table where the main query reads it"""
+        name = normalize_identifier(definition['name'])
+        positions = [
+            i for i, token in enumerate(main_tokens)
+            if i > 0 and normalize_identifier(token.value) == name and token.ttype not in sqlparse.tokens.Keyword
+            and (main_tokens[i - 1].value.upper() in TABLE_INTRODUCERS or main_tokens[i - 1].value.upper().endswith('JOIN')
+                 or main_tokens[i - 1].value == ',')
+            and not (i + 1 < len(main_tokens) and main_tokens[i + 1].value in ('.', '('))
+        ]
+        if len(positions) != 1:
+            return None
+        
+        position = positions[0]
+        following = main_tokens[position + 1] if position + 1 < len(main_tokens) else None
+        aliased = following is not None and (following.value.upper() == 'AS' or following.ttype in sqlparse.tokens.Name)
+        if aliased and definition['columns']:
+            return None
+        columns = f"({', '.join(definition['columns'])})" if definition['columns'] else ''
+        derived = f"({self._tokens_to_text(definition['tokens'])})" + ('' if aliased else f" AS {definition['name']}{columns}")
+        
+        before = self._tokens_to_text(main_tokens[:position])
+        after = self._tokens_to_text(main_tokens[position + 1:])
+        main_text = f"{before} {derived}" + (f"{'' if after[:1] in (',', ')') else ' '}{after}" if after else '')
+        others = [other['text'] for other in definitions if other is not definition]
+        if not others:
+            return main_text
+        return f"WITH {'RECURSIVE ' if recursive else ''}{', '.join(others)} {main_text}"
+    
+    def _analyze_uniqueness(self, query, analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """DISTINCT, GROUP BY and UNION that cannot remove rows because primary and unique keys already make them unique"""
+        uniqueness = {'checked': False, 'unique_rows': None, 'branches': [], 'redundant': []}
+        if not self.schema or analysis['query_type'] != 'SELECT':
+            return uniqueness
+        
+        tokens = [token for token in self._significant_tokens(query) if token.value != ';']
+        _, main_tokens, _ = self._split_with_clause(tokens)
+        branch_tokens, operators = self._set_branches(main_tokens)
+        branches = [self._branch_keys(branch) for branch in branch_tokens]
+        uniqueness['branches'] = branches
+        uniqueness['checked'] = all(branch['checked'] for branch in branches)
+        if not operators:
+            uniqueness['unique_rows'] = branches[0]['distinct'] or branches[0]['unique_rows']
+        
+        def finding(operation, members, width, reason, rewritten_query):
+            rows = [branch['estimated_rows'] for branch in members]
+            known = None not in rows
+            return {
+                'operation': operation,
+                'branch': branches.index(members[0]) if len(members) == 1 else None,
+                'reason': reason,
+                'rewritten_query': rewritten_query,
+                'estimated_rows': sum(rows) if known else None,
+                'estimated_work_bytes': sum(branch['estimated_rows'] * branch[width] for branch in members) if known else None
+            }
+        
+        for branch, own_tokens in zip(branches, branch_tokens):
+            if not branch['checked']:
+                continue
+            if branch['distinct'] and branch['unique_rows']:
+                keyword = next((token for token in own_tokens[:2] if token.value.upper() == 'DISTINCT'), None)
+                uniqueness['redundant'].append(finding(
+                    'distinct', [branch], 'output_bytes',
+                    'the selected columns include every GROUP BY key' if branch['grouped']
+                    else 'the selected columns determine a unique key of every table',
+                    self._tokens_to_text([token for token in tokens if token is not keyword]) if keyword else None
+                ))
+            if branch['unique_groups']:
+                uniqueness['redundant'].append(finding(
+                    'group_by', [branch], 'group_bytes',
+                    'the GROUP BY columns determine a unique key of every table, so each group is a single row',
+                    self._ungrouped_query(tokens, own_tokens)
+                ))
+        
+        # UNION may become UNION ALL when no branch repeats a row and no row can come from two branches
+        if 'UNION' in operators and set(operators) <= {'UNION', 'UNION ALL'} and uniqueness['checked'] \
+                and all(branch['distinct'] or branch['unique_rows'] for branch in branches) \
+                and all(self._disjoint_branches(first, second)
+                        for number, first in enumerate(branches) for second in branches[number + 1:]):
+            members = {id(token) for branch in branch_tokens for token in branch}
+            union_all = sqlparse.sql.Token(sqlparse.tokens.Keyword, 'UNION ALL')
+            rewritten = [
+                union_all if id(token) not in members and ' '.join(token.value.upper().split()) == 'UNION' else token
+                for token in tokens
+            ]
+            uniqueness['redundant'].append(finding(
+                'union', branches, 'output_bytes',
+                'every branch returns distinct rows and no row can come from two branches',
+                self._tokens_to_text(rewritten)
+            ))
+        
+        return uniqueness
+    
+    def _branch_keys(self, tokens) -> Dict[str, Any]:
+        """Whether one SELECT block's rows and groups are unique, following primary/unique keys through joins and equality filters"""
+        self._checkpoint()
+        parsed = sqlparse.parse(self._tokens_to_text(tokens))
+        block = parsed[0] if parsed else None
+        clauses = self._top_level_clauses(block) if block is not None else {}
+        references = [ref for ref in self._extract_table_references(block) if ref['depth'] == 0] if block is not None else []
+        select_tokens = clauses.get('SELECT', [])
+        leading = select_tokens[0].value.upper() if select_tokens else ''
+        branch = {
+            'checked': False,
+            'distinct': leading == 'DISTINCT',
+            'grouped': 'GROUP BY' in clauses,
+            'unique_rows': False,
+            'unique_groups': False,
+            'outputs': [],
+            'keyed_outputs': [],
+            'estimated_rows': None,
+            'output_bytes': None,
+            'group_bytes': None
+        }
+        if leading in ('DISTINCT', 'ALL'):
+            select_tokens = select_tokens[1:]
+        if not select_tokens or select_tokens[0].value.upper() in ('ON', 'TOP'):
+            return branch
+        
+        tables = {}
+        for ref in references:
+            entry = None if ref['derived'] else self.schema.get_table(ref['name'])
+            qualifier = normalize_identifier(ref['alias'] or ref['name'] or '')
+            if not entry or qualifier in tables:
+                return branch
+            tables[qualifier] = entry
+        if not tables:
+            return branch
+        
+        def resolve(expression):
+            if not COLUMN_EXPRESSION.match(expression):
+                return None
+            parts = [normalize_identifier(part) for part in expression.split('.')]
+            owners = parts[:1] if len(parts) == 2 else [
+                qualifier for qualifier, entry in tables.items() if parts[0] in entry['columns']]
+            if len(owners) != 1 or owners[0] not in tables or parts[-1] not in tables[owners[0]]['columns']:
+                return None
+            return owners[0], parts[-1]
+        
+        def classify(condition):
+            match = COLUMN_EQUALITY.match(condition)
+            if match and resolve(match.group(1)) and resolve(match.group(2)):
+                return resolve(match.group(1)), resolve(match.group(2)), None
+            match = COLUMN_CONSTANT.match(condition)
+            if match and resolve(match.group(1)):
+                return resolve(match.group(1)), None, match.group(2)
+            match = REVERSED_COLUMN_CONSTANT.match(condition)
+            if match and resolve(match.group(2)):
+                return resolve(match.group(2)), None, match.group(1)
+            return None
+        
+        # A key determines its table's row; the row stands in for every column of the table
+        dependencies = []
+        keys = {}
+        constants = {}
+        for qualifier, entry in tables.items():
+            keys[qualifier] = [
+                key for key in entry['unique_keys']
+                if set(key) <= set(entry['columns'])
+                and (key == entry['primary_key'] or not any(entry['columns'][column]['nullable'] for column in key))
+            ]
+            row = {(qualifier, ROW_IDENTITY)} | {(qualifier, column) for column in entry['columns']}
+            dependencies.extend(({(qualifier, column) for column in key}, row) for key in keys[qualifier])
+        
+        def equate(condition):
+            bound = classify(condition)
+            if not bound:
+                return
+            column, other, value = bound
+            if other:
+                dependencies.extend([({column}, {other}), ({other}, {column})])
+            else:
+                dependencies.append((set(), {column}))
+                if LITERAL.fullmatch(value):
+                    constants[column] = value
+        
+        for condition in self._split_conjuncts(clauses.get('WHERE', [])):
+            equate(condition)
+        
+        # Split FROM into joins; each comma or JOIN introduces the next table reference
+        qualifiers = list(tables)
+        joins = []
+        modifiers = set()
+        depth = 0
+        for token in clauses.get('FROM', []):
+            keyword = ' '.join(token.value.upper().split())
+            if depth == 0 and keyword in JOIN_MODIFIERS:
+                modifiers.add(keyword)
+            elif depth == 0 and (token.value == ',' or keyword.endswith('JOIN')):
+                words = set(keyword.split()) | modifiers
+                modifiers = set()
+                if words & {'RIGHT', 'FULL', 'NATURAL', 'LATERAL'} or len(joins) + 1 >= len(qualifiers):
+                    return branch
+                joins.append({'qualifier': qualifiers[len(joins) + 1], 'left': 'LEFT' in words, 'on': None})
+            elif depth == 0 and keyword == 'USING':
+                return branch
+            elif depth == 0 and keyword == 'ON' and joins:
+                joins[-1]['on'] = []
+            elif joins and joins[-1]['on'] is not None:
+                joins[-1]['on'].append(token)
+            if token.value == '(':
+                depth += 1
+            elif token.value == ')':
+                depth -= 1
+        
+        for join in joins:
+            conditions = self._split_conjuncts(join['on'] or [])
+            if not join['left']:
+                for condition in conditions:
+                    equate(condition)
+                continue
+            # A LEFT JOIN keeps one row per outer row when its ON clause fixes a key of the joined table
+            joined = join['qualifier']
+            outer = {resolve(column) for column in self._column_references(join['on'] or [])}
+            if None in outer:
+                continue
+            bound = set()
+            for condition in conditions:
+                column, other, _ = classify(condition) or (None, None, None)
+                if column and other and (column[0] == joined) != (other[0] == joined):
+                    bound.add(column[1] if column[0] == joined else other[1])
+                elif column and not other and column[0] == joined:
+                    bound.add(column[1])
+            if any(set(key) <= bound for key in keys[joined]):
+                dependencies.append((
+                    {column for column in outer if column[0] != joined},
+                    {(joined, ROW_IDENTITY)} | {(joined, column) for column in tables[joined]['columns']}
+                ))
+        
+        def closure(columns):
+            closed = set(columns)
+            changed = True
+            while changed:
+                changed = False
+                for determinant, dependents in dependencies:
+                    if determinant <= closed and not dependents <= closed:
+                        closed |= dependents
+                        changed = True
+            return closed
+        
+        def identifies(columns):
+            closed = closure(columns)
+            return all((qualifier, ROW_IDENTITY) in closed for qualifier in tables)
+        
+        resolved_outputs = []
+        aliases = {}
+        for item in self._split_top_level_tokens(select_tokens):
+            expression_tokens, alias = self._select_item_tokens(item)
+            expression = self._tokens_to_text(expression_tokens)
+            if expression == '*' or expression.endswith('.*'):
+                qualifier = normalize_identifier(expression[:-2]) if expression != '*' else None
+                expanded = [
+                    (owner, column) for owner in tables if qualifier in (None, owner, tables[owner]['name'])
+                    for column in tables[owner]['columns']
+                ]
+            else:
+                expanded = [resolve(expression)]
+            for column in expanded:
+                resolved_outputs.append(column)
+                branch['outputs'].append({
+                    'expression': f"{column[0]}.{column[1]}" if len(expanded) > 1 or expression.endswith('*') else expression,
+                    'table': tables[column[0]]['name'] if column else None,
+                    'column': column[1] if column else None,
+                    'constant': constants.get(column) if column else (expression if LITERAL.fullmatch(expression) else None)
+                })
+            if alias:
+                aliases[normalize_identifier(alias)] = expression
+        output_columns = {column for column in resolved_outputs if column}
+        
+        positions = {}
+        for position, column in enumerate(resolved_outputs):
+            if column:
+                positions.setdefault(column, position)
+        for qualifier, entry in tables.items():
+            for key in keys[qualifier]:
+                if all((qualifier, column) in positions for column in key):
+                    branch['keyed_outputs'].append({
+                        'table': entry['name'],
+                        'positions': [positions[(qualifier, column)] for column in key],
+                        'fixed': {column: value for (owner, column), value in constants.items() if owner == qualifier}
+                    })
+        
+        # ROLLUP, CUBE and GROUPING SETS add subtotal rows, so their groups are never one row each
+        group_columns = []
+        all_resolved = True
+        for item in self._split_top_level_tokens(clauses.get('GROUP BY', [])):
+            key = self._tokens_to_text(item)
+            if key.isdigit() and 0 < int(key) <= len(branch['outputs']):
+                key = branch['outputs'][int(key) - 1]['expression']
+            elif normalize_identifier(key) in aliases:
+                key = aliases[normalize_identifier(key)]
+            column = resolve(key)
+            if column:
+                group_columns.append(column)
+            else:
+                all_resolved = False
+        subtotals = any(token.value.upper() in ('ROLLUP', 'CUBE', 'GROUPING SETS') for token in block.flatten())
+        
+        if branch['grouped']:
+            branch['unique_groups'] = not subtotals and bool(group_columns) and identifies(group_columns)
+            # Grouped rows are unique on the GROUP BY keys, so the output is unique when it determines all of them
+            branch['unique_rows'] = not subtotals and all_resolved and bool(group_columns) \
+                and set(group_columns) <= closure(output_columns)
+        else:
+            branch['unique_rows'] = identifies(output_columns)
+        branch['checked'] = True
         
-        find_subqueries_recursive(query)
-        return subqueries
+        def width(columns):
+            owners = {owner for owner, _ in columns}
+            return SORT_TUPLE_OVERHEAD_BYTES + sum(
+                self.schema.estimate_row_width(tables[owner]['name'], [column for other, column in columns if other == owner])
+                for owner in owners
+            )
+        
+        row_count = tables[qualifiers[0]]['stats'].get('row_count')
+        if row_count is not None:
+            branch['estimated_rows'] = max(int(row_count * DEFAULT_SELECTIVITY), 1) if 'WHERE' in clauses else row_count
+        branch['output_bytes'] = width(output_columns)
+        branch['group_bytes'] = width(set(group_columns))
+        
+        return branch
+    
+    def _disjoint_branches(self, first: Dict[str, Any], second: Dict[str, Any]) -> bool:
+        """Whether two set-operation branches can never return the same row"""
+        for left, right in zip(first['outputs'], second['outputs']):
+            if left['constant'] and right['constant'] and self._literals_differ(left['constant'], right['constant']):
+                return True
+        
+        # Both branches return the same table's key in the same positions, from rows filtered to different values
+        for left in first['keyed_outputs']:
+            for right in second['keyed_outputs']:
+                if left['table'] == right['table'] and left['positions'] == right['positions'] and any(
+                        column in right['fixed'] and self._literals_differ(value, right['fixed'][column])
+                        for column, value in left['fixed'].items()):
+                    return True
+        
+        return False
+    
+    def _literals_differ(self, left: str, right: str) -> bool:
+        """Whether two literals are certainly different values; strings ignore case and trailing spaces as some collations do"""
+        categories = {self._literal_category(left), self._literal_category(right)}
+        if categories <= NUMERIC_CATEGORIES:
+            return float(left) != float(right)
+        if categories <= STRING_CATEGORIES:
+            left, right = (literal[literal.index("'") + 1:-1].replace("''", "'").lower().rstrip() for literal in (left, right))
+            return left != right
+        return False
+    
+    def _ungrouped_query(self, tokens, branch_tokens) -> Optional[str]:
+        """The statement without one block's GROUP BY, each aggregate evaluated over its group's single row"""
+        if any(token.value.upper() in ('OVER', 'HAVING') for token in branch_tokens) \
+                or any(token.ttype in sqlparse.tokens.DML for token in branch_tokens[1:]):
+            return None
+        
+        dropped = set()
+        grouping = False
+        depth = 0
+        for token in branch_tokens:
+            keyword = ' '.join(token.value.upper().split())
+            if depth == 0 and token.ttype in sqlparse.tokens.Keyword and (keyword in CLAUSE_KEYWORDS or keyword in SET_OPERATORS):
+                grouping = keyword == 'GROUP BY'
+            if token.value == '(':
+                depth += 1
+            elif token.value == ')':
+                depth -= 1
+            if grouping:
+                dropped.add(id(token))
+        
+        replacements = {}
+        for call in self._extract_aggregate_calls(branch_tokens):
+            if call['function'] == 'COUNT':
+                constant = call['argument'] == '*' or NUMBER_TEXT.match(call['argument'])
+                replacements[call['expression']] = '1' if constant else f"CASE WHEN {call['argument']} IS NULL THEN 0 ELSE 1 END"
+            elif call['function'] in SINGLE_ROW_AGGREGATES:
+                replacements[call['expression']] = call['argument']
+            else:
+                return None
+        
+        text = self._tokens_to_text([token for token in tokens if id(token) not in dropped])
+        for expression, replacement in replacements.items():
+            text = text.replace(expression, replacement)
+        return text
     
     def _detect_issues(self, query, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Detect performance issues in the query"""
@@ -309,15 +2492,196 @@ class SQLAnalyzer:
                 'impact': 'Multiple joins can significantly impact performance'
             })
         
-        # Check for subqueries
-        if analysis['subqueries']:
+        # Check for correlated subqueries, which run once per outer row
+        correlated = [
+            subquery for subquery in analysis['subqueries']
+            if subquery.get('correlated') and subquery['kind'] != 'lateral'
+        ]
+        if correlated:
+            issues.append({
+                'type': 'correlated_subquery',
+                'severity': 'high',
+                'message': (f"{len(correlated)} correlated subquery(ies) referencing "
+                            f"{', '.join(sorted({column for subquery in correlated for column in subquery['correlated_columns']}))}"),
+                'impact': 'A correlated subquery is re-executed for every row of the outer query'
+            })
+        
+        # Check for subqueries (CTE bodies are checked below)
+        subqueries = [subquery for subquery in analysis['subqueries'] if subquery['kind'] != 'cte']
+        if subqueries:
             issues.append({
                 'type': 'subqueries',
                 'severity': 'medium',
-                'message': f"Query contains {len(analysis['subqueries'])} subquery(ies)",
+                'message': f"Query contains {len(subqueries)} subquery(ies)",
                 'impact': 'Subqueries may be less efficient than JOINs in some cases'
             })
         
+        # Check CTEs: recursion without a bound, reuse and filters a materialized CTE cannot see
+        for view in analysis['ctes']['definitions']:
+            if view['unbounded']:
+                issues.append({
+                    'type': 'unbounded_recursive_cte',
+                    'severity': 'high',
+                    'message': f"Recursive CTE {view['name']} has no depth limit, cycle check or outer LIMIT",
+                    'impact': 'A cycle in the data recurses until the recursion limit or memory is exhausted'
+                })
+            if view['references'] == 0 and not view['data_modifying']:
+                issues.append({
+                    'type': 'unused_cte',
+                    'severity': 'low',
+                    'message': f"CTE {view['name']} is never referenced",
+                    'impact': 'Engines that materialize every CTE still compute it'
+                })
+            elif view['references'] > 1:
+                issues.append({
+                    'type': 'cte_multiple_references',
+                    'severity': 'medium' if view['pushdown'] else 'low',
+                    'message': f"CTE {view['name']} is referenced {view['references']} times",
+                    'impact': ('Materialized once without the outer filters and indexes (PostgreSQL 12+, MySQL), '
+                               'or computed again for every reference (SQL Server)')
+                })
+            if view['pushdown']:
+                issues.append({
+                    'type': 'filter_outside_cte',
+                    'severity': 'medium' if view['materialized'] or view['references'] > 1 else 'low',
+                    'message': (f"{' AND '.join(dict.fromkeys(p['predicate'] for p in view['pushdown']))} "
+                                f"filters CTE {view['name']} only after it is computed"),
+                    'impact': ('A materialized CTE (PostgreSQL before 12, MATERIALIZED or several references) '
+                               'is an optimization fence: every row is computed before the filter runs')
+                })
+        for view in analysis['ctes']['derived_tables']:
+            if view['pushdown'] and not view['mergeable']:
+                issues.append({
+                    'type': 'filter_outside_derived_table',
+                    'severity': 'low',
+                    'message': (f"{' AND '.join(p['predicate'] for p in view['pushdown'])} "
+                                f"filters derived table {view['name']} only after it is computed"),
+                    'impact': 'Engines that materialize a grouped or DISTINCT derived table (MySQL before 8.0.22) compute every row first'
+                })
+        
+        # Check UPDATE/DELETE write paths
+        write_path = analysis['write_path']
+        if write_path['is_write']:
+            if not write_path['where']:
+                issues.append({
+                    'type': 'write_without_where',
+                    'severity': 'high',
+                    'message': f"{analysis['query_type']} without WHERE modifies every row of {write_path['target_table']}",
+                    'impact': 'Locks the whole table for one long transaction and floods WAL/binlog replication'
+                })
+            elif write_path['non_sargable_predicates']:
+                issues.append({
+                    'type': 'non_sargable_write',
+                    'severity': 'high',
+                    'message': f"{analysis['query_type']} filter cannot use an index: {', '.join(write_path['non_sargable_predicates'])}",
+                    'impact': 'Scans the full table while acquiring row locks'
+                })
+            if write_path['where'] and write_path['unbounded']:
+                rows = write_path['estimated_rows']
+                issues.append({
+                    'type': 'unbounded_write',
+                    'severity': 'medium',
+                    'message': (f"Unbounded {analysis['query_type']} may touch up to {rows:,} rows in one transaction"
+                                if rows is not None else f"Unbounded {analysis['query_type']} runs as one large transaction"),
+                    'impact': 'Long lock hold times and replication lag; batch the write in chunks'
+                })
+            if write_path['indexed_columns_updated']:
+                issues.append({
+                    'type': 'indexed_column_update',
+                    'severity': 'low',
+                    'message': f"UPDATE modifies indexed columns: {', '.join(write_path['indexed_columns_updated'])}",
+                    'impact': 'Every affected index must be updated (no HOT updates in PostgreSQL)'
+                })
+        
+        # Check for DDL that blocks traffic while it scans or rewrites a table
+        for issue in analysis['ddl']['issues']:
+            issues.append({field: issue[field] for field in ('type', 'severity', 'message', 'impact')})
+        
+        # Check for deep or unordered OFFSET pagination
+        if analysis['pagination']['deep_offset']:
+            offset = analysis['limit']['offset_value']
+            issues.append({
+                'type': 'deep_offset',
+                'severity': 'medium' if analysis['limit']['offset_parameterized'] else 'high',
+                'message': (f"OFFSET {offset} reads and discards {offset} rows before returning a page"
+                            if offset is not None else 'Parameterized OFFSET grows with page depth'),
+                'impact': 'Each deeper page costs more; keyset pagination keeps every page equally cheap'
+            })
+        
+        if analysis['limit']['has_offset'] and not analysis['order_by']['has_order_by']:
+            issues.append({
+                'type': 'offset_without_order',
+                'severity': 'medium',
+                'message': 'OFFSET without ORDER BY returns pages in an unspecified order',
+                'impact': 'Rows can be skipped or repeated between pages'
+            })
+        
+        # Check for comparisons between mismatched types or collations
+        for mismatch in analysis['type_mismatches']:
+            # Comparisons the dialect resolves without touching an index (bigint = int on PostgreSQL) cost nothing
+            if implicit_conversion(mismatch, self.dialect) is None:
+                continue
+            column = mismatch['column']
+            other = mismatch['other_column']
+            if mismatch['reason'] == 'collation':
+                message = (f"{mismatch['condition']} compares {column['collation'] or column['charset']} "
+                           f"with {other['collation'] or other['charset']}")
+            elif other:
+                message = f"{mismatch['condition']} compares {column['type']} with {other['type']}"
+            else:
+                message = (f"{column['expression']} ({column['type']}) is compared with "
+                           f"{mismatch['literal_category'].replace('_', ' ')} literal {mismatch['literals'][0]}")
+            string_vs_number = {column['category'], other['category'] if other else mismatch['literal_category']}
+            issues.append({
+                'type': 'collation_mismatch' if mismatch['reason'] == 'collation' else 'implicit_conversion',
+                'severity': 'high' if string_vs_number & STRING_CATEGORIES and string_vs_number & NUMERIC_CATEGORIES else 'medium',
+                'message': message,
+                'impact': 'An implicit conversion on the indexed side keeps the index from being used, or the comparison fails'
+            })
+        
+        # Check sorts: windows that could share one sort, top-N without an index and sorts that spill to disk
+        sorts = analysis['sorts']
+        if sorts['shared_window_sorts'] < sorts['window_sorts']:
+            issues.append({
+                'type': 'separate_window_sorts',
+                'severity': 'medium',
+                'message': (f"Window functions need {sorts['window_sorts']} separate sorts; "
+                            f"{sorts['shared_window_sorts']} would do with PARTITION BY columns listed in the same order"),
+                'impact': 'Each extra sort reorders every input row'
+            })
+        order_sort = next((operation for operation in sorts['operations'] if operation['source'] == 'order_by'), None)
+        index_order = order_sort['index_order'] if order_sort else None
+        rows = sorts['estimated_rows']
+        if sorts['top_n'] and index_order and index_order['checked'] and not index_order['satisfied_by'] \
+                and not analysis['pagination']['deep_offset']:
+            issues.append({
+                'type': 'top_n_sort',
+                'severity': 'medium',
+                'message': (f"ORDER BY {', '.join(analysis['order_by']['columns'])} with LIMIT sorts "
+                            + (f"~{rows:,} rows" if rows is not None else 'every matching row')
+                            + f" because no index on {index_order['table']} returns them in order"),
+                'impact': 'An index in the sort order reads only the first N entries instead of sorting every row'
+            })
+        elif sorts['spills_to_disk']:
+            issues.append({
+                'type': 'sort_spill',
+                'severity': 'medium',
+                'message': (f"Sorting ~{rows:,} rows (~{sorts['estimated_sort_bytes'] / 1048576:,.0f} MB) exceeds "
+                            f"{SORT_MEMORY_BYTES // 1048576} MB of sort memory and spills to disk"),
+                'impact': 'An external merge sort writes and rereads temporary files'
+            })
+        
+        for redundant in analysis['uniqueness'].get('redundant', []):
+            operation = REDUNDANT_OPERATIONS[redundant['operation']]
+            rows = redundant['estimated_rows']
+            issues.append({
+                'type': f"redundant_{redundant['operation']}",
+                'severity': 'medium',
+                'message': f"{operation} cannot remove any rows: {redundant['reason']}",
+                'impact': (f"Sorts or hashes ~{rows:,} rows (~{redundant['estimated_work_bytes'] / 1048576:,.0f} MB) for nothing"
+                           if rows is not None else 'Sorts or hashes every row for nothing')
+            })
+        
         # Check for ORDER BY without LIMIT
         if analysis['order_by']['has_order_by'] and not analysis['limit']['has_limit']:
             issues.append({
@@ -331,24 +2695,14 @@ class SQLAnalyzer:
     
     def _calculate_complexity_score(self, analysis: Dict[str, Any]) -> int:
         """Calculate a complexity score for the query"""
-        score = 0
-        
         # Base score
-        score += 1
+        score = 1
         
         # Add points for complexity factors
-        score += len(analysis['tables']) * 2
-        score += analysis['joins']['join_count'] * 3
-        score += len(analysis['subqueries']) * 5
-        score += len(analysis['where_clause']['functions_used']) * 2
-        
-        if analysis['group_by']['has_group_by']:
-            score += 3
-        
-        if analysis['order_by']['has_order_by']:
-            score += 2
+        for feature, count in complexity_features(analysis).items():
+            score += count * self.complexity_weights.get(feature, 0)
         
-        return score
+        return int(round(score))
     
     def _estimate_performance(self, analysis: Dict[str, Any]) -> str:
         """Estimate query performance based on analysis"""
@@ -0,0 +1,126 @@
+import gzip
+import os
+import tarfile
+import zipfile
+import zlib
+from typing import List, Tuple, BinaryIO, Optional
+
+# Extensions accepted for a single SQL file and for the members of an archive
+SQL_EXTENSIONS = ('.sql', '.txt')
+ARCHIVE_EXTENSIONS = ('.sql.gz', '.txt.gz', '.zip', '.tar.gz', '.tgz')
+CHUNK_BYTES = 64 * 1024
+
+class UploadError(ValueError):
+    """An upload that is not SQL, not a supported archive, or cannot be decoded"""
+
+class DecompressionLimitExceeded(UploadError):
+    """An archive expanded past the decompressed-size bound (a likely zip bomb)"""
+
+def upload_kind(filename: str) -> Optional[str]:
+    """'sql', 'gzip', 'zip' or 'tar' for a supported upload name, else None"""
+    name = (filename or '').lower()
+    if name.endswith(('.tar.gz', '.tgz')):
+        return 'tar'
+    if name.endswith(('.sql.gz', '.txt.gz')):
+        return 'gzip'
+    if name.endswith('.zip'):
+        return 'zip'
+    if name.endswith(SQL_EXTENSIONS):
+        return 'sql'
+    return None
+
+class SQLArchiveReader:
+    """Decode an uploaded SQL file or archive in memory, one (name, sql) pair per SQL file"""
+
+    def __init__(self, max_decompressed_bytes: int = 64 * 1024 * 1024, max_files: int = 1000):
+        self.max_decompressed_bytes = max_decompressed_bytes
+        self.max_files = max_files
+        self.decompressed_bytes = 0
+        self.skipped_members = []
+
+    def read(self, stream: BinaryIO, filename: str) -> List[Tuple[str, str]]:
+        """SQL files in the upload, in archive order"""
+        kind = upload_kind(filename)
+        if kind is None:
+            raise UploadError(f"Unsupported file type; upload {', '.join(SQL_EXTENSIONS + ARCHIVE_EXTENSIONS)}")
+        name = os.path.basename(filename)
+
+        try:
+            if kind == 'sql':
+                return [(name, self._decode(name, self._read_bounded(stream)))]
+            if kind == 'gzip':
+                with gzip.GzipFile(fileobj=stream, mode='rb') as member:
+                    return [(name[:-3], self._decode(name, self._read_bounded(member)))]
+            if kind == 'zip':
+                return self._read_zip(stream)
+            return self._read_tar(stream)
+        except (OSError, EOFError, zlib.error, zipfile.BadZipFile, tarfile.TarError) as e:
+            # gzip raises OSError/EOFError on corrupt or truncated input
+            raise UploadError(f"Could not read {name}: {e}")
+
+    def _read_zip(self, stream: BinaryIO) -> List[Tuple[str, str]]:
+        """Members of a zip archive; each is inflated chunk by chunk, whatever its header claims"""
+        files = []
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not self._wanted(info.filename):
+                    continue
+                with archive.open(info) as member:
+                    files.append((info.filename, self._decode(info.filename, self._read_bounded(member))))
+                self._check_file_count(files)
+        return files
+
+    def _read_tar(self, stream: BinaryIO) -> List[Tuple[str, str]]:
+        """Members of a gzipped tarball, read in a single forward pass"""
+        files = []
+        # 'r|gz' never seeks, so members are decompressed as the stream is consumed
+        with tarfile.open(fileobj=stream, mode='r|gz') as archive:
+            for info in archive:
+                # Skipped members are still inflated to reach the next header, so every member counts
+                if self.decompressed_bytes + tarfile.BLOCKSIZE + info.size > self.max_decompressed_bytes:
+                    raise self._limit_exceeded()
+                self.decompressed_bytes += tarfile.BLOCKSIZE
+                if not info.isfile() or not self._wanted(info.name):
+                    self.decompressed_bytes += info.size
+                    continue
+                member = archive.extractfile(info)
+                files.append((info.name, self._decode(info.name, self._read_bounded(member))))
+                self._check_file_count(files)
+        return files
+
+    def _wanted(self, member_name: str) -> bool:
+        """SQL/text members, leaving out OS metadata such as __MACOSX/ and ._ resource forks"""
+        base = member_name.replace('\\', '/').rsplit('/', 1)[-1]
+        if member_name.startswith('__MACOSX/') or base.startswith('._'):
+            return False
+        if not base.lower().endswith(SQL_EXTENSIONS):
+            self.skipped_members.append(member_name)
+            return False
+        return True
+
+    def _check_file_count(self, files: List[Tuple[str, str]]) -> None:
+        if len(files) > self.max_files:
+            raise UploadError(f"Archive holds more than {self.max_files} SQL files")
+
+    def _read_bounded(self, source: BinaryIO) -> bytes:
+        """Read to the end, counting every decompressed byte against the upload-wide bound"""
+        chunks = []
+        while True:
+            chunk = source.read(CHUNK_BYTES)
+            if not chunk:
+                return b''.join(chunks)
+            self.decompressed_bytes += len(chunk)
+            if self.decompressed_bytes > self.max_decompressed_bytes:
+                raise self._limit_exceeded()
+            chunks.append(chunk)
+
+    def _limit_exceeded(self) -> DecompressionLimitExceeded:
+        return DecompressionLimitExceeded(
+            f"Upload expands beyond {self.max_decompressed_bytes} bytes; split it into smaller archives"
+        )
+
+    def _decode(self, name: str, data: bytes) -> str:
+        try:
+            return data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise UploadError(f"{name} is not UTF-8 text")
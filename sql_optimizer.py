@@ -1,15 +1,98 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import math
 import re
 
+from schema_catalog import SchemaCatalog, normalize_identifier
+from index_advisor import IndexAdvisor
+from sql_analyzer import (LITERAL_PATTERN, NUMERIC_CATEGORIES, STRING_CATEGORIES, SORT_MEMORY_BYTES,
+                          REDUNDANT_OPERATIONS, implicit_conversion)
+
+# Rough per-row costs used for batch estimates
+ROW_WRITE_MICROS = 20
+INDEX_ENTRY_MICROS = 10
+LOG_RECORD_OVERHEAD_BYTES = 40
+INDEX_ENTRY_BYTES = 32
+# Hand-picked score deductions per issue severity; a calibrated CostModel replaces them
+ISSUE_PENALTIES = {'high': 20, 'medium': 10, 'low': 5}
+DIALECT_NAMES = {
+    'postgresql': 'PostgreSQL', 'postgres': 'PostgreSQL', 'mysql': 'MySQL', 'mariadb': 'MariaDB',
+    'sqlserver': 'SQL Server', 'oracle': 'Oracle', 'sqlite': 'SQLite'
+}
+# Rule patterns, compiled once at import
+STANDALONE_LITERAL = re.compile(rf'(?<![\w.])(?:{LITERAL_PATTERN})')
+CALL_ARGUMENT = re.compile(r'^\w+\s*\((.*)\)$', re.DOTALL)
+NON_WORD = re.compile(r'\W+')
+ORDER_BY_TAIL = re.compile(r'ORDER BY.*$', re.IGNORECASE)
+# Error raised where the dialect refuses to compare the two sides implicitly
+CONVERSION_ERRORS = {
+    ('postgresql', 'type'): 'operator does not exist',
+    ('postgresql', 'collation'): 'could not determine which collation to use for string comparison',
+    ('sqlserver', 'collation'): 'Cannot resolve the collation conflict',
+    ('mysql', 'collation'): 'Illegal mix of collations'
+}
+DDL_SUGGESTION_TITLES = {
+    'blocking_index_build': 'Build the index online',
+    'table_rewrite': 'Avoid the full table rewrite',
+    'blocking_foreign_key': 'Add the foreign key without blocking writes',
+    'blocking_validation': 'Validate the constraint without blocking traffic'
+}
+# When each engine materializes a CTE instead of expanding it into the outer query
+CTE_FENCES = {
+    'postgresql': 'materializes every CTE before version 12, and on 12+ one that is declared MATERIALIZED or referenced more than once',
+    'mysql': 'materializes a CTE it cannot merge and pushes outer conditions into it only from MySQL 8.0.22',
+    'oracle': 'may materialize a CTE into a temporary table before applying outer filters',
+    'sqlite': 'materializes a CTE that is declared MATERIALIZED or referenced more than once'
+}
+REDUNDANCY_TITLES = {
+    'distinct': 'Drop the DISTINCT',
+    'group_by': 'Drop the GROUP BY',
+    'union': 'Use UNION ALL'
+}
+REDUNDANCY_FALLBACKS = {
+    'distinct': '-- Remove DISTINCT from the select list',
+    'group_by': '-- Remove GROUP BY and replace each aggregate with its value over the single row'
+}
+# How each engine raises the memory one query may sort in
+SORT_MEMORY_SETTINGS = {
+    'postgresql': "SET LOCAL work_mem = '{megabytes}MB';  -- inside the query's transaction",
+    'postgres': "SET LOCAL work_mem = '{megabytes}MB';  -- inside the query's transaction",
+    'mysql': 'SET SESSION sort_buffer_size = {bytes};',
+    'mariadb': 'SET SESSION sort_buffer_size = {bytes};',
+    'oracle': "ALTER SESSION SET workarea_size_policy = MANUAL;\nALTER SESSION SET sort_area_size = {bytes};"
+}
+RECURSION_GUARDS = {
+    'postgresql': '-- PostgreSQL 14+ can stop at cycles instead: ) CYCLE <key column> SET is_cycle USING path',
+    'mysql': '-- MySQL otherwise aborts with an error at cte_max_recursion_depth (1000 by default)',
+    'mariadb': '-- MariaDB otherwise stops silently at max_recursive_iterations',
+    'sqlserver': '-- Or cap the statement: OPTION (MAXRECURSION 100)',
+    'oracle': "-- Or stop at cycles: ) CYCLE <key column> SET is_cycle TO 'Y' DEFAULT 'N'",
+    'sqlite': '-- Or end the recursive member with LIMIT'
+}
+
 class SQLOptimizer:
-    def __init__(self):
+    def __init__(self, schema: Optional[SchemaCatalog] = None, dialect: str = 'postgresql',
+                 batch_size: int = 5000, batch_sleep: float = 0.1, cost_model=None):
+        self.schema = schema
+        self.dialect = dialect
+        self.batch_size = batch_size
+        self.batch_sleep = batch_sleep
+        self._droppable_indexes = None
+        self.issue_penalties = cost_model.issue_penalties() if cost_model else ISSUE_PENALTIES
         self.optimization_rules = {
             'index_optimization': self._suggest_index_optimizations,
             'join_optimization': self._suggest_join_optimizations,
             'where_optimization': self._suggest_where_optimizations,
+            'type_conversion_optimization': self._suggest_type_conversion_optimizations,
             'select_optimization': self._suggest_select_optimizations,
+            'covering_index_optimization': self._suggest_covering_index_optimizations,
             'aggregation_optimization': self._suggest_aggregation_optimizations,
             'subquery_optimization': self._suggest_subquery_optimizations,
+            'cte_optimization': self._suggest_cte_optimizations,
+            'sort_optimization': self._suggest_sort_optimizations,
+            'redundancy_elimination': self._suggest_redundancy_eliminations,
+            'pagination_optimization': self._suggest_pagination_optimizations,
+            'write_optimization': self._suggest_write_optimizations,
+            'ddl_optimization': self._suggest_ddl_optimizations,
             'general_optimization': self._suggest_general_optimizations
         }
     
@@ -53,14 +136,8 @@ class SQLOptimizer:
             base_score = performance_scores.get(analysis['estimated_performance'], 50)
             
             # Deduct points for issues
-            issue_penalties = {
-                'high': 20,
-                'medium': 10,
-                'low': 5
-            }
-            
             for issue in analysis.get('issues', []):
-                base_score -= issue_penalties.get(issue['severity'], 5)
+                base_score -= self.issue_penalties.get(issue['severity'], 5)
             
             # Ensure score doesn't go below 0
             base_score = max(0, base_score)
@@ -107,8 +184,32 @@ class SQLOptimizer:
                 'impact': 'Eliminates sorting overhead for ORDER BY operations'
             })
         
+        # Suggest dropping redundant or unused indexes on the tables this query writes or reads
+        tables = {normalize_identifier(table) for table in analysis['tables']}
+        for finding in self.get_droppable_indexes():
+            if finding['table'] not in tables or not finding['droppable']:
+                continue
+            suggestions.append({
+                'type': 'index_drop',
+                'priority': 'high' if analysis['query_type'] in ('INSERT', 'UPDATE', 'DELETE') else 'medium',
+                'title': f"Drop {finding['reason'].replace('_', ' ')} index {finding['index']}",
+                'description': finding['detail'],
+                'code_example': finding['drop_statement'],
+                'impact': (f"Write amplification on {finding['table']} drops from "
+                           f"{finding['write_amplification']['write_amplification']} to "
+                           f"{finding['write_amplification']['write_amplification_after']} structures per row")
+            })
+        
         return suggestions
     
+    def get_droppable_indexes(self) -> List[Dict[str, Any]]:
+        """Redundant and unused index findings for the configured schema (computed once)"""
+        if self.schema is None:
+            return []
+        if self._droppable_indexes is None:
+            self._droppable_indexes = IndexAdvisor(self.schema, self.dialect).find_droppable_indexes()
+        return self._droppable_indexes
+    
     def _suggest_join_optimizations(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Suggest join-related optimizations"""
         suggestions = []
@@ -165,19 +266,207 @@ class SQLOptimizer:
         
         return suggestions
     
+    def _suggest_type_conversion_optimizations(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Suggest fixes for comparisons the dialect resolves by converting a column, or refuses outright"""
+        suggestions = []
+        dialect = DIALECT_NAMES.get(self.dialect, self.dialect)
+        
+        for mismatch in analysis.get('type_mismatches', []):
+            converted = implicit_conversion(mismatch, self.dialect)
+            if converted is None:
+                continue
+            column, other = mismatch['column'], mismatch['other_column']
+            
+            if converted == 'error':
+                # Protect the indexed side and bring the other one to it
+                protected = other if other and other['indexed'] and not column['indexed'] else column
+                family = {'mariadb': 'mysql', 'postgres': 'postgresql'}.get(self.dialect, self.dialect)
+                error = CONVERSION_ERRORS[(family, mismatch['reason'])]
+                title = f"{dialect} rejects the comparison {mismatch['condition']}"
+                description = f"{dialect} has no implicit conversion for this comparison and fails with \"{error}\""
+                priority = 'high'
+            else:
+                protected = column if converted == 'column' else other
+                source = other if protected is column else column
+                if source is None:
+                    target = mismatch['literal_category'].replace('_', ' ')
+                elif mismatch['reason'] == 'collation':
+                    target = source['collation'] or source['charset']
+                else:
+                    target = source['type']
+                name = f"{protected['table']}.{protected['column']}"
+                title = f"Implicit conversion of {name} " + ('disables its index' if protected['indexed'] else f"in {mismatch['condition']}")
+                description = (f"{dialect} converts {name} ({protected['type']}) to {target} for every row it compares, "
+                               f"so {mismatch['condition']} cannot seek an index on {protected['column']}")
+                priority = 'high' if protected['indexed'] else 'medium'
+            
+            if mismatch['kind'] == 'literal':
+                code_example = f"-- Instead of: {mismatch['condition']}\n{self._corrected_predicate(mismatch)}"
+            else:
+                partner = other if protected is column else column
+                code_example = (f"-- Instead of: {mismatch['condition']}\n"
+                                f"-- Convert the other side explicitly:\n"
+                                f"{protected['expression']} {mismatch['operator']} {self._cast_expression(partner, protected, mismatch['reason'])}\n"
+                                f"-- Or align the column definitions:\n"
+                                f"{self._align_column(mismatch, protected, partner, converted)}")
+            
+            suggestions.append({
+                'type': 'type_conversion_optimization',
+                'priority': priority,
+                'title': title,
+                'description': description,
+                'code_example': code_example,
+                'impact': ('Index seeks on the comparison instead of a conversion per scanned row'
+                           if converted != 'error' else 'The statement runs instead of failing')
+            })
+        
+        return suggestions
+    
+    def _corrected_predicate(self, mismatch: Dict[str, Any]) -> str:
+        """The predicate with each literal written in the column's type"""
+        column = mismatch['column']
+        operators = iter(['>=', '<=']) if mismatch['operator'] == 'BETWEEN' else None
+        never_matches = []
+        
+        def rewrite(match):
+            literal = match.group(0)
+            operator = next(operators) if operators else mismatch['operator']
+            if literal.upper().startswith('N'):
+                return literal[1:].lstrip() if column['category'] == 'string' else literal
+            if literal.startswith("'"):
+                return literal
+            if column['category'] in STRING_CATEGORIES:
+                return f"'{literal}'"
+            value = float(literal)
+            if value.is_integer():
+                return str(int(value))
+            if operator in ('>', '<='):
+                return str(math.floor(value))
+            if operator in ('>=', '<'):
+                return str(math.ceil(value))
+            never_matches.append(literal)
+            return literal
+        
+        predicate = STANDALONE_LITERAL.sub(rewrite, mismatch['condition'])
+        if never_matches:
+            return (f"-- {column['expression']} holds integers, so {', '.join(never_matches)} can never be equal to it; "
+                    f"check the value being passed")
+        return f"-- Use: {predicate}"
+    
+    def _cast_expression(self, expression_column: Dict[str, Any], target: Dict[str, Any], reason: str) -> str:
+        """An explicit conversion of one column to another column's type or collation"""
+        expression = expression_column['expression']
+        if reason == 'collation':
+            if target['collation']:
+                return f"{expression} COLLATE {self._collation_name(target['collation'])}"
+            return f"CONVERT({expression} USING {target['charset']})"
+        
+        target_type = target['type'].upper()
+        if self.dialect in ('mysql', 'mariadb'):
+            # MySQL CAST only accepts a handful of target types
+            target_type = {'integer': 'SIGNED', 'float': 'DOUBLE', 'string': 'CHAR', 'national_string': 'NCHAR'}.get(
+                target['category'], target_type)
+        return f"CAST({expression} AS {target_type})"
+    
+    def _align_column(self, mismatch: Dict[str, Any], protected: Dict[str, Any], partner: Dict[str, Any],
+                      converted: str) -> str:
+        """ALTER TABLE that gives one side of a join predicate the other side's type or collation"""
+        if mismatch['reason'] == 'collation':
+            # Change the side that gets converted (or, on a conflict, the side without the index)
+            changed, source = (protected, partner) if converted != 'error' else (partner, protected)
+            column_type = changed['type'].upper()
+            if source['collation']:
+                column_type += f" COLLATE {self._collation_name(source['collation'])}"
+            else:
+                column_type += f" CHARACTER SET {source['charset']}"
+        else:
+            # Store numbers as numbers; otherwise widen the converted side to the other side's type
+            changed, source = (protected, partner) if converted != 'error' else (
+                (protected, partner) if protected['category'] in STRING_CATEGORIES else (partner, protected))
+            column_type = source['type'].upper()
+        
+        table, name = changed['table'], changed['column']
+        not_null = '' if changed['nullable'] else ' NOT NULL'
+        if self.dialect in ('mysql', 'mariadb'):
+            return f"ALTER TABLE {table} MODIFY {name} {column_type}{not_null};"
+        if self.dialect == 'sqlserver':
+            return f"ALTER TABLE {table} ALTER COLUMN {name} {column_type}{not_null};"
+        if self.dialect == 'oracle':
+            return f"ALTER TABLE {table} MODIFY ({name} {column_type});"
+        if self.dialect == 'sqlite':
+            return f"-- SQLite cannot change a column type in place; rebuild {table} with {name} {column_type}"
+        using = '' if mismatch['reason'] == 'collation' else f" USING {name}::{source['type']}"
+        return f"ALTER TABLE {table} ALTER COLUMN {name} TYPE {column_type}{using};"
+    
+    def _collation_name(self, collation: str) -> str:
+        """PostgreSQL collation names are identifiers and keep their case only when quoted"""
+        return f'"{collation}"' if self.dialect in ('postgresql', 'postgres') else collation
+    
     def _suggest_select_optimizations(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Suggest SELECT clause optimizations"""
         suggestions = []
         
         # Wildcard select
-        if '*' in analysis['columns']:
+        wildcard_tables = [usage for usage in analysis.get('column_usage', []) if usage['wildcard']]
+        if '*' in analysis['columns'] or wildcard_tables:
+            description = 'SELECT * retrieves all columns, which may not be necessary'
+            impact = 'Reduces network transfer and improves performance'
+            if wildcard_tables and self.schema:
+                widths = [
+                    f"{usage['table']}: {len(usage['select'])} columns, ~{self.schema.estimate_row_width(usage['table'])} bytes/row"
+                    for usage in wildcard_tables
+                ]
+                description += f" ({'; '.join(widths)})"
+                needed = [
+                    self.schema.estimate_row_width(usage['table'], [
+                        column for role in ('equality', 'range', 'join', 'order_by', 'group_by', 'other')
+                        for column in usage[role]
+                    ]) for usage in wildcard_tables
+                ]
+                impact = (f"Every returned row carries ~{sum(self.schema.estimate_row_width(u['table']) for u in wildcard_tables)} bytes; "
+                          f"the columns the query itself filters, joins and sorts on need ~{sum(needed)}")
             suggestions.append({
                 'type': 'select_optimization',
                 'priority': 'medium',
                 'title': 'Replace SELECT * with specific columns',
-                'description': 'SELECT * retrieves all columns, which may not be necessary',
+                'description': description,
                 'code_example': '-- Instead of: SELECT * FROM table\n-- Use: SELECT column1, column2, column3 FROM table',
-                'impact': 'Reduces network transfer and improves performance'
+                'impact': impact
+            })
+        
+        return suggestions
+    
+    def _suggest_covering_index_optimizations(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Suggest covering indexes that allow index-only scans, sized from the schema's column types"""
+        suggestions = []
+        if self.schema is None:
+            return suggestions
+        
+        advisor = IndexAdvisor(self.schema, self.dialect)
+        for usage in analysis.get('column_usage', []):
+            recommendation = advisor.recommend_covering_index(usage, analysis['limit'].get('limit_value'))
+            if not recommendation or recommendation['already_covered_by']:
+                continue
+            
+            rows = recommendation['rows_per_execution']
+            impact = (f"Reads ~{recommendation['index_entry_bytes']} bytes per row instead of "
+                      f"~{recommendation['row_bytes'] + recommendation['index_entry_bytes']} "
+                      f"({recommendation['io_reduction_pct']}% less I/O)")
+            if rows is not None:
+                impact += (f"; ~{recommendation['io_bytes_per_execution'] - recommendation['io_bytes_per_execution_covering']:,} "
+                           f"bytes and {rows:,} heap fetches saved per execution")
+            size = recommendation['index_size_bytes']
+            
+            suggestions.append({
+                'type': 'covering_index',
+                'priority': 'high' if rows is not None and rows > 1 else 'medium',
+                'title': f"Covering index for an index-only scan on {recommendation['table']}",
+                'description': (f"The query needs {len(recommendation['needed_columns'])} columns "
+                                f"(~{recommendation['needed_bytes']} bytes) of a ~{recommendation['row_bytes']}-byte row; "
+                                'an index holding all of them answers it without visiting the table'
+                                + (f" (estimated index size {size / 1048576:,.1f} MiB)" if size is not None else '')),
+                'code_example': recommendation['statement'],
+                'impact': impact
             })
         
         return suggestions
@@ -203,8 +492,35 @@ class SQLOptimizer:
         """Suggest subquery optimizations"""
         suggestions = []
         
+        for number, subquery in enumerate(analysis['subqueries'], 1):
+            suggestion = None
+            if subquery.get('correlated') and subquery['kind'] != 'lateral':
+                suggestion = self._decorrelate_subquery(subquery, number)
+            elif subquery.get('kind') == 'not_in':
+                conditions = subquery['inner_filters'] + [f"{subquery['inner_select']} = {subquery['outer_expression']}"]
+                # The two differ only on NULLs: NOT IN keeps no row once the subquery yields a NULL,
+                # and drops rows whose own value is NULL, which NOT EXISTS keeps
+                nulls = [f"{subquery['outer_expression']} is NULL (NOT EXISTS keeps the row)"]
+                if self._nullable_column(subquery['inner_table'], subquery['inner_select']):
+                    nulls.insert(0, f"{subquery['inner_select']} can be NULL (NOT IN then returns no rows)")
+                suggestion = {
+                    'type': 'subquery_optimization',
+                    'priority': 'medium',
+                    'title': 'Replace NOT IN (subquery) with NOT EXISTS',
+                    'description': ('NOT IN often prevents an anti-join plan; NOT EXISTS plans as an anti-join and '
+                                    'returns the same rows unless NULLs are involved'),
+                    'code_example': (f"-- Instead of: {subquery['outer_expression']} NOT IN ({subquery['content']})\n"
+                                     f"-- Use: NOT EXISTS (SELECT 1 FROM {subquery['inner_from']} "
+                                     f"WHERE {' AND '.join(conditions)})\n"
+                                     f"-- Results differ when {' or '.join(nulls)}"),
+                    'impact': 'An anti-join instead of a per-row probe'
+                }
+            if suggestion:
+                suggestions.append(suggestion)
+        
         # Subquery optimization
-        if analysis['subqueries']:
+        if analysis['subqueries'] and not suggestions and any(
+                subquery.get('kind', 'scalar') not in ('derived_table', 'lateral', 'cte') for subquery in analysis['subqueries']):
             suggestions.append({
                 'type': 'subquery_optimization',
                 'priority': 'medium',
@@ -216,6 +532,580 @@ class SQLOptimizer:
         
         return suggestions
     
+    def _nullable_column(self, table: Optional[str], expression: Optional[str]) -> bool:
+        """Whether a column may hold NULL; anything the schema does not declare NOT NULL may"""
+        entry = self.schema.get_table(table) if self.schema and table else None
+        column = entry['columns'].get(normalize_identifier((expression or '').split('.')[-1])) if entry else None
+        return column is None or column['nullable']
+    
+    def _decorrelate_subquery(self, subquery: Dict[str, Any], number: int) -> Optional[Dict[str, Any]]:
+        """Rewrite a correlated subquery as a grouped join, semi/anti-join, window function or LATERAL join"""
+        predicates = subquery['correlation_predicates']
+        executions = subquery.get('estimated_executions')
+        avoided = (f"Runs once instead of {executions:,} times (avoids {executions - 1:,} executions)"
+                   if executions else 'Runs once instead of once per outer row')
+        alias = subquery['alias'] or f"sq{number}"
+        filters = subquery['inner_filters']
+        # Predicates comparing against the outer row only work inside the per-row subquery;
+        # [NOT] EXISTS already plans as a semi/anti-join, and a LATERAL join would repeat outer rows
+        if subquery.get('correlated_filters'):
+            if subquery['kind'] in ('exists', 'not_exists', 'in', 'not_in'):
+                return None
+            predicates = []
+        where = f"\n    WHERE {' AND '.join(filters)}" if filters else ''
+        
+        def key_name(expression):
+            return expression.split('.')[-1]
+        
+        if predicates and subquery['location'] == 'select' and subquery['aggregate']:
+            join_alias = f"{alias}_agg"
+            keys = ', '.join(predicate['inner'] for predicate in predicates)
+            on = ' AND '.join(f"{join_alias}.{key_name(predicate['inner'])} = {predicate['outer']}" for predicate in predicates)
+            value = f"{join_alias}.{alias}"
+            if subquery['aggregate'] == 'COUNT':
+                value = f"COALESCE({value}, 0)"
+            return {
+                'type': 'subquery_optimization',
+                'priority': 'high',
+                'title': 'Decorrelate SELECT-list subquery into a grouped join',
+                'description': (f"The {subquery['aggregate']} subquery is evaluated once per outer row; aggregating "
+                                f"{subquery['inner_table']} once and joining on {keys} gives the same result"),
+                'code_example': (f"-- Replace the subquery in the SELECT list with: {value} AS {alias}\n"
+                                 f"-- and add to the FROM clause:\n"
+                                 f"LEFT JOIN (\n    SELECT {keys}, {subquery['inner_select']} AS {alias}\n"
+                                 f"    FROM {subquery['inner_from']}{where}\n    GROUP BY {keys}\n) {join_alias} ON {on}"),
+                'impact': avoided
+            }
+        
+        if predicates and subquery['kind'] in ('exists', 'not_exists', 'in', 'not_in'):
+            join_alias = f"{(subquery['inner_table'] or alias).split('.')[-1]}_match"
+            pairs = [(predicate['inner'], predicate['outer']) for predicate in predicates]
+            if subquery['kind'] in ('in', 'not_in') and subquery['outer_expression']:
+                pairs.append((subquery['inner_select'], subquery['outer_expression']))
+            keys = ', '.join(inner for inner, _ in pairs)
+            on = ' AND '.join(f"{join_alias}.{key_name(inner)} = {outer}" for inner, outer in pairs)
+            derived = f"(\n    SELECT DISTINCT {keys}\n    FROM {subquery['inner_from']}{where}\n) {join_alias} ON {on}"
+            if subquery['kind'] in ('exists', 'in'):
+                title = 'Decorrelate EXISTS/IN subquery into a semi-join'
+                code_example = f"-- Remove the {subquery['kind'].upper()} predicate and join instead:\nJOIN {derived}"
+            else:
+                title = 'Decorrelate NOT EXISTS/NOT IN subquery into an anti-join'
+                code_example = (f"-- Remove the {subquery['kind'].upper().replace('_', ' ')} predicate and anti-join instead:\n"
+                                f"LEFT JOIN {derived}\n-- and filter: WHERE {join_alias}.{key_name(pairs[0][0])} IS NULL")
+            return {
+                'type': 'subquery_optimization',
+                'priority': 'high',
+                'title': title,
+                'description': (f"The subquery on {subquery['inner_table']} is probed for every outer row; "
+                                'deduplicating it once and joining lets the planner hash or merge the two sides'),
+                'code_example': code_example,
+                'impact': avoided
+            }
+        
+        outer_qualifier = (subquery['outer_expression'] or '').split('.')[0]
+        outer_table = subquery['correlated_tables'].get(outer_qualifier)
+        if (predicates and subquery['location'] in ('where', 'having') and subquery['aggregate'] and subquery['operator']
+                and outer_table and subquery['inner_table']
+                and normalize_identifier(outer_table) == normalize_identifier(subquery['inner_table'])):
+            inner_alias = subquery['inner_from'].split()[-1]
+            argument = CALL_ARGUMENT.match(subquery['inner_select'])
+            argument = argument.group(1) if argument else '*'
+            if filters:
+                argument = f"CASE WHEN {' AND '.join(filters)} THEN {'1' if argument == '*' else argument} END"
+            argument = re.sub(r'\b' + re.escape(inner_alias) + r'\.', f"{outer_qualifier}.", argument)
+            partition = ', '.join(predicate['outer'] for predicate in predicates)
+            window_column = f"{subquery['aggregate'].lower()}_{key_name(subquery['outer_expression'])}"
+            return {
+                'type': 'subquery_optimization',
+                'priority': 'high',
+                'title': 'Replace correlated aggregate subquery with a window function',
+                'description': (f"The subquery recomputes {subquery['aggregate']} over {subquery['inner_table']} for each row; "
+                                f"a window partitioned by {partition} computes it in a single pass"),
+                'code_example': (f"SELECT * FROM (\n    SELECT {outer_qualifier}.*, {subquery['aggregate']}({argument}) "
+                                 f"OVER (PARTITION BY {partition}) AS {window_column}\n"
+                                 f"    FROM {outer_table} {outer_qualifier}\n"
+                                 f") {outer_qualifier}\n"
+                                 f"WHERE {subquery['outer_expression']} {subquery['operator']} {outer_qualifier}.{window_column}\n"
+                                 f"-- AND the outer query's other predicates: filtering inside the derived table "
+                                 f"would change the rows the window aggregates"),
+                'impact': avoided
+            }
+        
+        if self.dialect == 'sqlserver':
+            join = f"OUTER APPLY (\n    {subquery['content']}\n) {alias}"
+        else:
+            join = f"LEFT JOIN LATERAL (\n    {subquery['content']}\n) {alias} ON true"
+        return {
+            'type': 'subquery_optimization',
+            'priority': 'medium',
+            'title': 'Move correlated subquery into a LATERAL join',
+            'description': ('A lateral join makes the per-row lookup explicit, lets several columns come from one '
+                            'probe and gives the planner join strategies instead of a subplan'),
+            'code_example': f"-- Replace the subquery with {alias}.<column> and add to the FROM clause:\n{join}",
+            'impact': 'Combines repeated per-row subqueries into one probe per outer row'
+        }
+    
+    def _suggest_cte_optimizations(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Suggest bounding recursion, moving outer filters into CTEs and derived tables, and the dialect's CTE hints"""
+        suggestions = []
+        ctes = analysis.get('ctes') or {}
+        dialect = DIALECT_NAMES.get(self.dialect, self.dialect)
+        family = {'mariadb': 'mysql', 'postgres': 'postgresql'}.get(self.dialect, self.dialect)
+        
+        for view in ctes.get('definitions', []):
+            name = view['name']
+            definition = f"{name}({', '.join(view['columns'])})" if view['columns'] else name
+            
+            if view['unbounded']:
+                keyword = 'WITH' if family in ('sqlserver', 'oracle') else 'WITH RECURSIVE'
+                code = [f"-- Carry a depth counter through the recursion and stop at a bound:\n{keyword} {view['bounded_definition']}"
+                        ] if view['bounded_definition'] else []
+                guard = RECURSION_GUARDS.get(self.dialect) or RECURSION_GUARDS.get(family)
+                if guard:
+                    code.append(guard)
+                suggestions.append({
+                    'type': 'cte_optimization',
+                    'priority': 'high',
+                    'title': f"Bound the recursion of {name}",
+                    'description': (f"The recursive member of {name} has no depth limit, cycle check or outer LIMIT, "
+                                    f"so a counter or a cycle in the data recurses until the engine's limit or memory runs out"),
+                    'code_example': '\n'.join(code),
+                    'impact': 'The recursion stops at a known depth instead of running until a limit or memory runs out'
+                })
+            
+            # SQL Server always expands a CTE where it is referenced, so outer filters already reach it
+            if view['pushdown'] and family != 'sqlserver':
+                predicates = ' AND '.join(dict.fromkeys(predicate['predicate'] for predicate in view['pushdown']))
+                code = [f"WITH {definition} AS (\n    {view['pushed_content']}\n)"] if view['pushed_content'] else []
+                if family in ('postgresql', 'sqlite'):
+                    version = 'PostgreSQL 12+' if family == 'postgresql' else 'SQLite 3.35+'
+                    code.append(f"-- Or, on {version}, let the planner push the filter into each reference:\n"
+                                f"WITH {definition} AS NOT MATERIALIZED (\n    {view['content']}\n)")
+                elif self.dialect == 'mysql':
+                    code.append(f"-- Or merge it into the outer query: SELECT /*+ MERGE({name}) */ ...")
+                elif family == 'oracle':
+                    code.append(f"-- Or inline it: WITH {name} AS (SELECT /*+ INLINE */ ...)")
+                if view['inline_query']:
+                    code.append(f"-- Or inline it as a derived table:\n{view['inline_query']}")
+                suggestions.append({
+                    'type': 'cte_optimization',
+                    'priority': 'medium' if view['materialized'] or view['references'] > 1 else 'low',
+                    'title': f"Move the filter into CTE {name}" if view['pushed_content'] else f"Let the filters reach CTE {name}",
+                    'description': (f"{dialect} {CTE_FENCES.get(family, 'may materialize a CTE before applying outer filters')}, "
+                                    f"so {predicates} runs only after every row of {name} is computed"),
+                    'code_example': '\n'.join(code),
+                    'impact': 'The CTE computes only the rows the outer query keeps and can use an index on the filtered column'
+                })
+            
+            if view['references'] > 1 and family == 'sqlserver':
+                suggestions.append({
+                    'type': 'cte_optimization',
+                    'priority': 'medium',
+                    'title': f"Compute CTE {name} once in a temporary table",
+                    'description': f"SQL Server expands a CTE at every reference, so {name} runs {view['references']} times",
+                    'code_example': (f"SELECT * INTO #{name} FROM (\n    {view['content']}\n) AS {name};\n"
+                                     f"-- then read #{name} in place of {name}"),
+                    'impact': f"Computes {name} once instead of {view['references']} times"
+                })
+            elif view['references'] > 1 and family == 'oracle' and not view['pushdown']:
+                suggestions.append({
+                    'type': 'cte_optimization',
+                    'priority': 'low',
+                    'title': f"Materialize CTE {name} once",
+                    'description': f"Oracle decides per query whether to materialize a reused CTE; the hint computes {name} once",
+                    'code_example': f"WITH {name} AS (SELECT /*+ MATERIALIZE */ ...)",
+                    'impact': f"Computes {name} once instead of {view['references']} times"
+                })
+            elif view['references'] == 0 and not view['data_modifying']:
+                suggestions.append({
+                    'type': 'cte_optimization',
+                    'priority': 'low',
+                    'title': f"Remove unused CTE {name}",
+                    'description': f"Nothing reads {name}; engines that materialize every CTE still compute it",
+                    'code_example': f"-- Remove from the WITH list: {definition} AS ({view['content']})",
+                    'impact': 'Skips computing rows nothing reads'
+                })
+        
+        # PostgreSQL, SQL Server, Oracle and MariaDB push outer filters into grouped derived tables themselves
+        for view in ctes.get('derived_tables', []):
+            if view['pushdown'] and view['pushed_content'] and not view['mergeable'] and self.dialect == 'mysql':
+                predicates = ' AND '.join(predicate['predicate'] for predicate in view['pushdown'])
+                suggestions.append({
+                    'type': 'cte_optimization',
+                    'priority': 'low',
+                    'title': f"Move the filter into derived table {view['name']}",
+                    'description': (f"MySQL before 8.0.22 materializes the {'grouped' if view['grouped'] else 'DISTINCT'} "
+                                    f"derived table {view['name']} before applying {predicates}"),
+                    'code_example': f"(\n    {view['pushed_content']}\n) AS {view['name']}",
+                    'impact': 'Groups only the rows the outer query keeps'
+                })
+        
+        return suggestions
+    
+    def _suggest_sort_optimizations(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Suggest window orderings that share a sort, indexes that return rows in sort order and enough sort memory"""
+        suggestions = []
+        sorts = analysis.get('sorts') or {}
+        if not sorts:
+            return suggestions
+        
+        if sorts['shared_window_sorts'] < sorts['window_sorts']:
+            changed = [window for window in sorts['windows'] if window['aligned_specification'] != window['specification']]
+            saved = sorts['window_sorts'] - sorts['shared_window_sorts']
+            suggestions.append({
+                'type': 'sort_optimization',
+                'priority': 'medium',
+                'title': 'List PARTITION BY columns in the same order so windows share a sort',
+                'description': (f"The windows are evaluated with {sorts['window_sorts']} sorts; listing their PARTITION BY "
+                                f"columns in one order lets {sorts['shared_window_sorts']} sort(s) serve them all"),
+                'code_example': '\n'.join(
+                    f"-- Instead of: {window['function']} OVER ({window['specification']})\n"
+                    f"{window['function']} OVER ({window['aligned_specification']})"
+                    for window in changed
+                ),
+                'impact': f"{saved} fewer sort(s) of every input row"
+            })
+        
+        order_sort = next((operation for operation in sorts['operations'] if operation['source'] == 'order_by'), None)
+        index_order = order_sort['index_order'] if order_sort else None
+        rows = sorts['estimated_rows']
+        if not index_order or index_order['satisfied_by'] or (analysis.get('pagination') or {}).get('deep_offset'):
+            return suggestions
+        mixed = len({column.endswith(' DESC') for column in index_order['index_columns'][-len(order_sort['keys']):]}) > 1
+        
+        if sorts['top_n'] and index_order['checked']:
+            code = index_order['statement']
+            if mixed and self.dialect == 'mysql':
+                code += '\n-- MySQL honors DESC index columns from 8.0; earlier versions sort mixed directions anyway'
+            limit = sorts['limit_rows']
+            suggestions.append({
+                'type': 'sort_optimization',
+                'priority': 'high' if rows is not None and limit is not None and rows >= 1000 * limit else 'medium',
+                'title': 'Let an index return the first rows in ORDER BY order',
+                'description': (f"No index on {index_order['table']} matches ORDER BY "
+                                f"{', '.join(analysis['order_by']['columns'])}, so "
+                                + (f"~{rows:,} rows are" if rows is not None else 'every matching row is')
+                                + ' sorted' + (f" to return {limit}" if limit is not None else '')),
+                'code_example': code,
+                'impact': (f"Reads about {limit} index entries instead of sorting "
+                           + (f"~{rows:,} rows" if rows is not None else 'every row')
+                           if limit is not None else 'Stops after the first N index entries instead of sorting every row')
+            })
+        elif sorts['spills_to_disk']:
+            megabytes = math.ceil(sorts['estimated_sort_bytes'] / 1048576)
+            setting = SORT_MEMORY_SETTINGS.get(self.dialect)
+            code = index_order['statement']
+            if setting:
+                code += '\n-- Or give this query enough sort memory:\n' + setting.format(
+                    megabytes=megabytes, bytes=sorts['estimated_sort_bytes'])
+            suggestions.append({
+                'type': 'sort_optimization',
+                'priority': 'medium',
+                'title': 'Avoid the on-disk sort',
+                'description': (f"Sorting ~{rows:,} rows needs ~{megabytes:,} MB, more than the sort memory, so "
+                                f"{DIALECT_NAMES.get(self.dialect, self.dialect)} sorts in passes through temporary files"),
+                'code_example': code,
+                'impact': 'Reads rows in index order, or sorts in memory without temporary-file I/O'
+            })
+        
+        return suggestions
+    
+    def _suggest_redundancy_eliminations(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Suggest dropping DISTINCT and GROUP BY, or using UNION ALL, where keys already make the rows unique"""
+        suggestions = []
+        
+        for redundant in (analysis.get('uniqueness') or {}).get('redundant', []):
+            operation = redundant['operation']
+            rows = redundant['estimated_rows']
+            work = redundant['estimated_work_bytes']
+            description = f"The {REDUNDANT_OPERATIONS[operation]} cannot remove any rows: {redundant['reason']}"
+            if operation == 'group_by':
+                description += ('. Each aggregate becomes its value over one row (COUNT to 1 or a NULL check); '
+                                'SUM and AVG may return a narrower type than before')
+            impact = 'Skips a sort or hash over every result row'
+            if rows is not None:
+                impact = f"Skips a sort or hash of ~{rows:,} rows (~{math.ceil(work / 1048576):,} MB)"
+                if work > SORT_MEMORY_BYTES:
+                    impact += ' that would not fit in sort memory'
+            suggestions.append({
+                'type': 'redundancy_elimination',
+                'priority': 'high' if work is not None and work > SORT_MEMORY_BYTES else 'medium',
+                'title': REDUNDANCY_TITLES[operation],
+                'description': description,
+                'code_example': redundant['rewritten_query'] or REDUNDANCY_FALLBACKS[operation],
+                'impact': impact
+            })
+        
+        return suggestions
+    
+    def _suggest_pagination_optimizations(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Suggest keyset (seek) pagination for deep OFFSET queries"""
+        suggestions = []
+        pagination = analysis.get('pagination') or {}
+        keyset = pagination.get('keyset')
+        
+        if not pagination.get('deep_offset') or not keyset or not keyset['rewritable']:
+            return suggestions
+        
+        keys = analysis['order_by']['keys'] + [
+            {'expression': column, 'direction': analysis['order_by']['keys'][-1]['direction'], 'nulls': None}
+            for column in pagination['tie_breaker']
+        ]
+        
+        if pagination['order_by_unique'] is False and pagination['tie_breaker']:
+            uniqueness = f"The ORDER BY is not unique, so {', '.join(pagination['tie_breaker'])} is appended as a tie-breaker."
+        elif pagination['order_by_unique'] is None:
+            uniqueness = 'Make sure the ORDER BY keys are unique (append the primary key if needed) so no row is skipped.'
+        else:
+            uniqueness = 'The ORDER BY keys form a unique key, so pages never overlap.'
+        
+        code_example = '-- Next page: bind the sort keys of the last row already returned\n'
+        if keyset.get('added_columns'):
+            code_example += f"-- {', '.join(keyset['added_columns'])} added to the select list so the client has them to bind\n"
+        nullable = pagination.get('nullable_keys') or []
+        if nullable:
+            uniqueness += (f" {', '.join(nullable)} can be NULL and the seek predicate is never true for NULL, so "
+                           'those rows would be skipped: page through them separately or declare the column NOT NULL.')
+            code_example += (f"-- Rows where {' or '.join(f'{key} IS NULL' for key in nullable)} never match the "
+                             'seek predicate; page through them separately\n')
+        code_example += self._build_keyset_query(keyset, keys, analysis['limit'])
+        if keyset['index_columns']:
+            index_name = 'idx_' + '_'.join(
+                [keyset['table'].split('.')[-1]] + [column.split()[0] for column in keyset['index_columns']]
+            ) + '_keyset'
+            code_example += (f"\n\n-- Supporting index\nCREATE INDEX {index_name} ON {keyset['table']}"
+                             f"({', '.join(keyset['index_columns'])});")
+        
+        offset = analysis['limit']['offset_value']
+        suggestions.append({
+            'type': 'pagination_optimization',
+            'priority': 'medium' if offset is None else 'high',
+            'title': 'Replace OFFSET pagination with keyset (seek) pagination',
+            'description': ('OFFSET makes the database read and discard every skipped row; seeking past the last '
+                            f"row seen reads only the rows of the page. {uniqueness}"),
+            'code_example': code_example,
+            'impact': (f"Avoids scanning {offset} discarded rows per page" if offset is not None
+                       else 'Page cost stays constant regardless of page depth')
+        })
+        
+        return suggestions
+    
+    def _build_keyset_query(self, keyset: Dict[str, Any], keys: List[Dict[str, Any]], limit: Dict[str, Any]) -> str:
+        """Render the seek-predicate version of a paginated query in the optimizer's dialect"""
+        placeholders = [':last_' + (NON_WORD.sub('_', key['expression'].split('.')[-1]).strip('_').lower() or str(i + 1))
+                        for i, key in enumerate(keys)]
+        directions = {key['direction'] for key in keys}
+        
+        if len(keys) == 1:
+            operator = '<' if keys[0]['direction'] == 'DESC' else '>'
+            predicate = f"{keys[0]['expression']} {operator} {placeholders[0]}"
+        elif len(directions) == 1 and self.dialect not in ('sqlserver', 'oracle'):
+            operator = '<' if 'DESC' in directions else '>'
+            predicate = (f"({', '.join(key['expression'] for key in keys)}) {operator} "
+                         f"({', '.join(placeholders)})")
+        else:
+            # Mixed directions (or no row-value comparison support): expand into an OR chain
+            branches = []
+            for i, key in enumerate(keys):
+                terms = [f"{keys[j]['expression']} = {placeholders[j]}" for j in range(i)]
+                terms.append(f"{key['expression']} {'<' if key['direction'] == 'DESC' else '>'} {placeholders[i]}")
+                branches.append('(' + ' AND '.join(terms) + ')')
+            predicate = '(' + '\n    OR '.join(branches) + ')'
+        
+        where = f"WHERE ({keyset['where']})\n  AND {predicate}" if keyset['where'] else f"WHERE {predicate}"
+        order_by = ', '.join(
+            key['expression'] + (' DESC' if key['direction'] == 'DESC' else '') + (f" {key['nulls']}" if key['nulls'] else '')
+            for key in keys
+        )
+        page_size = limit['limit_value'] if limit['limit_value'] is not None else ':page_size'
+        
+        if self.dialect == 'sqlserver':
+            page = f"OFFSET 0 ROWS FETCH NEXT {page_size} ROWS ONLY"
+        elif self.dialect == 'oracle':
+            page = f"FETCH FIRST {page_size} ROWS ONLY"
+        else:
+            page = f"LIMIT {page_size}"
+        
+        return f"{keyset['base_query']}\n{where}\nORDER BY {order_by}\n{page};"
+    
+    def _suggest_write_optimizations(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Suggest chunked execution for large UPDATE/DELETE statements"""
+        suggestions = []
+        write_path = analysis.get('write_path') or {}
+        
+        if not write_path.get('is_write'):
+            return suggestions
+        
+        if write_path['non_sargable_predicates']:
+            suggestions.append({
+                'type': 'write_optimization',
+                'priority': 'high',
+                'title': f"Make the {analysis['query_type']} filter sargable",
+                'description': (f"{', '.join(write_path['non_sargable_predicates'])} forces a full scan while rows are "
+                                'being locked; compare the bare column against a computed range or constant instead'),
+                'code_example': ("-- Instead of: WHERE DATE(created_at) = '2024-01-01'\n"
+                                 "-- Use: WHERE created_at >= '2024-01-01' AND created_at < '2024-01-02'"),
+                'impact': 'Lets the write locate its rows through an index and lock only those rows'
+            })
+        
+        if write_path['unbounded'] and write_path['batchable']:
+            key = write_path['batch_key']['column']
+            estimate = self.estimate_write_batch(analysis)
+            description = (f"Process {write_path['target_table']} in batches of {self.batch_size} rows keyed on {key}, "
+                           f"committing after each batch and pausing {self.batch_sleep}s so replicas and vacuum keep up")
+            if analysis['query_type'] == 'DELETE' and not write_path['where']:
+                description += '. If the goal is to empty the table, TRUNCATE avoids per-row logging entirely'
+            
+            suggestions.append({
+                'type': 'write_optimization',
+                'priority': 'high',
+                'title': f"Run the {analysis['query_type']} in keyset-batched chunks",
+                'description': description,
+                'code_example': self._build_batched_write(analysis, key),
+                'impact': (f"Each batch holds locks for ~{estimate['lock_ms_per_batch']} ms and writes "
+                           f"~{estimate['log_bytes_per_batch'] // 1024} KiB of {estimate['log_name']}"
+                           + (f" across ~{estimate['batches']:,} batches" if estimate['batches'] else ''))
+            })
+        elif write_path['unbounded'] and write_path.get('batch_key'):
+            suggestions.append({
+                'type': 'write_optimization',
+                'priority': 'medium',
+                'title': f"Split the {analysis['query_type']} into smaller transactions",
+                'description': (f"The statement writes every matching row in one transaction, but no keyset-batched "
+                                f"rewrite is generated: {write_path['batch_key']['reason']}"),
+                'code_example': ('-- Walk a unique, ordered integer key in ranges, committing after each range:\n'
+                                 '-- ... WHERE <filter> AND key > :last_key AND key <= :batch_max'),
+                'impact': 'Shorter lock holds and smaller WAL/binlog bursts per transaction'
+            })
+        
+        if write_path['indexed_columns_updated']:
+            suggestions.append({
+                'type': 'write_optimization',
+                'priority': 'low',
+                'title': 'Avoid updating indexed columns where possible',
+                'description': (f"Updating {', '.join(write_path['indexed_columns_updated'])} rewrites index entries; "
+                                'skip rows whose value does not change, or drop indexes that are not needed'),
+                'code_example': '-- Add: AND column IS DISTINCT FROM new_value',
+                'impact': 'Fewer index writes and, in PostgreSQL, HOT updates for unindexed changes'
+            })
+        
+        return suggestions
+    
+    def estimate_write_batch(self, analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """Estimate lock-hold time and WAL/binlog volume for one batch of an UPDATE/DELETE"""
+        write_path = analysis['write_path']
+        table = write_path['target_table']
+        mysql = self.dialect in ('mysql', 'mariadb')
+        row_bytes = self.schema.estimate_row_width(table) if self.schema and self.schema.get_table(table) else 100
+        indexes = self.schema.get_indexes(table) if self.schema else []
+        
+        if analysis['query_type'] == 'UPDATE':
+            # Non-HOT updates add a new entry to every index
+            touched_indexes = len(indexes) if write_path['indexed_columns_updated'] or mysql else 0
+            log_row_bytes = row_bytes * 2 if mysql else row_bytes
+        else:
+            # PostgreSQL only marks the tuple dead; index entries are removed later by vacuum
+            touched_indexes = len(indexes) if mysql else 0
+            log_row_bytes = row_bytes if mysql else 0
+        
+        per_row_bytes = LOG_RECORD_OVERHEAD_BYTES + log_row_bytes + (0 if mysql else touched_indexes * INDEX_ENTRY_BYTES)
+        per_row_micros = ROW_WRITE_MICROS + touched_indexes * INDEX_ENTRY_MICROS
+        rows = write_path['estimated_rows']
+        
+        return {
+            'batch_size': self.batch_size,
+            'lock_ms_per_batch': round(self.batch_size * per_row_micros / 1000, 1),
+            'log_bytes_per_batch': self.batch_size * per_row_bytes,
+            'log_name': 'binlog' if mysql else ('transaction log' if self.dialect == 'sqlserver' else 'WAL'),
+            'batches': -(-rows // self.batch_size) if rows else None
+        }
+    
+    def _build_batched_write(self, analysis: Dict[str, Any], key: str) -> str:
+        """Render a keyset-batched loop for an UPDATE/DELETE in the optimizer's dialect"""
+        write_path = analysis['write_path']
+        table = write_path['target_table']
+        where = f"({write_path['where']}) AND " if write_path['where'] else ''
+        # The cursor has the key's own type and starts just below its smallest value
+        key_type = write_path['batch_key']['variable_type']
+        start = write_path['batch_key']['start']
+        
+        def write_statement(last, batch_max):
+            range_filter = f"{where}{key} > {last} AND {key} <= {batch_max}"
+            if analysis['query_type'] == 'UPDATE':
+                return f"UPDATE {table} SET {write_path['set_clause']} WHERE {range_filter};"
+            return f"DELETE FROM {table} WHERE {range_filter};"
+        
+        if self.dialect in ('mysql', 'mariadb'):
+            return (
+                "DELIMITER $$\n"
+                f"CREATE PROCEDURE batched_{analysis['query_type'].lower()}_{table.split('.')[-1]}()\n"
+                "BEGIN\n"
+                f"    DECLARE last_key {key_type.upper()};\n"
+                f"    DECLARE batch_max {key_type.upper()};\n"
+                f"    SELECT {start} INTO last_key FROM {table};\n"
+                "    REPEAT\n"
+                f"        SELECT MAX({key}) INTO batch_max FROM (\n"
+                f"            SELECT {key} FROM {table} WHERE {where}{key} > last_key ORDER BY {key} LIMIT {self.batch_size}\n"
+                "        ) AS batch;\n"
+                "        IF batch_max IS NOT NULL THEN\n"
+                f"            {write_statement('last_key', 'batch_max')}\n"
+                "            SET last_key = batch_max;\n"
+                "            COMMIT;\n"
+                f"            DO SLEEP({self.batch_sleep});\n"
+                "        END IF;\n"
+                "    UNTIL batch_max IS NULL END REPEAT;\n"
+                "END$$\n"
+                "DELIMITER ;"
+            )
+        
+        if self.dialect == 'sqlserver':
+            delay = f"{self.batch_sleep:06.3f}"
+            return (
+                f"DECLARE @last_key {key_type.upper()}, @batch_max {key_type.upper()};\n"
+                f"SELECT @last_key = {start} FROM {table};\n"
+                "WHILE 1 = 1\n"
+                "BEGIN\n"
+                f"    SELECT @batch_max = MAX({key}) FROM (\n"
+                f"        SELECT TOP ({self.batch_size}) {key} FROM {table} WHERE {where}{key} > @last_key ORDER BY {key}\n"
+                "    ) AS batch;\n"
+                "    IF @batch_max IS NULL BREAK;\n"
+                f"    {write_statement('@last_key', '@batch_max')}\n"
+                "    SET @last_key = @batch_max;\n"
+                f"    WAITFOR DELAY '00:00:{delay}';\n"
+                "END;"
+            )
+        
+        if self.dialect in ('postgresql', 'postgres'):
+            # COMMIT inside DO requires PostgreSQL 11+ and must run outside an explicit transaction
+            return (
+                "DO $$\n"
+                "DECLARE\n"
+                f"    last_key {key_type};\n"
+                f"    batch_max {key_type};\n"
+                "BEGIN\n"
+                f"    SELECT {start} INTO last_key FROM {table};\n"
+                "    LOOP\n"
+                f"        SELECT max({key}) INTO batch_max FROM (\n"
+                f"            SELECT {key} FROM {table} WHERE {where}{key} > last_key ORDER BY {key} LIMIT {self.batch_size}\n"
+                "        ) AS batch;\n"
+                "        EXIT WHEN batch_max IS NULL;\n"
+                f"        {write_statement('last_key', 'batch_max')}\n"
+                "        last_key := batch_max;\n"
+                "        COMMIT;\n"
+                f"        PERFORM pg_sleep({self.batch_sleep});\n"
+                "    END LOOP;\n"
+                "END $$;"
+            )
+        
+        return (
+            f"-- Start from :last_key = (SELECT {start} FROM {table}) and repeat from the application\n"
+            "-- until no rows remain, committing between batches\n"
+            f"SELECT MAX({key}) AS batch_max FROM (\n"
+            f"    SELECT {key} FROM {table} WHERE {where}{key} > :last_key ORDER BY {key} LIMIT {self.batch_size}\n"
+            ") AS batch;\n"
+            f"{write_statement(':last_key', ':batch_max')}"
+        )
+    
     def _suggest_general_optimizations(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Suggest general optimizations"""
         suggestions = []
@@ -249,12 +1139,41 @@ class SQLOptimizer:
                 'priority': 'medium',
                 'title': 'Consider breaking down complex query',
                 'description': 'Complex queries can be broken into smaller, more manageable parts',
-                'code_example': '-- Use CTEs (Common Table Expressions) or temporary tables',
+                'code_example': ('-- Use CTEs (Common Table Expressions) or temporary tables\n'
+                                 '-- Keep filters inside each CTE: a materialized CTE is an optimization fence'),
                 'impact': 'Improves maintainability and potentially performance'
             })
         
         return suggestions
     
+    def _suggest_ddl_optimizations(self, analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Suggest the online form of DDL that would block traffic while it scans or rewrites a table"""
+        suggestions = []
+        
+        for operation in (analysis.get('ddl') or {}).get('operations', []):
+            issue = operation['issue']
+            if not issue or not operation['safe_alternative']:
+                continue
+            
+            description = f"{issue['message']}. Run these steps instead; each holds its lock only briefly"
+            if any('CONCURRENTLY' in step for step in operation['safe_alternative']):
+                description += '. CONCURRENTLY cannot run inside a transaction block'
+            if any(step.startswith('UPDATE') for step in operation['safe_alternative']):
+                description += '. Run the backfill UPDATE in keyset batches'
+            seconds = operation['estimated_seconds']
+            
+            suggestions.append({
+                'type': 'ddl_optimization',
+                'priority': 'high' if issue['severity'] == 'high' else 'medium',
+                'title': DDL_SUGGESTION_TITLES[issue['type']],
+                'description': description,
+                'code_example': '\n'.join(operation['safe_alternative']),
+                'impact': (f"Avoids blocking {issue['blocks']} on {operation['table']}"
+                           + (f" for ~{seconds:,.0f} s" if seconds else ''))
+            })
+        
+        return suggestions
+    
     def _get_priority_score(self, priority: str) -> int:
         """Convert priority string to numeric score for sorting"""
         priority_scores = {
@@ -273,7 +1192,7 @@ class SQLOptimizer:
         if analysis['query_type'] == 'SELECT' and not analysis['limit']['has_limit']:
             if 'ORDER BY' in optimized_query.upper():
                 # Add LIMIT after ORDER BY
-                optimized_query = re.sub(r'ORDER BY.*$', r'\g<0> LIMIT 1000', optimized_query, flags=re.IGNORECASE)
+                optimized_query = ORDER_BY_TAIL.sub(r'\g<0> LIMIT 1000', optimized_query)
             else:
                 # Add LIMIT at the end
                 optimized_query += ' LIMIT 1000'
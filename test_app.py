@@ -142,6 +142,1326 @@ def test_api_endpoint():
         print(f"❌ API test failed: {str(e)}")
         return False
 
+def test_sequence_analysis():
+    """Test N+1 and single-row INSERT burst detection"""
+    print("\n🔁 Testing sequence analysis...")
+    
+    from sequence_analyzer import SequenceAnalyzer
+    
+    statements = [f"SELECT name FROM users WHERE id = {i};" for i in range(1, 6)]
+    statements += [f"INSERT INTO events (id, kind) VALUES ({i}, 'click');" for i in range(4)]
+    
+    result = SequenceAnalyzer().analyze_sequence('\n'.join(statements))
+    patterns = [burst['pattern'] for burst in result['bursts']]
+    
+    assert patterns == ['n_plus_one_select', 'single_row_insert']
+    assert result['round_trips_saved'] == 7
+    assert 'id IN (1, 2, 3, 4, 5)' in result['bursts'][0]['rewrites'][0]['sql']
+    assert result['bursts'][1]['rewrites'][0]['strategy'] == 'multi_row_values'
+    
+    # COPY keeps empty strings apart from NULL
+    inserts = [f"INSERT INTO events (id, kind) VALUES ({i}, {value});" for i, value in enumerate(["''", "'a\"b'", "''"])]
+    inserts += [f"INSERT INTO events (id, kind) VALUES ({i}, NULL);" for i in range(3, 6)]
+    copies = [burst['rewrites'][-1] for burst in SequenceAnalyzer().analyze_sequence('\n'.join(inserts))['bursts']]
+    assert [copy['strategy'] for copy in copies] == ['copy', 'copy']
+    assert copies[0]['sql'].split('\n')[1:] == ['"0",""', '"1","a""b"', '"2",""', '\\.']
+    assert copies[1]['sql'].split('\n')[1:] == ['"3",', '"4",', '"5",', '\\.']
+    
+    # Statement-level tails are kept once, and rows holding expressions are never sent through COPY
+    returning = [f"INSERT INTO events (id, kind) VALUES ({i}, 'x') RETURNING id;" for i in range(3)]
+    rewrites = SequenceAnalyzer().analyze_sequence('\n'.join(returning))['bursts'][0]['rewrites']
+    assert [rewrite['strategy'] for rewrite in rewrites] == ['multi_row_values']
+    assert rewrites[0]['sql'].endswith("(2, 'x')\nRETURNING id;")
+    stamped = [f"INSERT INTO events (id, created_at) VALUES ({i}, now());" for i in range(3)]
+    rewrites = SequenceAnalyzer().analyze_sequence('\n'.join(stamped))['bursts'][0]['rewrites']
+    assert [rewrite['strategy'] for rewrite in rewrites] == ['multi_row_values']
+    
+    # Identical INSERTs stay a batching burst; identical SELECTs are duplicates
+    repeated = SequenceAnalyzer().analyze_sequence("INSERT INTO hits (page) VALUES ('home');" * 3)['bursts'][0]
+    assert repeated['pattern'] == 'single_row_insert'
+    assert SequenceAnalyzer().analyze_sequence("SELECT 1 FROM t WHERE id = 1;" * 3)['bursts'][0]['pattern'] == 'duplicate_statement'
+    
+    # Statements further apart than the time window do not form a burst
+    log = [{'sql': f"SELECT name FROM users WHERE id = {i}", 'timestamp': i * 10} for i in range(5)]
+    assert SequenceAnalyzer(window_seconds=1.0).analyze_sequence(log)['bursts'] == []
+    
+    print("✅ Sequence analysis working")
+    return True
+
+def test_index_advisor():
+    """Test redundant and unused index detection"""
+    print("\n🗂️  Testing index advisor...")
+    
+    from schema_catalog import SchemaCatalog
+    from index_advisor import IndexAdvisor
+    
+    ddl = """
+    CREATE TABLE orders (
+        id BIGINT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        status VARCHAR(20),
+        created_at TIMESTAMP
+    );
+    CREATE INDEX orders_user_status_idx ON orders (user_id, status);
+    CREATE INDEX orders_user_idx ON orders (user_id);
+    CREATE INDEX orders_id_idx ON orders (id);
+    CREATE INDEX orders_status_idx ON orders (status);
+    CREATE INDEX orders_status_copy_idx ON orders (status);
+    CREATE INDEX orders_created_idx ON orders (created_at);
+    """
+    usage = "relname,indexrelname,idx_scan\norders,orders_created_idx,0\norders,orders_user_status_idx,5120\n"
+    
+    catalog = SchemaCatalog().load_ddl(ddl).load_index_usage(usage)
+    report = IndexAdvisor(catalog).analyze()
+    reasons = {finding['index']: finding['reason'] for finding in report['findings']}
+    
+    assert reasons == {
+        'orders_user_idx': 'left_prefix',
+        'orders_id_idx': 'redundant_with_primary_key',
+        'orders_status_copy_idx': 'duplicate',
+        'orders_created_idx': 'unused'
+    }
+    assert report['tables'][0]['write_amplification'] == 8
+    assert report['tables'][0]['write_amplification_after'] == 4
+    
+    # Drop recommendations show up next to the regular index suggestions
+    analyzer = SQLAnalyzer()
+    analysis_results = analyzer.analyze_queries(analyzer.parse_sql("UPDATE orders SET status = 'paid' WHERE id = 1;"))
+    suggestions = SQLOptimizer(schema=catalog).generate_suggestions(analysis_results)[0]
+    assert sum(1 for suggestion in suggestions if suggestion['type'] == 'index_drop') == 4
+    
+    print("✅ Index advisor working")
+    return True
+
+def test_keyset_pagination():
+    """Test OFFSET pagination parsing and keyset rewrite generation"""
+    print("\n📄 Testing keyset pagination...")
+    
+    from schema_catalog import SchemaCatalog
+    
+    analyzer = SQLAnalyzer()
+    for sql, limit_value, offset_value in [
+        ("SELECT id FROM posts ORDER BY id LIMIT 20 OFFSET 40;", 20, 40),
+        ("SELECT id FROM posts ORDER BY id LIMIT 40, 20;", 20, 40),
+        ("SELECT id FROM posts ORDER BY id OFFSET 40 ROWS FETCH NEXT 20 ROWS ONLY;", 20, 40),
+        ("SELECT TOP 20 id FROM posts ORDER BY id;", 20, None),
+    ]:
+        limit = analyzer.analyze_queries(analyzer.parse_sql(sql))[0]['limit']
+        assert limit['has_limit'] and limit['limit_value'] == limit_value, sql
+        assert limit['offset_value'] == offset_value, sql
+    
+    schema = SchemaCatalog().load_ddl("CREATE TABLE posts (id BIGINT PRIMARY KEY, author_id INT, created_at TIMESTAMP);")
+    sql = "SELECT id, created_at FROM posts WHERE author_id = 7 ORDER BY created_at DESC LIMIT 20 OFFSET 5000;"
+    analysis_results = SQLAnalyzer(schema=schema).analyze_queries(SQLAnalyzer().parse_sql(sql))
+    
+    assert 'deep_offset' in [issue['type'] for issue in analysis_results[0]['issues']]
+    assert analysis_results[0]['pagination']['order_by_unique'] is False
+    assert analysis_results[0]['pagination']['tie_breaker'] == ['id']
+    
+    suggestion = next(
+        suggestion for suggestion in SQLOptimizer(schema=schema).generate_suggestions(analysis_results)[0]
+        if suggestion['type'] == 'pagination_optimization'
+    )
+    assert '(created_at, id) < (:last_created_at, :last_id)' in suggestion['code_example']
+    assert 'ON posts(author_id, created_at DESC, id DESC)' in suggestion['code_example']
+    assert 'OFFSET' not in suggestion['code_example']
+    
+    # Sort keys the client never received are selected, and nullable keys come with a warning
+    schema.load_ddl("CREATE TABLE users (id BIGINT PRIMARY KEY, name TEXT, email TEXT);")
+    sql = "SELECT email FROM users ORDER BY name DESC LIMIT 20 OFFSET 100000"
+    analysis = SQLAnalyzer(schema=schema).analyze_queries(SQLAnalyzer().parse_sql(sql))[0]
+    assert analysis['pagination']['nullable_keys'] == ['name']
+    suggestion = next(
+        suggestion for suggestion in SQLOptimizer(schema=schema).generate_suggestions([analysis])[0]
+        if suggestion['type'] == 'pagination_optimization'
+    )
+    assert 'SELECT email, name, id FROM users' in suggestion['code_example']
+    assert 'name IS NULL never match' in suggestion['code_example'] and 'name can be NULL' in suggestion['description']
+    
+    print("✅ Keyset pagination working")
+    return True
+
+def test_write_path_analysis():
+    """Test UPDATE/DELETE write-path detection and batched rewrites"""
+    print("\n✏️  Testing write-path analysis...")
+    
+    from schema_catalog import SchemaCatalog
+    
+    schema = SchemaCatalog().load_ddl("""
+    CREATE TABLE events (id BIGINT PRIMARY KEY, created_at TIMESTAMP, kind VARCHAR(40));
+    CREATE INDEX events_kind_idx ON events (kind);
+    """).load_table_stats("relname,n_live_tup\nevents,200000000\n")
+    analyzer = SQLAnalyzer(schema=schema)
+    
+    sql = """
+    DELETE FROM events WHERE created_at < '2023-01-01';
+    UPDATE events SET kind = 'archived';
+    UPDATE events SET kind = 'x' WHERE DATE(created_at) = '2024-01-01';
+    DELETE FROM events WHERE id = 42;
+    """
+    analysis_results = analyzer.analyze_queries(analyzer.parse_sql(sql))
+    issue_types = [[issue['type'] for issue in analysis['issues']] for analysis in analysis_results]
+    
+    assert 'unbounded_write' in issue_types[0]
+    assert 'write_without_where' in issue_types[1] and 'indexed_column_update' in issue_types[1]
+    assert 'non_sargable_write' in issue_types[2]
+    assert issue_types[3] == []
+    
+    optimizer = SQLOptimizer(schema=schema, dialect='mysql', batch_size=1000)
+    suggestion = next(
+        suggestion for suggestion in optimizer.generate_suggestions(analysis_results)[0]
+        if suggestion['title'].startswith('Run the DELETE')
+    )
+    assert 'LIMIT 1000' in suggestion['code_example'] and 'DO SLEEP' in suggestion['code_example']
+    
+    assert 'DECLARE last_key BIGINT;' in suggestion['code_example']
+    assert 'SELECT MIN(id) - 1 INTO last_key FROM events;' in suggestion['code_example']
+    
+    estimate = optimizer.estimate_write_batch(analysis_results[0])
+    assert estimate['batches'] == 200000 and estimate['log_name'] == 'binlog'
+    
+    # Only a single-column integer key that the statement leaves alone is walked in batches
+    schema.load_ddl("""
+    CREATE TABLE sessions (token uuid PRIMARY KEY, expired boolean);
+    CREATE TABLE order_lines (order_id int, line int, qty int, PRIMARY KEY (order_id, line));
+    """)
+    sql = """
+    DELETE FROM sessions WHERE expired;
+    DELETE FROM order_lines WHERE qty = 0;
+    UPDATE events SET id = id + 1000000 WHERE kind = 'x';
+    DELETE FROM audit WHERE created_at < '2020-01-01';
+    """
+    unbatchable = analyzer.analyze_queries(analyzer.parse_sql(sql))
+    assert not any(analysis['write_path']['batchable'] for analysis in unbatchable)
+    reasons = [analysis['write_path']['batch_key']['reason'] for analysis in unbatchable]
+    assert 'sessions.token is uuid' in reasons[0] and 'several columns' in reasons[1]
+    assert 'changes the key id' in reasons[2] and 'does not describe audit' in reasons[3]
+    for suggestions in SQLOptimizer(schema=schema).generate_suggestions(unbatchable):
+        assert not any('last_key' in s['code_example'] and 'DECLARE' in s['code_example'] for s in suggestions)
+        assert any(s['title'].startswith('Split the') for s in suggestions)
+    
+    postgres = SQLOptimizer(schema=schema).generate_suggestions(analysis_results[:1])[0]
+    loop = next(s['code_example'] for s in postgres if s['title'].startswith('Run the DELETE'))
+    assert '    last_key bigint;' in loop and 'SELECT MIN(id) - 1 INTO last_key FROM events;' in loop
+    
+    print("✅ Write-path analysis working")
+    return True
+
+def test_subquery_decorrelation():
+    """Test correlated subquery classification and decorrelated rewrites"""
+    print("\n🔗 Testing subquery decorrelation...")
+    
+    from schema_catalog import SchemaCatalog
+    
+    schema = SchemaCatalog().load_ddl("""
+    CREATE TABLE users (id INT PRIMARY KEY, name VARCHAR(100));
+    CREATE TABLE orders (id INT PRIMARY KEY, user_id INT, status VARCHAR(20), created_at TIMESTAMP);
+    """).load_table_stats("relname,n_live_tup\nusers,50000\norders,900000\n")
+    analyzer = SQLAnalyzer(schema=schema)
+    
+    sql = """
+    SELECT u.id, (SELECT COUNT(*) FROM orders o WHERE o.user_id = u.id AND o.status = 'paid') AS order_count
+    FROM users u WHERE u.id NOT IN (SELECT user_id FROM orders WHERE status = 'refunded');
+    SELECT * FROM orders o WHERE o.created_at = (SELECT MAX(o2.created_at) FROM orders o2 WHERE o2.user_id = o.user_id);
+    SELECT u.id FROM users u WHERE EXISTS (SELECT 1 FROM orders o WHERE o.user_id = u.id AND o.created_at > u.name);
+    """
+    analysis_results = analyzer.analyze_queries(analyzer.parse_sql(sql))
+    
+    scalar, not_in = analysis_results[0]['subqueries']
+    assert scalar['kind'] == 'scalar' and scalar['location'] == 'select' and scalar['correlated']
+    assert scalar['correlation_predicates'] == [{'inner': 'o.user_id', 'outer': 'u.id'}]
+    assert scalar['aggregate'] == 'COUNT' and scalar['estimated_executions'] == 50000
+    assert not_in['kind'] == 'not_in' and not not_in['correlated']
+    assert 'correlated_subquery' in [issue['type'] for issue in analysis_results[0]['issues']]
+    
+    optimizer = SQLOptimizer(schema=schema)
+    suggestions = optimizer.generate_suggestions(analysis_results)
+    examples = [s['code_example'] for s in suggestions[0] if s['type'] == 'subquery_optimization']
+    assert any('GROUP BY o.user_id' in example and 'COALESCE' in example for example in examples)
+    # The subquery's own filter stays in the NOT EXISTS, and the NULL caveat is spelled out
+    not_exists = [example for example in examples if 'NOT EXISTS' in example][0]
+    assert "WHERE status = 'refunded' AND user_id = u.id" in not_exists
+    assert 'user_id can be NULL' in not_exists
+    window = [s for s in suggestions[1] if s['type'] == 'subquery_optimization'][0]
+    assert 'OVER (PARTITION BY o.user_id)' in window['code_example']
+    assert '899,999' in window['impact']
+    assert window['code_example'].index('-- AND the outer query') > window['code_example'].index('WHERE o.created_at')
+    # A non-equality predicate on the outer row cannot move into a joined derived table
+    correlated = analysis_results[2]['subqueries'][0]
+    assert correlated['correlated_filters'] == ['o.created_at > u.name']
+    assert not any('JOIN (' in s['code_example'] or 'LATERAL' in s['code_example']
+                   for s in suggestions[2] if s['type'] == 'subquery_optimization')
+    
+    print("✅ Subquery decorrelation working")
+    return True
+
+def test_job_queue():
+    """Test background analysis jobs, progress polling, TTL and the concurrency bound"""
+    print("\n📬 Testing analysis job queue...")
+    
+    import tempfile
+    import threading
+    import time
+    from job_queue import JobStore, JobQueue, JobQueueFull
+    
+    with tempfile.TemporaryDirectory() as directory:
+        store = JobStore(os.path.join(directory, 'jobs.sqlite3'), ttl_seconds=60)
+        queue = JobQueue(store, max_workers=1, max_pending=1)
+        release = threading.Event()
+        
+        def analysis(sql, progress):
+            release.wait(5)
+            progress(1, 1)
+            return {'sql': sql}
+        
+        job_id = queue.submit(analysis, 'SELECT 1')
+        assert queue.get(job_id)['status'] in ('queued', 'running')
+        try:
+            queue.submit(analysis, 'SELECT 2')
+            assert False, 'queue limit not enforced'
+        except JobQueueFull:
+            pass
+        
+        release.set()
+        for _ in range(100):
+            job = queue.get(job_id)
+            if job['status'] == 'completed':
+                break
+            time.sleep(0.05)
+        assert job['status'] == 'completed' and job['result'] == {'sql': 'SELECT 1'}
+        assert job['progress']['percent'] == 100.0
+        
+        store.update(job_id, expires_at=0)
+        assert queue.get(job_id) is None and store.purge_expired() == 1
+        queue._executor.shutdown()
+    
+    print("✅ Analysis job queue working")
+    return True
+
+def test_analysis_stream():
+    """Test the Server-Sent Events analysis stream and that it stops when the client goes away"""
+    print("\n📡 Testing analysis progress stream...")
+    
+    import json
+    import app as web_app
+    
+    client = web_app.app.test_client()
+    sql = ';\n'.join(f"SELECT * FROM users WHERE id = {n}" for n in range(50)) + ';'
+    
+    response = client.post('/analyze/stream', data={'sql_text': sql})
+    assert response.mimetype == 'text/event-stream'
+    frames = [frame for frame in response.get_data(as_text=True).split('\n\n') if frame]
+    events = [(frame.split('\n')[0][len('event: '):], json.loads(frame.split('\n')[1][len('data: '):])) for frame in frames]
+    assert events[0][1]['statements_parsed'] == 50
+    assert sum(1 for event, _ in events if event == 'query') == 50
+    assert events[-1][0] == 'summary' and events[-1][1]['total_queries'] == 50
+    
+    analyzed = []
+    
+    class CountingAnalyzer(web_app.SQLAnalyzer):
+        def analyze_queries(self, parsed_queries):
+            analyzed.extend(parsed_queries)
+            return super().analyze_queries(parsed_queries)
+    
+    # The shared cache already holds these statements from the first request
+    original_analyzer, original_cache = web_app.SQLAnalyzer, web_app.analysis_cache
+    web_app.SQLAnalyzer, web_app.analysis_cache = CountingAnalyzer, None
+    try:
+        response = client.post('/analyze/stream', data={'sql_text': sql}, buffered=False)
+        stream = iter(response.response)
+        next(stream)
+        next(stream)
+        response.close()
+    finally:
+        web_app.SQLAnalyzer, web_app.analysis_cache = original_analyzer, original_cache
+    assert len(analyzed) == 1
+    
+    print("✅ Analysis progress stream working")
+    return True
+
+def test_consolidated_report():
+    """Test the workload-consolidated report groups repeated statements and shrinks the response"""
+    print("\n🗜️  Testing consolidated workload report...")
+    
+    import app as web_app
+    
+    client = web_app.app.test_client()
+    sql = '\n'.join(
+        f"SELECT * FROM users WHERE email = 'user{n}@example.com' ORDER BY name; UPDATE orders SET status = 'x' WHERE id = {n};"
+        for n in range(300)
+    )
+    
+    full = client.post('/analyze', data={'sql_text': sql})
+    report = client.post('/analyze', data={'sql_text': sql, 'report': 'consolidated', 'statements': '1,2'})
+    assert len(full.get_data()) >= 10 * len(report.get_data())
+    
+    data = report.get_json()
+    assert data['summary']['total_queries'] == 600 and data['summary']['unique_fingerprints'] == 2
+    assert data['fingerprints'][0]['count'] == 300
+    titles = [suggestion['title'] for suggestion in data['suggestions']]
+    assert len(titles) == len(set(titles))
+    assert all(suggestion['count'] == len(suggestion['statement_ids']) for suggestion in data['suggestions'])
+    assert [statement['id'] for statement in data['statements']] == [1, 2]
+    
+    # Malformed statement ids are a client error, rejected before any analysis runs
+    bad = client.post('/analyze', data={'sql_text': sql, 'report': 'consolidated', 'statements': 'abc'})
+    assert bad.status_code == 400 and 'statements' in bad.get_json()['error']
+    bad = client.post('/api/analyze', json={'sql': 'SELECT 1', 'report': 'consolidated', 'statements': [1.5]})
+    assert bad.status_code == 400
+    
+    print("✅ Consolidated workload report working")
+    return True
+
+def test_response_shaping():
+    """Test sparse fieldsets, cursor pagination and on-demand formatting on /api/analyze"""
+    print("\n✂️  Testing response shaping...")
+    
+    import app as web_app
+    
+    client = web_app.app.test_client()
+    sql = '\n'.join(f"SELECT * FROM users WHERE id = {n};" for n in range(25))
+    
+    full = client.post('/api/analyze', json={'sql': sql}).get_json()
+    assert 'formatted_query' not in full['analysis'][0] and len(full['analysis']) == 25
+    
+    page = client.post('/api/analyze?fields=issues,complexity_score&limit=10', json={'sql': sql}).get_json()
+    assert set(page['analysis'][0]) == {'issues', 'complexity_score'} and 'suggestions' not in page
+    assert len(page['analysis']) == 10 and page['page']['total_statements'] == 25
+    
+    seen = len(page['analysis'])
+    while page['page']['next_cursor']:
+        page = client.post(f"/api/analyze?fields=issues&limit=10&cursor={page['page']['next_cursor']}",
+                           json={'sql': sql}).get_json()
+        seen += len(page['analysis'])
+    assert seen == 25 and page['page']['offset'] == 20
+    
+    # Each statement keeps its own text, even when a statement before it yields no analysis
+    mixed = "-- header only\n;SELECT 1 FROM a WHERE id = 1;\nSELECT 2 FROM b WHERE id = 2;"
+    shaped = client.post('/api/analyze?fields=original_query&limit=5', json={'sql': mixed}).get_json()
+    assert [entry['original_query'].strip() for entry in shaped['analysis']] == \
+        ['SELECT 1 FROM a WHERE id = 1;', 'SELECT 2 FROM b WHERE id = 2;']
+    second = client.post('/api/analyze?fields=original_query&limit=1', json={'sql': mixed}).get_json()
+    assert second['page']['total_statements'] == 2 and second['analysis'][0]['original_query'].startswith('SELECT 1')
+    
+    formatted = client.post('/api/analyze', json={'sql': sql, 'fields': ['formatted_query'], 'limit': 1}).get_json()
+    assert formatted['analysis'][0]['formatted_query'].startswith('SELECT *\nFROM users')
+    
+    assert client.post('/api/analyze?cursor=bogus', json={'sql': sql}).status_code == 400
+    for bad_limit in ('-1', '0', 'ten', '2.5'):
+        assert client.post(f'/api/analyze?limit={bad_limit}', json={'sql': sql}).status_code == 400
+    assert client.post('/api/analyze', json={'sql': sql, 'limit': -1}).status_code == 400
+    capped = client.post('/api/analyze?limit=1000000&fields=issues', json={'sql': sql}).get_json()
+    assert capped['page']['limit'] == web_app.MAX_PAGE_LIMIT and capped['page']['next_cursor'] is None
+    
+    print("✅ Response shaping working")
+    return True
+
+def test_query_clustering():
+    """Test MinHash/LSH clustering of near-duplicate queries"""
+    print("\n🧩 Testing near-duplicate query clustering...")
+    
+    from query_clustering import QueryClusterer
+    
+    report = "SELECT u.id, u.name, u.email{extra} FROM users u JOIN orders o ON o.user_id = u.id " \
+             "WHERE o.status = 'paid' AND o.created_at > '{day}' ORDER BY u.name"
+    log = [
+        {'sql': report.format(extra='', day='2024-01-01'), 'duration_ms': 120},
+        {'sql': report.format(extra='', day='2024-01-02'), 'duration_ms': 80},
+        {'sql': report.format(extra=', u.phone', day='2024-02-01'), 'duration_ms': 300},
+        {'sql': "SELECT count(*) FROM products WHERE category = 'books'", 'duration_ms': 5},
+        {'sql': "DELETE FROM sessions WHERE expires_at < now()", 'duration_ms': 7},
+    ]
+    
+    result = QueryClusterer().cluster(log)
+    assert result['total_statements'] == 5 and result['unique_fingerprints'] == 4
+    assert len(result['clusters']) == 1
+    
+    cluster = result['clusters'][0]
+    assert cluster['variant_count'] == 2 and cluster['statement_count'] == 3
+    assert cluster['total_duration_ms'] == 500.0
+    assert 'u.phone' in cluster['representative_query']
+    
+    print("✅ Near-duplicate query clustering working")
+    return True
+
+def test_materialized_view_advisor():
+    """Test materialized view recommendations for repeated rollups"""
+    print("\n🧊 Testing materialized view advisor...")
+    
+    from schema_catalog import SchemaCatalog
+    from view_advisor import MaterializedViewAdvisor
+    
+    schema = SchemaCatalog().load_table_stats("relname,n_live_tup\nevents,50000000\n")
+    sql = """
+    SELECT date_trunc('day', e.created_at) AS day, e.tenant_id, COUNT(*) AS events FROM events e
+    WHERE e.kind = 'purchase' AND e.tenant_id = 42 GROUP BY 1, e.tenant_id;
+    SELECT date_trunc('day', e.created_at) AS day, AVG(e.amount) FROM events e
+    WHERE e.kind = 'purchase' GROUP BY date_trunc('day', e.created_at) HAVING COUNT(*) > 10;
+    SELECT e.tenant_id, COUNT(DISTINCT e.user_id) FROM events e WHERE e.kind = 'purchase' GROUP BY e.tenant_id;
+    SELECT * FROM users;
+    """
+    result = MaterializedViewAdvisor(schema=schema).recommend(sql)
+    assert result['total_statements'] == 4 and result['aggregate_statements'] == 3
+    
+    recommendation = result['recommendations'][0]
+    assert recommendation['variant_count'] == 2
+    assert [key['column'] for key in recommendation['grouping_keys']] == ['day', 'tenant_id']
+    assert recommendation['fixed_filters'] == ["e.kind = 'purchase'"]
+    assert recommendation['create_statement'].startswith('CREATE MATERIALIZED VIEW mv_events_by_day_tenant_id')
+    
+    rewrites = [rewrite['rewritten_query'] for rewrite in recommendation['rewrites']]
+    assert 'SUM(count_all) AS events' in rewrites[0] and 'WHERE tenant_id = 42' in rewrites[0]
+    assert 'SUM(sum_amount) / NULLIF(SUM(count_amount), 0)' in rewrites[1]
+    assert 'HAVING SUM(count_all) > 10' in rewrites[1]
+    
+    assert recommendation['estimate']['estimated_view_rows'] == 10000
+    assert recommendation['estimate']['refresh']['rows_scanned_per_refresh'] == 50000000
+    
+    # Filters on a measure or a timestamp would turn into near-unique view keys, so those queries stay out;
+    # a key that only ever filters leaves the view's size unknown
+    schema.load_ddl("CREATE TABLE orders (id BIGINT PRIMARY KEY, region TEXT, channel TEXT, amount NUMERIC(12,2), "
+                    "created_at TIMESTAMP); ")
+    schema.load_table_stats("relname,n_live_tup\norders,1000000\n")
+    sql = """
+    SELECT region, SUM(amount) FROM orders WHERE channel = 'web' GROUP BY region;
+    SELECT region, COUNT(*) FROM orders GROUP BY region;
+    SELECT region, COUNT(*) FROM orders WHERE amount > 100 GROUP BY region;
+    SELECT region, COUNT(*) FROM orders WHERE created_at >= '2024-01-01' GROUP BY region;
+    """
+    recommendation = MaterializedViewAdvisor(schema=schema).recommend(sql)['recommendations'][0]
+    assert recommendation['variant_count'] == 2
+    assert [key['column'] for key in recommendation['grouping_keys']] == ['region', 'channel']
+    assert [excluded['reason'].split(';')[0] for excluded in recommendation['excluded']] == [
+        'amount > 100 filters on the measure amount', "created_at >= '2024-01-01' filters on the timestamp column created_at"]
+    assert recommendation['estimate']['estimated_view_rows'] is None
+    assert recommendation['estimate']['scan_reduction_pct'] is None and 'channel' in recommendation['estimate']['note']
+    
+    print("✅ Materialized view advisor working")
+    return True
+
+def test_literal_parameterization():
+    """Test literal-only statement families and driver-specific placeholders"""
+    print("\n🔣 Testing literal auto-parameterization...")
+    
+    from parameterizer import LiteralParameterizer
+    
+    sql = "SELECT * FROM users u WHERE u.email = 'o''neil@example.com' AND u.id IN (1, 2) AND u.score % 2 = 0"
+    assert LiteralParameterizer('psycopg2').parameterize(sql) == (
+        'SELECT * FROM users u WHERE u.email = %s AND u.id IN %s AND u.score %% %s = %s',
+        ["o'neil@example.com", (1, 2), 2, 0]
+    )
+    assert LiteralParameterizer('mysql-connector').parameterize(sql)[0].endswith('u.id IN (%s, %s) AND u.score %% %s = %s')
+    assert LiteralParameterizer('sqlalchemy').parameterize(sql) == (
+        'SELECT * FROM users u WHERE u.email = :email AND u.id IN :id AND u.score % :score = :score_2',
+        {'email': "o'neil@example.com", 'id': [1, 2], 'score': 2, 'score_2': 0}
+    )
+    
+    # Typed literals are bound through a cast; an interval with a unit keyword keeps its literal
+    typed = "SELECT id FROM events WHERE created_at > DATE '2020-01-01' AND created_at > now() - INTERVAL '1' DAY"
+    assert LiteralParameterizer('psycopg2').parameterize(typed) == (
+        "SELECT id FROM events WHERE created_at > CAST(%s AS date) AND created_at > now() - INTERVAL '1' DAY",
+        ['2020-01-01']
+    )
+    
+    log = [{'sql': f"SELECT name FROM users WHERE id = {n}", 'calls': 3} for n in range(12)]
+    log.append({'sql': 'SELECT now()'})
+    result = LiteralParameterizer('sqlalchemy').analyze(log)
+    assert result['total_statements'] == 37
+    assert result['plan_cache_entries'] == 13 and result['plan_cache_entries_parameterized'] == 2
+    
+    family = result['families'][0]
+    assert family['plan_cache_entries'] == 12 and family['parameterized_sql'] == 'SELECT name FROM users WHERE id = :id'
+    assert family['parameters'][:2] == [{'id': 0}, {'id': 1}]
+    assert family['suggestion']['priority'] == 'high'
+    assert 'bindparam' not in family['suggestion']['code_example']
+    
+    in_log = [f"SELECT name FROM users WHERE id IN ({n}, {n + 1})" for n in range(3)]
+    in_family = LiteralParameterizer('sqlalchemy').analyze(in_log)['families'][0]
+    assert in_family['parameterized_sql'] == 'SELECT name FROM users WHERE id IN :id'
+    assert "text(sql).bindparams(bindparam('id', expanding=True))" in in_family['suggestion']['code_example']
+    
+    print("✅ Literal auto-parameterization working")
+    return True
+
+def test_covering_index_advisor():
+    """Test covering-index recommendations and row-width estimates"""
+    print("\n📐 Testing covering-index advisor...")
+    
+    from schema_catalog import SchemaCatalog
+    
+    schema = SchemaCatalog().load_ddl("""
+        CREATE TABLE orders (id BIGINT PRIMARY KEY, user_id INT, status VARCHAR(20), created_at TIMESTAMP,
+                             total NUMERIC(12,2), notes TEXT, shipping_address VARCHAR(400));
+        CREATE TABLE users (id INT PRIMARY KEY, name VARCHAR(100), email VARCHAR(200));
+        CREATE INDEX orders_user_idx ON orders (user_id);
+    """).load_table_stats("relname,n_live_tup\norders,20000000\n")
+    analyzer = SQLAnalyzer(schema=schema)
+    
+    query = "SELECT o.id, o.total FROM orders o WHERE o.user_id = 5 AND o.status = 'paid' ORDER BY o.created_at DESC LIMIT 20"
+    analysis = analyzer.analyze_queries(analyzer.parse_sql(query))
+    usage = analysis[0]['column_usage'][0]
+    assert usage['table'] == 'orders' and usage['equality'] == ['user_id', 'status']
+    assert usage['order_by'] == ['created_at'] and set(usage['select']) == {'id', 'total'}
+    
+    suggestions = SQLOptimizer(schema=schema, dialect='postgresql').generate_suggestions(analysis)[0]
+    covering = [s for s in suggestions if s['type'] == 'covering_index']
+    assert covering[0]['code_example'] == ('CREATE INDEX idx_orders_user_id_status_created_at_covering '
+                                           'ON orders (user_id, status, created_at) INCLUDE (id, total);')
+    assert '20 heap fetches' in covering[0]['impact']
+    
+    # MySQL has no INCLUDE and InnoDB secondary indexes already carry the primary key
+    suggestions = SQLOptimizer(schema=schema, dialect='mysql').generate_suggestions(analysis)[0]
+    covering = [s for s in suggestions if s['type'] == 'covering_index']
+    assert covering[0]['code_example'].endswith('ON orders (user_id, status, created_at, total);')
+    
+    # An index that already holds every needed column is not suggested again
+    analysis = analyzer.analyze_queries(analyzer.parse_sql("SELECT user_id FROM orders WHERE user_id = 3"))
+    suggestions = SQLOptimizer(schema=schema).generate_suggestions(analysis)[0]
+    assert not [s for s in suggestions if s['type'] == 'covering_index']
+    
+    # An optimizer without a schema still handles analyses from a schema-aware analyzer
+    analysis = analyzer.analyze_queries(analyzer.parse_sql("SELECT * FROM orders WHERE user_id = 3"))
+    suggestions = SQLOptimizer().generate_suggestions(analysis)[0]
+    assert any(s['type'] == 'select_optimization' for s in suggestions)
+    
+    analysis = analyzer.analyze_queries(analyzer.parse_sql("SELECT * FROM users WHERE id = 1"))
+    assert analysis[0]['column_usage'][0]['wildcard']
+    select = [s for s in SQLOptimizer(schema=schema).generate_suggestions(analysis)[0] if s['type'] == 'select_optimization']
+    assert '~119 bytes/row' in select[0]['description']
+    
+    print("✅ Covering-index advisor working")
+    return True
+
+def test_implicit_type_conversion():
+    """Test implicit-cast and collation mismatch detection with dialect casting rules"""
+    print("\n🔀 Testing implicit type conversion detection...")
+    
+    from schema_catalog import SchemaCatalog
+    
+    schema = SchemaCatalog().load_ddl("""
+        CREATE TABLE customers (id INT PRIMARY KEY, phone VARCHAR(20), legacy_id VARCHAR(20)) DEFAULT CHARSET=utf8mb3;
+        CREATE TABLE orders (id BIGINT PRIMARY KEY, customer_id BIGINT, customer_ref VARCHAR(20), qty INT)
+            DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+        CREATE INDEX customers_phone_idx ON customers (phone);
+        CREATE INDEX orders_customer_ref_idx ON orders (customer_ref);
+    """)
+    analyzer = SQLAnalyzer(schema=schema)
+    
+    query = """SELECT o.id FROM orders o JOIN customers c ON o.customer_id = c.id AND o.customer_ref = c.legacy_id
+                 WHERE c.phone = 5551234 AND o.qty BETWEEN 1.5 AND 9.5 AND o.id = '7'"""
+    analysis = analyzer.analyze_queries(analyzer.parse_sql(query))
+    mismatches = {(m['kind'], m['reason'], m['condition']) for m in analysis[0]['type_mismatches']}
+    assert mismatches == {
+        ('join', 'type', 'o.customer_id = c.id'),
+        ('join', 'collation', 'o.customer_ref = c.legacy_id'),
+        ('literal', 'type', 'c.phone = 5551234'),
+        ('literal', 'type', 'o.qty BETWEEN 1.5 AND 9.5')
+    }
+    assert any(issue['type'] == 'implicit_conversion' and issue['severity'] == 'high' for issue in analysis[0]['issues'])
+    # PostgreSQL compares bigint with int without casting an index side, so that join is not an issue there
+    messages = [issue['message'] for issue in analysis[0]['issues']]
+    assert not any('bigint with int' in message for message in messages)
+    sqlserver_analysis = SQLAnalyzer(schema=schema, dialect='sqlserver').analyze_queries(analyzer.parse_sql(query))
+    assert any('bigint with int' in issue['message'] for issue in sqlserver_analysis[0]['issues'])
+    
+    def conversions(dialect):
+        suggestions = SQLOptimizer(schema=schema, dialect=dialect).generate_suggestions(analysis)[0]
+        return {s['title']: s for s in suggestions if s['type'] == 'type_conversion_optimization'}
+    
+    # MySQL casts the string column to a number and converts utf8mb3 values to utf8mb4
+    mysql = conversions('mysql')
+    assert "-- Use: c.phone = '5551234'" in mysql['Implicit conversion of customers.phone disables its index']['code_example']
+    assert 'ALTER TABLE customers MODIFY legacy_id VARCHAR(20) COLLATE utf8mb4_0900_ai_ci;' in \
+        mysql['Implicit conversion of customers.legacy_id in o.customer_ref = c.legacy_id']['code_example']
+    assert len(mysql) == 2
+    
+    # PostgreSQL refuses varchar = integer, and promotes int to numeric for a decimal literal
+    postgres = conversions('postgresql')
+    assert postgres['PostgreSQL rejects the comparison c.phone = 5551234']['priority'] == 'high'
+    assert '-- Use: o.qty BETWEEN 2 AND 9' in postgres['Implicit conversion of orders.qty in o.qty BETWEEN 1.5 AND 9.5']['code_example']
+    
+    # SQL Server converts the narrower integer side of a join
+    sqlserver = conversions('sqlserver')
+    assert 'c.id = CAST(o.customer_id AS INT)' in sqlserver['Implicit conversion of customers.id disables its index']['code_example']
+    
+    print("✅ Implicit type conversion detection working")
+    return True
+
+def test_shared_analysis_cache():
+    """Test the cross-worker analysis cache shared through a WAL-mode SQLite file"""
+    print("\n🗄️ Testing shared analysis cache...")
+    
+    import tempfile
+    import subprocess
+    import app as web_app
+    from analysis_cache import AnalysisCache
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cache.sqlite3')
+        cache = AnalysisCache(path, max_entries=2)
+        context = web_app.analysis_context()
+        
+        # Formatting and comments do not change the key; literals and the context do
+        key = cache.key('SELECT * FROM users WHERE id = 1;', context)
+        assert key == cache.key('SELECT *\n  FROM users -- lookup\n WHERE id = 1', context)
+        assert key != cache.key('SELECT * FROM users WHERE id = 2', context)
+        assert key != cache.key('SELECT * FROM users WHERE id = 1', web_app.analysis_context(dialect='mysql'))
+        
+        cache.set(key, {'analysis': {'issues': []}, 'suggestions': []})
+        
+        # A separate process (another gunicorn worker) sees the entry through the shared file
+        reader = f"from analysis_cache import AnalysisCache; print(AnalysisCache({path!r}).get({key!r}))"
+        output = subprocess.run([sys.executable, '-c', reader], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        assert output.strip() == "{'analysis': {'issues': []}, 'suggestions': []}"
+        
+        cache.set_many({bytes([n]) * 16: n for n in range(3)})
+        assert cache.prune() == 2 and cache.stats()['entries'] == 2
+        
+        original_cache = web_app.analysis_cache
+        web_app.analysis_cache = AnalysisCache(os.path.join(directory, 'app.sqlite3'))
+        try:
+            first = web_app.run_analysis('SELECT * FROM orders WHERE id = 7')
+            analyzed = []
+            
+            class CountingAnalyzer(web_app.SQLAnalyzer):
+                def analyze_queries(self, parsed_queries):
+                    analyzed.extend(parsed_queries)
+                    return super().analyze_queries(parsed_queries)
+            
+            original_analyzer = web_app.SQLAnalyzer
+            web_app.SQLAnalyzer = CountingAnalyzer
+            try:
+                second = web_app.run_analysis('SELECT *\n  FROM orders\n WHERE id = 7;')
+            finally:
+                web_app.SQLAnalyzer = original_analyzer
+            assert not analyzed and second == first
+            assert web_app.analysis_cache.stats()['hits'] == 1
+        finally:
+            web_app.analysis_cache = original_cache
+    
+    print("✅ Shared analysis cache working")
+    return True
+
+def test_analysis_budget():
+    """Test input/statement/token/time budgets and truncated partial results"""
+    print("\n⏱️ Testing analysis budgets...")
+    
+    import time
+    import app as web_app
+    from analysis_budget import AnalysisBudget
+    
+    wide = 'SELECT name FROM users WHERE id IN (' + ', '.join(str(n) for n in range(50)) + ')'
+    sql = f"SELECT 1 FROM a; {wide}; SELECT 2 FROM b; SELECT 3 FROM c; SELECT 4 FROM d;"
+    
+    original_budget = dict(web_app.ANALYSIS_BUDGET)
+    web_app.ANALYSIS_BUDGET.update(max_statements=3, max_statement_tokens=40)
+    try:
+        result = web_app.run_analysis(sql)
+    finally:
+        web_app.ANALYSIS_BUDGET.clear()
+        web_app.ANALYSIS_BUDGET.update(original_budget)
+    assert result['truncated'] and len(result['analysis']) == 3
+    assert result['truncation']['reasons'] == ['max_statements']
+    assert result['truncation']['skipped_statements'] == [{'statement': 2, 'reason': 'max_statement_tokens'}]
+    
+    # A cut-off input keeps only the statements that arrived whole
+    budget = AnalysisBudget(max_input_bytes=len('SELECT 1 FROM a; SELECT 2 FR'))
+    assert [number for number, _ in budget.statements('SELECT 1 FROM a; SELECT 2 FROM b;')] == [1]
+    assert budget.report()['reasons'] == ['max_input_bytes']
+    
+    # Running out of time stops at the next checkpoint and keeps the finished statements
+    nested = 'SELECT * FROM t WHERE a IN (' * 30 + 'SELECT 1' + ')' * 30
+    budget = AnalysisBudget(max_seconds=0.2)
+    analyzer = SQLAnalyzer(budget=budget)
+    parsed = analyzer.parse_sql(f"SELECT 1 FROM a; {nested}; SELECT 2 FROM b;")
+    assert len(analyzer.analyze_queries(parsed[:1])) == 1
+    started = time.monotonic()
+    budget.deadline = started + 0.05
+    results = analyzer.analyze_queries(parsed[1:])
+    assert results == [] and budget.exhausted and budget.truncated
+    assert time.monotonic() - started < 1.0
+    
+    print("✅ Analysis budgets working")
+    return True
+
+def test_load_harness():
+    """Test the load-test harness against the in-process Flask app"""
+    print("\n📈 Testing load-test harness...")
+    
+    import os
+    import tempfile
+    import app as web_app
+    import load_test
+    
+    statements = load_test.load_statements()
+    corpus = load_test.build_corpus(statements[:6], upload_statements=12, batch_statements=3)
+    assert set(corpus) == {'paste', 'upload', 'api_batch'}
+    assert corpus['upload'][0]['files']['sql_file'][1].count(';') == 12
+    
+    target = load_test.InProcessTarget(web_app.app)
+    sampler = load_test.RssSampler(os.getpid())
+    summary = load_test.run_load(target, corpus, {'paste': 3, 'api_batch': 1}, concurrency=2, duration=30,
+                                 max_requests=12, sampler=sampler)
+    assert summary['requests'] == 12 and summary['errors'] == 0, summary['error_breakdown']
+    latency = summary['latency_ms']
+    assert 0 < latency['p50'] <= latency['p95'] <= latency['p99'] <= latency['max']
+    assert set(summary['scenarios']) <= {'paste', 'api_batch'}
+    assert sum(scenario['requests'] for scenario in summary['scenarios'].values()) == 12
+    if os.path.exists('/proc/self/status'):
+        assert sampler.report()['workers'][0]['peak_rss_bytes'] > 0
+    
+    # Open loop: Poisson arrivals at a fixed rate, uploads included
+    summary = load_test.run_load(target, corpus, {'upload': 1}, concurrency=1, duration=30, rate=50, max_requests=3)
+    assert summary['requests'] == 3 and summary['errors'] == 0, summary['error_breakdown']
+    
+    assert load_test.percentile([5, 1, 4, 2, 3], 0.5) == 3
+    assert load_test.percentile(list(range(1, 101)), 0.99) == 99
+    assert load_test.parse_mix('paste=1,upload=0') == {'paste': 1, 'upload': 0}
+    
+    # Saved runs are comparable side by side
+    path = os.path.join(tempfile.mkdtemp(), 'runs.jsonl')
+    run = {'started_at': '2026-01-01T00:00:00', 'summary': summary, 'memory': sampler.report(),
+           'config': {'server': 'gunicorn', 'worker_class': 'gthread', 'workers': 4, 'concurrency': 8, 'rate': None}}
+    load_test.save_result(path, run)
+    load_test.save_result(path, dict(run, config=dict(run['config'], worker_class='sync')))
+    table = load_test.compare_results(path).splitlines()
+    assert len(table) == 4 and 'gthread' in table[2] and 'sync' in table[3]
+    
+    print("✅ Load-test harness working")
+    return True
+
+def test_cost_calibration():
+    """Test fitting complexity weights and issue penalties to measured latencies"""
+    print("\n📐 Testing cost calibration...")
+    
+    import os
+    import random
+    import tempfile
+    from cost_calibration import CostCalibrator, CostModel, FEATURE_NAMES, spearman
+    
+    # Latency is driven by joins on this engine; ORDER BY is nearly free
+    rng = random.Random(7)
+    rows = ['sql,mean_exec_time,calls']
+    for i in range(60):
+        joins = rng.randint(0, 3)
+        ordered = rng.random() < 0.5
+        sql = f"SELECT t0.id FROM t0" + ''.join(f" JOIN t{j} ON t{j}.id = t{j - 1}.ref" for j in range(1, joins + 1))
+        sql += f" WHERE t0.id > {i}" + (' ORDER BY t0.id' if ordered else '')
+        latency = 2 ** (1 + 1.5 * joins + 0.05 * ordered + rng.gauss(0, 0.3))
+        rows.append(f'"{sql}",{latency:.3f},{rng.randint(1, 5)}')
+    
+    calibrator = CostCalibrator(alpha=1.0)
+    samples = calibrator.load_samples('\n'.join(rows))
+    assert len(samples) == 60
+    X, y, weights = calibrator.feature_matrix(samples)
+    assert X.shape == (60, len(FEATURE_NAMES)) and y.shape == (60,)
+    
+    model = calibrator.fit(samples)
+    weights = model.complexity_weights()
+    # Each join also adds a table, so the two share the effect of roughly 1.5 doublings (7.5 points)
+    assert 6 < weights['joins'] + weights['tables'] < 9 and weights['order_by'] < 1
+    assert model.metrics['spearman_cross_validated'] > 0.8
+    assert model.metrics['spearman'] >= model.metrics['spearman_default_weights']
+    assert spearman([1, 2, 2, 3], [10, 20, 20, 30]) == 1.0
+    
+    # Repeated log lines of one statement share a fold, so no copy is predicted from another
+    import numpy as np
+    groups = np.array(['SELECT 1', 'SELECT 2', 'SELECT 1', 'SELECT 3', 'SELECT 4', 'SELECT 1', 'SELECT 2'], dtype=object)
+    assignment = calibrator.fold_assignment(groups)
+    assert len({assignment[0], assignment[2], assignment[5]}) == 1 and assignment[1] == assignment[6]
+    assert len(set(assignment.tolist())) == 2
+    assert calibrator.fold_assignment(np.array(['SELECT 1'] * 10, dtype=object)) is None
+    
+    # The saved model replaces the hand-picked weights in both scoring functions
+    path = os.path.join(tempfile.mkdtemp(), 'cost_model.json')
+    model.save(path)
+    loaded = CostModel.load(path)
+    assert loaded.complexity_weights() == weights and loaded.digest() == model.digest()
+    
+    # Latencies no feature explains fit all-zero weights, which are never saved
+    flat = calibrator.fit([{'sql': 'SELECT id FROM t0', 'latency_ms': 5.0}, {'sql': 'SELECT id FROM t1', 'latency_ms': 5.0}])
+    assert flat.is_degenerate() and not model.is_degenerate()
+    try:
+        flat.save(os.path.join(tempfile.mkdtemp(), 'flat.json'))
+        assert False, 'a degenerate model must not be saved'
+    except ValueError:
+        pass
+    
+    sql = "SELECT a.id FROM a JOIN b ON b.id = a.ref JOIN c ON c.id = b.ref ORDER BY a.id"
+    default = SQLAnalyzer().analyze_queries(SQLAnalyzer().parse_sql(sql))[0]
+    calibrated = SQLAnalyzer(cost_model=loaded).analyze_queries(SQLAnalyzer().parse_sql(sql))[0]
+    assert default['complexity_score'] == 1 + 3 * 2 + 2 * 3 + 2
+    assert calibrated['complexity_score'] != default['complexity_score']
+    assert SQLOptimizer(cost_model=loaded).issue_penalties == loaded.issue_penalties()
+    assert SQLOptimizer().issue_penalties == {'high': 20, 'medium': 10, 'low': 5}
+    
+    print("✅ Cost calibration working")
+    return True
+
+def test_cold_start():
+    """Test lazy startup, the import-time budget and the precompiled rule patterns"""
+    print("\n🧊 Testing cold start...")
+    
+    import import_benchmark
+    
+    result = import_benchmark.measure_import(env={'STARTUP_MODE': 'lazy'})
+    assert result['deferred_loaded'] == [], result['deferred_loaded']
+    budget = import_benchmark.TEST_IMPORT_TIME_BUDGET_MS
+    assert result['cumulative_ms'] <= budget, f"import app took {result['cumulative_ms']} ms (budget {budget} ms)"
+    
+    eager = import_benchmark.measure_import(runs=1, env={'STARTUP_MODE': 'eager', 'ANALYSIS_CACHE_PATH': ''})
+    assert {'sql_analyzer', 'sql_optimizer', 'job_queue'} <= set(eager['deferred_loaded'])
+    
+    # Lazily loaded names still resolve as module attributes
+    import app as web_app
+    assert web_app.SQLAnalyzer.__name__ == 'SQLAnalyzer' and web_app.lazy('SQLAnalyzer') is web_app.SQLAnalyzer
+    try:
+        web_app.missing_attribute
+        assert False, 'unknown attributes must still raise'
+    except AttributeError:
+        pass
+    
+    # The combined function pattern keeps the first function of each family, in family order
+    analyzer = SQLAnalyzer()
+    sql = "SELECT 1 FROM t WHERE CAST(a AS int) = 1 AND LOWER(b) = 'x' AND UPPER(c) = 'Y' AND COALESCE(d, 0) = 0"
+    where = analyzer.analyze_queries(analyzer.parse_sql(sql))[0]['where_clause']
+    assert where['functions_used'] == ['LOWER', 'COALESCE', 'CAST']
+    
+    print("✅ Cold start working")
+    return True
+
+def test_archive_uploads():
+    """Test in-memory uploads of gzip, zip and tar.gz archives and the decompression limit"""
+    print("\n🗜️ Testing archive uploads...")
+    
+    import gzip
+    import io
+    import tarfile
+    import zipfile
+    import app as web_app
+    from sql_archive import SQLArchiveReader, DecompressionLimitExceeded, upload_kind
+    
+    client = web_app.app.test_client()
+    slow = "SELECT * FROM orders WHERE LOWER(email) = 'a@b.c';"
+    fast = "SELECT id FROM users WHERE id = 1;"
+    
+    # Uploads are buffered in memory, never spooled to a temporary file
+    assert isinstance(web_app.InMemoryRequest({})._get_file_stream(10 ** 7, 'application/zip'), io.BytesIO)
+    assert [upload_kind(name) for name in ('a.sql', 'a.sql.gz', 'a.zip', 'a.tgz', 'a.exe')] == \
+        ['sql', 'gzip', 'zip', 'tar', None]
+    
+    response = client.post('/analyze', data={'sql_file': (io.BytesIO(gzip.compress(slow.encode())), 'dump.sql.gz')},
+                           content_type='multipart/form-data')
+    data = response.get_json()
+    assert response.status_code == 200 and data['summary']['files'][0]['name'] == 'dump.sql'
+    assert data['queries'][0]['file'] == 'dump.sql'
+    
+    # Zip members are analyzed in archive order; OS metadata and non-SQL members are skipped
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('reports/slow.sql', slow + '\n' + slow)
+        archive.writestr('__MACOSX/reports/._slow.sql', b'\x00\x05')
+        archive.writestr('README.md', '# not sql')
+        archive.writestr('fast.sql', fast)
+    response = client.post('/analyze', data={'sql_file': (io.BytesIO(buffer.getvalue()), 'queries.zip')},
+                           content_type='multipart/form-data')
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [query['file'] for query in data['queries']] == ['reports/slow.sql', 'reports/slow.sql', 'fast.sql']
+    files = {entry['name']: entry for entry in data['summary']['files']}
+    assert files['reports/slow.sql']['total_queries'] == 2 and files['fast.sql']['total_queries'] == 1
+    assert files['reports/slow.sql']['issues_found'] > files['fast.sql']['issues_found']
+    
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, sql in (('a.sql', slow), ('b.txt', fast)):
+            info = tarfile.TarInfo(name)
+            info.size = len(sql.encode())
+            archive.addfile(info, io.BytesIO(sql.encode()))
+    response = client.post('/analyze', data={'sql_file': (io.BytesIO(buffer.getvalue()), 'queries.tar.gz')},
+                           content_type='multipart/form-data')
+    assert [entry['name'] for entry in response.get_json()['summary']['files']] == ['a.sql', 'b.txt']
+    
+    # A plain upload keeps the original response shape
+    response = client.post('/analyze', data={'sql_file': (io.BytesIO(fast.encode()), 'one.sql')},
+                           content_type='multipart/form-data')
+    assert 'files' not in response.get_json()['summary'] and 'file' not in response.get_json()['queries'][0]
+    response = client.post('/analyze', data={'sql_file': (io.BytesIO(b'MZ'), 'tool.exe')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+    
+    # A zip bomb stops at the decompressed-size limit instead of filling memory
+    bomb = io.BytesIO()
+    with zipfile.ZipFile(bomb, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('bomb.sql', b'-' * (8 * 1024 * 1024))
+    assert len(bomb.getvalue()) < 64 * 1024
+    try:
+        SQLArchiveReader(max_decompressed_bytes=1024 * 1024).read(io.BytesIO(bomb.getvalue()), 'bomb.zip')
+        assert False, 'the bomb must be rejected'
+    except DecompressionLimitExceeded:
+        pass
+    # Skipped tar members count too: their declared size is rejected before they are inflated
+    tar_bomb = io.BytesIO()
+    with tarfile.open(fileobj=tar_bomb, mode='w:gz') as archive:
+        payload = b'\0' * (8 * 1024 * 1024)
+        info = tarfile.TarInfo('payload.bin')
+        info.size = len(payload)
+        archive.addfile(info, io.BytesIO(payload))
+    reader = SQLArchiveReader(max_decompressed_bytes=1024 * 1024)
+    try:
+        reader.read(io.BytesIO(tar_bomb.getvalue()), 'bomb.tar.gz')
+        assert False, 'the skipped member must count against the limit'
+    except DecompressionLimitExceeded:
+        assert reader.decompressed_bytes == 0
+    limit = web_app.MAX_DECOMPRESSED_BYTES
+    web_app.MAX_DECOMPRESSED_BYTES = 1024 * 1024
+    try:
+        response = client.post('/analyze', data={'sql_file': (io.BytesIO(bomb.getvalue()), 'bomb.zip')},
+                               content_type='multipart/form-data')
+    finally:
+        web_app.MAX_DECOMPRESSED_BYTES = limit
+    assert response.status_code == 413 and 'expands beyond' in response.get_json()['error']
+    
+    print("✅ Archive uploads working")
+    return True
+
+def test_feature_store():
+    """Test the columnar feature store's vectorized summaries and .npz / memory-mapped round trips"""
+    print("\n🧮 Testing feature store...")
+    
+    import os
+    import tempfile
+    import numpy as np
+    from feature_store import FeatureStore
+    from schema_catalog import SchemaCatalog
+    
+    schema = SchemaCatalog().load_ddl(
+        "CREATE TABLE orders (id int PRIMARY KEY, email text, status text, customer_id int);"
+        "CREATE INDEX orders_status ON orders (status);"
+        "CREATE TABLE customers (id int PRIMARY KEY, email text);"
+    )
+    store = FeatureStore()
+    billing = """
+    SELECT id FROM orders WHERE email = 'a@b.c';
+    SELECT id FROM orders WHERE status = 'open' LIMIT 10;
+    SELECT o.id FROM orders o JOIN customers c ON c.id = o.customer_id WHERE LOWER(c.email) = 'x';
+    """
+    assert store.add_sql(billing, service='billing', schema=schema) == 3
+    assert store.add_sql("SELECT id FROM customers WHERE email = 'q';", service='crm', schema=schema) == 1
+    assert len(store) == 4
+    
+    # Unindexed WHERE columns per table; orders.status leads an index and is not counted
+    assert store.top_k('where_tables', unindexed=True) == [('orders', 1), ('customers', 1)]
+    assert dict(store.top_k('where_columns')) == {'orders.email': 1, 'orders.status': 1, 'customers.email': 1}
+    assert store.top_k('tables', k=1) == [('orders', 3)]
+    assert store.top_k('issues')[0] == ('missing_limit', 3)
+    
+    assert store.distribution('join_count', by='service') == {'billing': {0: 2, 1: 1}, 'crm': {0: 1}}
+    assert store.group_by('service') == {'billing': 3, 'crm': 1}
+    assert store.group_by('service', 'join_count', agg='max') == {'billing': 1, 'crm': 0}
+    assert store.mask(service='billing', min_join_count=1).tolist() == [False, False, True, False]
+    assert store.mask(issue='functions_in_where').sum() == 1 and store.mask(table='customers').sum() == 2
+    assert store.summary(where=store.mask(service='crm'))['statements'] == 1
+    
+    # Both formats reopen with the same vocabularies; the directory form is memory-mapped
+    directory = tempfile.mkdtemp()
+    for path in (os.path.join(directory, 'features.npz'), os.path.join(directory, 'features')):
+        store.save(path)
+        loaded = FeatureStore.load(path)
+        assert loaded.summary() == store.summary()
+        assert loaded.top_k('where_tables', unindexed=True) == store.top_k('where_tables', unindexed=True)
+    assert isinstance(loaded.columns['join_count'], np.memmap)
+    loaded.add_sql("SELECT 1;")
+    assert len(loaded) == 5 and loaded.summary()['statements'] == 5
+    
+    print("✅ Feature store working")
+    return True
+
+def test_ddl_analysis():
+    """Test DDL lock levels, rewrite estimates, online alternatives and lower-lock migration plans"""
+    print("\n🔒 Testing DDL analysis...")
+    
+    from ddl_analyzer import DDLAnalyzer
+    from schema_catalog import SchemaCatalog
+    import app as web_app
+    
+    schema = SchemaCatalog().load_ddl(
+        "CREATE TABLE orders (id bigint PRIMARY KEY, email varchar(100), status text, customer_id int);"
+        "CREATE TABLE customers (id int PRIMARY KEY);"
+    ).load_table_stats("relname,n_live_tup,avg_row_bytes\norders,50000000,120\ncustomers,1000000,80")
+    ddl = DDLAnalyzer(schema=schema)
+    
+    index = ddl.analyze_statement("CREATE INDEX orders_email ON orders (lower(email))")
+    assert index['lock'] == 'SHARE' and index['blocks'] == 'writes' and index['estimated_seconds'] > 10
+    assert index['operations'][0]['safe_alternative'] == ["CREATE INDEX CONCURRENTLY orders_email ON orders (lower(email));"]
+    assert ddl.analyze_statement("CREATE INDEX CONCURRENTLY i ON orders (status)")['issues'] == []
+    
+    mysql = ddl.analyze_statement("ALTER TABLE `orders` ADD INDEX orders_status (status)")
+    assert mysql['dialect'] == 'mysql' and mysql['issues'][0]['type'] == 'blocking_index_build'
+    assert mysql['operations'][0]['safe_alternative'][0].endswith('ALGORITHM=INPLACE, LOCK=NONE;')
+    assert ddl.analyze_statement("CREATE INDEX i ON orders (status) ALGORITHM=INPLACE LOCK=NONE")['issues'] == []
+    
+    # Volatile defaults and type changes rewrite the table; constant defaults and VARCHAR widening do not
+    volatile = ddl.analyze_statement("ALTER TABLE orders ADD COLUMN token uuid DEFAULT gen_random_uuid()")
+    assert volatile['rewrite'] and volatile['lock'] == 'ACCESS EXCLUSIVE' and volatile['issues'][0]['type'] == 'table_rewrite'
+    assert not ddl.analyze_statement("ALTER TABLE orders ADD COLUMN note text DEFAULT 'n/a'")['rewrite']
+    assert DDLAnalyzer(schema=schema, server_version=10).analyze_statement(
+        "ALTER TABLE orders ADD COLUMN note text DEFAULT 'n/a'")['rewrite']
+    assert ddl.analyze_statement("ALTER TABLE orders ALTER COLUMN customer_id TYPE bigint")['rewrite']
+    assert not ddl.analyze_statement("ALTER TABLE orders ALTER COLUMN email TYPE varchar(200)")['rewrite']
+    
+    foreign_key = ddl.analyze_statement(
+        "ALTER TABLE orders ADD CONSTRAINT orders_customer_fk FOREIGN KEY (customer_id) REFERENCES customers (id)")
+    assert foreign_key['lock'] == 'SHARE ROW EXCLUSIVE' and foreign_key['issues'][0]['type'] == 'blocking_foreign_key'
+    assert foreign_key['operations'][0]['safe_alternative'][1] == \
+        "ALTER TABLE orders VALIDATE CONSTRAINT orders_customer_fk;"
+    assert ddl.analyze_statement("ALTER TABLE orders ADD FOREIGN KEY (customer_id) REFERENCES customers (id) "
+                                 "NOT VALID")['issues'] == []
+    
+    # The analyzer reports DDL issues and the optimizer the online steps
+    analyzer = SQLAnalyzer(schema=schema)
+    analysis = analyzer.analyze_queries(analyzer.parse_sql("CREATE INDEX orders_status ON orders (status);"))[0]
+    assert [issue['type'] for issue in analysis['issues']] == ['blocking_index_build']
+    suggestion = SQLOptimizer(schema=schema).generate_suggestions([analysis])[0][0]
+    assert suggestion['type'] == 'ddl_optimization' and 'CONCURRENTLY' in suggestion['code_example']
+    
+    # The plan keeps dependencies: the index on customer_id waits for the swapped-in bigint column
+    migration = """
+    ALTER TABLE orders ALTER COLUMN customer_id TYPE bigint;
+    CREATE INDEX orders_customer ON orders (customer_id);
+    ALTER TABLE orders DROP COLUMN status;
+    CREATE TABLE refunds (id bigint PRIMARY KEY, order_id bigint);
+    CREATE INDEX refunds_order ON refunds (order_id);
+    """
+    plan = ddl.plan(migration)
+    steps = [step['sql'] for step in plan['steps']]
+    swap = next(i for i, sql in enumerate(steps) if 'RENAME COLUMN customer_id TO customer_id_old' in sql)
+    build = steps.index("CREATE INDEX CONCURRENTLY orders_customer ON orders (customer_id);")
+    assert steps.index("ALTER TABLE orders ADD COLUMN customer_id_new bigint;") < swap < build
+    # A trigger keeps the copy current while a keyset-batched backfill runs; the swap drops it atomically
+    sync = next(i for i, sql in enumerate(steps) if sql.startswith('CREATE FUNCTION orders_customer_id_sync()'))
+    backfill = next(step for step in plan['steps'] if step['operation'] == 'backfill')
+    assert sync < steps.index(backfill['sql']) < swap
+    assert 'WHERE id > last_key ORDER BY id LIMIT 5000' in backfill['sql'] and not backfill['transactional']
+    assert backfill['estimated_seconds'] > 0
+    assert steps[swap].startswith('BEGIN; DROP TRIGGER orders_customer_id_sync ON orders;')
+    assert 'SELECT MIN(id) - 1 INTO last_key FROM orders;' in backfill['sql'] and '    last_key bigint;' in backfill['sql']
+    
+    # The copy starts from MIN(key) - 1 in the key's type, and the drop lists what the old column takes with it
+    keyed = SchemaCatalog().load_ddl(
+        "CREATE TABLE accounts (token uuid PRIMARY KEY, plan int NOT NULL DEFAULT 1);"
+        "CREATE INDEX accounts_plan ON accounts (plan);"
+        "CREATE TABLE ledger (id int PRIMARY KEY, amount int NOT NULL);"
+        "CREATE UNIQUE INDEX ledger_amount ON ledger (id, amount);"
+    )
+    refused = DDLAnalyzer(schema=keyed).analyze_statement("ALTER TABLE accounts ALTER COLUMN plan TYPE bigint")
+    assert refused['operations'][0]['safe_alternative'] is None
+    assert 'no online copy is suggested because accounts.token is uuid' in refused['issues'][0]['message']
+    copied = DDLAnalyzer(schema=keyed).analyze_statement("ALTER TABLE ledger ALTER COLUMN amount TYPE bigint")
+    drop = copied['operations'][0]['safe_alternative'][-1]
+    assert drop.startswith('-- Recreate NOT NULL, unique index ledger_amount on amount before this drop')
+    assert drop.endswith('ALTER TABLE ledger DROP COLUMN amount_old;')
+    assert '    last_key int;' in copied['operations'][0]['safe_alternative'][2]
+    assert "CREATE INDEX refunds_order ON refunds (order_id);" in steps
+    assert steps[-1] == "ALTER TABLE orders DROP COLUMN status;"
+    assert plan['summary']['blocking_seconds_before'] > 60 and plan['summary']['blocking_seconds_after'] == 0
+    assert plan['preamble'] == ["SET lock_timeout = '5s';"]
+    
+    response = web_app.app.test_client().post('/api/migrations', json={
+        'sql': "CREATE INDEX orders_status ON orders (status);",
+        'schema': "CREATE TABLE orders (id int PRIMARY KEY, status text);"
+    })
+    assert response.status_code == 200 and response.get_json()['steps'][0]['transactional'] is False
+    
+    print("✅ DDL analysis working")
+    return True
+
+def test_cte_analysis():
+    """Test CTE and derived-table analysis: references, filter pushdown, recursion bounds and dialect hints"""
+    print("\n🧩 Testing CTE analysis...")
+    
+    analyzer = SQLAnalyzer()
+    queries = [
+        "WITH recent AS MATERIALIZED (SELECT customer_id, total, status FROM orders WHERE total > 0) "
+        "SELECT r.customer_id FROM recent r JOIN customers c ON c.id = r.customer_id WHERE r.status = 'paid'",
+        "WITH s AS (SELECT customer_id, total FROM orders), unused AS (SELECT 1) "
+        "SELECT a.total FROM s a JOIN s b ON a.customer_id = b.customer_id LIMIT 5",
+        "WITH RECURSIVE t(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM t) SELECT n FROM t",
+        "WITH RECURSIVE t(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM t WHERE n < 10) SELECT n FROM t",
+        "SELECT s.customer_id FROM (SELECT customer_id, SUM(total) AS total FROM orders GROUP BY customer_id) s "
+        "WHERE s.customer_id = 42 AND s.total > 100 LIMIT 1"
+    ]
+    materialized, reused, unbounded, bounded, derived = analyzer.analyze_queries(analyzer.parse_sql(';'.join(queries)))
+    
+    # CTE names are not tables, and CTE bodies are not reported as subqueries
+    assert materialized['tables'] == ['orders', 'customers']
+    assert 'subqueries' not in [issue['type'] for issue in materialized['issues']]
+    recent = materialized['ctes']['definitions'][0]
+    assert recent['materialized'] is True and recent['references'] == 1
+    assert recent['pushdown'][0]['pushed_predicate'] == "status = 'paid'"
+    assert recent['pushed_content'] == "SELECT customer_id, total, status FROM orders WHERE total > 0 AND status = 'paid'"
+    assert recent['inline_query'].startswith("SELECT r.customer_id FROM (SELECT customer_id, total, status FROM orders")
+    assert {'type': 'filter_outside_cte', 'severity': 'medium'} in [
+        {'type': issue['type'], 'severity': issue['severity']} for issue in materialized['issues']]
+    
+    shared, unused = reused['ctes']['definitions']
+    assert shared['references'] == 2 and unused['references'] == 0
+    assert {'cte_multiple_references', 'unused_cte'} <= {issue['type'] for issue in reused['issues']}
+    
+    # UNION ALL recursion without a bound gets a depth counter; a depth predicate is a bound
+    counter = unbounded['ctes']['definitions'][0]
+    assert counter['recursive'] and counter['unbounded']
+    assert counter['bounded_definition'] == \
+        "t(n, depth) AS (SELECT 1, 1 UNION ALL SELECT n + 1, t.depth + 1 FROM t WHERE t.depth < 100)"
+    assert 'unbounded_recursive_cte' in [issue['type'] for issue in unbounded['issues']]
+    assert bounded['ctes']['definitions'][0]['termination'] == 'depth_limit'
+    assert 'unbounded_recursive_cte' not in [issue['type'] for issue in bounded['issues']]
+    
+    # Only the grouping column's filter can move below GROUP BY
+    grouped = derived['ctes']['derived_tables'][0]
+    assert [predicate['predicate'] for predicate in grouped['pushdown']] == ['s.customer_id = 42']
+    assert 'WHERE customer_id = 42 GROUP BY customer_id' in grouped['pushed_content']
+    
+    # An IS NULL test on the NULL-padded side of a LEFT JOIN is the anti-join itself and stays outside
+    anti_join = analyzer.analyze_queries(analyzer.parse_sql(
+        "WITH c AS MATERIALIZED (SELECT user_id, total FROM orders) "
+        "SELECT u.id FROM users u LEFT JOIN c ON c.user_id = u.id WHERE c.user_id IS NULL"))[0]
+    assert anti_join['ctes']['definitions'][0]['pushdown'] == []
+    assert anti_join['ctes']['definitions'][0]['pushed_content'] is None
+    assert 'filter_outside_cte' not in [issue['type'] for issue in anti_join['issues']]
+    
+    def cte_suggestions(dialect, analysis):
+        return [suggestion for suggestion in SQLOptimizer(dialect=dialect).generate_suggestions([analysis])[0]
+                if suggestion['type'] == 'cte_optimization']
+    
+    postgres = cte_suggestions('postgresql', materialized)[0]
+    assert postgres['priority'] == 'medium' and 'AS NOT MATERIALIZED' in postgres['code_example']
+    assert '/*+ MERGE(recent) */' in cte_suggestions('mysql', materialized)[0]['code_example']
+    assert cte_suggestions('sqlserver', materialized) == []
+    assert cte_suggestions('sqlserver', reused)[0]['code_example'].startswith('SELECT * INTO #s FROM')
+    assert 'OPTION (MAXRECURSION 100)' in cte_suggestions('sqlserver', unbounded)[0]['code_example']
+    assert 'WITH RECURSIVE t(n, depth)' in cte_suggestions('postgresql', unbounded)[0]['code_example']
+    assert cte_suggestions('postgresql', derived) == [] and len(cte_suggestions('mysql', derived)) == 1
+    assert cte_suggestions('postgresql', anti_join) == []
+    
+    print("✅ CTE analysis working")
+    return True
+
+def test_sort_analysis():
+    """Test sort analysis: index-order satisfaction, top-N and spill estimates, and shared window sorts"""
+    from schema_catalog import SchemaCatalog
+    print("\n🔃 Testing sort analysis...")
+    
+    schema = SchemaCatalog().load_ddl("""
+        CREATE TABLE orders (id BIGINT PRIMARY KEY, customer_id INT, status VARCHAR(20),
+                             created_at TIMESTAMP, total NUMERIC(12,2), note TEXT);
+        CREATE INDEX orders_customer_created ON orders (customer_id, created_at DESC);
+    """).load_table_stats("relname,n_live_tup\norders,20000000\n")
+    assert schema.tables['orders']['indexes'][-1]['descending'] == [False, True]
+    
+    analyzer = SQLAnalyzer(schema=schema)
+    queries = [
+        "SELECT id, total FROM orders WHERE customer_id = 7 ORDER BY created_at DESC LIMIT 20",
+        "SELECT id, total FROM orders WHERE customer_id = 7 ORDER BY created_at LIMIT 20",
+        "SELECT id, total FROM orders ORDER BY total DESC LIMIT 10",
+        "SELECT id, total, note FROM orders ORDER BY total",
+        "SELECT id, ROW_NUMBER() OVER (PARTITION BY customer_id, status ORDER BY created_at) AS rn, "
+        "SUM(total) OVER (PARTITION BY status, customer_id) AS running, RANK() OVER w AS ranked "
+        "FROM orders WINDOW w AS (PARTITION BY customer_id ORDER BY total DESC) LIMIT 5",
+        "SELECT customer_id, COUNT(*) FROM orders GROUP BY customer_id"
+    ]
+    forward, backward, top_n, spill, windows, grouped = analyzer.analyze_queries(analyzer.parse_sql(';'.join(queries)))
+    
+    # The equality column is skipped, and reversing every direction reads the index backwards
+    order = forward['sorts']['operations'][0]['index_order']
+    assert order['satisfied_by'] == 'orders_customer_created' and not order['backward']
+    assert forward['sorts']['sort_method'] == 'index_scan'
+    assert backward['sorts']['operations'][0]['index_order']['backward'] is True
+    
+    assert top_n['sorts']['top_n'] and top_n['sorts']['sort_method'] == 'top_n_heapsort'
+    assert 'top_n_sort' in [issue['type'] for issue in top_n['issues']]
+    assert spill['sorts']['sort_method'] == 'external_merge' and spill['sorts']['spills_to_disk']
+    assert 'sort_spill' in [issue['type'] for issue in spill['issues']]
+    
+    # Reordering the SUM window's PARTITION BY lets it reuse the ROW_NUMBER sort
+    assert windows['sorts']['window_sorts'] == 3 and windows['sorts']['shared_window_sorts'] == 2
+    assert windows['sorts']['windows'][1]['aligned_specification'] == 'PARTITION BY customer_id, status'
+    assert windows['sorts']['windows'][2]['specification'] == 'PARTITION BY customer_id ORDER BY total DESC'
+    assert 'separate_window_sorts' in [issue['type'] for issue in windows['issues']]
+    assert not windows['order_by']['has_order_by']
+    assert grouped['sorts']['operations'][0]['index_order']['satisfied_by'] == 'orders_customer_created'
+    
+    def sort_suggestions(dialect, analysis):
+        return [suggestion for suggestion in SQLOptimizer(schema=schema, dialect=dialect).generate_suggestions([analysis])[0]
+                if suggestion['type'] == 'sort_optimization']
+    
+    index = sort_suggestions('postgresql', top_n)[0]
+    assert index['priority'] == 'high' and index['code_example'] == 'CREATE INDEX idx_orders_total_sort ON orders (total DESC);'
+    assert "SET LOCAL work_mem = '1412MB'" in sort_suggestions('postgresql', spill)[0]['code_example']
+    assert 'SET SESSION sort_buffer_size' in sort_suggestions('mysql', spill)[0]['code_example']
+    assert 'SUM(total) OVER (PARTITION BY customer_id, status)' in sort_suggestions('postgresql', windows)[0]['code_example']
+    assert sort_suggestions('postgresql', forward) == []
+    
+    print("✅ Sort analysis working")
+    return True
+
+def test_redundancy_elimination():
+    """Test key-based detection of DISTINCT, GROUP BY and UNION that cannot remove rows"""
+    from schema_catalog import SchemaCatalog
+    print("\n🧮 Testing redundancy elimination...")
+    
+    schema = SchemaCatalog().load_ddl("""
+        CREATE TABLE customers (id BIGINT PRIMARY KEY, email VARCHAR(200) NOT NULL UNIQUE,
+                                nickname VARCHAR(50) UNIQUE, region VARCHAR(10));
+        CREATE TABLE orders (id BIGINT PRIMARY KEY, customer_id BIGINT NOT NULL, status VARCHAR(20), total NUMERIC(12,2));
+        CREATE TABLE order_items (order_id BIGINT NOT NULL, line_no INT NOT NULL, sku VARCHAR(20),
+                                  PRIMARY KEY (order_id, line_no));
+    """).load_table_stats("relname,n_live_tup\norders,5000000\ncustomers,200000\norder_items,20000000\n")
+    
+    analyzer = SQLAnalyzer(schema=schema)
+    queries = [
+        "SELECT DISTINCT o.id, c.email FROM orders o JOIN customers c ON c.id = o.customer_id",
+        "SELECT DISTINCT c.id, c.email FROM orders o JOIN customers c ON c.id = o.customer_id",
+        "SELECT DISTINCT i.order_id, i.sku FROM order_items i WHERE i.line_no = 1",
+        "SELECT DISTINCT nickname FROM customers",
+        "SELECT o.id, COUNT(*), SUM(total) AS total FROM orders o GROUP BY o.id",
+        "SELECT o.id, COUNT(*) FROM orders o JOIN order_items i ON i.order_id = o.id GROUP BY o.id",
+        "SELECT id, email FROM customers WHERE region = 'eu' UNION SELECT id, email FROM customers WHERE region = 'us'",
+        "SELECT 'order' AS kind, id FROM orders UNION SELECT 'customer', id FROM customers",
+        "SELECT id FROM orders UNION SELECT id FROM customers"
+    ]
+    results = analyzer.analyze_queries(analyzer.parse_sql(';'.join(queries)))
+    joined, fanned_out, fixed_line, nullable, grouped, item_groups, regions, tagged, overlapping = results
+    
+    def redundant(analysis):
+        return [finding['operation'] for finding in analysis['uniqueness']['redundant']]
+    
+    # The order's key reaches the customer through the join; customers repeat once per order
+    assert redundant(joined) == ['distinct'] and redundant(fanned_out) == []
+    finding = joined['uniqueness']['redundant'][0]
+    assert finding['rewritten_query'] == 'SELECT o.id, c.email FROM orders o JOIN customers c ON c.id = o.customer_id'
+    assert finding['estimated_rows'] == 5000000 and finding['estimated_work_bytes'] > 0
+    assert 'redundant_distinct' in [issue['type'] for issue in joined['issues']]
+    # An equality filter completes the composite key; a nullable UNIQUE column is not a key
+    assert redundant(fixed_line) == ['distinct'] and redundant(nullable) == []
+    
+    assert redundant(grouped) == ['group_by'] and redundant(item_groups) == []
+    assert grouped['uniqueness']['redundant'][0]['rewritten_query'] == 'SELECT o.id, 1, total AS total FROM orders o'
+    assert item_groups['uniqueness']['unique_rows'] is True
+    
+    assert redundant(regions) == ['union'] and redundant(tagged) == ['union'] and redundant(overlapping) == []
+    assert " UNION ALL SELECT id, email FROM customers WHERE region = 'us'" in \
+        regions['uniqueness']['redundant'][0]['rewritten_query']
+    
+    suggestions = [suggestion for batch in SQLOptimizer(schema=schema).generate_suggestions([grouped, regions])
+                   for suggestion in batch if suggestion['type'] == 'redundancy_elimination']
+    assert [suggestion['title'] for suggestion in suggestions] == ['Drop the GROUP BY', 'Use UNION ALL']
+    assert suggestions[0]['priority'] == 'high' and 'SUM and AVG' in suggestions[0]['description']
+    
+    print("✅ Redundancy elimination working")
+    return True
+
 if __name__ == "__main__":
     print("=" * 60)
     print("🧪 SQL Optimizer Pro - Test Suite")
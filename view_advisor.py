@@ -0,0 +1,350 @@
+import re
+from typing import List, Dict, Any, Optional, Union
+
+from sql_analyzer import SQLAnalyzer
+from schema_catalog import SchemaCatalog, column_type_category, normalize_identifier
+
+DECOMPOSABLE_AGGREGATES = {'SUM', 'COUNT', 'MIN', 'MAX', 'AVG'}
+# Assumed distinct values per grouping key when the catalog has no better information
+DEFAULT_GROUP_CARDINALITY = 100
+# Column types with roughly one distinct value per row; grouping a view by them rebuilds the base table
+HIGH_CARDINALITY_CATEGORIES = {'temporal', 'decimal', 'float', 'uuid'}
+SIMPLE_FILTER = re.compile(r'^([\w.]+)\s*(=|<>|!=|<=|>=|<|>|\bIN\b|\bBETWEEN\b|\bLIKE\b|\bIS\b)', re.IGNORECASE)
+
+class MaterializedViewAdvisor:
+    """Find repeated, subsumable GROUP BY rollups and recommend a materialized view or summary table"""
+
+    def __init__(self, schema: Optional[SchemaCatalog] = None, dialect: str = 'postgresql',
+                 min_queries: int = 2, refresh_interval_minutes: int = 60):
+        self.schema = schema
+        self.dialect = dialect.lower()
+        self.min_queries = min_queries
+        self.refresh_interval_minutes = refresh_interval_minutes
+        self.analyzer = SQLAnalyzer(schema=schema)
+
+    def recommend(self, entries: Union[str, List[Any]]) -> Dict[str, Any]:
+        """Group aggregate queries by source tables and build one view per answerable group"""
+        if isinstance(entries, str):
+            entries = [str(stmt) for stmt in self.analyzer.parse_sql(entries)]
+
+        profiles = []
+        total = 0
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {'sql': entry}
+            if not (entry.get('sql') or '').strip():
+                continue
+            total += 1
+            profile = self._profile(entry)
+            if profile:
+                profiles.append(profile)
+
+        by_source = {}
+        for profile in profiles:
+            by_source.setdefault(profile['source'].lower(), []).append(profile)
+
+        recommendations = []
+        for group in by_source.values():
+            recommendation = self._recommend_view(group)
+            if recommendation:
+                recommendations.append(recommendation)
+
+        recommendations.sort(key=lambda r: (-(r['total_duration_ms'] or 0), -r['statement_count']))
+        return {
+            'total_statements': total,
+            'aggregate_statements': len(profiles),
+            'recommendations': recommendations
+        }
+
+    def _profile(self, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Grouping keys, aggregates, filters and source tables of one aggregate SELECT"""
+        parsed = self.analyzer.parse_sql(entry['sql'])
+        if not parsed or self.analyzer._get_query_type(parsed[0]) != 'SELECT':
+            return None
+        query = parsed[0]
+        clauses = self.analyzer._top_level_clauses(query)
+        group_by = self.analyzer._analyze_group_by(query)
+        if 'FROM' not in clauses or 'WITH' in clauses or not group_by['aggregates']:
+            return None
+
+        select_items = [
+            self.analyzer._split_select_item(item)
+            for item in self.analyzer._split_top_level_tokens(clauses['SELECT'])
+        ]
+        filters = self.analyzer._split_conjuncts(clauses.get('WHERE', []))
+        calls = int(entry.get('calls') or 1)
+        aggregates = list(group_by['aggregates'])
+        for clause in ('HAVING', 'ORDER BY'):
+            for call in self.analyzer._extract_aggregate_calls(clauses.get(clause, [])):
+                if call['expression'] not in [known['expression'] for known in aggregates]:
+                    aggregates.append(call)
+
+        return {
+            'sql': entry['sql'].strip(),
+            'source': self.analyzer._tokens_to_text(clauses['FROM']),
+            'tables': self.analyzer._extract_tables(query),
+            'references': [ref for ref in self.analyzer._extract_table_references(query) if ref['depth'] == 0],
+            'select_items': select_items,
+            'keys': group_by['columns'],
+            'aggregates': aggregates,
+            'filters': filters,
+            'having': self.analyzer._tokens_to_text(clauses.get('HAVING', [])),
+            'order_by': self.analyzer._tokens_to_text(clauses.get('ORDER BY', [])),
+            'limit': self.analyzer._tokens_to_text(clauses.get('LIMIT', [])),
+            'calls': calls,
+            'duration_ms': float(entry['duration_ms']) * calls if entry.get('duration_ms') is not None else None,
+            'decomposable': all(
+                call['function'] in DECOMPOSABLE_AGGREGATES and not call['distinct']
+                for call in aggregates
+            )
+        }
+
+    def _recommend_view(self, group: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Build the smallest view (keys, measures, fixed filters) that answers every query in the group"""
+        candidates = [profile for profile in group if profile['decomposable']]
+        if len(candidates) < self.min_queries:
+            return None
+
+        # Filters every query shares verbatim are baked into the view; the rest must filter on a view key
+        baked = [f for f in candidates[0]['filters'] if all(f in profile['filters'] for profile in candidates)]
+        measure_arguments = {call['argument'].lower() for profile in candidates for call in profile['aggregates']}
+        answerable = []
+        excluded = []
+        keys = []
+        for profile in candidates:
+            filter_columns = []
+            reason = None
+            for condition in profile['filters']:
+                if condition in baked:
+                    continue
+                match = SIMPLE_FILTER.match(condition)
+                if not match:
+                    reason = f"{condition} is not a simple column comparison"
+                    break
+                reason = self._high_cardinality(match.group(1), profile, measure_arguments)
+                if reason:
+                    reason = f"{condition} filters on {reason}; grouping the view by it keeps about one row per base row"
+                    break
+                filter_columns.append(match.group(1))
+            if reason:
+                excluded.append({'sql': profile['sql'], 'reason': reason})
+                continue
+            answerable.append(profile)
+            for key in profile['keys'] + filter_columns:
+                if key.lower() not in [k.lower() for k in keys]:
+                    keys.append(key)
+        if len(answerable) < self.min_queries:
+            return None
+        grouped = {key.lower() for profile in answerable for key in profile['keys']}
+        filter_only_keys = [key for key in keys if key.lower() not in grouped]
+
+        key_names = self._key_names(keys, answerable)
+        measures = {}
+        for profile in answerable:
+            for call in profile['aggregates']:
+                for function, argument in self._base_measures(call):
+                    measures.setdefault((function, argument.lower()), (function, argument))
+
+        main_table = answerable[0]['tables'][0] if answerable[0]['tables'] else 'source'
+        view_name = f"mv_{main_table.split('.')[-1]}_by_{'_'.join(key_names[k.lower()] for k in keys)}"[:63]
+
+        measure_columns = {}
+        select_list = [key if key == key_names[key.lower()] else f"{key} AS {key_names[key.lower()]}" for key in keys]
+        for function, argument in measures.values():
+            column = self._measure_column(function, argument)
+            measure_columns[(function, argument.lower())] = column
+            if function == 'COUNT' and self.dialect == 'sqlserver':
+                select_list.append(f"COUNT_BIG({argument}) AS {column}")
+            else:
+                select_list.append(f"{function}({argument}) AS {column}")
+        view_select = f"SELECT {', '.join(select_list)}\nFROM {answerable[0]['source']}"
+        if baked:
+            view_select += f"\nWHERE {' AND '.join(baked)}"
+        view_select += f"\nGROUP BY {', '.join(keys)}"
+
+        statement_count = sum(profile['calls'] for profile in answerable)
+        durations = [profile['duration_ms'] for profile in answerable if profile['duration_ms'] is not None]
+
+        return {
+            'view_name': view_name,
+            'source': answerable[0]['source'],
+            'tables': answerable[0]['tables'],
+            'grouping_keys': [{'expression': key, 'column': key_names[key.lower()]} for key in keys],
+            'measures': [
+                {'function': function, 'argument': argument, 'column': measure_columns[(function, argument.lower())]}
+                for function, argument in measures.values()
+            ],
+            'fixed_filters': baked,
+            'create_statement': self._create_statement(view_name, view_select, [key_names[k.lower()] for k in keys]),
+            'statement_count': statement_count,
+            'variant_count': len(answerable),
+            'total_duration_ms': round(sum(durations), 3) if durations else None,
+            'rewrites': [
+                {'original_query': profile['sql'],
+                 'rewritten_query': self._rewrite(profile, view_name, key_names, measure_columns, baked)}
+                for profile in answerable
+            ],
+            'excluded': excluded,
+            'estimate': self._estimate(main_table, len(keys), statement_count, view_name, filter_only_keys),
+            'suggestion': {
+                'type': 'materialized_view_optimization',
+                'priority': 'high' if len(answerable) >= 3 else 'medium',
+                'title': f"Pre-aggregate {len(answerable)} rollup variants over {main_table} into {view_name}",
+                'description': (f"{len(answerable)} GROUP BY queries on the same source differ only in grouping keys, "
+                                'measures or filters; a view grouped by the union of their keys answers all of them'),
+                'code_example': view_select,
+                'impact': f"{statement_count} executions read the pre-aggregated view instead of the base table"
+            }
+        }
+
+    def _high_cardinality(self, column: str, profile: Dict[str, Any], measure_arguments: set) -> Optional[str]:
+        """Why a filter column would blow up the view's row count (a measure, unique or continuous column)"""
+        if column.lower() in measure_arguments:
+            return f"the measure {column}"
+        resolved = self.analyzer._resolve_column(column, profile['references'])
+        table = self.schema.get_table(resolved[0]) if resolved else None
+        if not table or resolved[1] not in table['columns']:
+            return None
+        if [resolved[1]] == table['primary_key'] or [resolved[1]] in table['unique_keys']:
+            return f"the unique column {column}"
+        column_type = table['columns'][resolved[1]]['type']
+        if column_type_category(column_type) in HIGH_CARDINALITY_CATEGORIES:
+            return f"the {column_type} column {column}"
+        return None
+
+    def _key_names(self, keys: List[str], profiles: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Column names for grouping keys: the bare column, an existing select alias, or key_N"""
+        names = {}
+        for number, key in enumerate(keys, 1):
+            name = None
+            if re.match(r'^[\w.]+$', key):
+                name = key.split('.')[-1]
+            else:
+                for profile in profiles:
+                    for expression, alias in profile['select_items']:
+                        if alias and expression.lower() == key.lower():
+                            name = alias
+                            break
+                    if name:
+                        break
+            name = normalize_identifier(name or f"key_{number}")
+            while name in names.values():
+                name = f"{name}_{number}"
+            names[key.lower()] = name
+        return names
+
+    def _base_measures(self, call: Dict[str, Any]) -> List[tuple]:
+        """Re-aggregatable measures a call needs (AVG is rebuilt from SUM and COUNT)"""
+        if call['function'] == 'AVG':
+            return [('SUM', call['argument']), ('COUNT', call['argument'])]
+        return [(call['function'], call['argument'])]
+
+    def _measure_column(self, function: str, argument: str) -> str:
+        """View column name for a measure, e.g. sum_amount or count_all"""
+        if argument == '*':
+            return f"{function.lower()}_all"
+        slug = re.sub(r'\W+', '_', argument.split('.')[-1].lower()).strip('_')
+        return f"{function.lower()}_{slug or 'value'}"
+
+    def _rollup(self, call: Dict[str, Any], measure_columns: Dict[tuple, str]) -> str:
+        """Expression computing an aggregate from the view's partial aggregates"""
+        def column(function):
+            return measure_columns[(function, call['argument'].lower())]
+
+        if call['function'] in ('SUM', 'COUNT'):
+            return f"SUM({column(call['function'])})"
+        if call['function'] == 'AVG':
+            return f"SUM({column('SUM')}) / NULLIF(SUM({column('COUNT')}), 0)"
+        return f"{call['function']}({column(call['function'])})"
+
+    def _rewrite(self, profile: Dict[str, Any], view_name: str, key_names: Dict[str, str],
+                 measure_columns: Dict[tuple, str], baked: List[str]) -> str:
+        """The query answered from the view"""
+        def replace(text: str) -> str:
+            for call in profile['aggregates']:
+                text = text.replace(call['expression'], self._rollup(call, measure_columns))
+            for key, name in sorted(key_names.items(), key=lambda item: -len(item[0])):
+                text = re.sub(r'(?<![\w.])' + re.escape(key) + r'(?![\w(])', name, text, flags=re.IGNORECASE)
+            return text
+
+        select_list = []
+        for expression, alias in profile['select_items']:
+            rewritten = replace(expression)
+            if alias and alias != rewritten:
+                rewritten += f" AS {alias}"
+            elif re.match(r'^[\w.]+$', expression) and expression.lower() in key_names \
+                    and rewritten != expression.split('.')[-1]:
+                rewritten += f" AS {expression.split('.')[-1]}"
+            select_list.append(rewritten)
+
+        sql = f"SELECT {', '.join(select_list)}\nFROM {view_name}"
+        filters = [replace(condition) for condition in profile['filters'] if condition not in baked]
+        if filters:
+            sql += f"\nWHERE {' AND '.join(filters)}"
+        sql += f"\nGROUP BY {', '.join(key_names[key.lower()] for key in profile['keys'])}"
+        if profile['having']:
+            sql += f"\nHAVING {replace(profile['having'])}"
+        if profile['order_by']:
+            sql += f"\nORDER BY {replace(profile['order_by'])}"
+        if profile['limit']:
+            sql += f"\nLIMIT {profile['limit']}"
+        return sql
+
+    def _create_statement(self, view_name: str, view_select: str, key_columns: List[str]) -> str:
+        """Dialect-specific DDL: materialized view, indexed view or summary table"""
+        keys = ', '.join(key_columns)
+        if self.dialect in ('postgresql', 'postgres'):
+            return (f"CREATE MATERIALIZED VIEW {view_name} AS\n{view_select};\n"
+                    f"CREATE UNIQUE INDEX {view_name}_key_idx ON {view_name} ({keys});")
+        if self.dialect == 'oracle':
+            return (f"CREATE MATERIALIZED VIEW {view_name}\nBUILD IMMEDIATE REFRESH COMPLETE ON DEMAND\n"
+                    f"ENABLE QUERY REWRITE AS\n{view_select};")
+        if self.dialect == 'sqlserver':
+            return (f"CREATE VIEW dbo.{view_name} WITH SCHEMABINDING AS\n{view_select};\n"
+                    f"CREATE UNIQUE CLUSTERED INDEX {view_name}_key_idx ON dbo.{view_name} ({keys});")
+        return (f"CREATE TABLE {view_name} AS\n{view_select};\n"
+                f"CREATE UNIQUE INDEX {view_name}_key_idx ON {view_name} ({keys});")
+
+    def _estimate(self, table: str, key_count: int, statement_count: int, view_name: str,
+                  filter_only_keys: List[str]) -> Dict[str, Any]:
+        """Rows scanned per query before/after and the cost of keeping the view fresh"""
+        table_entry = self.schema.get_table(table) if self.schema else None
+        source_rows = table_entry['stats'].get('row_count') if table_entry else None
+        view_rows = min(source_rows, DEFAULT_GROUP_CARDINALITY ** key_count) if source_rows is not None else None
+        # A key that only appears in filters has a cardinality nothing in the log bounds
+        if filter_only_keys:
+            view_rows = None
+        estimated = bool(source_rows) and view_rows is not None
+        refreshes_per_day = round(24 * 60 / self.refresh_interval_minutes, 2)
+
+        estimate = {
+            'source_rows': source_rows,
+            'estimated_view_rows': view_rows,
+            'scan_reduction_pct': round((1 - view_rows / source_rows) * 100, 1) if estimated else None,
+            'rows_scanned_saved': (source_rows - view_rows) * statement_count if estimated else None,
+            'refresh': {
+                'statement': self._refresh_statement(view_name),
+                'interval_minutes': self.refresh_interval_minutes,
+                'refreshes_per_day': refreshes_per_day,
+                'rows_scanned_per_refresh': source_rows
+            }
+        }
+        if filter_only_keys:
+            estimate['note'] = (f"{', '.join(filter_only_keys)} only filter and never group a query, "
+                                "so the view's row count and scan reduction are not estimated")
+        if self.dialect == 'sqlserver':
+            estimate['refresh'].update(
+                statement=None, refreshes_per_day=None, rows_scanned_per_refresh=0,
+                note='Indexed views are maintained synchronously on every write to the base tables'
+            )
+        return estimate
+
+    def _refresh_statement(self, view_name: str) -> str:
+        """How the view or summary table is brought up to date"""
+        if self.dialect in ('postgresql', 'postgres'):
+            return f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name};"
+        if self.dialect == 'oracle':
+            return f"BEGIN DBMS_MVIEW.REFRESH('{view_name}', 'C'); END;"
+        if self.dialect in ('mysql', 'mariadb'):
+            return f"-- schedule with CREATE EVENT: REPLACE INTO {view_name} <view SELECT>;"
+        return f"DELETE FROM {view_name}; INSERT INTO {view_name} <view SELECT>;"
@@ -0,0 +1,81 @@
+import json
+from typing import List, Dict, Any, Optional, Iterable
+
+import sqlparse
+
+from sql_analyzer import SQLAnalyzer
+
+class WorkloadReport:
+    """Consolidate per-statement analysis into one entry per fingerprint, issue and suggestion"""
+
+    def __init__(self, analyzer: Optional[SQLAnalyzer] = None):
+        self.analyzer = analyzer or SQLAnalyzer()
+
+    def build(self, parsed_queries: List[sqlparse.sql.Statement], analysis_results: List[Dict[str, Any]],
+              suggestions: List[List[Dict[str, Any]]], optimization_score: float,
+              detail_ids: Iterable[int] = ()) -> Dict[str, Any]:
+        """Group statements by fingerprint and issue/suggestion, listing each distinct entry once"""
+        # analyze_queries skips comment-only statements; keep ids aligned with its results
+        statements = [query for query in parsed_queries if query.get_type() and query.get_type() != 'Comment']
+        fingerprints = {}
+        issues = {}
+        grouped_suggestions = {}
+
+        for statement_id, (query, analysis) in enumerate(zip(statements, analysis_results), 1):
+            fingerprint = self.analyzer.fingerprint(query)[0]
+            group = fingerprints.setdefault(fingerprint, {
+                'fingerprint': fingerprint,
+                'query_type': analysis['query_type'],
+                'tables': analysis['tables'],
+                'sample_query': str(query).strip(),
+                'statement_ids': [],
+                'issue_types': sorted({issue['type'] for issue in analysis['issues']})
+            })
+            group['statement_ids'].append(statement_id)
+
+            for issue in analysis['issues']:
+                key = (issue['type'], issue['severity'], issue['message'])
+                entry = issues.setdefault(key, dict(issue, statement_ids=[]))
+                entry['statement_ids'].append(statement_id)
+
+            query_suggestions = suggestions[statement_id - 1] if statement_id <= len(suggestions) else []
+            for suggestion in query_suggestions:
+                key = json.dumps(suggestion, sort_keys=True, default=str)
+                entry = grouped_suggestions.setdefault(key, dict(suggestion, statement_ids=[]))
+                entry['statement_ids'].append(statement_id)
+
+        report = {
+            'summary': {
+                'total_queries': len(parsed_queries),
+                'issues_found': sum(len(analysis['issues']) for analysis in analysis_results),
+                'optimization_score': optimization_score,
+                'unique_fingerprints': len(fingerprints),
+                'unique_issues': len(issues),
+                'unique_suggestions': len(grouped_suggestions)
+            },
+            'fingerprints': self._ranked(fingerprints.values()),
+            'issues': self._ranked(issues.values()),
+            'suggestions': self._ranked(grouped_suggestions.values()),
+            'statements': []
+        }
+
+        for statement_id in sorted(set(detail_ids)):
+            if 1 <= statement_id <= len(analysis_results):
+                query = statements[statement_id - 1]
+                report['statements'].append({
+                    'id': statement_id,
+                    'original_query': str(query),
+                    'formatted_query': sqlparse.format(str(query), reindent=True, keyword_case='upper'),
+                    'analysis': analysis_results[statement_id - 1],
+                    'suggestions': suggestions[statement_id - 1] if statement_id <= len(suggestions) else []
+                })
+
+        return report
+
+    def _ranked(self, groups: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Attach frequencies and order the most widespread entries first"""
+        ranked = []
+        for group in groups:
+            group['count'] = len(group['statement_ids'])
+            ranked.append(group)
+        return sorted(ranked, key=lambda group: -group['count'])